@@ -3,7 +3,9 @@ from .models import (
     UserRole, UserProfile, Category, Product, 
     Order, OrderItem, Discount, Setting,
     PaymentTransaction, AuditLog, BusinessLogo,
-    BusinessSettings
+    BusinessSettings, ArchivedOrder, ArchivedOrderItem,
+    ArchivedPaymentTransaction, BackgroundJob, IdempotencyKey,
+    KitchenTicket, Table, Printer, PrintJob, ProductAffinity, StockAlert, Customer
 )
 
 @admin.register(UserRole)
@@ -24,7 +26,7 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'stock_quantity', 'is_available', 'is_archived')
+    list_display = ('name', 'category', 'price', 'stock_quantity', 'reorder_threshold', 'is_available', 'is_archived')
     list_filter = ('category', 'is_available', 'is_archived', 'running_item')
     search_fields = ('name', 'sku', 'description')
 
@@ -44,13 +46,43 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('order_status', 'payment_status', 'payment_method', 'order_type', 'created_at')
     search_fields = ('reference_number', 'customer_name', 'customer_phone', 'table_number', 'notes')
     readonly_fields = ('created_at', 'updated_at')
+    raw_id_fields = ('customer',)
     inlines = [OrderItemInline, PaymentTransactionInline]
+    # Skip the unfiltered COUNT(*) on every changelist page
+    show_full_result_count = False
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    exclude = ('product',)
+    readonly_fields = ('product_name', 'quantity', 'unit_price', 'total_price', 'notes', 'created_at')
+
+class ArchivedPaymentTransactionInline(admin.TabularInline):
+    model = ArchivedPaymentTransaction
+    extra = 0
+    readonly_fields = ('transaction_number', 'amount', 'payment_method', 'transaction_status', 'transaction_note', 'created_at')
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('reference_number', 'user', 'customer_name', 'table_number', 'order_type', 'total_amount', 'payment_method', 'payment_status', 'order_status', 'created_at')
+    list_filter = ('order_status', 'payment_status', 'payment_method', 'order_type')
+    search_fields = ('reference_number', 'customer_name', 'customer_phone', 'table_number')
+    date_hierarchy = 'created_at'
+    inlines = [ArchivedOrderItemInline, ArchivedPaymentTransactionInline]
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 @admin.register(Discount)
 class DiscountAdmin(admin.ModelAdmin):
     list_display = ('name', 'code', 'type', 'value', 'is_active', 'start_date', 'end_date')
     list_filter = ('type', 'is_active', 'start_date', 'end_date')
     search_fields = ('name', 'code')
+    filter_horizontal = ('products', 'categories')
 
 @admin.register(Setting)
 class SettingAdmin(admin.ModelAdmin):
@@ -65,6 +97,69 @@ class AuditLogAdmin(admin.ModelAdmin):
     search_fields = ('action', 'details', 'user__username')
     readonly_fields = ('created_at',)
 
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'progress', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedupe_key')
+    exclude = ('result_file',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'updated_at', 'worker', 'error')
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'request_path', 'response_status', 'created_at', 'expires_at')
+    list_filter = ('request_path', 'response_status')
+    search_fields = ('key', 'user__username')
+    readonly_fields = ('created_at',)
+
+@admin.register(KitchenTicket)
+class KitchenTicketAdmin(admin.ModelAdmin):
+    list_display = ('order', 'reference_number', 'order_type', 'table_number', 'revision', 'ordered_at', 'updated_at')
+    list_filter = ('order_type',)
+    search_fields = ('reference_number', 'customer_name')
+    readonly_fields = ('ordered_at', 'updated_at')
+
+@admin.register(Table)
+class TableAdmin(admin.ModelAdmin):
+    list_display = ('number', 'current_order', 'updated_at')
+    search_fields = ('number',)
+    readonly_fields = ('current_order', 'updated_at')
+
+@admin.register(Printer)
+class PrinterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'role', 'target', 'columns', 'is_active', 'updated_at')
+    list_filter = ('role', 'is_active')
+    search_fields = ('name', 'target')
+
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'description', 'printer', 'status', 'attempts', 'created_by', 'created_at', 'printed_at')
+    list_filter = ('status', 'kind', 'printer')
+    search_fields = ('description',)
+    exclude = ('data',)
+    readonly_fields = ('created_at', 'printed_at', 'updated_at', 'error')
+
+@admin.register(ProductAffinity)
+class ProductAffinityAdmin(admin.ModelAdmin):
+    list_display = ('product', 'rank', 'related_product', 'orders', 'confidence')
+    search_fields = ('product__name', 'related_product__name')
+    list_select_related = ('product', 'related_product')
+
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+    list_display = ('product', 'stock_quantity', 'threshold', 'is_open', 'created_at', 'resolved_at', 'resolved_by')
+    list_filter = ('is_open',)
+    search_fields = ('product__name',)
+    list_select_related = ('product', 'resolved_by')
+    readonly_fields = ('created_at',)
+
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ('phone', 'name', 'visit_count', 'lifetime_spend', 'last_order_at')
+    search_fields = ('phone_key', 'phone', 'name')
+    # Maintained from the customer's orders, see posapp.customers
+    readonly_fields = ('visit_count', 'lifetime_spend', 'last_order_at', 'created_at', 'updated_at')
+
 @admin.register(BusinessSettings)
 class BusinessSettingsAdmin(admin.ModelAdmin):
     list_display = ('business_name', 'tax_rate_card', 'tax_rate_cash', 'default_service_charge', 'updated_at')
@@ -0,0 +1,280 @@
+"""
+Frequently bought together suggestions.
+
+How often two products are sold in the same order is kept as a sparse
+product x product matrix in ProductAffinityMatrix: two NumPy arrays, the
+sorted pair keys (product id << 32 | other product id) and their order
+counts. The diagonal holds the number of orders containing each product.
+
+The product_affinity job, queued when a day is ended, adds the completed
+orders of each closed business day not counted yet, one day at a time, so
+the history is read only once and archiving old orders loses nothing. It
+then stores the TOP_K products most often bought with each product in
+ProductAffinity, ranked by confidence: the share of the product's orders
+that also contain the other one.
+
+Serving loads ProductAffinity once into an in-memory dict of product id to
+suggested product ids, rebuilt when the 'affinity' or 'products' version
+changes like the discount table (posapp.discounts), so a lookup is a dict
+access.
+"""
+from io import BytesIO
+from itertools import islice
+import logging
+import threading
+import time
+
+import numpy as np
+from django.db import transaction
+
+from .archive import archive_database
+from .models import ArchivedOrderItem, OrderItem, Product, ProductAffinity, ProductAffinityMatrix
+from .summaries import business_days_after
+from .versioning import bump_version, get_versions, versions_are_shared
+
+logger = logging.getLogger('posapp')
+
+# Suggestions stored per product
+TOP_K = 5
+
+# Pairs sold together in fewer orders are chance, not affinity
+MIN_PAIR_ORDERS = 2
+
+# Larger orders (catering, events) say little about what goes together and
+# cost the square of their size in pairs
+MAX_BASKET_PRODUCTS = 30
+
+# Rows fetched per round trip and converted to arrays at a time
+CHUNK_SIZE = 20000
+
+# Seconds a table is trusted when other workers' changes cannot be seen
+TABLE_MAX_AGE = 30
+
+_ID_MASK = 0xFFFFFFFF
+
+_lock = threading.Lock()
+# (versions, built at, {product id: (suggested product ids)})
+_table = (None, 0, {})
+
+
+def _empty():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+
+def pair_counts(order_ids, product_ids):
+    """
+    Co-occurrence counts of the products in a set of orders
+
+    Args:
+        order_ids, product_ids: Arrays with one element per order item
+
+    Returns:
+        A tuple of (keys, counts); keys are sorted and hold both directions
+        of every pair, plus each product paired with itself for the number
+        of orders containing it
+    """
+    if not len(order_ids):
+        return _empty()
+    # One row per product per order, grouped by order
+    items = np.unique((np.asarray(order_ids, dtype=np.int64) << 32) | np.asarray(product_ids, dtype=np.int64))
+    orders, products = items >> 32, items & _ID_MASK
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(items)])
+    keep = np.repeat(sizes <= MAX_BASKET_PRODUCTS, sizes)
+    if not keep.all():
+        products, sizes = products[keep], sizes[sizes <= MAX_BASKET_PRODUCTS]
+        starts = np.cumsum(sizes) - sizes
+
+    # Every item is paired with every item of its order, itself included
+    pairs_per_item = np.repeat(sizes, sizes)
+    left = np.repeat(np.arange(len(products)), pairs_per_item)
+    first_pair = np.repeat(np.cumsum(pairs_per_item) - pairs_per_item, pairs_per_item)
+    right = np.repeat(np.repeat(starts, sizes), pairs_per_item) + np.arange(len(left)) - first_pair
+    return np.unique((products[left] << 32) | products[right], return_counts=True)
+
+
+def merge_counts(keys, counts, more_keys, more_counts):
+    """Sum of two sets of pair counts, as returned by pair_counts"""
+    merged, inverse = np.unique(np.concatenate([keys, more_keys]), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate([counts, more_counts]), minlength=len(merged))
+    return merged, np.rint(totals).astype(np.int64)
+
+
+def top_pairs(keys, counts, top_k=TOP_K):
+    """
+    The top_k products most often bought with each product
+
+    Returns:
+        A tuple of arrays (product ids, related product ids, orders,
+        confidence, rank), sorted by product and rank
+    """
+    products, others = keys >> 32, keys & _ID_MASK
+    diagonal = products == others
+    pairs = ~diagonal & (counts >= MIN_PAIR_ORDERS)
+    product, related, orders = products[pairs], others[pairs], counts[pairs]
+    # Keys are sorted, so the diagonal is sorted by product too
+    baskets = counts[diagonal][np.searchsorted(products[diagonal], product)]
+    confidence = orders / baskets
+
+    by_rank = np.lexsort((related, -orders, -confidence, product))
+    product, related, orders, confidence = product[by_rank], related[by_rank], orders[by_rank], confidence[by_rank]
+    starts = np.flatnonzero(np.r_[True, product[1:] != product[:-1]]) if len(product) else np.zeros(0, dtype=np.int64)
+    rank = np.arange(len(product)) - np.repeat(starts, np.diff(np.r_[starts, len(product)]))
+    top = rank < top_k
+    return product[top], related[top], orders[top], confidence[top], rank[top]
+
+
+def _load(matrix):
+    if not matrix.pairs:
+        return _empty()
+    with np.load(BytesIO(bytes(matrix.pairs))) as arrays:
+        return arrays['keys'], arrays['counts']
+
+
+def _dump(keys, counts):
+    output = BytesIO()
+    np.savez_compressed(output, keys=keys, counts=counts)
+    return output.getvalue()
+
+
+def _basket_columns(start, end):
+    """
+    Order and product ids of the items of the completed orders created in
+    [start, end), hot and archived
+    """
+    sources = [
+        OrderItem.objects.all(),
+        ArchivedOrderItem.objects.using(archive_database()),
+    ]
+    order_ids, product_ids = [], []
+    for items in sources:
+        items = items.filter(order__order_status='Completed', order__created_at__lt=end)
+        if start is not None:
+            items = items.filter(order__created_at__gte=start)
+        rows = items.order_by().values_list('order_id', 'product_id').iterator(chunk_size=CHUNK_SIZE)
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            chunk_orders, chunk_products = zip(*chunk)
+            order_ids.append(np.array(chunk_orders, dtype=np.int64))
+            product_ids.append(np.array(chunk_products, dtype=np.int64))
+    if not order_ids:
+        return _empty()
+    return np.concatenate(order_ids), np.concatenate(product_ids)
+
+
+def _store_top_pairs(keys, counts):
+    product, related, orders, confidence, rank = top_pairs(keys, counts)
+    existing = set(Product.objects.values_list('id', flat=True))
+    rows = [
+        ProductAffinity(product_id=p, related_product_id=r, rank=k, orders=o, confidence=c)
+        for p, r, o, c, k in zip(product.tolist(), related.tolist(), orders.tolist(), confidence.tolist(), rank.tolist())
+        # Products only referenced by archived orders may have been deleted
+        if p in existing and r in existing
+    ]
+    with transaction.atomic():
+        ProductAffinity.objects.all().delete()
+        ProductAffinity.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def update_affinity(rebuild=False, progress=None):
+    """
+    Count the closed business days not counted yet and store the top pairs
+
+    Args:
+        rebuild: Start the matrix over from the first end day
+        progress: Optional callable taking (days done, days to do)
+
+    Returns:
+        A dict with the number of days and orders counted and of stored pairs
+    """
+    matrix = ProductAffinityMatrix.objects.first() or ProductAffinityMatrix.objects.create(pairs=b'')
+    if rebuild:
+        matrix.pairs, matrix.counted_until, matrix.days_counted, matrix.orders_counted = b'', None, 0, 0
+        matrix.save()
+
+    periods = business_days_after(matrix.counted_until)
+    keys, counts = _load(matrix)
+
+    orders_counted = 0
+    for done, (start, end) in enumerate(periods):
+        order_ids, product_ids = _basket_columns(start, end)
+        day_keys, day_counts = pair_counts(order_ids, product_ids)
+        keys, counts = merge_counts(keys, counts, day_keys, day_counts)
+        day_orders = len(np.unique(order_ids))
+        orders_counted += day_orders
+
+        # Saved after every day, so an interrupted run resumes where it stopped
+        matrix.pairs = _dump(keys, counts)
+        matrix.counted_until = end
+        matrix.days_counted += 1
+        matrix.orders_counted += day_orders
+        matrix.save()
+        if progress:
+            progress(done + 1, len(periods))
+
+    if periods or rebuild:
+        stored = _store_top_pairs(keys, counts)
+        bump_version('affinity')
+    else:
+        stored = ProductAffinity.objects.count()
+    logger.info(f"Product affinity: counted {len(periods)} business days, {orders_counted} orders, stored {stored} pairs")
+    return {'days': len(periods), 'orders': orders_counted, 'pairs': stored}
+
+
+def _compile():
+    available = Product.objects.filter(is_available=True, is_archived=False).values('id')
+    rows = (ProductAffinity.objects.filter(related_product__in=available)
+            .order_by('product_id', 'rank').values_list('product_id', 'related_product_id'))
+    table = {}
+    for product_id, related_id in rows:
+        table.setdefault(product_id, []).append(related_id)
+    return {product_id: tuple(related) for product_id, related in table.items()}
+
+
+def _current_table():
+    global _table
+    versions = get_versions('affinity', 'products')
+    table = _table
+    fresh = table[0] == versions
+    if fresh and not versions_are_shared():
+        fresh = time.monotonic() - table[1] < TABLE_MAX_AGE
+    if fresh:
+        return table
+    with _lock:
+        # Another thread may have rebuilt it meanwhile
+        if _table is not table and _table[0] == versions:
+            return _table
+        _table = (versions, time.monotonic(), _compile())
+        return _table
+
+
+def suggestion_table():
+    """Every product's suggestions, as {product id: (product ids, best first)}"""
+    return _current_table()[2]
+
+
+def suggestions(product_ids, limit=TOP_K):
+    """
+    Products most often bought with any of product_ids, best first
+
+    The suggestions of every product take turns, so each product in a
+    basket gets its best match in before any gets its second.
+
+    Returns:
+        A list of at most limit product ids, none of them in product_ids
+    """
+    table = suggestion_table()
+    product_ids = [int(product_id) for product_id in product_ids]
+    basket = set(product_ids)
+    lists = [table.get(product_id, ()) for product_id in product_ids]
+    found = []
+    for rank in range(TOP_K):
+        for related in lists:
+            if rank < len(related) and related[rank] not in basket and related[rank] not in found:
+                found.append(related[rank])
+                if len(found) == limit:
+                    return found
+    return found
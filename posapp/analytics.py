@@ -0,0 +1,286 @@
+"""
+Sales analytics: hour x weekday heatmap, day of week and basket size.
+
+These figures cover months of orders, so instead of one GROUP BY per figure
+the orders of a range are read once as compact columns (id, created_at,
+total and, from a second stream, item quantities) with
+``values_list(...).iterator()`` and aggregated with NumPy in one pass.
+Ranges reaching below the archive cutoff read the archived orders too.
+
+Every figure is a sum, so a range is split into business days (the periods
+between two end days). The sums of a closed business day are cached through
+report_cache, keyed by its end day and the orders versions of its days, so
+a later edit of one of its orders still invalidates them. Only the open
+period and the partial business days at either end of the range are read
+from the database on every request.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+import logging
+
+import numpy as np
+from django.utils import timezone
+
+from . import report_cache
+from .archive import order_sources
+from .models import ArchivedOrder, ArchivedOrderItem, EndDay, OrderItem
+
+logger = logging.getLogger('posapp')
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SLOTS = 7 * 24
+
+# Baskets of this many items or more share the last bucket
+MAX_BASKET_ITEMS = 20
+
+# Rows fetched per round trip and converted to arrays at a time
+CHUNK_SIZE = 20000
+
+
+def _chunks(rows):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _order_columns(orders):
+    """
+    The id, created_at (UTC epoch seconds) and total (in cents) of orders as
+    three arrays
+    """
+    ids, seconds, cents = [], [], []
+    rows = orders.values_list('id', 'created_at', 'total_amount').iterator(chunk_size=CHUNK_SIZE)
+    for chunk in _chunks(rows):
+        chunk_ids, created, totals = zip(*chunk)
+        ids.append(np.array(chunk_ids, dtype=np.int64))
+        seconds.append(np.fromiter((moment.timestamp() for moment in created), dtype=np.float64, count=len(chunk)))
+        cents.append(np.rint(np.array(totals, dtype=np.float64) * 100).astype(np.int64))
+    if not ids:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(ids), np.concatenate(seconds).astype(np.int64), np.concatenate(cents)
+
+
+def _item_counts(orders, ids):
+    """Number of items in each of the orders, in the order of ids"""
+    counts = np.zeros(len(ids), dtype=np.int64)
+    if not len(ids):
+        return counts
+    if orders.model is ArchivedOrder:
+        items = ArchivedOrderItem.objects.using(orders.db)
+    else:
+        items = OrderItem.objects.all()
+    order_ids, quantities = [], []
+    rows = items.filter(order__in=orders).order_by().values_list('order_id', 'quantity').iterator(chunk_size=CHUNK_SIZE)
+    for chunk in _chunks(rows):
+        chunk_ids, chunk_quantities = zip(*chunk)
+        order_ids.append(np.array(chunk_ids, dtype=np.int64))
+        quantities.append(np.array(chunk_quantities, dtype=np.int64))
+    if not order_ids:
+        return counts
+    order_ids = np.concatenate(order_ids)
+    # Position of each item's order in ids
+    by_id = np.argsort(ids)
+    positions = by_id[np.searchsorted(ids, order_ids, sorter=by_id)]
+    return np.bincount(positions, weights=np.concatenate(quantities), minlength=len(ids)).astype(np.int64)
+
+
+def _local_slots(seconds):
+    """
+    Heatmap slot (weekday * 24 + local hour, Monday 0) of UTC epoch seconds
+
+    The UTC offset is looked up once per hour the orders span rather than
+    once per order.
+    """
+    if not len(seconds):
+        return np.zeros(0, dtype=np.int64)
+    hours = seconds // 3600
+    first = int(hours.min())
+    tz = timezone.get_current_timezone()
+    offsets = np.array([
+        datetime.fromtimestamp(hour * 3600, tz).utcoffset().total_seconds()
+        for hour in range(first, int(hours.max()) + 1)
+    ], dtype=np.int64)
+    local = seconds + offsets[hours - first]
+    # 1970-01-01 was a Thursday
+    weekdays = (local // 86400 + 3) % 7
+    return weekdays * 24 + (local // 3600) % 24
+
+
+def _read_sums(start, end):
+    """
+    Sums of the orders created in [start, end), excluding cancelled ones,
+    hot and archived
+
+    Returns:
+        A dict of plain lists: orders, revenue (cents) and items per heatmap
+        slot, and the number of orders per basket size
+    """
+    seconds, cents, items = [], [], []
+    for orders in order_sources(start):
+        orders = orders.filter(created_at__gte=start, created_at__lt=end).exclude(order_status='Cancelled')
+        source_ids, source_seconds, source_cents = _order_columns(orders)
+        seconds.append(source_seconds)
+        cents.append(source_cents)
+        items.append(_item_counts(orders, source_ids))
+    seconds, cents, items = np.concatenate(seconds), np.concatenate(cents), np.concatenate(items)
+    slots = _local_slots(seconds)
+    return {
+        'orders': np.bincount(slots, minlength=SLOTS).tolist(),
+        'revenue': np.rint(np.bincount(slots, weights=cents, minlength=SLOTS)).astype(np.int64).tolist(),
+        'items': np.rint(np.bincount(slots, weights=items, minlength=SLOTS)).astype(np.int64).tolist(),
+        'basket_sizes': np.bincount(np.minimum(items, MAX_BASKET_ITEMS), minlength=MAX_BASKET_ITEMS + 1).tolist(),
+    }
+
+
+def _segments(start, end):
+    """
+    Split [start, end) at the end days inside it
+
+    Returns:
+        A list of (start, end, end_day_id); end_day_id is set for the closed
+        business days lying wholly inside the range and None for the pieces
+        at either end
+    """
+    previous = EndDay.objects.filter(end_date__lte=start).order_by('-end_date').values_list('end_date', flat=True).first()
+    end_days = EndDay.objects.filter(end_date__gt=start, end_date__lte=end).order_by('end_date').values_list('id', 'end_date')
+    segments = []
+    segment_start = start
+    for end_day_id, end_date in end_days:
+        whole = previous is not None and previous == segment_start
+        segments.append((segment_start, end_date, end_day_id if whole else None))
+        segment_start = previous = end_date
+    if segment_start < end:
+        segments.append((segment_start, end, None))
+    return segments
+
+
+def _money(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _average(total, count):
+    return total / count if count else 0
+
+
+def _day_count(start_date, end_date):
+    """Number of each weekday (Monday 0) from start_date to end_date"""
+    ordinals = np.arange(start_date.toordinal(), end_date.toordinal() + 1)
+    # date.fromordinal(1) was a Monday
+    return np.bincount((ordinals - 1) % 7, minlength=7)
+
+
+def _figures(sums, start_date, end_date):
+    orders = np.array(sums['orders'], dtype=np.int64).reshape(7, 24)
+    revenue = np.array(sums['revenue'], dtype=np.int64).reshape(7, 24)
+    items = np.array(sums['items'], dtype=np.int64).reshape(7, 24)
+    basket_sizes = np.array(sums['basket_sizes'], dtype=np.int64)
+    order_count, revenue_cents, item_count = int(orders.sum()), int(revenue.sum()), int(items.sum())
+
+    busiest = int(orders.max()) if order_count else 0
+    heatmap = [
+        {
+            'weekday': WEEKDAYS[weekday],
+            'cells': [
+                {
+                    'hour': hour,
+                    'orders': int(orders[weekday, hour]),
+                    'revenue': _money(revenue[weekday, hour]),
+                    # Share of the busiest slot, for shading
+                    'level': round(100 * int(orders[weekday, hour]) / busiest) if busiest else 0,
+                }
+                for hour in range(24)
+            ],
+        }
+        for weekday in range(7)
+    ]
+
+    day_count = _day_count(start_date, end_date)
+    weekdays = []
+    for weekday in range(7):
+        weekday_orders, weekday_cents = int(orders[weekday].sum()), int(revenue[weekday].sum())
+        weekdays.append({
+            'weekday': WEEKDAYS[weekday],
+            'days': int(day_count[weekday]),
+            'orders': weekday_orders,
+            'revenue': _money(weekday_cents),
+            'orders_per_day': round(_average(weekday_orders, int(day_count[weekday])), 1),
+            'revenue_per_day': _money(round(_average(weekday_cents, int(day_count[weekday])))),
+            'average_basket_value': _money(round(_average(weekday_cents, weekday_orders))),
+        })
+
+    hours = [
+        {'hour': hour, 'orders': int(orders[:, hour].sum()), 'revenue': _money(revenue[:, hour].sum())}
+        for hour in range(24)
+    ]
+
+    basket_distribution = [
+        {
+            'items': f'{size}+' if size == MAX_BASKET_ITEMS else str(size),
+            'orders': int(count),
+            'share': round(100 * int(count) / order_count, 1) if order_count else 0,
+        }
+        for size, count in enumerate(basket_sizes)
+        # Orders without items only show up if there are any
+        if size or count
+    ]
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'order_count': order_count,
+        'revenue': _money(revenue_cents),
+        'item_count': item_count,
+        'average_basket_value': _money(round(_average(revenue_cents, order_count))),
+        'average_basket_items': round(_average(item_count, order_count), 2),
+        'heatmap': heatmap,
+        'weekdays': weekdays,
+        'hours': hours,
+        'basket_sizes': basket_distribution,
+    }
+
+
+def sales_analytics(start_date, end_date, since=None):
+    """
+    Heatmap, day of week and basket size figures for a range of days
+
+    Args:
+        start_date, end_date: First and last local day of the range
+        since: Only count orders created from this moment (branch managers
+            see data since the last end day), or None
+
+    Returns:
+        A dict of plain data (ints, Decimals and lists), also used as the
+        JSON response of the analytics API
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+    if since and since > start:
+        start = since
+        start_date = timezone.localdate(since)
+
+    totals = {'orders': np.zeros(SLOTS, np.int64), 'revenue': np.zeros(SLOTS, np.int64),
+              'items': np.zeros(SLOTS, np.int64), 'basket_sizes': np.zeros(MAX_BASKET_ITEMS + 1, np.int64)}
+    closed_days = 0
+    segments = _segments(start, end) if start < end else []
+    for segment_start, segment_end, end_day_id in segments:
+        if end_day_id is None:
+            sums = _read_sums(segment_start, segment_end)
+        else:
+            closed_days += 1
+            sums = report_cache.cached_report(
+                'analytics_business_day', segment_start, segment_end, [report_cache.ORDERS],
+                lambda segment_start=segment_start, segment_end=segment_end: _read_sums(segment_start, segment_end),
+                end_day=end_day_id,
+            )
+        for name, values in sums.items():
+            totals[name] += np.asarray(values, dtype=np.int64)
+
+    figures = _figures(totals, start_date, end_date)
+    figures['closed_business_days'] = closed_days
+    logger.debug(f"Sales analytics {start_date} to {end_date}: {len(segments)} segments, {closed_days} closed business days")
+    return figures
@@ -2,7 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from ..models import (
     UserRole, UserProfile, Category, Product, 
-    Order, OrderItem, Discount, Setting
+    Order, OrderItem, Discount, Setting,
+    ArchivedOrder, ArchivedOrderItem
 )
 
 class UserRoleSerializer(serializers.ModelSerializer):
@@ -106,6 +107,19 @@ class OrderSerializer(serializers.ModelSerializer):
         
         return order
 
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrderItem
+        fields = '__all__'
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    user_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    
+    class Meta:
+        model = ArchivedOrder
+        fields = '__all__'
+
 class DiscountSerializer(serializers.ModelSerializer):
     class Meta:
         model = Discount
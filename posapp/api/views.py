@@ -10,8 +10,14 @@ from ..models import (
 from .serializers import (
     UserSerializer, CategorySerializer, ProductSerializer,
     OrderSerializer, OrderItemSerializer, DiscountSerializer,
-    SettingSerializer
+    SettingSerializer, ArchivedOrderSerializer
 )
+from ..archive import order_history
+from ..ingest import MAX_BATCH_ORDERS, create_orders_bulk
+from ..order_search import search_filter
+from .. import discounts as discount_rules, forecasting, settings_store
+from django.db.models import F, Q
+import datetime
 from django_filters.rest_framework import DjangoFilterBackend
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -59,6 +65,13 @@ class CategoryViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
 
+def _hours_param(request):
+    """The ``within_hours`` query parameter as a float, or None if missing or malformed"""
+    try:
+        return float(request.query_params['within_hours'])
+    except (KeyError, ValueError):
+        return None
+
 class ProductViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows products to be viewed or edited.
@@ -91,11 +104,61 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
+        """
+        Products with less than ``threshold`` (default 10) in stock, and with
+        ``within_hours`` also those forecast to run out within that many hours
+        """
         threshold = int(request.query_params.get('threshold', 10))
-        low_stock_products = Product.objects.filter(stock_quantity__lt=threshold)
+        low_stock_filter = Q(stock_quantity__lt=threshold)
+        if request.query_params.get('within_hours'):
+            within_hours = _hours_param(request)
+            if within_hours is None:
+                return Response(
+                    {"error": "within_hours must be a number"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            running_out = [
+                forecast['product_id'] for forecast in forecasting.forecasts()
+                if forecast['hours_to_stockout'] is not None and forecast['hours_to_stockout'] <= within_hours
+            ]
+            low_stock_filter |= Q(id__in=running_out)
+        low_stock_products = Product.objects.filter(low_stock_filter)
         serializer = self.get_serializer(low_stock_products, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], url_path='forecast', url_name='stock-forecast')
+    def stock_forecast(self, request):
+        """
+        Stock forecasts of the products not archived, soonest stockout first
+
+        ``within_hours`` keeps the products running out within that many
+        hours, ``reorder=true`` those due for reordering.
+        """
+        within_hours = _hours_param(request)
+        if request.query_params.get('within_hours') and within_hours is None:
+            return Response(
+                {"error": "within_hours must be a number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        results = forecasting.forecasts()
+        if within_hours is not None:
+            results = [
+                forecast for forecast in results
+                if forecast['hours_to_stockout'] is not None and forecast['hours_to_stockout'] <= within_hours
+            ]
+        if request.query_params.get('reorder', '').lower() in ('1', 'true'):
+            results = [forecast for forecast in results if forecast['reorder_quantity'] > 0]
+        results.sort(key=lambda forecast: (
+            forecast['hours_to_stockout'] is None, forecast['hours_to_stockout'] or 0, forecast['name']
+        ))
+        return Response(results)
+    
+    @action(detail=True, methods=['get'])
+    def forecast(self, request, pk=None):
+        """Stock forecast of one product"""
+        product = self.get_object()
+        return Response(forecasting.forecasts(Product.objects.filter(pk=product.pk))[0])
+    
     @action(detail=True, methods=['post'])
     def update_stock(self, request, pk=None):
         product = self.get_object()
@@ -126,6 +189,44 @@ class OrderViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['reference_number', 'customer_name', 'customer_phone']
     
+    def list(self, request, *args, **kwargs):
+        """
+        List orders newest first, including archived history.
+        
+        Optional ``date_from``/``date_to`` (YYYY-MM-DD) limit the range; the
+        archive tables are only read when the range reaches below the archive
+        cutoff. ``search`` takes a reference number, phone number, table
+        number or customer name (see posapp.order_search).
+        """
+        try:
+            date_from = request.query_params.get('date_from')
+            date_to = request.query_params.get('date_to')
+            date_from = datetime.date.fromisoformat(date_from) if date_from else None
+            date_to = datetime.date.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            return Response(
+                {"error": "date_from and date_to must use the YYYY-MM-DD format"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Matched with an index lookup chosen by the shape of the search text
+        filters = search_filter(request.query_params.get('search', ''))
+        orders = order_history(filters, date_from, date_to)
+        page = self.paginate_queryset(orders)
+        if page is None:
+            page = list(orders)
+        
+        context = self.get_serializer_context()
+        data = [
+            ArchivedOrderSerializer(order, context=context).data if getattr(order, 'is_archived', False)
+            else OrderSerializer(order, context=context).data
+            for order in page
+        ]
+        
+        if self.paginator is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+    
     @action(detail=False, methods=['get'])
     def today(self, request):
         from django.utils import timezone
@@ -148,6 +249,34 @@ class OrderViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Create up to MAX_BATCH_ORDERS orders in one request.
+        
+        Expects ``{"orders": [...]}`` with payloads as posted to
+        /api/orders/. Valid orders are created even when others in the batch
+        are rejected; ``results`` has one entry per order, in order.
+        """
+        orders = request.data.get('orders') if isinstance(request.data, dict) else None
+        if not isinstance(orders, list):
+            return Response(
+                {"error": "orders must be a list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(orders) > MAX_BATCH_ORDERS:
+            return Response(
+                {"error": f"At most {MAX_BATCH_ORDERS} orders can be sent at once"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = create_orders_bulk(orders, request.user)
+        return Response({
+            "created": sum(1 for result in results if result['status'] == 'created'),
+            "rejected": sum(1 for result in results if result['status'] == 'rejected'),
+            "results": results,
+        })
+    
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
         order = self.get_object()
@@ -180,7 +309,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             order.subtotal = sum(item.total_price for item in order.items.all())
             
             # Calculate tax based on settings or default
-            tax_rate = float(Setting.objects.get(setting_key='tax_rate').setting_value) / 100
+            tax_rate = settings_store.get_value('tax_rate') / 100
             order.tax_amount = order.subtotal * tax_rate
             
             # Calculate total
@@ -220,7 +349,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             order.subtotal = sum(item.total_price for item in order.items.all())
             
             # Calculate tax based on settings or default
-            tax_rate = float(Setting.objects.get(setting_key='tax_rate').setting_value) / 100
+            tax_rate = settings_store.get_value('tax_rate') / 100
             order.tax_amount = order.subtotal * tax_rate
             
             # Calculate total
@@ -246,37 +375,29 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            discount = Discount.objects.get(code=discount_code, is_active=True)
-            
-            # Check if the discount is valid (within date range)
-            from django.utils import timezone
-            today = timezone.now().date()
-            
-            if (discount.start_date and discount.start_date > today) or \
-               (discount.end_date and discount.end_date < today):
-                return Response(
-                    {"error": "This discount code is not valid at this time"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Apply the discount
-            if discount.type == 'Percentage':
-                order.discount_amount = order.subtotal * (discount.value / 100)
-            else:  # Fixed amount
-                order.discount_amount = min(discount.value, order.subtotal)  # Don't exceed subtotal
-            
-            # Update total
-            order.total_amount = order.subtotal + order.tax_amount - order.discount_amount
-            order.save()
-            
-            serializer = self.get_serializer(order)
-            return Response(serializer.data)
-        except Discount.DoesNotExist:
+        rule, message = discount_rules.validate(discount_code)
+        if rule is None:
             return Response(
-                {"error": "Invalid discount code"},
-                status=status.HTTP_404_NOT_FOUND
+                {"error": message},
+                status=status.HTTP_404_NOT_FOUND if message == discount_rules.INVALID_CODE_MESSAGE else status.HTTP_400_BAD_REQUEST
             )
+        
+        items = None
+        if rule.is_scoped:
+            items = list(order.items.values('product_id', 'total_price', category_id=F('product__category_id')))
+        message = rule.check(order.subtotal, items)
+        if message:
+            return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Apply the discount; a fixed amount never exceeds what it applies to
+        order.discount_amount = rule.amount(order.subtotal, items)
+        
+        # Update total
+        order.total_amount = order.subtotal + order.tax_amount - order.discount_amount
+        order.save()
+        
+        serializer = self.get_serializer(order)
+        return Response(serializer.data)
 
 class DiscountViewSet(viewsets.ModelViewSet):
     queryset = Discount.objects.all()
@@ -301,25 +422,12 @@ class DiscountViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            discount = Discount.objects.get(code=code, is_active=True)
-            
-            # Check if the discount is valid (within date range)
-            from django.utils import timezone
-            today = timezone.now().date()
-            
-            if (discount.start_date and discount.start_date > today) or \
-               (discount.end_date and discount.end_date < today):
-                return Response(
-                    {"valid": False, "message": "This discount code is not valid at this time"}
-                )
-            
-            serializer = self.get_serializer(discount)
-            return Response({"valid": True, "discount": serializer.data})
-        except Discount.DoesNotExist:
-            return Response(
-                {"valid": False, "message": "Invalid discount code"}
-            )
+        rule, message = discount_rules.validate(code)
+        if rule is None:
+            return Response({"valid": False, "message": message})
+        
+        serializer = self.get_serializer(rule.discount)
+        return Response({"valid": True, "discount": serializer.data})
 
 class SettingViewSet(viewsets.ModelViewSet):
     queryset = Setting.objects.all()
@@ -341,10 +449,4 @@ class SettingViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def business_info(self, request):
         keys = ['business_name', 'business_address', 'business_phone', 'currency_symbol']
-        settings = Setting.objects.filter(setting_key__in=keys)
-        
-        result = {}
-        for setting in settings:
-            result[setting.setting_key] = setting.setting_value
-        
-        return Response(result) 
\ No newline at end of file
+        return Response(settings_store.get_values(keys)) 
\ No newline at end of file
@@ -5,4 +5,5 @@ class PosappConfig(AppConfig):
     name = 'posapp'
     
     def ready(self):
-        import posapp.signals 
\ No newline at end of file
+        import posapp.signals
+        import posapp.tasks 
\ No newline at end of file
@@ -0,0 +1,405 @@
+"""
+Hot/cold partitioning of historical orders.
+
+Orders older than a configurable number of closed business days are moved
+out of the hot ``Order``/``OrderItem``/``PaymentTransaction`` tables into the
+``Archived*`` tables by the ``archive_orders`` management command. The
+partition point is stored as the ``order_archive_cutoff`` setting: every order
+created before the cutoff lives in the archive, everything else is hot.
+
+Views read history through ``order_history`` which only touches the archive
+when the requested date range reaches below the cutoff. Reports and KPIs
+add up hot and archived orders through ``aggregate_orders`` and
+``product_sales`` the same way.
+"""
+from collections import defaultdict
+from datetime import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q, Sum
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import (
+    Order, OrderItem, PaymentTransaction, EndDay, Setting, Product,
+    ArchivedOrder, ArchivedOrderItem, ArchivedPaymentTransaction
+)
+from .versioning import bump_version
+from . import audit, report_cache
+
+logger = logging.getLogger('posapp')
+
+ARCHIVE_CUTOFF_KEY = 'order_archive_cutoff'
+
+
+def archive_database():
+    """Database alias holding the archive tables"""
+    return getattr(settings, 'POS_ARCHIVE_DATABASE', 'default')
+
+
+def get_archive_cutoff():
+    """
+    Get the current hot/cold partition point
+
+    Returns:
+        A timezone-aware datetime, or None if nothing has been archived yet
+    """
+    value = Setting.get_value(ARCHIVE_CUTOFF_KEY)
+    return parse_datetime(value) if value else None
+
+
+def _set_archive_cutoff(cutoff):
+    Setting.set_value(ARCHIVE_CUTOFF_KEY, cutoff.isoformat(), 'Orders created before this moment are archived')
+
+
+class OrderHistory:
+    """
+    Read-only sequence chaining hot orders and archived orders.
+
+    Both querysets must be ordered by ``-created_at``. Because every archived
+    order is older than every hot order, concatenating the two keeps the
+    combined ordering, so Paginator can slice it without a UNION query.
+    """
+
+    def __init__(self, hot, cold):
+        self.hot = hot
+        self.cold = cold
+        self._hot_count = None
+
+    @property
+    def querysets(self):
+        """Both querysets in sort order, for KeysetPaginator"""
+        return (self.hot, self.cold)
+
+    def _get_hot_count(self):
+        if self._hot_count is None:
+            self._hot_count = self.hot.count()
+        return self._hot_count
+
+    def count(self):
+        return self._get_hot_count() + self.cold.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        yield from self.hot
+        yield from self.cold
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            results = self[key:key + 1]
+            if not results:
+                raise IndexError(key)
+            return results[0]
+
+        start = key.start or 0
+        stop = key.stop
+        hot_count = self._get_hot_count()
+
+        results = []
+        if start < hot_count:
+            hot_stop = hot_count if stop is None else min(stop, hot_count)
+            results.extend(self.hot[start:hot_stop])
+
+        cold_start = max(start - hot_count, 0)
+        if stop is None:
+            results.extend(self.cold[cold_start:])
+        elif stop > hot_count:
+            results.extend(self.cold[cold_start:stop - hot_count])
+        return results
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _day_end(day):
+    return timezone.make_aware(datetime.combine(day, datetime.max.time()))
+
+
+def order_history(filters=None, date_from=None, date_to=None):
+    """
+    Get orders matching the filters, reading the archive only when needed
+
+    Args:
+        filters: Q object applied to both hot and archived orders
+        date_from: Optional date, inclusive lower bound on created_at
+        date_to: Optional date, inclusive upper bound on created_at
+
+    Returns:
+        A queryset of Order or ArchivedOrder, or an OrderHistory chaining both,
+        ordered newest first
+    """
+    filters = filters if filters is not None else Q()
+    if date_from:
+        filters &= Q(created_at__date__gte=date_from)
+    if date_to:
+        filters &= Q(created_at__date__lte=date_to)
+
+    hot = Order.objects.filter(filters).select_related('user').order_by('-created_at')
+
+    cutoff = get_archive_cutoff()
+    if cutoff is None:
+        return hot
+
+    needs_cold = date_from is None or _day_start(date_from) < cutoff
+    needs_hot = date_to is None or _day_end(date_to) >= cutoff
+
+    cold = ArchivedOrder.objects.filter(filters).select_related('user').order_by('-created_at')
+    if not needs_cold:
+        return hot
+    if not needs_hot:
+        return cold
+    return OrderHistory(hot, cold)
+
+
+def _reaches_archive(start, cutoff):
+    if cutoff is None:
+        return False
+    if start is None:
+        return True
+    return (start if isinstance(start, datetime) else _day_start(start)) < cutoff
+
+
+def order_sources(start=None):
+    """
+    The order tables holding orders created from start on
+
+    Args:
+        start: Optional date or timezone-aware datetime
+
+    Returns:
+        A list of unordered querysets: the hot orders, then the archived
+        orders when the archive may hold some created from start on
+    """
+    sources = [Order.objects.order_by()]
+    if _reaches_archive(start, get_archive_cutoff()):
+        sources.append(ArchivedOrder.objects.using(archive_database()).order_by())
+    return sources
+
+
+def aggregate_orders(filters=None, start=None, **aggregates):
+    """
+    Aggregate hot and archived orders as one table
+
+    Args:
+        filters: Q object applied to both hot and archived orders
+        start: Earliest created_at the filters allow, so the archive is only
+            read when it can hold matching orders
+        aggregates: Count and Sum expressions, which add up across tables
+
+    Returns:
+        A dict like QuerySet.aggregate, with None for a Sum over no rows
+    """
+    totals = dict.fromkeys(aggregates)
+    for orders in order_sources(start):
+        if filters is not None:
+            orders = orders.filter(filters)
+        for name, value in orders.aggregate(**aggregates).items():
+            if value is not None:
+                totals[name] = value if totals[name] is None else totals[name] + value
+    return totals
+
+
+def product_sales(filters, start=None, category=None, with_category=True):
+    """
+    Quantity sold and sales per product over hot and archived order items
+
+    Archived items keep the product name from when they were archived. They
+    may live in another database, so their categories are read from the
+    products.
+
+    Args:
+        filters: Q object selecting the orders, applied to both tables
+        start: Earliest created_at the filters allow, see aggregate_orders
+        category: Optional category id
+        with_category: Also group by category name, as product__category__name
+
+    Returns:
+        A list of dicts with product__name, total_quantity and total_sales,
+        most sold first
+    """
+    totals = defaultdict(lambda: {'total_quantity': 0, 'total_sales': 0})
+
+    def add(key, row):
+        product = totals[key]
+        product['total_quantity'] += row['total_quantity'] or 0
+        product['total_sales'] += row['total_sales'] or 0
+
+    sums = {'total_quantity': Sum('quantity'), 'total_sales': Sum('total_price')}
+    hot_fields = ('product__name', 'product__category__name') if with_category else ('product__name',)
+    for orders in order_sources(start):
+        orders = orders.filter(filters)
+        if orders.model is Order:
+            items = OrderItem.objects.filter(order__in=orders)
+            if category:
+                items = items.filter(product__category_id=category)
+            for row in items.values(*hot_fields).annotate(**sums):
+                add(tuple(row[field] for field in hot_fields), row)
+            continue
+
+        rows = list(ArchivedOrderItem.objects.using(orders.db).filter(order__in=orders)
+                    .values('product_id', 'product_name').annotate(**sums))
+        categories = {}
+        if category or with_category:
+            products = Product.objects.filter(id__in={row['product_id'] for row in rows})
+            if category:
+                products = products.filter(category_id=category)
+            categories = dict(products.values_list('id', 'category__name'))
+        for row in rows:
+            # Deleted products are in no category
+            if category and row['product_id'] not in categories:
+                continue
+            key = (row['product_name'], categories.get(row['product_id'])) if with_category else (row['product_name'],)
+            add(key, row)
+
+    sales = [{**dict(zip(hot_fields, key)), **product} for key, product in totals.items()]
+    sales.sort(key=lambda product: product['total_quantity'], reverse=True)
+    return sales
+
+
+def get_order_or_archived(order_id):
+    """Get an order by id from the hot table, falling back to the archive"""
+    try:
+        return Order.objects.get(id=order_id)
+    except Order.DoesNotExist:
+        try:
+            return ArchivedOrder.objects.get(id=order_id)
+        except ArchivedOrder.DoesNotExist:
+            raise Http404("No order matches the given query.")
+
+
+def compute_archive_cutoff(keep_days):
+    """
+    Work out how far the archive may advance
+
+    Args:
+        keep_days: Number of most recent closed business days to keep hot
+
+    Returns:
+        A timezone-aware datetime, or None if there is nothing to archive
+    """
+    closed_days = list(EndDay.objects.order_by('-end_date').values_list('end_date', flat=True)[keep_days:keep_days + 1])
+    if not closed_days:
+        return None
+    cutoff = closed_days[0]
+
+    # Never archive a business day whose SalesSummary has not been built yet,
+    # sales_summary still needs its orders in the hot table
+    unsummarized = EndDay.objects.filter(
+        end_date__lte=cutoff,
+        sales_summary__isnull=True
+    ).order_by('end_date').first()
+    if unsummarized:
+        previous = EndDay.objects.filter(end_date__lt=unsummarized.end_date).order_by('-end_date').first()
+        if not previous:
+            return None
+        cutoff = previous.end_date
+
+    # Pending orders stay hot, so the partition cannot move past the oldest one
+    oldest_pending = Order.objects.filter(order_status='Pending').aggregate(oldest=Min('created_at'))['oldest']
+    if oldest_pending and oldest_pending < cutoff:
+        cutoff = oldest_pending
+
+    current = get_archive_cutoff()
+    if current and current >= cutoff:
+        return None
+    return cutoff
+
+
+def _copy_fields(source, target_model, **extra):
+    """Build an unsaved target_model instance from the fields it shares with source"""
+    target_fields = {f.attname for f in target_model._meta.concrete_fields}
+    values = {
+        f.attname: getattr(source, f.attname)
+        for f in source._meta.concrete_fields
+        if f.attname in target_fields
+    }
+    values.update(extra)
+    return target_model(**values)
+
+
+def archive_batch(order_ids):
+    """
+    Move one batch of orders, with their items and transactions, to the archive
+
+    The archive rows are written first with ignore_conflicts so a batch that
+    was interrupted between the two steps can simply be replayed.
+
+    Returns:
+        Number of orders moved
+    """
+    orders = list(Order.objects.filter(id__in=order_ids))
+    items = list(OrderItem.objects.filter(order_id__in=order_ids).select_related('product'))
+    transactions = list(PaymentTransaction.objects.filter(order_id__in=order_ids))
+
+    archived_orders = [_copy_fields(order, ArchivedOrder) for order in orders]
+    archived_items = [
+        _copy_fields(item, ArchivedOrderItem, product_name=item.product.name)
+        for item in items
+    ]
+    archived_transactions = [_copy_fields(txn, ArchivedPaymentTransaction) for txn in transactions]
+
+    using = archive_database()
+    with transaction.atomic(using=using):
+        ArchivedOrder.objects.bulk_create(archived_orders, ignore_conflicts=True)
+        ArchivedOrderItem.objects.bulk_create(archived_items, ignore_conflicts=True)
+        ArchivedPaymentTransaction.objects.bulk_create(archived_transactions, ignore_conflicts=True)
+
+    with transaction.atomic():
+        # Items and transactions are removed by the cascade. The rows live on
+        # in the archive, so one entry covers the batch instead of one per row
+        with audit.suppressed():
+            Order.objects.filter(id__in=[order.id for order in orders]).delete()
+        # Reports read both tables, so one built after the archive rows were
+        # written and before this commit counted the batch twice
+        report_cache.mark_changed(report_cache.ORDERS, *(order.created_at for order in orders))
+        audit.record('Orders Archived', 'Order', details=f'Archived {len(orders)} orders')
+    bump_version('orders')
+
+    return len(orders)
+
+
+def archive_orders(keep_days, batch_size=500, dry_run=False, progress=None):
+    """
+    Archive orders older than the given number of closed business days
+
+    Args:
+        keep_days: Number of most recent closed business days to keep hot
+        batch_size: Number of orders moved per transaction
+        dry_run: Only count the orders that would be moved
+        progress: Optional callable receiving the running total after each batch
+
+    Returns:
+        A tuple of (cutoff, orders_moved)
+    """
+    cutoff = compute_archive_cutoff(keep_days)
+    if cutoff is None:
+        return None, 0
+
+    candidates = Order.objects.filter(created_at__lt=cutoff).exclude(order_status='Pending')
+    if dry_run:
+        return cutoff, candidates.count()
+
+    moved = 0
+    while True:
+        batch = list(candidates.order_by('created_at', 'id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            break
+        moved += archive_batch(batch)
+
+        # Advance the partition point as far as the hot table allows so readers
+        # see a consistent split even if the run is interrupted
+        oldest_hot = Order.objects.aggregate(oldest=Min('created_at'))['oldest']
+        _set_archive_cutoff(min(cutoff, oldest_hot) if oldest_hot else cutoff)
+
+        if progress:
+            progress(moved)
+
+    _set_archive_cutoff(cutoff)
+    logger.info(f"Archived {moved} orders created before {cutoff}")
+    return cutoff, moved
@@ -0,0 +1,213 @@
+"""
+Write-behind audit log.
+
+Model signals describe what changed and pass the entry to record(), which
+queues it once the surrounding transaction commits. A background thread drains
+the queue and inserts the rows with bulk_create in batches, so an audited save
+costs a queue put instead of an INSERT inside the request.
+
+Pending entries are written when the process exits; a full queue makes the
+caller write the backlog directly rather than drop entries.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+logger = logging.getLogger('posapp')
+
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_BATCH_SIZE = 200
+# Seconds the writer waits for more entries before writing a partial batch
+AUDIT_FLUSH_INTERVAL = 1.0
+
+# Fields whose values are never written to the log, only that they changed
+MASKED_FIELDS = {'password'}
+
+# The request being handled, set by middleware.AuditContextMiddleware
+current_request = ContextVar('posapp_audit_request', default=None)
+_suppressed = ContextVar('posapp_audit_suppressed', default=False)
+
+
+class AuditWriter:
+    """Bounded queue of audit entries drained by a daemon thread"""
+
+    def __init__(self, maxsize=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._reset()
+
+    def _reset(self):
+        # Also called in forked children, which must not share the parent's
+        # queue locks or thread
+        self.queue = queue.Queue(self.maxsize)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def put(self, entry):
+        """Queue one entry, a dict of AuditLog field values"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # The writer is falling behind; write the backlog from this thread
+            # instead of dropping entries
+            logger.warning("Audit queue is full, writing queued entries directly")
+            self.flush()
+            self.write([entry])
+
+    def write(self, entries):
+        """Insert entries now, from the calling thread"""
+        try:
+            AuditLog.objects.bulk_create([AuditLog(**entry) for entry in entries], batch_size=self.batch_size)
+        except Exception:
+            logger.exception(f"Failed to write {len(entries)} audit log entries: {entries}")
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='posapp-audit-writer', daemon=True)
+                self._thread.start()
+
+    def _take_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take_batch()
+            if batch:
+                self.write(batch)
+                # The thread keeps its own connection; respect CONN_MAX_AGE
+                # and drop it if the server closed it
+                close_old_connections()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        entries = []
+        while True:
+            try:
+                entries.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if entries:
+            self.write(entries)
+        return len(entries)
+
+    def close(self, timeout=5):
+        """Stop the writer thread and write whatever is still queued"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            # Let it finish the batch it is writing
+            self._thread.join(timeout)
+        self.flush()
+
+
+writer = AuditWriter()
+atexit.register(writer.close)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=writer._reset)
+
+
+@contextmanager
+def suppressed():
+    """Skip audit entries for changes made inside the block, e.g. bulk archiving"""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def record(action, entity, entity_id=None, details=None, user=None):
+    """
+    Queue an audit log entry
+
+    The entry is queued when the current transaction commits, so rolled back
+    changes are never logged. The user, IP address and user agent default to
+    those of the current request.
+
+    Args:
+        action: Short description, e.g. 'Order Updated'
+        entity: Model name the entry is about
+        entity_id: Primary key of the changed row
+        details: Human readable description of the change
+        user: User responsible, if not the request's user
+    """
+    if _suppressed.get():
+        return
+
+    entry = {
+        'action': action,
+        'entity': entity,
+        'entity_id': entity_id,
+        'details': details,
+        'created_at': timezone.now(),
+    }
+    request = current_request.get()
+    if request is not None:
+        request_user = getattr(request, 'user', None)
+        if user is None and request_user is not None and request_user.is_authenticated:
+            user = request_user
+        entry['ip_address'] = request.META.get('REMOTE_ADDR')
+        entry['user_agent'] = request.META.get('HTTP_USER_AGENT', '')[:255]
+    entry['user_id'] = user.pk if user is not None else None
+
+    if getattr(settings, 'POS_AUDIT_EAGER', False):
+        transaction.on_commit(lambda: writer.write([entry]))
+    else:
+        transaction.on_commit(lambda: writer.put(entry))
+
+
+def track(instance, fields):
+    """Remember the current values of fields so a later save can tell what changed"""
+    # Deferred fields are left out rather than loaded
+    instance._audit_original = {name: instance.__dict__[name] for name in fields if name in instance.__dict__}
+
+
+def changed_fields(instance):
+    """
+    Fields changed since track() was last called for instance
+
+    Returns:
+        A dict of field name to (old, new) values
+    """
+    original = getattr(instance, '_audit_original', {})
+    return {
+        name: (old, instance.__dict__[name])
+        for name, old in original.items()
+        if name in instance.__dict__ and instance.__dict__[name] != old
+    }
+
+
+def describe_changes(changes):
+    """Render changed_fields() output as 'field: old -> new; ...'"""
+    parts = []
+    for name, (old, new) in changes.items():
+        if name in MASKED_FIELDS:
+            parts.append(f'{name} changed')
+        else:
+            parts.append(f'{name}: {old} -> {new}')
+    return '; '.join(parts)
@@ -1,22 +1,19 @@
-from .models import Setting, Order
+from django.utils.functional import SimpleLazyObject
+
+from . import settings_store
+from .pending_orders import pending_order_count
 
 def settings_processor(request):
     """Context processor to make settings available in all templates"""
-    settings_dict = {}
-    
     # Get core settings used in most pages
-    core_settings = [
+    settings_dict = settings_store.get_values([
         'business_name',
         'currency_symbol',
         'currency_position',
         'tax_rate',
         'enable_tax',
         'theme_color',
-    ]
-    
-    # Get settings from database
-    for key in core_settings:
-        settings_dict[key] = Setting.get_value(key, default='')
+    ])
     
     # Process currency symbol and position for easier use in templates
     currency_symbol = settings_dict.get('currency_symbol', '$')
@@ -34,16 +31,18 @@ def settings_processor(request):
     return {'settings': settings_dict}
 
 def pending_orders_processor(request):
-    """Context processor to count pending orders for the current user"""
-    user_pending_orders = 0
-    
-    if request.user.is_authenticated:
+    """Context processor to count pending orders for the current user
+
+    The count is only looked up when a template uses it, so pages without
+    the navbar warning (receipts, fragments, JSON-rendering views) skip it.
+    """
+    def user_pending_orders():
+        if not request.user.is_authenticated:
+            return 0
         # Skip for admin users
         is_admin = request.user.is_superuser or (hasattr(request.user, 'profile') and request.user.profile.role.name == 'Admin')
-        if not is_admin:
-            user_pending_orders = Order.objects.filter(
-                user=request.user,
-                order_status='Pending'
-            ).count()
+        if is_admin:
+            return 0
+        return pending_order_count(request.user)
     
-    return {'user_pending_orders': user_pending_orders} 
\ No newline at end of file
+    return {'user_pending_orders': SimpleLazyObject(user_pending_orders)} 
\ No newline at end of file
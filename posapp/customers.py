@@ -0,0 +1,447 @@
+"""
+Repeat customers, identified by phone number.
+
+Orders keep the free-text customer_name/customer_phone typed at the POS and
+are also linked to a Customer, looked up by ``phone_key``: the number reduced
+to its significant digits, so '0300-1234567', '+92 300 1234567' and
+'300 1234567' are one customer. Orders are linked when they are created or
+edited (posapp.ingest, order_edit); ``backfill`` links the orders recorded
+before customers existed.
+
+The phone key is a unique index, so the POS type-ahead (``lookup``) and the
+order list's phone search are a range scan on the index rather than a scan
+of every order.
+
+Customer.visit_count, lifetime_spend and last_order_at are kept in step with
+the customer's orders by the Order signals in signals.py, with F() updates
+inside the transaction that changes the order, like the pending order counts
+(posapp.pending_orders). Cancelled orders do not count. Orders leave the hot
+table by being archived, so deleting an order does not take it out of its
+customer's aggregates.
+"""
+from collections import defaultdict
+from decimal import Decimal
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Q, Sum, Value, When
+from django.utils import timezone
+
+from .archive import archive_database, order_history
+from .models import ArchivedOrder, Customer, Order
+from .versioning import bump_version, get_version, versions_are_shared
+
+logger = logging.getLogger('posapp')
+
+# Numbers with fewer significant digits are not linked to a customer
+PHONE_KEY_MIN_DIGITS = 7
+
+# Digits typed before the type-ahead looks anything up
+LOOKUP_MIN_DIGITS = 3
+LOOKUP_LIMIT = 10
+
+# Customers whose orders an order list phone search matches at most
+SEARCH_LIMIT = 50
+
+# Orders shown in a customer's history
+HISTORY_ORDERS = 10
+
+HISTORY_KEY_PREFIX = 'posapp:customer_history:'
+# Superseded keys are never read again; this only lets them age out
+HISTORY_CACHE_TIMEOUT = 60 * 60
+
+# Orders linked per transaction by the backfill
+BACKFILL_BATCH_SIZE = 500
+
+# Characters a phone number may be typed with
+_PHONE_RE = re.compile(r'^\+?[\d\s().-]+$')
+
+
+def _namespace(customer_id):
+    return f'customer:{customer_id}'
+
+
+def _digits(phone):
+    """Significant digits of a phone number, without trunk or international prefix"""
+    digits = re.sub(r'\D', '', str(phone or '')).lstrip('0')
+    country_code = getattr(settings, 'POS_PHONE_COUNTRY_CODE', '')
+    if country_code and digits.startswith(country_code) and len(digits) > len(country_code):
+        digits = digits[len(country_code):]
+    return digits
+
+
+def phone_key(phone):
+    """
+    The lookup key of a phone number
+
+    Returns:
+        The significant digits, or None if there are too few to be a number
+    """
+    digits = _digits(phone)
+    if len(digits) < PHONE_KEY_MIN_DIGITS:
+        return None
+    return digits[:Customer._meta.get_field('phone_key').max_length]
+
+
+def search_key(query):
+    """The phone key prefix a search for query should match, or None if it is not a phone number"""
+    query = (query or '').strip()
+    if not _PHONE_RE.match(query):
+        return None
+    return phone_key(query)
+
+
+def _entry(phone, name, delivery_address):
+    return (str(phone).strip()[:20], (name or '').strip()[:100], (delivery_address or '').strip())
+
+
+def _changes(customer, phone, name, delivery_address):
+    """Fields of customer that the details from a new order update"""
+    changes = {}
+    if phone and customer.phone != phone:
+        changes['phone'] = phone
+    # Blank details on an order do not erase the ones already known
+    if name and customer.name != name:
+        changes['name'] = name
+    if delivery_address and customer.delivery_address != delivery_address:
+        changes['delivery_address'] = delivery_address
+    return changes
+
+
+def upsert(phone, name='', delivery_address=''):
+    """
+    Get or create the customer with a phone number, updating their details
+
+    Call inside the transaction that saves the order.
+
+    Returns:
+        The Customer, or None if phone is not a phone number
+    """
+    key = phone_key(phone)
+    if key is None:
+        return None
+    phone, name, delivery_address = _entry(phone, name, delivery_address)
+    customer, created = Customer.objects.get_or_create(
+        phone_key=key,
+        defaults={'phone': phone, 'name': name, 'delivery_address': delivery_address},
+    )
+    if not created:
+        changes = _changes(customer, phone, name, delivery_address)
+        if changes:
+            Customer.objects.filter(pk=customer.pk).update(updated_at=timezone.now(), **changes)
+            for field, value in changes.items():
+                setattr(customer, field, value)
+            transaction.on_commit(lambda: bump_version(_namespace(customer.pk)))
+    return customer
+
+
+def upsert_many(entries, update=True):
+    """
+    Get or create the customers of many orders with a few queries
+
+    Args:
+        entries: Dict of phone key to (phone, name, delivery address)
+        update: Update the details of existing customers; the backfill only
+            fills in new customers, whose details are older than the ones
+            already known
+
+    Returns:
+        A dict of phone key to customer id
+    """
+    if not entries:
+        return {}
+    existing = {customer.phone_key: customer for customer in Customer.objects.filter(phone_key__in=entries)}
+    if update:
+        for key, customer in existing.items():
+            changes = _changes(customer, *entries[key])
+            if changes:
+                Customer.objects.filter(pk=customer.pk).update(updated_at=timezone.now(), **changes)
+                transaction.on_commit(lambda customer_id=customer.pk: bump_version(_namespace(customer_id)))
+    missing = [
+        Customer(phone_key=key, phone=phone, name=name, delivery_address=delivery_address)
+        for key, (phone, name, delivery_address) in entries.items()
+        if key not in existing
+    ]
+    if missing:
+        # Another terminal may create the same customer meanwhile
+        Customer.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update(
+            (customer.phone_key, customer)
+            for customer in Customer.objects.filter(phone_key__in=[customer.phone_key for customer in missing])
+        )
+    return {key: customer.pk for key, customer in existing.items()}
+
+
+def attach(orders):
+    """Link unsaved orders to their customers before they are inserted with bulk_create"""
+    entries = {}
+    for order in orders:
+        order._phone_key = phone_key(order.customer_phone)
+        if order._phone_key is not None:
+            entries[order._phone_key] = _entry(order.customer_phone, order.customer_name, order.delivery_address)
+    customer_ids = upsert_many(entries)
+    for order in orders:
+        order.customer_id = customer_ids.get(order._phone_key)
+
+
+def _share(order):
+    """(customer id, total) that order adds to its customer's aggregates, or None"""
+    if order.customer_id is None or order.order_status == 'Cancelled':
+        return None
+    return order.customer_id, order.total_amount
+
+
+# Marks an order loaded without the fields its share depends on
+UNKNOWN = object()
+
+
+def track(order):
+    """Remember what order adds to its customer's aggregates, to compare against on its next save"""
+    if order.pk is None:
+        order._customer_share = None
+    elif all(field in order.__dict__ for field in ('customer_id', 'order_status', 'total_amount')):
+        order._customer_share = _share(order)
+    else:
+        order._customer_share = UNKNOWN
+
+
+def order_saved(order, created):
+    """Move a saved order's total between customers' aggregates as its customer, status or total changed"""
+    previous = None if created else getattr(order, '_customer_share', UNKNOWN)
+    current = _share(order)
+    if previous is UNKNOWN:
+        if order.customer_id is not None:
+            recount([order.customer_id])
+    elif previous != current:
+        if previous and current and previous[0] == current[0]:
+            adjust(current[0], 0, current[1] - previous[1])
+        else:
+            if previous:
+                adjust(previous[0], -1, -previous[1])
+            if current:
+                adjust(current[0], 1, current[1], order.created_at)
+    elif order.customer_id is not None:
+        # The aggregates stand, but the order in the customer's history changed
+        transaction.on_commit(lambda: bump_version(_namespace(order.customer_id)))
+    order._customer_share = current
+
+
+def orders_created(orders):
+    """Count orders inserted with bulk_create, which skips the Order signals"""
+    visits, spend, last_order = defaultdict(int), defaultdict(Decimal), {}
+    for order in orders:
+        share = _share(order)
+        if share is None:
+            continue
+        customer_id, total = share
+        visits[customer_id] += 1
+        spend[customer_id] += Decimal(total)
+        last_order[customer_id] = max(order.created_at, last_order.get(customer_id, order.created_at))
+    for customer_id in visits:
+        adjust(customer_id, visits[customer_id], spend[customer_id], last_order[customer_id])
+
+
+def adjust(customer_id, visits, spend, last_order_at=None):
+    """Add to a customer's aggregates; call inside the order's transaction"""
+    updates = {
+        'visit_count': F('visit_count') + visits,
+        'lifetime_spend': F('lifetime_spend') + spend,
+    }
+    if last_order_at is not None:
+        updates['last_order_at'] = Case(
+            When(Q(last_order_at__isnull=True) | Q(last_order_at__lt=last_order_at), then=Value(last_order_at)),
+            default=F('last_order_at'),
+        )
+    Customer.objects.filter(pk=customer_id).update(**updates)
+    transaction.on_commit(lambda: bump_version(_namespace(customer_id)))
+
+
+def _order_totals(customer_ids):
+    """{customer id: (visits, spend, last order)} over the hot and archived orders"""
+    totals = {}
+    sources = [Order.objects.all(), ArchivedOrder.objects.using(archive_database())]
+    for orders in sources:
+        rows = (orders.filter(customer_id__in=customer_ids).exclude(order_status='Cancelled')
+                .order_by().values('customer_id')
+                .annotate(visits=Count('id'), spend=Sum('total_amount'), last=Max('created_at')))
+        for row in rows:
+            visits, spend, last = totals.get(row['customer_id'], (0, Decimal('0'), row['last']))
+            totals[row['customer_id']] = (visits + row['visits'], spend + row['spend'], max(last, row['last']))
+    return totals
+
+
+def recount(customer_ids=None, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Recompute customers' aggregates from their orders, e.g. after a restore
+
+    Args:
+        customer_ids: Customers to recount, or None for all customers
+        batch_size: Customers recounted per transaction
+
+    Returns:
+        Number of customers recounted
+    """
+    if customer_ids is None:
+        customer_ids = Customer.objects.order_by('pk').values_list('pk', flat=True)
+    customer_ids = list(customer_ids)
+    for offset in range(0, len(customer_ids), batch_size):
+        batch = customer_ids[offset:offset + batch_size]
+        with transaction.atomic():
+            totals = _order_totals(batch)
+            for customer_id in batch:
+                visits, spend, last = totals.get(customer_id, (0, Decimal('0'), None))
+                Customer.objects.filter(pk=customer_id).update(visit_count=visits, lifetime_spend=spend, last_order_at=last)
+            transaction.on_commit(lambda batch=batch: bump_version(*[_namespace(customer_id) for customer_id in batch]))
+    return len(customer_ids)
+
+
+def _backfill_batch(model, using, after_id, batch_size, filters):
+    """
+    Link one batch of model's orders that have a phone number but no customer
+
+    Returns:
+        A tuple of (last order id read, or None when done, orders linked)
+    """
+    with transaction.atomic(using=using):
+        rows = list(
+            model.objects.using(using).select_for_update()
+            .filter(filters, id__gt=after_id, customer__isnull=True)
+            .exclude(customer_phone__isnull=True).exclude(customer_phone='')
+            .order_by('id')
+            .values_list('id', 'customer_name', 'customer_phone', 'delivery_address',
+                         'order_status', 'total_amount', 'created_at')[:batch_size]
+        )
+        if not rows:
+            return None, 0
+
+        entries, keys = {}, {}
+        for order_id, name, phone, delivery_address, _, _, _ in rows:
+            key = phone_key(phone)
+            if key is not None:
+                previous = entries.get(key, ('', '', ''))
+                # Oldest first, so later orders' details win, but blanks do not erase
+                phone, name, delivery_address = _entry(phone, name, delivery_address)
+                entries[key] = (phone, name or previous[1], delivery_address or previous[2])
+                keys[order_id] = key
+
+        linked = 0
+        with transaction.atomic():
+            customer_ids = upsert_many(entries, update=False)
+            order_ids = defaultdict(list)
+            for order_id, key in keys.items():
+                order_ids[customer_ids[key]].append(order_id)
+            if order_ids:
+                linked = model.objects.using(using).filter(id__in=list(keys)).update(customer_id=Case(
+                    *[When(id__in=ids, then=Value(customer_id)) for customer_id, ids in order_ids.items()],
+                ))
+            # Orders without a customer were never counted, so theirs are added
+            visits, spend, last_order = defaultdict(int), defaultdict(Decimal), {}
+            for order_id, _, _, _, order_status, total, created_at in rows:
+                if order_id not in keys or order_status == 'Cancelled':
+                    continue
+                customer_id = customer_ids[keys[order_id]]
+                visits[customer_id] += 1
+                spend[customer_id] += total
+                last_order[customer_id] = max(created_at, last_order.get(customer_id, created_at))
+            for customer_id in visits:
+                adjust(customer_id, visits[customer_id], spend[customer_id], last_order[customer_id])
+    return rows[-1][0], linked
+
+
+def backfill(batch_size=BACKFILL_BATCH_SIZE, progress=None, filters=None):
+    """
+    Link the hot and archived orders recorded before customers existed
+
+    Orders are read in batches by id and only orders without a customer are
+    touched, so an interrupted run can simply be started again.
+
+    Args:
+        batch_size: Orders read per transaction
+        progress: Optional callable receiving the running total of orders linked
+        filters: Optional Q object limiting the orders linked
+
+    Returns:
+        A dict with the number of orders linked and of customers
+    """
+    filters = filters if filters is not None else Q()
+    linked = 0
+    for model, using in ((Order, 'default'), (ArchivedOrder, archive_database())):
+        after_id = 0
+        while after_id is not None:
+            after_id, batch_linked = _backfill_batch(model, using, after_id, batch_size, filters)
+            linked += batch_linked
+            if after_id is not None and progress:
+                progress(linked)
+    bump_version('orders')
+    customers = Customer.objects.count()
+    logger.info(f"Customer backfill linked {linked} orders to {customers} customers")
+    return {'orders': linked, 'customers': customers}
+
+
+def lookup(prefix, limit=LOOKUP_LIMIT):
+    """
+    Customers whose phone number starts with prefix, for the POS type-ahead
+
+    The match is a range scan on the phone key index, in key order.
+
+    Returns:
+        A list of dicts: id, phone, name, delivery_address, visit_count,
+        lifetime_spend and last_order_at
+    """
+    digits = _digits(prefix)
+    if len(digits) < LOOKUP_MIN_DIGITS:
+        return []
+    return list(
+        Customer.objects.filter(phone_key__startswith=digits).order_by('phone_key')
+        .values('id', 'phone', 'name', 'delivery_address', 'visit_count', 'lifetime_spend', 'last_order_at')[:limit]
+    )
+
+
+def matching_ids(key, limit=SEARCH_LIMIT):
+    """Ids of the customers whose phone key starts with key, for filtering orders"""
+    return list(Customer.objects.filter(phone_key__startswith=key).order_by('phone_key').values_list('id', flat=True)[:limit])
+
+
+def _load_history(customer_id):
+    customer = (Customer.objects.filter(pk=customer_id)
+                .values('id', 'phone', 'name', 'delivery_address', 'visit_count', 'lifetime_spend', 'last_order_at')
+                .first())
+    if customer is None:
+        return None
+    orders = order_history(Q(customer_id=customer_id))[:HISTORY_ORDERS]
+    customer['orders'] = [
+        {
+            'id': order.id,
+            'reference_number': order.reference_number,
+            'order_type': order.order_type,
+            'order_status': order.order_status,
+            'total_amount': order.total_amount,
+            'created_at': order.created_at,
+            'is_archived': getattr(order, 'is_archived', False),
+        }
+        for order in orders
+    ]
+    return customer
+
+
+def customer_history(customer_id):
+    """
+    A customer's details, aggregates and most recent orders
+
+    Cached until one of the customer's orders or their details change.
+
+    Returns:
+        A dict like those of lookup, with 'orders' listing the HISTORY_ORDERS
+        most recent orders, or None if there is no such customer
+    """
+    if not versions_are_shared():
+        return _load_history(customer_id)
+    key = f'{HISTORY_KEY_PREFIX}{customer_id}:{get_version(_namespace(customer_id))}'
+    history = cache.get(key)
+    if history is None:
+        history = _load_history(customer_id)
+        cache.set(key, history, HISTORY_CACHE_TIMEOUT)
+    return history
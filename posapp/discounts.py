@@ -0,0 +1,219 @@
+"""
+Discount code rules, compiled into an in-memory table.
+
+Looking a code up used to mean a query per check, repeated by every view
+that applies discounts. Instead the active discounts are loaded once into a
+dict of code to DiscountRule, and checks run against that, date windows
+included, so a window opening or closing at the day boundary needs no
+rebuild. The table is rebuilt when the 'discounts' version counter changes
+(Discount saves and deletes, see signals.py).
+
+When the cache is not shared between workers a bump made by another worker
+is invisible here, so the table is also rebuilt every TABLE_MAX_AGE
+seconds.
+
+A rule can be limited to products or categories (the discount then only
+applies to the matching items) and to orders above a minimum subtotal.
+"""
+from decimal import Decimal
+import threading
+import time
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Category, Discount, Product
+from .versioning import get_version, versions_are_shared
+
+INVALID_CODE_MESSAGE = 'Invalid discount code'
+
+# Seconds a table is trusted when other workers' changes cannot be seen
+TABLE_MAX_AGE = 30
+
+_lock = threading.Lock()
+# (version, built at, {code key: DiscountRule}, {id: DiscountRule})
+_table = (None, 0, {}, {})
+
+
+def code_key(code):
+    """Normalise a code the way the database's case-insensitive collation compares it"""
+    return (code or '').strip().casefold()
+
+
+class DiscountRule:
+    """A compiled active discount, evaluated without database access"""
+
+    __slots__ = ('discount', 'id', 'code', 'type', 'value', 'start_date', 'end_date',
+                 'min_subtotal', 'product_ids', 'category_ids')
+
+    def __init__(self, discount, product_ids=(), category_ids=()):
+        self.discount = discount
+        self.id = discount.id
+        self.code = discount.code
+        self.type = discount.type
+        self.value = discount.value
+        self.start_date = discount.start_date
+        self.end_date = discount.end_date
+        self.min_subtotal = discount.min_subtotal
+        self.product_ids = frozenset(product_ids)
+        self.category_ids = frozenset(category_ids)
+
+    @property
+    def is_scoped(self):
+        return bool(self.product_ids or self.category_ids)
+
+    def is_valid_on(self, day):
+        return not ((self.start_date and self.start_date > day) or (self.end_date and self.end_date < day))
+
+    def applies_to(self, product_id, category_id=None):
+        if not self.is_scoped:
+            return True
+        return product_id in self.product_ids or (category_id is not None and category_id in self.category_ids)
+
+    def eligible_total(self, subtotal, items=None):
+        """
+        Part of the order the discount applies to
+
+        Args:
+            subtotal: Order subtotal
+            items: For scoped rules, dicts with product_id, total_price and
+                optionally category_id; see with_categories()
+        """
+        if not self.is_scoped:
+            return subtotal
+        return sum(
+            (Decimal(str(item['total_price'])) for item in items or ()
+             if self.applies_to(int(item['product_id']), item.get('category_id'))),
+            Decimal('0'),
+        )
+
+    def check(self, subtotal=None, items=None):
+        """
+        Returns:
+            Why the discount does not apply to the order, or None if it does.
+            Conditions are only checked when the order is given.
+        """
+        if subtotal is not None and self.min_subtotal and subtotal < self.min_subtotal:
+            return f'This discount needs an order of at least {self.min_subtotal}'
+        if items is not None and self.is_scoped and not self.eligible_total(subtotal or 0, items):
+            return 'This discount does not apply to any item in the order'
+        return None
+
+    def amount(self, subtotal, items=None):
+        """Discount amount for an order, never more than the part it applies to"""
+        base = self.eligible_total(subtotal, items)
+        if self.type == 'Percentage':
+            return base * (self.value / Decimal('100'))
+        return min(self.value, base)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.discount.name,
+            'code': self.code,
+            'type': self.type,
+            'value': float(self.value),
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'min_subtotal': float(self.min_subtotal) if self.min_subtotal else None,
+            'product_ids': sorted(self.product_ids),
+            'category_ids': sorted(self.category_ids),
+        }
+
+
+def _compile():
+    """Rules for the active discounts, keyed by code and by id"""
+    # Only the ids are needed, but prefetching them also lets
+    # DiscountSerializer render rule.discount without queries
+    discounts = Discount.objects.filter(is_active=True).prefetch_related(
+        Prefetch('products', queryset=Product.objects.only('id')),
+        Prefetch('categories', queryset=Category.objects.only('id')),
+    )
+    by_code, by_id = {}, {}
+    for discount in discounts:
+        rule = DiscountRule(
+            discount,
+            [product.id for product in discount.products.all()],
+            [category.id for category in discount.categories.all()],
+        )
+        by_id[rule.id] = rule
+        if rule.code:
+            by_code[code_key(rule.code)] = rule
+    return by_code, by_id
+
+
+def _current_table():
+    global _table
+    version = get_version('discounts')
+    table = _table
+    fresh = table[0] == version
+    if fresh and not versions_are_shared():
+        fresh = time.monotonic() - table[1] < TABLE_MAX_AGE
+    if fresh:
+        return table
+    with _lock:
+        # Another thread may have rebuilt it meanwhile
+        if _table is not table and _table[0] == version:
+            return _table
+        by_code, by_id = _compile()
+        _table = (version, time.monotonic(), by_code, by_id)
+        return _table
+
+
+def get_rule(discount_id=None, code=None):
+    """
+    The rule for an active discount, by id or code, whatever its date window
+
+    Returns:
+        The DiscountRule, or None if there is no such active discount
+    """
+    if code is not None:
+        return _current_table()[2].get(code_key(code))
+    return _current_table()[3].get(discount_id)
+
+
+def validate(code, subtotal=None, items=None):
+    """
+    Check a discount code, and the order it is for when given
+
+    Args:
+        code: Discount code as entered
+        subtotal: Optional order subtotal, for minimum spend rules
+        items: Optional order items (see DiscountRule.eligible_total), for
+            product or category scoped rules
+
+    Returns:
+        A tuple (rule, message); rule is None when the code cannot be used
+        and message says why
+    """
+    key = code_key(code)
+    if not key:
+        return None, 'Discount code is required'
+    rule = _current_table()[2].get(key)
+    if rule is None:
+        return None, INVALID_CODE_MESSAGE
+    if not rule.is_valid_on(timezone.now().date()):
+        return None, 'This discount code is not valid at this time'
+    if rule.category_ids and items:
+        items = with_categories(items)
+    message = rule.check(subtotal, items)
+    if message:
+        return None, message
+    return rule, None
+
+
+def order_amount(rule, subtotal, items=None):
+    """Discount amount for an order, looking up item categories if the rule needs them"""
+    if rule.category_ids and items:
+        items = with_categories(items)
+    return rule.amount(subtotal, items)
+
+
+def with_categories(items):
+    """Items with the category_id of their products added, for category scoped rules"""
+    missing = {int(item['product_id']) for item in items if 'category_id' not in item}
+    categories = dict(Product.objects.filter(id__in=missing).values_list('id', 'category_id')) if missing else {}
+    return [
+        item if 'category_id' in item else dict(item, category_id=categories.get(int(item['product_id'])))
+        for item in items
+    ]
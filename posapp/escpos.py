@@ -0,0 +1,254 @@
+"""
+ESC/POS byte streams for thermal receipt printers.
+
+``Ticket`` builds a receipt from text lines, label/amount rows and rules,
+wrapped to the printer's column count, and returns the bytes to send to the
+printer (see posapp.printing). Only the commands every ESC/POS printer
+understands are used: initialise, code page, alignment, bold, double size,
+raster image, feed and cut.
+
+The business logo is converted once per logo and paper width to a raster
+image command and kept in the default cache, so printing a receipt never
+decodes or dithers the image again.
+"""
+from io import BytesIO
+import logging
+import textwrap
+
+from django.core.cache import cache
+from PIL import Image
+
+from .models import BusinessLogo
+
+logger = logging.getLogger('posapp')
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+LEFT, CENTER, RIGHT = 0, 1, 2
+
+# PC858 is code page 437 with the euro sign, selected by ESC t 19
+ENCODING = 'cp858'
+CODE_PAGE = 19
+
+# Width of the printable area in dots: 576 on 80mm paper, 384 on 58mm
+DEFAULT_DOT_WIDTH = 576
+DEFAULT_COLUMNS = 48
+
+# Logos taller than this are scaled down, so they do not waste paper
+MAX_LOGO_HEIGHT = 160
+
+LOGO_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Commands Ticket emits, skipped by plain_text(), with the number of
+# argument bytes they take
+_COMMANDS = {
+    ESC + b'@': 0,
+    ESC + b't': 1,
+    ESC + b'a': 1,
+    ESC + b'E': 1,
+    ESC + b'd': 1,
+    GS + b'!': 1,
+    GS + b'V': 2,
+}
+
+
+class Ticket:
+    """
+    Builder for one printed receipt
+
+    Args:
+        columns: Characters per line in the normal font
+        dot_width: Printable width in dots, for the logo
+    """
+
+    def __init__(self, columns=DEFAULT_COLUMNS, dot_width=DEFAULT_DOT_WIDTH):
+        self.columns = columns
+        self.dot_width = dot_width
+        self._buffer = BytesIO()
+        self._buffer.write(ESC + b'@' + ESC + b't' + bytes([CODE_PAGE]))
+
+    def _write(self, data):
+        self._buffer.write(data)
+        return self
+
+    def _encode(self, text):
+        return str(text).encode(ENCODING, errors='replace')
+
+    def align(self, alignment):
+        return self._write(ESC + b'a' + bytes([alignment]))
+
+    def bold(self, on=True):
+        return self._write(ESC + b'E' + bytes([1 if on else 0]))
+
+    def double(self, on=True):
+        """Double width and height characters"""
+        return self._write(GS + b'!' + bytes([0x11 if on else 0]))
+
+    def text(self, text='', align=LEFT, bold=False, double=False):
+        """
+        One or more lines of text, wrapped to the line width
+
+        Newlines in text start new lines; blank text prints an empty line.
+        """
+        width = self.columns // 2 if double else self.columns
+        self.align(align)
+        if bold:
+            self.bold()
+        if double:
+            self.double()
+        lines = []
+        for paragraph in str(text).splitlines() or ['']:
+            lines.extend(textwrap.wrap(paragraph, width) or [''])
+        for line in lines:
+            self._write(self._encode(line) + b'\n')
+        if double:
+            self.double(False)
+        if bold:
+            self.bold(False)
+        if align != LEFT:
+            self.align(LEFT)
+        return self
+
+    def row(self, left, right='', bold=False):
+        """
+        A label on the left and a value aligned to the right of the line
+
+        A label too long to share the line with the value is wrapped, with
+        the value on its last line.
+        """
+        left, right = str(left), str(right)
+        width = self.columns - len(right) - 1 if right else self.columns
+        lines = textwrap.wrap(left, max(width, 1)) or ['']
+        if bold:
+            self.bold()
+        for line in lines[:-1]:
+            self._write(self._encode(line) + b'\n')
+        last = lines[-1]
+        padding = max(self.columns - len(last) - len(right), 1 if right else 0)
+        self._write(self._encode(last + ' ' * padding + right) + b'\n')
+        if bold:
+            self.bold(False)
+        return self
+
+    def columns_row(self, cells, widths, bold=False):
+        """
+        Fixed width columns; the first is left aligned and wrapped, the others
+        right aligned
+
+        Args:
+            cells: Values of the columns
+            widths: Width of every column but the first, which takes the rest
+        """
+        first_width = self.columns - sum(widths)
+        lines = textwrap.wrap(str(cells[0]), max(first_width, 1)) or ['']
+        rest = ''.join(str(cell).rjust(width) for cell, width in zip(cells[1:], widths))
+        if bold:
+            self.bold()
+        self._write(self._encode(lines[0].ljust(first_width) + rest) + b'\n')
+        for line in lines[1:]:
+            self._write(self._encode(line) + b'\n')
+        if bold:
+            self.bold(False)
+        return self
+
+    def rule(self, char='-'):
+        return self._write(self._encode(char * self.columns) + b'\n')
+
+    def raster(self, command):
+        """A raster image command, as returned by logo_raster()"""
+        if command:
+            self.align(CENTER)._write(command + b'\n').align(LEFT)
+        return self
+
+    def feed(self, lines=1):
+        return self._write(ESC + b'd' + bytes([lines]))
+
+    def cut(self):
+        """Feed the paper past the cutter and cut, leaving a hinge"""
+        return self._write(GS + b'V' + bytes([66, 3]))
+
+    def getvalue(self):
+        return self._buffer.getvalue()
+
+
+def raster_image(image, dot_width):
+    """
+    A Pillow image as a GS v 0 raster image command
+
+    The image is flattened onto white, scaled to fit the paper and
+    MAX_LOGO_HEIGHT, and dithered to black and white.
+    """
+    image = image.convert('RGBA')
+    background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+    image = Image.alpha_composite(background, image).convert('L')
+    scale = min(dot_width / image.width, MAX_LOGO_HEIGHT / image.height, 1)
+    if scale < 1:
+        image = image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)))
+    # Rows are sent in whole bytes
+    width = (image.width + 7) // 8 * 8
+    if width != image.width:
+        padded = Image.new('L', (width, image.height), 255)
+        padded.paste(image, (0, 0))
+        image = padded
+    # In mode '1' a set bit is white, for the printer it is black
+    data = bytes(byte ^ 0xFF for byte in image.convert('1').tobytes())
+    row_bytes = width // 8
+    return (GS + b'v0\x00'
+            + row_bytes.to_bytes(2, 'little') + image.height.to_bytes(2, 'little')
+            + data)
+
+
+def logo_raster(dot_width=DEFAULT_DOT_WIDTH):
+    """
+    The current business logo as a raster image command
+
+    Converted on first use for every logo and width and cached; uploading a
+    new logo creates a new BusinessLogo row and so a new cache entry.
+
+    Returns:
+        The command bytes, or b'' when there is no logo or it cannot be read
+    """
+    logo_id = BusinessLogo.objects.order_by('-uploaded_at').values_list('id', flat=True).first()
+    if logo_id is None:
+        return b''
+    key = f'posapp:escpos:logo:{logo_id}:{dot_width}'
+    command = cache.get(key)
+    if command is None:
+        command = b''
+        try:
+            logo = BusinessLogo.objects.get(id=logo_id)
+            if logo.image:
+                command = raster_image(Image.open(BytesIO(bytes(logo.image))), dot_width)
+        except Exception as e:
+            # Print without the logo rather than not at all
+            logger.warning(f"Could not rasterize business logo #{logo_id}: {str(e)}")
+        cache.set(key, command, LOGO_CACHE_TIMEOUT)
+    return command
+
+
+def plain_text(data):
+    """
+    The text of a ticket with the commands stripped, for previews and tests
+
+    Raster images are shown as '[image WxH]'.
+    """
+    output = []
+    i = 0
+    while i < len(data):
+        two = data[i:i + 2]
+        if two == GS + b'v':
+            row_bytes = int.from_bytes(data[i + 4:i + 6], 'little')
+            height = int.from_bytes(data[i + 6:i + 8], 'little')
+            output.append(f'[image {row_bytes * 8}x{height}]')
+            i += 8 + row_bytes * height
+        elif two in _COMMANDS:
+            i += 2 + _COMMANDS[two]
+        elif data[i:i + 1] in (ESC, GS):
+            i += 1
+        else:
+            start = i
+            while i < len(data) and data[i:i + 1] not in (ESC, GS):
+                i += 1
+            output.append(data[start:i].decode(ENCODING, errors='replace'))
+    return ''.join(output)
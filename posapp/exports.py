@@ -0,0 +1,221 @@
+"""
+Excel report builders.
+
+The export views only validate their parameters and queue a job; the
+workbooks themselves are written here by the ``export_orders_excel`` and
+``export_order_items_excel`` background jobs.
+"""
+from io import BytesIO
+from itertools import chain
+
+from django.db.models import Count, Q
+
+from . import archive
+from .models import Category
+
+# Try to import xlwt for Excel export, but make it optional
+EXCEL_EXPORT_AVAILABLE = False
+try:
+    import xlwt
+    EXCEL_EXPORT_AVAILABLE = True
+except ImportError:
+    print("xlwt not installed. Excel export will be disabled.")
+except Exception as e:
+    print(f"xlwt error: {e}")
+
+EXCEL_CONTENT_TYPE = 'application/ms-excel'
+
+# Rows written between two progress updates
+PROGRESS_EVERY = 500
+
+
+def _report_progress(progress, done, total):
+    if progress and total and done % PROGRESS_EVERY == 0:
+        progress(int(done * 100 / total), f'Wrote {done} of {total} rows')
+
+
+def build_orders_workbook(start_date_obj, end_date_obj, status=None, progress=None):
+    """
+    Write the orders report
+
+    Args:
+        start_date_obj: Timezone-aware start of the report period
+        end_date_obj: Timezone-aware end of the report period
+        status: Optional order status filter
+        progress: Optional callable receiving (percent, message)
+
+    Returns:
+        A tuple of (filename, workbook bytes)
+    """
+    # Filter orders using exact timestamps, reading the archive too when the
+    # period reaches below the archive cutoff
+    filters = Q(created_at__gte=start_date_obj, created_at__lte=end_date_obj)
+    if status:
+        filters &= Q(order_status=status)
+    sources = [
+        orders.filter(filters).annotate(items_count=Count('items'))
+        for orders in archive.order_sources(start_date_obj)
+    ]
+
+    total_orders = sum(orders.count() for orders in sources)
+
+    # Create workbook and add a worksheet
+    workbook = xlwt.Workbook(encoding='utf-8')
+    worksheet = workbook.add_sheet('Orders Report')
+
+    # Styling
+    header_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center; pattern: pattern solid, fore_colour light_blue;')
+    title_style = xlwt.easyxf('font: bold on, height 280; align: wrap on, vert centre, horiz center;')
+    date_range_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center;')
+    date_style = xlwt.easyxf('font: bold off; align: wrap on, vert centre, horiz center', num_format_str='YYYY-MM-DD HH:MM:SS')
+    money_style = xlwt.easyxf('font: bold off; align: horiz right', num_format_str='#,##0.00')
+    total_style = xlwt.easyxf('font: bold on; align: horiz right; pattern: pattern solid, fore_colour light_green;', num_format_str='#,##0.00')
+
+    # Add report title and date range
+    title_row = 0
+    date_range_row = 1
+    header_row = 3  # Move header down to make room for title and date range
+
+    # Report title
+    worksheet.write_merge(title_row, title_row, 0, 11, 'Orders Report', title_style)
+
+    # Date range information
+    date_range_text = f'Report Period: {start_date_obj.strftime("%d %b %Y %H:%M:%S")} to {end_date_obj.strftime("%d %b %Y %H:%M:%S")}'
+    if status:
+        date_range_text += f' | Status: {status}'
+    worksheet.write_merge(date_range_row, date_range_row, 0, 11, date_range_text, date_range_style)
+
+    # Write header row
+    columns = ['Order #', 'Date', 'Customer', 'Customer Phone', 'Items Count', 'Status', 'Payment Status', 'Payment Method', 'Subtotal', 'Tax', 'Discount', 'Total']
+
+    for col_num, column_title in enumerate(columns):
+        worksheet.write(header_row, col_num, column_title, header_style)
+
+    # Write data rows
+    grand_total = 0
+    all_orders = chain.from_iterable(orders.iterator(chunk_size=PROGRESS_EVERY) for orders in sources)
+    for row_num, order in enumerate(all_orders, 1):
+        # Adjust row index to account for header rows
+        adjusted_row = row_num + header_row
+
+        worksheet.write(adjusted_row, 0, order.reference_number)
+        worksheet.write(adjusted_row, 1, order.created_at.strftime('%Y-%m-%d %H:%M:%S'), date_style)
+        worksheet.write(adjusted_row, 2, order.customer_name or 'Walk-in Customer')
+        worksheet.write(adjusted_row, 3, order.customer_phone or 'N/A')
+        worksheet.write(adjusted_row, 4, order.items_count)
+        worksheet.write(adjusted_row, 5, order.order_status)
+        worksheet.write(adjusted_row, 6, order.payment_status)
+        worksheet.write(adjusted_row, 7, order.payment_method)
+        worksheet.write(adjusted_row, 8, float(order.subtotal), money_style)
+        worksheet.write(adjusted_row, 9, float(order.tax_amount), money_style)
+        worksheet.write(adjusted_row, 10, float(order.discount_amount or 0), money_style)
+        worksheet.write(adjusted_row, 11, float(order.total_amount), money_style)
+
+        # Only include non-cancelled orders in the total
+        if order.order_status != 'Cancelled':
+            grand_total += float(order.total_amount)
+
+        _report_progress(progress, row_num, total_orders)
+
+    # Write grand total row
+    total_row = total_orders + header_row + 2
+    worksheet.write(total_row, 10, "GRAND TOTAL:", xlwt.easyxf('font: bold on; align: horiz right;'))
+    worksheet.write(total_row, 11, grand_total, total_style)
+
+    # Set column width
+    for col_num in range(len(columns)):
+        worksheet.col(col_num).width = 256 * 20  # 20 characters wide
+
+    filename = f"orders_report_{start_date_obj.strftime('%Y%m%d_%H%M%S')}_to_{end_date_obj.strftime('%Y%m%d_%H%M%S')}.xls"
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return filename, buffer.getvalue()
+
+
+def build_order_items_workbook(start_date_obj, end_date_obj, category=None, progress=None):
+    """
+    Write the products sold report
+
+    Args:
+        start_date_obj: Timezone-aware start of the report period
+        end_date_obj: Timezone-aware end of the report period
+        category: Optional category id filter
+        progress: Optional callable receiving (percent, message)
+
+    Returns:
+        A tuple of (filename, workbook bytes)
+    """
+    # Aggregate product sales data with exact timestamps, hot and archived
+    filters = Q(created_at__gte=start_date_obj, created_at__lte=end_date_obj, order_status='Completed')  # Only include completed orders
+
+    if category:
+        category_name = Category.objects.get(id=category).name
+    else:
+        category_name = "All Categories"
+
+    # Group by product and sum quantities and totals
+    product_sales = archive.product_sales(filters, start_date_obj, category=category)
+    for product in product_sales:
+        product['avg_unit_price'] = product['total_sales'] / product['total_quantity'] if product['total_quantity'] else 0
+
+    # Create workbook and add a worksheet
+    workbook = xlwt.Workbook(encoding='utf-8')
+    worksheet = workbook.add_sheet('Products Sold Report')
+
+    # Define column widths in characters
+    col_widths = [30, 20, 15, 15, 20]
+
+    # Styling
+    header_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center; pattern: pattern solid, fore_colour light_blue;')
+    title_style = xlwt.easyxf('font: bold on, height 280; align: wrap on, vert centre, horiz center;')
+    date_range_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center;')
+    money_style = xlwt.easyxf('font: bold off; align: horiz right', num_format_str='#,##0.00')
+    total_style = xlwt.easyxf('font: bold on; align: horiz right; pattern: pattern solid, fore_colour light_green;', num_format_str='#,##0.00')
+
+    # Add report title and date range
+    title_row = 0
+    date_range_row = 1
+    header_row = 3  # Move header down to make room for title and date range
+
+    # Report title
+    worksheet.write_merge(title_row, title_row, 0, 4, 'Products Sold Report', title_style)
+
+    # Date range information
+    date_range_text = f'Report Period: {start_date_obj.strftime("%d %b %Y %H:%M:%S")} to {end_date_obj.strftime("%d %b %Y %H:%M:%S")} | Category: {category_name}'
+    worksheet.write_merge(date_range_row, date_range_row, 0, 4, date_range_text, date_range_style)
+
+    # Write header row
+    columns = ['Product', 'Category', 'Quantity Sold', 'Unit Price', 'Total Sales']
+
+    for col_num, column_title in enumerate(columns):
+        worksheet.write(header_row, col_num, column_title, header_style)
+        worksheet.col(col_num).width = 256 * col_widths[col_num]  # Set column width
+
+    # Write data rows
+    grand_total_qty = 0
+    grand_total_sales = 0
+    for row_num, product in enumerate(product_sales, 1):
+        # Adjust row index to account for header rows
+        adjusted_row = row_num + header_row
+
+        worksheet.write(adjusted_row, 0, product['product__name'])
+        worksheet.write(adjusted_row, 1, product['product__category__name'] or 'Unknown')
+        worksheet.write(adjusted_row, 2, product['total_quantity'])
+        worksheet.write(adjusted_row, 3, float(product['avg_unit_price']), money_style)
+        worksheet.write(adjusted_row, 4, float(product['total_sales']), money_style)
+
+        grand_total_qty += product['total_quantity']
+        grand_total_sales += float(product['total_sales'])
+
+        _report_progress(progress, row_num, len(product_sales))
+
+    # Write grand total row
+    total_row = len(product_sales) + header_row + 2
+    worksheet.write(total_row, 1, "GRAND TOTAL:", xlwt.easyxf('font: bold on; align: horiz right;'))
+    worksheet.write(total_row, 2, grand_total_qty, xlwt.easyxf('font: bold on;'))
+    worksheet.write(total_row, 4, grand_total_sales, total_style)
+
+    filename = f"products_sold_report_{start_date_obj.strftime('%Y%m%d_%H%M%S')}_to_{end_date_obj.strftime('%Y%m%d_%H%M%S')}.xls"
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return filename, buffer.getvalue()
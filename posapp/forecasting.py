@@ -0,0 +1,340 @@
+"""
+Stock depletion forecasts and reorder suggestions.
+
+How fast each product sells is kept in SalesVelocity as NumPy arrays: per
+product and weekday, an exponentially weighted mean and variance of the
+quantity sold in a business day. The stock_forecast job, queued when a day
+is ended, folds in each closed business day not counted yet, one day at a
+time, as one observation for its weekday (a product not sold that day
+counts as a zero), so the history is read only once. A business day's
+weekday is the one of its middle, as it starts at the previous end of day,
+often the evening before.
+
+A forecast spreads each weekday's mean evenly over its hours from now on,
+so the cumulative demand of every product over the horizon is one cumsum,
+and reports when it reaches the product's stock. A product whose stock does
+not cover the demand of the reorder lead time plus a safety stock (SAFETY_Z
+standard deviations of that demand) gets a reorder quantity covering the
+lead time and the following cover days (settings reorder_lead_days and
+reorder_cover_days).
+
+Forecasts are cached per product, keyed by its stock and the 'forecast'
+version, so only products whose stock changed are computed again.
+"""
+from datetime import timedelta
+from io import BytesIO
+from itertools import islice
+import logging
+import math
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import settings_store
+from .archive import archive_database
+from .models import ArchivedOrderItem, OrderItem, Product, SalesVelocity
+from .summaries import business_days_after
+from .versioning import bump_version, get_version
+
+logger = logging.getLogger('posapp')
+
+# Weeks after which a business day's sales weigh half as much
+HALF_LIFE_WEEKS = 4
+ALPHA = 1 - 0.5 ** (1 / HALF_LIFE_WEEKS)
+
+# Days ahead a stockout is looked for
+HORIZON_DAYS = 28
+
+# Safety stock in standard deviations of the lead time demand (~95% service)
+SAFETY_Z = 1.65
+
+# Forecasts depend on the hour they start from, so they expire with it
+FORECAST_CACHE_TIMEOUT = 60 * 60
+
+FORECAST_KEY_PREFIX = 'posapp:forecast:'
+
+# Rows fetched per round trip and converted to arrays at a time
+CHUNK_SIZE = 20000
+
+
+def _empty_state():
+    return np.zeros(0, dtype=np.int64), np.zeros((0, 7)), np.zeros((0, 7)), np.zeros(7, dtype=np.int64)
+
+
+def _load(velocity):
+    """The (product ids, mean, variance, days seen per weekday) of a SalesVelocity"""
+    if not velocity or not velocity.velocities:
+        return _empty_state()
+    with np.load(BytesIO(bytes(velocity.velocities))) as arrays:
+        return arrays['product_ids'], arrays['mean'], arrays['variance'], arrays['seen']
+
+
+def _dump(product_ids, mean, variance, seen):
+    output = BytesIO()
+    np.savez_compressed(output, product_ids=product_ids, mean=mean, variance=variance, seen=seen)
+    return output.getvalue()
+
+
+def _day_sales(start, end):
+    """
+    Quantity sold per product in the orders created in [start, end),
+    excluding cancelled ones, hot and archived
+
+    Returns:
+        A tuple of arrays (sorted product ids, quantities)
+    """
+    sources = [
+        OrderItem.objects.all(),
+        ArchivedOrderItem.objects.using(archive_database()),
+    ]
+    product_ids, quantities = [], []
+    for items in sources:
+        rows = (items.filter(order__created_at__gte=start, order__created_at__lt=end)
+                .exclude(order__order_status='Cancelled')
+                .order_by().values_list('product_id', 'quantity').iterator(chunk_size=CHUNK_SIZE))
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            chunk_products, chunk_quantities = zip(*chunk)
+            product_ids.append(np.array(chunk_products, dtype=np.int64))
+            quantities.append(np.array(chunk_quantities, dtype=np.int64))
+    if not product_ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    products, inverse = np.unique(np.concatenate(product_ids), return_inverse=True)
+    return products, np.bincount(inverse, weights=np.concatenate(quantities), minlength=len(products))
+
+
+def add_day(state, weekday, day_products, day_quantities):
+    """
+    Fold one business day's sales into the velocity state
+
+    Args:
+        state: Tuple of (product ids, mean, variance, days seen per weekday)
+        weekday: Weekday of the business day, Monday 0
+        day_products, day_quantities: Sales of the day, as from _day_sales
+
+    Returns:
+        The new state; products sold for the first time are added with no
+        sales on the days before
+    """
+    product_ids, mean, variance, seen = state
+    if len(np.setdiff1d(day_products, product_ids, assume_unique=True)):
+        known = product_ids
+        product_ids = np.union1d(product_ids, day_products)
+        positions = np.searchsorted(product_ids, known)
+        mean, variance = np.zeros((len(product_ids), 7)), np.zeros((len(product_ids), 7))
+        mean[positions], variance[positions] = state[1], state[2]
+    else:
+        mean, variance = mean.copy(), variance.copy()
+    sold = np.zeros(len(product_ids))
+    sold[np.searchsorted(product_ids, day_products)] = day_quantities
+
+    if seen[weekday]:
+        # Exponentially weighted mean and variance (West's incremental form)
+        difference = sold - mean[:, weekday]
+        increment = ALPHA * difference
+        mean[:, weekday] += increment
+        variance[:, weekday] = (1 - ALPHA) * (variance[:, weekday] + difference * increment)
+    else:
+        mean[:, weekday] = sold
+    seen = seen.copy()
+    seen[weekday] += 1
+    return product_ids, mean, variance, seen
+
+
+def update_velocity(rebuild=False, progress=None):
+    """
+    Count the closed business days not counted yet into the sales velocity
+
+    Args:
+        rebuild: Start over from the first end day
+        progress: Optional callable taking (days done, days to do)
+
+    Returns:
+        A dict with the number of days counted and of products known
+    """
+    velocity = SalesVelocity.objects.first() or SalesVelocity.objects.create(velocities=b'')
+    if rebuild:
+        velocity.velocities, velocity.counted_until, velocity.days_counted = b'', None, 0
+        velocity.save()
+
+    periods = business_days_after(velocity.counted_until)
+    state = _load(velocity)
+    for done, (start, end) in enumerate(periods):
+        day_products, day_quantities = _day_sales(start, end)
+        weekday = timezone.localtime(start + (end - start) / 2).weekday()
+        state = add_day(state, weekday, day_products, day_quantities)
+
+        # Saved after every day, so an interrupted run resumes where it stopped
+        velocity.velocities = _dump(*state)
+        velocity.counted_until = end
+        velocity.days_counted += 1
+        velocity.save()
+        if progress:
+            progress(done + 1, len(periods))
+
+    if periods or rebuild:
+        bump_version('forecast')
+    logger.info(f"Sales velocity: counted {len(periods)} business days, {len(state[0])} products")
+    return {'days': len(periods), 'products': len(state[0])}
+
+
+def _hour_weekdays(start, hours):
+    """Local weekday of each of the hours from start"""
+    return np.array([timezone.localtime(start + timedelta(hours=hour)).weekday() for hour in range(hours)], dtype=np.int64)
+
+
+def project(stock, mean, variance, now, lead_days, cover_days):
+    """
+    Stockout and reorder projections for a batch of products
+
+    Args:
+        stock: Array of the products' stock quantities
+        mean, variance: Arrays [products, 7] of their daily sales per weekday
+        now: Aware datetime the projection starts from
+        lead_days, cover_days: Reorder lead time and cover, in days
+
+    Returns:
+        A dict of arrays: hours_to_stockout (inf beyond the horizon),
+        reorder_point and reorder_quantity
+    """
+    stock = np.asarray(stock, dtype=np.float64)
+    lead_hours = max(1, round(lead_days * 24))
+    cover_hours = max(lead_hours, round((lead_days + cover_days) * 24))
+    hours = max(HORIZON_DAYS * 24, cover_hours)
+    weekdays = _hour_weekdays(now, hours)
+
+    hourly = mean[:, weekdays] / 24
+    demand = np.cumsum(hourly, axis=1)
+    rows = np.arange(len(stock))
+    runs_out = demand[:, -1] >= stock
+    # First hour by the end of which the demand reaches the stock,
+    # interpolated within it
+    first = np.argmax(demand >= stock[:, None], axis=1)
+    before = np.where(first > 0, demand[rows, first - 1], 0)
+    rate = hourly[rows, first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        into_hour = np.where(rate > 0, (stock - before) / rate, 0)
+    hours_to_stockout = np.where(runs_out, first + np.clip(into_hour, 0, 1), np.inf)
+    hours_to_stockout = np.where(stock <= 0, 0, hours_to_stockout)
+
+    # Days' sales are independent, so variances add up; spread over hours
+    # like the mean so part days count in proportion
+    lead_variance = (variance[:, weekdays[:lead_hours]] / 24).sum(axis=1)
+    safety_stock = SAFETY_Z * np.sqrt(lead_variance)
+    reorder_point = demand[:, lead_hours - 1] + safety_stock
+    wanted = demand[:, cover_hours - 1] + safety_stock - stock
+    reorder_quantity = np.where(stock <= reorder_point, np.ceil(np.maximum(wanted, 0)), 0)
+    return {
+        'hours_to_stockout': hours_to_stockout,
+        'reorder_point': np.ceil(reorder_point),
+        'reorder_quantity': reorder_quantity,
+    }
+
+
+def _forecast_key(version, hour, lead_days, cover_days, product_id, stock, running_item):
+    return f'{FORECAST_KEY_PREFIX}{version}:{hour}:{lead_days}:{cover_days}:{product_id}:{stock}:{int(running_item)}'
+
+
+def _compute(products, now, lead_days, cover_days):
+    """Forecasts of (id, stock, running item) rows, as cached per product"""
+    product_ids, mean, variance, _ = _load(SalesVelocity.objects.first())
+    ids = np.array([product_id for product_id, _, _ in products], dtype=np.int64)
+    stock = np.array([quantity for _, quantity, _ in products], dtype=np.float64)
+    positions = np.minimum(np.searchsorted(product_ids, ids), max(len(product_ids) - 1, 0))
+    known = (product_ids[positions] == ids) if len(product_ids) else np.zeros(len(ids), dtype=bool)
+    product_mean, product_variance = np.zeros((len(ids), 7)), np.zeros((len(ids), 7))
+    product_mean[known], product_variance[known] = mean[positions[known]], variance[positions[known]]
+
+    projection = project(stock, product_mean, product_variance, now, lead_days, cover_days)
+    forecasts = []
+    for row, (product_id, quantity, running_item) in enumerate(products):
+        hours = float(projection['hours_to_stockout'][row])
+        # Running items are never out of stock
+        runs_out = math.isfinite(hours) and not running_item
+        forecasts.append({
+            'product_id': product_id,
+            'stock_quantity': quantity,
+            'running_item': running_item,
+            'daily_velocity': round(float(product_mean[row].mean()), 2),
+            'weekday_velocity': [round(float(value), 2) for value in product_mean[row]],
+            'stockout_at': now + timedelta(hours=hours) if runs_out else None,
+            'reorder_point': 0 if running_item else int(projection['reorder_point'][row]),
+            'reorder_quantity': 0 if running_item else int(projection['reorder_quantity'][row]),
+        })
+    return forecasts
+
+
+def forecasts(products=None):
+    """
+    Stock forecasts of products
+
+    Args:
+        products: Product queryset, all products not archived by default
+
+    Returns:
+        A list of dicts in the order of products: product_id, name,
+        stock_quantity, running_item, daily_velocity, weekday_velocity
+        (Monday first), stockout_at and hours_to_stockout (None if stock
+        lasts beyond the horizon), reorder_point and reorder_quantity
+    """
+    if products is None:
+        products = Product.objects.filter(is_archived=False)
+    rows = list(products.values_list('id', 'name', 'stock_quantity', 'running_item'))
+    now = timezone.now()
+    business = settings_store.get_values(['reorder_lead_days', 'reorder_cover_days'])
+    lead_days, cover_days = float(business['reorder_lead_days']), float(business['reorder_cover_days'])
+    version, hour = get_version('forecast'), now.replace(minute=0, second=0, microsecond=0)
+    keys = [
+        _forecast_key(version, int(hour.timestamp()), lead_days, cover_days, product_id, stock, running_item)
+        for product_id, _, stock, running_item in rows
+    ]
+
+    found = cache.get_many(keys)
+    missing = [(row[0], row[2], row[3]) for row, key in zip(rows, keys) if key not in found]
+    if missing:
+        # Projected from the start of the hour, so a cached forecast stays
+        # valid for the whole hour its key belongs to
+        computed = _compute(missing, hour, lead_days, cover_days)
+        by_id = {forecast['product_id']: forecast for forecast in computed}
+        fresh = {key: by_id[row[0]] for row, key in zip(rows, keys) if key not in found}
+        cache.set_many(fresh, FORECAST_CACHE_TIMEOUT)
+        found.update(fresh)
+
+    results = []
+    for (product_id, name, _, _), key in zip(rows, keys):
+        forecast = dict(found[key], name=name)
+        stockout_at = forecast['stockout_at']
+        forecast['hours_to_stockout'] = (
+            round(max((stockout_at - now).total_seconds(), 0) / 3600, 1) if stockout_at else None
+        )
+        results.append(forecast)
+    return results
+
+
+def running_out(within_hours=None, limit=None):
+    """
+    Products to reorder or running out soon, soonest stockout first
+
+    Args:
+        within_hours: Also list products running out within this many
+            hours, whether or not they are due for reordering
+        limit: Number of products to return at most
+
+    Returns:
+        A list of forecasts, as from forecasts()
+    """
+    results = [
+        forecast for forecast in forecasts()
+        if forecast['reorder_quantity'] > 0 or (
+            within_hours is not None and forecast['hours_to_stockout'] is not None
+            and forecast['hours_to_stockout'] <= within_hours
+        )
+    ]
+    results.sort(key=lambda forecast: (
+        forecast['hours_to_stockout'] if forecast['hours_to_stockout'] is not None else math.inf,
+        forecast['name'],
+    ))
+    return results[:limit] if limit else results
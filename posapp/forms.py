@@ -64,7 +64,7 @@ class ProductForm(forms.ModelForm):
     
     class Meta:
         model = Product
-        fields = ('name', 'product_code', 'category', 'price', 'sku', 'stock_quantity', 'is_available', 'running_item', 'description')
+        fields = ('name', 'product_code', 'category', 'price', 'sku', 'stock_quantity', 'reorder_threshold', 'is_available', 'running_item', 'description')
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'product_code': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter unique product code'}),
@@ -72,6 +72,7 @@ class ProductForm(forms.ModelForm):
             'price': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'sku': forms.TextInput(attrs={'class': 'form-control'}),
             'stock_quantity': forms.NumberInput(attrs={'class': 'form-control'}),
+            'reorder_threshold': forms.NumberInput(attrs={'class': 'form-control', 'min': 0}),
             'is_available': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'running_item': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
@@ -160,7 +161,8 @@ class OrderItemForm(forms.ModelForm):
 class DiscountForm(forms.ModelForm):
     class Meta:
         model = Discount
-        fields = ('name', 'code', 'type', 'value', 'is_active', 'start_date', 'end_date')
+        fields = ('name', 'code', 'type', 'value', 'is_active', 'start_date', 'end_date',
+                  'min_subtotal', 'products', 'categories')
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'code': forms.TextInput(attrs={'class': 'form-control'}),
@@ -169,6 +171,9 @@ class DiscountForm(forms.ModelForm):
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'start_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'end_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'min_subtotal': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+            'products': forms.SelectMultiple(attrs={'class': 'form-control', 'size': 6}),
+            'categories': forms.SelectMultiple(attrs={'class': 'form-control', 'size': 6}),
         }
     
     def clean_code(self):
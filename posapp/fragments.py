@@ -0,0 +1,86 @@
+"""
+Fragment responses for the AJAX search on list pages.
+
+The list pages refresh their rows with fetch() while the user types. Those
+requests only need the rows and the pagination, so they are answered with a
+small fragment rendered without the base layout or the project's context
+processors, and carry an ETag built from the list's data version so a repeated
+search over unchanged data is answered with 304 Not Modified.
+"""
+from functools import wraps
+import hashlib
+
+from django.http import HttpResponse
+from django.template.context_processors import csrf
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .versioning import get_versions, versions_are_shared
+
+FRAGMENT_TEMPLATE = 'posapp/partials/list_fragment.html'
+
+
+def is_fragment_request(request):
+    """Whether the request asks for the list fragment instead of the full page"""
+    return request.GET.get('partial') == '1' or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def render_list_fragment(request, rows_template, page, context=None):
+    """
+    Render only the rows and pagination of a list page
+
+    Context processors are skipped; the fragment gets the template context
+    plus the current user and CSRF token, which is all the row templates use.
+
+    Args:
+        rows_template: Template rendering the rows for the objects in page
+        page: The KeysetPage being shown
+        context: Extra context for the rows template
+    """
+    fragment_context = dict(context or {})
+    fragment_context.update({
+        'rows_template': rows_template,
+        'page': page,
+        'request': request,
+        'user': request.user,
+    })
+    fragment_context.update(csrf(request))
+    return HttpResponse(render_to_string(FRAGMENT_TEMPLATE, fragment_context))
+
+
+def list_etag(request, *namespaces):
+    """ETag for a list request from the data versions it depends on"""
+    versions = get_versions(*namespaces)
+    raw = '|'.join([str(request.user.pk), request.get_full_path()] + [str(v) for v in versions])
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def conditional_fragment(*namespaces):
+    """
+    Decorator answering repeated fragment requests with 304 Not Modified
+
+    The ETag is checked before the view runs, so an unchanged list costs a
+    cache lookup instead of its queries. Only fragment requests are
+    conditional; full pages carry messages and CSRF tokens that must not be
+    served stale. ETags are only used when the version counters are shared
+    by every worker (see versioning.versions_are_shared).
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method != 'GET' or not is_fragment_request(request) or not versions_are_shared():
+                return view_func(request, *args, **kwargs)
+
+            etag = list_etag(request, *namespaces)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response['ETag'] = etag
+            # The same URL serves the full page to normal navigation
+            patch_vary_headers(response, ['X-Requested-With'])
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return _wrapped_view
+    return decorator
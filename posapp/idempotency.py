@@ -0,0 +1,126 @@
+"""
+Idempotency keys for POST APIs.
+
+Terminals on a flaky connection retry order submissions. A client that sends
+an ``Idempotency-Key`` header gets the same response for every request with
+that key: the first request runs the view and stores its response, later ones
+replay it without running the view again.
+
+The key's row is locked for the whole first request, so a retry that arrives
+while the original is still running waits for it and then replays its result
+instead of creating a second order. Only successful responses are stored:
+after a 4xx (out of stock, table taken) or a 5xx the key is released, so a
+retry runs the view again once the problem is fixed, with the same or a
+corrected request.
+"""
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import logging
+
+from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger('posapp')
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+
+
+def _request_hash(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def _replay(record):
+    response = HttpResponse(
+        record.response_body,
+        status=record.response_status,
+        content_type=record.response_content_type or None,
+    )
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_func=None, ttl=IDEMPOTENCY_TTL):
+    """
+    Decorator making a POST view safe to retry with an Idempotency-Key header
+
+    Requests without the header run the view as before. Must be applied
+    inside login_required, keys are scoped to the user.
+
+    Args:
+        ttl: How long a stored response is replayed
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view_func(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters',
+                }, status=400)
+
+            request_hash = _request_hash(request)
+            now = timezone.now()
+            # Committed on its own so concurrent duplicates find the row to
+            # wait on
+            record, _ = IdempotencyKey.objects.get_or_create(
+                user=request.user,
+                key=key,
+                defaults={'request_path': request.path, 'request_hash': request_hash, 'expires_at': now + ttl},
+            )
+
+            with transaction.atomic():
+                # Blocks while another request with this key is running
+                record = IdempotencyKey.objects.select_for_update().get(pk=record.pk)
+
+                if record.expires_at <= now or not record.is_completed:
+                    # An expired key, or one whose earlier request failed, is
+                    # free to be reused for a new request
+                    record.request_path = request.path
+                    record.request_hash = request_hash
+                    record.response_status = None
+                    record.response_body = ''
+                    record.response_content_type = ''
+                    record.expires_at = now + ttl
+                elif record.request_path != request.path or record.request_hash != request_hash:
+                    return JsonResponse({
+                        'status': 'error',
+                        'message': f'This {IDEMPOTENCY_HEADER} was already used for a different request',
+                    }, status=422)
+                elif record.is_completed:
+                    logger.info(f"Replaying response for {IDEMPOTENCY_HEADER} {key} of user {request.user.pk}")
+                    return _replay(record)
+
+                response = view_func(request, *args, **kwargs)
+
+                if response.status_code < 400 and not response.streaming:
+                    record.response_status = response.status_code
+                    record.response_body = response.content.decode(response.charset)
+                    record.response_content_type = response.get('Content-Type', '')
+                    record.save()
+                return response
+        return _wrapped_view
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
+
+
+def purge_expired_keys():
+    """
+    Delete stored responses past their TTL
+
+    Returns:
+        The number of keys deleted
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,554 @@
+"""
+Order creation from POS terminal payloads.
+
+create_order_api takes one order as the POS screen posts it. Terminals that
+lost their connection keep orders in a local queue and later send them in
+batches to sync_orders_api; each queued order carries a client generated
+UUID (``client_uuid``) so an order that already reached the server is
+reported as a duplicate instead of being created twice.
+
+Integrations that push bursts of orders (kiosks, delivery aggregators) use
+create_orders_bulk through the batch API, which validates a whole batch
+against one read of the products involved and writes it with a handful of
+statements instead of several per order.
+"""
+from collections import defaultdict
+from decimal import Decimal
+import logging
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem, Product, EndDay
+from .versioning import bump_version
+from . import audit, customers, kitchen, numbering, order_search, pending_orders, report_cache, stock_alerts, tables
+from . import discounts as discount_rules
+
+logger = logging.getLogger('posapp')
+
+# Most orders accepted in one sync or batch request
+MAX_BATCH_ORDERS = 100
+
+
+class OrderValidationError(Exception):
+    """An order payload that cannot be accepted; the message is shown to the cashier"""
+
+    def __init__(self, message, product_id=None):
+        super().__init__(message)
+        self.message = message
+        self.product_id = product_id
+
+
+def parse_client_uuid(value):
+    """
+    Returns:
+        The UUID, or None if value is empty
+
+    Raises:
+        OrderValidationError: If value is not a valid UUID
+    """
+    if not value:
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise OrderValidationError(f'Invalid client_uuid: {value}')
+
+
+def build_order(data, user):
+    """
+    Validate an order payload and build the unsaved Order for it
+
+    Args:
+        data: Decoded order payload
+        user: User creating the order
+
+    Returns:
+        An unsaved Order
+
+    Raises:
+        OrderValidationError: If the payload is invalid
+    """
+    # Validate service charge
+    service_charge_percent = Decimal(str(data.get('service_charge_percent', '0')))
+    if service_charge_percent < 0:
+        raise OrderValidationError('Service charge cannot be negative')
+    if service_charge_percent > 100:
+        raise OrderValidationError('Service charge cannot exceed 100%')
+
+    client_uuid = parse_client_uuid(data.get('client_uuid'))
+
+    # Extract customer info
+    customer_name = data.get('customer_name', '')
+    customer_phone = data.get('customer_phone', '')
+
+    # Get order data
+    subtotal = Decimal(str(data.get('subtotal', '0')))
+    tax_amount = Decimal(str(data.get('tax_amount', '0')))
+    discount_amount = Decimal(str(data.get('discount_amount', '0')))
+    discount_code = data.get('discount_code', '')
+    discount_type = data.get('discount_type', '')
+    discount_value = data.get('discount_value', 0)
+
+    # Service charge (only for Dine In with subtotal >= 1000)
+    order_type = data.get('order_type', 'Take Away')
+    service_charge_percent = Decimal('0.00')
+    service_charge_amount = Decimal('0.00')
+
+    if order_type == 'Dine In' and subtotal >= 1000:
+        service_charge_percent = Decimal(str(data.get('service_charge_percent', '0')))
+        service_charge_amount = subtotal * (service_charge_percent / Decimal('100.0'))
+
+    # Delivery charges (only for Delivery)
+    delivery_charges = Decimal('0.00')
+    if order_type == 'Delivery':
+        delivery_charges = Decimal(str(data.get('delivery_charges', '0')))
+
+    # Calculate total amount
+    total_amount = subtotal - discount_amount + tax_amount + service_charge_amount + delivery_charges
+
+    # Check if a non-manual discount code was used
+    discount = None
+    if discount_code and discount_code != 'MANUAL':
+        # Looked up in the compiled discount table rather than queried
+        rule = discount_rules.get_rule(code=discount_code)
+        # If discount code doesn't exist, still create the order but without linking to a discount
+        discount = rule.discount if rule else None
+
+    return Order(
+        client_uuid=client_uuid,
+        customer_name=customer_name,
+        customer_phone=customer_phone,
+        search_name=order_search.normalize_name(customer_name),
+        subtotal=subtotal,
+        tax_amount=tax_amount,
+        discount_amount=discount_amount,
+        discount_code=discount_code,
+        discount_type=discount_type,
+        discount_value=Decimal(str(discount_value)) if discount_value else Decimal('0'),
+        discount=discount,  # Link to discount object if found
+        service_charge_percent=service_charge_percent,
+        service_charge_amount=service_charge_amount,
+        delivery_charges=delivery_charges,
+        total_amount=total_amount,
+        payment_method=data.get('payment_method', 'Cash'),
+        payment_status=data.get('payment_status', 'Pending'),
+        order_status=data.get('order_status', 'Pending'),
+        notes=data.get('notes', ''),
+        user=user if user.is_authenticated else None,
+        order_type=order_type,
+        delivery_address=data.get('delivery_address', ''),
+        table_number=str(data.get('table_number') or '').strip()
+    )
+
+
+def build_items(data):
+    """
+    Parse the items of an order payload
+
+    Returns:
+        A list of dicts with product_id, quantity, unit_price and total_price
+    """
+    return [
+        {
+            'product_id': int(item_data['product_id']),
+            'quantity': int(item_data['quantity']),
+            'unit_price': Decimal(str(item_data['unit_price'])),
+            'total_price': Decimal(str(item_data['total_price'])),
+        }
+        for item_data in data.get('items', [])
+    ]
+
+
+def create_order_from_payload(data, user, table_conflicts=None):
+    """
+    Create an order and its items from the JSON the POS screen posts
+
+    Must be called inside a transaction. Stock is checked and reduced here
+    unless the payload says the terminal already did (stock_already_reduced).
+    A Dine In order's table is claimed before the order is saved, so another
+    terminal cannot seat an order there at the same time.
+
+    Args:
+        data: Decoded order payload
+        user: User creating the order
+        table_conflicts: Optional list; when given, a table that is already
+            occupied is appended to it as a conflict instead of rejecting
+            the order, which is then created without taking the table
+
+    Returns:
+        The new Order
+
+    Raises:
+        OrderValidationError: If the payload is invalid, stock is short or
+            the table is occupied
+    """
+    order = build_order(data, user)
+    items = build_items(data)
+
+    try:
+        tables.claim(tables.table_number_of(order))
+    except tables.TableOccupiedError as e:
+        if table_conflicts is None:
+            raise OrderValidationError(e.message)
+        table_conflicts.append({'table_number': e.table_number, 'order_id': e.order_id})
+
+    # Check stock availability for all items first
+    for item in items:
+        product_id = item['product_id']
+        quantity = item['quantity']
+
+        # Skip stock check if stock already updated in UI
+        if data.get('stock_already_reduced', False):
+            continue
+
+        try:
+            product = Product.objects.select_for_update().get(id=product_id)
+
+            # Skip stock check for running items
+            if not product.running_item and product.stock_quantity < quantity:
+                raise OrderValidationError(
+                    f'Insufficient stock for {product.name}. Available: {product.stock_quantity}',
+                    product_id=product_id,
+                )
+        except Product.DoesNotExist:
+            raise OrderValidationError(f'Product with ID {product_id} does not exist')
+
+    order.customer = customers.upsert(order.customer_phone, order.customer_name, order.delivery_address)
+    order.save()
+
+    # Create order items
+    for item in items:
+        OrderItem.objects.create(order=order, **item)
+
+        # Update product stock if not already updated in UI
+        if not data.get('stock_already_reduced', False):
+            try:
+                product = Product.objects.get(id=item['product_id'])
+                if not product.running_item:
+                    product.stock_quantity -= item['quantity']
+                    product.save()
+            except Product.DoesNotExist:
+                # Log error but don't fail the order creation
+                logger.error(f"Failed to update stock for product ID {item['product_id']} - product not found")
+
+    logger.info(f"Order #{order.id} created successfully by {user.username if user.is_authenticated else 'anonymous'}")
+    return order
+
+
+def _synced_order(client_uuid):
+    """The order, live or archived, already created for client_uuid, or None"""
+    return (
+        Order.objects.filter(client_uuid=client_uuid).first()
+        or ArchivedOrder.objects.filter(client_uuid=client_uuid).first()
+    )
+
+
+def _existing_product_ids(payloads):
+    """Ids of the products referenced by payloads that exist"""
+    product_ids = set()
+    for payload in payloads:
+        if not isinstance(payload, dict):
+            continue
+        for item in payload.get('items') or []:
+            try:
+                product_ids.add(int(item['product_id']))
+            except (KeyError, TypeError, ValueError):
+                # Rejected with the rest of its order
+                pass
+    return set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+
+
+def _stock_shortfalls(quantities):
+    """
+    Products whose stock does not cover the quantities
+
+    Args:
+        quantities: Dict of product id to quantity
+
+    Returns:
+        A dict of product id to {'product_id', 'product_name', 'requested', 'available'}
+    """
+    shortfalls = {}
+    products = Product.objects.select_for_update().filter(id__in=quantities, running_item=False)
+    for product in products:
+        if product.stock_quantity < quantities[product.id]:
+            shortfalls[product.id] = {
+                'product_id': product.id,
+                'product_name': product.name,
+                'requested': quantities[product.id],
+                'available': product.stock_quantity,
+            }
+    return shortfalls
+
+
+def sync_orders(payloads, user):
+    """
+    Create the orders queued by an offline terminal
+
+    The batch runs in one transaction with a savepoint per order, so an
+    invalid order is rejected without affecting the others. Orders are
+    accepted even when stock turned out to be short or their table was taken
+    in the meantime, since the sale already happened at the terminal; these
+    are reported as conflicts so stock or seating can be corrected.
+
+    Args:
+        payloads: List of order payloads, each with a client_uuid
+        user: User the orders are created for
+
+    Returns:
+        A list with one result per payload, in order. Each result has the
+        client_uuid and a status of 'created', 'duplicate' or 'rejected',
+        plus order_id/reference_number or a message, and 'conflicts' listing
+        stock shortfalls for the order's products and the table, if it was
+        occupied.
+    """
+    results = []
+    quantities = defaultdict(int)
+    products_by_result = []
+    table_conflicts = []
+    known_products = _existing_product_ids(payloads)
+
+    with transaction.atomic():
+        for payload in payloads:
+            raw_uuid = payload.get('client_uuid') if isinstance(payload, dict) else None
+            result = {'client_uuid': raw_uuid}
+            results.append(result)
+            products_by_result.append(set())
+            table_conflicts.append([])
+            try:
+                client_uuid = parse_client_uuid(raw_uuid)
+                if client_uuid is None:
+                    raise OrderValidationError('client_uuid is required')
+                # Checked up front: queued orders skip the stock check that
+                # would otherwise catch them, and a dangling product id would
+                # only fail when the whole batch commits
+                for item in payload.get('items', []):
+                    if int(item['product_id']) not in known_products:
+                        raise OrderValidationError(f"Product with ID {item['product_id']} does not exist")
+
+                existing = _synced_order(client_uuid)
+                if existing is None:
+                    try:
+                        with transaction.atomic():
+                            order = create_order_from_payload(payload, user, table_conflicts[-1])
+                    except IntegrityError:
+                        # Sent concurrently by another sync of the same queue
+                        existing = _synced_order(client_uuid)
+                        if existing is None:
+                            raise
+                if existing is not None:
+                    result.update(status='duplicate', order_id=existing.id, reference_number=existing.reference_number)
+                    continue
+            except OrderValidationError as e:
+                result.update(status='rejected', message=e.message)
+                continue
+            except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+                result.update(status='rejected', message=f'Invalid order data: {e}')
+                continue
+
+            result.update(status='created', order_id=order.id, reference_number=order.reference_number)
+            for item in payload.get('items', []):
+                quantities[int(item['product_id'])] += int(item['quantity'])
+                products_by_result[-1].add(int(item['product_id']))
+
+        shortfalls = _stock_shortfalls(quantities) if quantities else {}
+
+    for result, product_ids, table_conflict in zip(results, products_by_result, table_conflicts):
+        result['conflicts'] = [shortfalls[product_id] for product_id in sorted(product_ids) if product_id in shortfalls]
+        if result['status'] == 'created':
+            result['conflicts'] += table_conflict
+    return results
+
+
+def _number_orders(orders):
+    """
+    Give unsaved orders the numbers generate_order_number sets on save()
+
+    bulk_create skips the pre_save signal, so the batch is numbered here with
+    one daily count, one sequence update and one round of reference number
+    checks.
+    """
+    last_end_day = EndDay.get_last_end_day()
+    if last_end_day:
+        daily_count = Order.objects.filter(created_at__gt=last_end_day.end_date).count()
+    else:
+        daily_count = Order.objects.filter(created_at__date=timezone.now().date()).count()
+
+    for n, (order, order_number, reference_number) in enumerate(
+        zip(orders, numbering.next_order_numbers(len(orders)), numbering.new_references(len(orders))), start=1
+    ):
+        order.daily_order_number = daily_count + n
+        order.order_number = order_number
+        order.reference_number = reference_number
+
+
+def _batch_lookups(payloads):
+    """Products, known client UUIDs and locked tables referenced by a batch"""
+    product_ids, client_uuids, table_numbers = set(), set(), set()
+    for payload in payloads:
+        if not isinstance(payload, dict):
+            continue
+        try:
+            product_ids.update(int(item['product_id']) for item in payload.get('items') or [])
+        except (KeyError, TypeError, ValueError):
+            pass
+        try:
+            client_uuid = parse_client_uuid(payload.get('client_uuid'))
+        except OrderValidationError:
+            client_uuid = None
+        if client_uuid:
+            client_uuids.add(client_uuid)
+        if payload.get('order_type') == 'Dine In' and payload.get('table_number'):
+            table_numbers.add(str(payload['table_number']).strip())
+
+    # Tables are locked before products, in the same order as
+    # create_order_from_payload, so the two cannot deadlock
+    locked_tables = tables.lock_tables(table_numbers)
+    products = {
+        product.id: product
+        for product in Product.objects.select_for_update()
+        .filter(id__in=product_ids)
+        .only('id', 'name', 'stock_quantity', 'running_item', 'reorder_threshold')
+    }
+    known = dict(Order.objects.filter(client_uuid__in=client_uuids).values_list('client_uuid', 'id'))
+    known.update(ArchivedOrder.objects.filter(client_uuid__in=client_uuids).values_list('client_uuid', 'id'))
+    return products, known, locked_tables
+
+
+def create_orders_bulk(payloads, user):
+    """
+    Validate and create a batch of orders with bulk inserts
+
+    Each payload is validated like create_order_api would, against stock and
+    tables as they stand after the batch's earlier orders. Invalid orders are rejected
+    without touching the database; the rest are inserted with one
+    bulk_create for orders and one for items, and stock for all of them is
+    reduced with a single UPDATE. Payloads may carry a client_uuid, in which
+    case an order that was already created is reported as a duplicate.
+
+    Signals do not run for bulk inserts: the batch is audited as one entry
+    and the data versions are bumped once.
+
+    Args:
+        payloads: List of order payloads
+        user: User creating the orders
+
+    Returns:
+        A list with one result per payload, in order: a dict with index and
+        status 'created' (with order_id and reference_number), 'duplicate'
+        (with order_id) or 'rejected' (with message, and product_id when
+        stock was short)
+    """
+    results = []
+    accepted = []
+    stock_used = defaultdict(int)
+
+    with transaction.atomic():
+        products, known, locked_tables = _batch_lookups(payloads)
+        seen = set()
+        seated = set()
+
+        for index, payload in enumerate(payloads):
+            result = {'index': index}
+            results.append(result)
+            try:
+                if not isinstance(payload, dict):
+                    raise OrderValidationError('Order must be an object')
+                order = build_order(payload, user)
+                items = build_items(payload)
+
+                if order.client_uuid is not None:
+                    if order.client_uuid in known:
+                        result.update(status='duplicate', order_id=known[order.client_uuid])
+                        continue
+                    if order.client_uuid in seen:
+                        raise OrderValidationError(f'client_uuid {order.client_uuid} appears twice in the batch')
+
+                table_number = tables.table_number_of(order)
+                if table_number is not None:
+                    if table_number not in locked_tables:
+                        locked_tables.update(tables.lock_tables([table_number]))
+                    if table_number in seated or tables.occupant(locked_tables[table_number]) is not None:
+                        raise OrderValidationError(f'Table #{table_number} already has a pending order')
+
+                reduce_stock = not payload.get('stock_already_reduced', False)
+                needed = defaultdict(int)
+                for item in items:
+                    product = products.get(item['product_id'])
+                    if product is None:
+                        raise OrderValidationError(f"Product with ID {item['product_id']} does not exist")
+                    if reduce_stock and not product.running_item:
+                        needed[product.id] += item['quantity']
+                for product_id, quantity in needed.items():
+                    available = products[product_id].stock_quantity - stock_used[product_id]
+                    if available < quantity:
+                        raise OrderValidationError(
+                            f'Insufficient stock for {products[product_id].name}. Available: {available}',
+                            product_id=product_id,
+                        )
+            except OrderValidationError as e:
+                result.update(status='rejected', message=e.message)
+                if e.product_id is not None:
+                    result['product_id'] = e.product_id
+                continue
+            except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+                result.update(status='rejected', message=f'Invalid order data: {e}')
+                continue
+
+            for product_id, quantity in needed.items():
+                stock_used[product_id] += quantity
+            if order.client_uuid is not None:
+                seen.add(order.client_uuid)
+            if table_number is not None:
+                seated.add(table_number)
+            accepted.append((result, order, items))
+
+        if accepted:
+            orders = [order for _, order, _ in accepted]
+            _number_orders(orders)
+            customers.attach(orders)
+            Order.objects.bulk_create(orders)
+            if orders[0].pk is None:
+                # The backend does not return primary keys from bulk inserts
+                ids = dict(Order.objects.filter(order_number__in=[order.order_number for order in orders])
+                           .values_list('order_number', 'id'))
+                for order in orders:
+                    order.pk = ids[order.order_number]
+
+            tables.seat_orders(orders)
+            pending_orders.orders_created(orders)
+            customers.orders_created(orders)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, original_quantity=item['quantity'], **item)
+                for _, order, items in accepted
+                for item in items
+            ])
+
+            if stock_used:
+                Product.objects.filter(id__in=stock_used).update(stock_quantity=F('stock_quantity') - Case(
+                    *[When(id=product_id, then=Value(quantity)) for product_id, quantity in stock_used.items()],
+                    output_field=IntegerField(),
+                ))
+                # The rows are locked, so their stock before the UPDATE is known
+                stock_alerts.stock_changed(
+                    (product_id, products[product_id].reorder_threshold, products[product_id].stock_quantity,
+                     products[product_id].stock_quantity - quantity)
+                    for product_id, quantity in stock_used.items()
+                )
+
+            for result, order, _ in accepted:
+                result.update(status='created', order_id=order.id, reference_number=order.reference_number)
+                # Signals do not run for bulk inserts
+                kitchen.schedule_refresh(order.id)
+            report_cache.mark_changed(report_cache.ORDERS, *(order.created_at for _, order, _ in accepted))
+            audit.record('Orders Created', 'Order', details=f'Created {len(orders)} orders in a batch')
+            logger.info(f"Batch of {len(orders)} orders created by {user.username if user.is_authenticated else 'anonymous'}")
+
+    if accepted:
+        bump_version('orders')
+        if stock_used:
+            bump_version('products', 'categories')
+    return results
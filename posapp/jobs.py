@@ -0,0 +1,363 @@
+"""
+Database-backed background jobs.
+
+Long-running work (end-of-day summaries, Excel exports, backfills) is queued
+as ``BackgroundJob`` rows and executed by the ``run_jobs`` management command,
+so it never holds up a request and needs no external broker.
+
+Handlers are plain functions registered by name::
+
+    @job_handler('export_orders_excel')
+    def export_orders(job, start, end, status=None):
+        job.set_progress(50, 'Writing rows')
+        ...
+        return {'rows': 10}
+
+The keyword arguments come from the job payload, the return value is stored
+as the job result. A handler that raises is retried with exponential backoff
+until ``max_attempts`` is reached. While a handler runs, the worker touches
+the job every ``HEARTBEAT_SECONDS``; a job that stops being touched is
+requeued by ``requeue_stale_jobs`` as a failed attempt.
+
+Set ``POS_JOBS_EAGER = True`` to run jobs inline when they are enqueued, which
+is handy for development when no worker is running.
+"""
+from datetime import timedelta
+import logging
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import BackgroundJob, NumberSequence
+
+logger = logging.getLogger('posapp')
+
+JOB_HANDLERS = {}
+
+ACTIVE_STATUSES = ('Queued', 'Running')
+
+# NumberSequence row locked while a job with a dedupe_key is queued
+ENQUEUE_LOCK = 'background_job_enqueue'
+
+# Delay before the first retry, doubled on every further attempt
+RETRY_BACKOFF_SECONDS = 30
+
+# How often a running job's updated_at is touched, well inside the worker's
+# --stale-after
+HEARTBEAT_SECONDS = 60
+
+
+def job_handler(name):
+    """Register the decorated function as the handler for jobs called name"""
+    def decorator(func):
+        JOB_HANDLERS[name] = func
+        return func
+    return decorator
+
+
+class JobContext:
+    """Handle passed to job handlers for reporting progress and storing output"""
+
+    def __init__(self, job):
+        self.job = job
+
+    @property
+    def id(self):
+        return self.job.id
+
+    def set_progress(self, percent, message=''):
+        """
+        Record how far the job has got
+
+        Args:
+            percent: Completion percentage, clamped to 0-100
+            message: Short description of the current step
+        """
+        percent = max(0, min(100, int(percent)))
+        self.job.progress = percent
+        self.job.progress_message = message[:255]
+        # Touch only the progress columns; updated_at doubles as the heartbeat
+        # used by requeue_stale_jobs
+        BackgroundJob.objects.filter(id=self.job.id).update(
+            progress=percent,
+            progress_message=self.job.progress_message,
+            updated_at=timezone.now()
+        )
+
+    def save_file(self, name, content, content_type='application/octet-stream'):
+        """Attach a downloadable file to the job result"""
+        self.job.result_file = content
+        self.job.result_file_name = name
+        self.job.result_file_type = content_type
+
+
+def _lock_enqueue():
+    """Lock the guard row serializing deduplicated enqueues until the transaction ends"""
+    guard = NumberSequence.objects.select_for_update().filter(name=ENQUEUE_LOCK)
+    if guard.first() is not None:
+        return
+    try:
+        with transaction.atomic():
+            NumberSequence.objects.create(name=ENQUEUE_LOCK)
+    except IntegrityError:
+        # Another enqueue created it first
+        guard.first()
+
+
+def enqueue(name, payload=None, user=None, max_attempts=3, dedupe_key=None):
+    """
+    Queue a job for the background worker
+
+    Args:
+        name: Registered handler name
+        payload: JSON-serializable dict passed to the handler as keyword arguments
+        user: Optional user who requested the job
+        max_attempts: Number of times the job is tried before it is marked Failed
+        dedupe_key: Optional key; if a queued or running job already holds it,
+            that job is returned instead of queuing a new one
+
+    Returns:
+        The BackgroundJob
+    """
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"No job handler registered for '{name}'")
+
+    with transaction.atomic():
+        if dedupe_key:
+            # Deduplicated enqueues wait for each other here, so two requests
+            # cannot both miss the other's job and queue it twice. Locking
+            # reads see the jobs committed while waiting.
+            _lock_enqueue()
+            existing = BackgroundJob.objects.select_for_update().filter(
+                dedupe_key=dedupe_key, status__in=ACTIVE_STATUSES
+            ).first()
+            if existing:
+                return existing
+
+        job = BackgroundJob.objects.create(
+            name=name,
+            payload=payload or {},
+            created_by=user if user is not None and user.is_authenticated else None,
+            max_attempts=max_attempts,
+            dedupe_key=dedupe_key
+        )
+    logger.info(f"Queued job {job.name} #{job.id}")
+
+    if getattr(settings, 'POS_JOBS_EAGER', False):
+        _mark_running(job, 'eager')
+        run_job(job)
+        job.refresh_from_db()
+    return job
+
+
+def _mark_running(job, worker_name):
+    job.status = 'Running'
+    job.attempts += 1
+    job.worker = worker_name
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'attempts', 'worker', 'started_at', 'updated_at'])
+
+
+def claim_next(rows, mark_running):
+    """
+    Lock the first row of a queue and mark it running
+
+    Rows are locked with SKIP LOCKED where the database supports it so several
+    workers can poll the same table without handing out a row twice. Shared
+    by the job queue and the print spool (posapp.printing).
+
+    Args:
+        rows: Ordered queryset of the rows that may be claimed
+        mark_running: Callable saving the row as taken, inside the lock
+
+    Returns:
+        The claimed row, or None if there is none
+    """
+    with transaction.atomic():
+        row = rows.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked).first()
+        if row is None:
+            return None
+        mark_running(row)
+    return row
+
+
+def retry_at(attempts, backoff_seconds):
+    """Due time of a retry after the attempts-th failure, with exponential backoff"""
+    return timezone.now() + timedelta(seconds=backoff_seconds * 2 ** (attempts - 1))
+
+
+def requeue_stale(rows, running_status, stale_after, error, released=None, failed=None):
+    """
+    Put back rows left running by a worker that died
+
+    The abandoned run counts as an attempt, so a row that has used all of its
+    attempts is marked Failed instead. rows' model needs the status,
+    attempts, max_attempts, run_after, error and updated_at fields.
+
+    Args:
+        rows: Queryset of the queue's rows
+        running_status: Status of the rows being worked on
+        stale_after: timedelta without an update after which a running row
+            is considered abandoned
+        error: Stored on the rows that fail
+        released: Optional dict of further fields set on every stale row
+        failed: Optional dict of further fields set on the rows that fail
+
+    Returns:
+        A tuple of (rows requeued, rows failed)
+    """
+    now = timezone.now()
+    released = released or {}
+    stale = rows.filter(status=running_status, updated_at__lt=now - stale_after)
+    failed_count = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='Failed', error=error, updated_at=now, **released, **(failed or {})
+    )
+    requeued_count = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='Queued', run_after=now, updated_at=now, **released
+    )
+    return requeued_count, failed_count
+
+
+def claim_job(worker_name):
+    """
+    Take the next due job off the queue
+
+    Returns:
+        The claimed BackgroundJob, now Running, or None if the queue is empty
+    """
+    due = BackgroundJob.objects.filter(status='Queued', run_after__lte=timezone.now()).order_by('run_after', 'id')
+    return claim_next(due, lambda job: _mark_running(job, worker_name))
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Put back jobs left Running by a worker that died, or fail them once they
+    are out of attempts
+
+    Args:
+        stale_after: timedelta without a heartbeat after which a running job
+            is considered abandoned
+
+    Returns:
+        Number of jobs requeued
+    """
+    requeued, failed = requeue_stale(
+        BackgroundJob.objects.all(), 'Running', stale_after,
+        'The worker running the job stopped responding',
+        released={'worker': None}, failed={'finished_at': timezone.now()},
+    )
+    if failed:
+        logger.warning(f"Failed {failed} stale jobs that had no attempts left")
+    return requeued
+
+
+class _Heartbeat(threading.Thread):
+    """Touches a running job's updated_at until stopped, so it is not taken for stale"""
+
+    def __init__(self, job):
+        super().__init__(name=f'posapp-job-{job.id}-heartbeat', daemon=True)
+        self.job_id = job.id
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_SECONDS):
+                BackgroundJob.objects.filter(id=self.job_id, status='Running').update(updated_at=timezone.now())
+        except Exception as e:
+            logger.error(f"Heartbeat of job #{self.job_id} stopped: {str(e)}")
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """
+    Execute a claimed job and record the outcome
+
+    Never raises; failures are stored on the job and scheduled for retry.
+    """
+    handler = JOB_HANDLERS.get(job.name)
+    if handler is None:
+        job.status = 'Failed'
+        job.error = f"No job handler registered for '{job.name}'"
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        return job
+
+    context = JobContext(job)
+    heartbeat = _Heartbeat(job)
+    heartbeat.start()
+    try:
+        result = handler(context, **job.payload)
+    except Exception as e:
+        logger.error(f"Job {job.name} #{job.id} failed on attempt {job.attempts}: {str(e)}")
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = 'Queued'
+            job.run_after = retry_at(job.attempts, RETRY_BACKOFF_SECONDS)
+        else:
+            job.status = 'Failed'
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'run_after', 'finished_at', 'updated_at'])
+        return job
+    finally:
+        heartbeat.stop()
+
+    job.status = 'Completed'
+    job.progress = 100
+    job.result = result
+    job.error = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'status', 'progress', 'result', 'error', 'finished_at', 'updated_at',
+        'result_file', 'result_file_name', 'result_file_type'
+    ])
+    logger.info(f"Job {job.name} #{job.id} completed")
+    return job
+
+
+def run_job_by_id(job_id):
+    """Run an already claimed job by primary key, for use from a process pool"""
+    close_old_connections()
+    try:
+        job = BackgroundJob.objects.get(id=job_id)
+        run_job(job)
+        return job.status
+    finally:
+        connection.close()
+
+
+def job_status(job):
+    """Serializable view of a job for the status endpoint"""
+    data = {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.progress_message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': None,
+        'error': None,
+    }
+    if job.status == 'Completed' and job.result_file_name:
+        data['download_url'] = reverse('job_download', kwargs={'job_id': job.id})
+    elif job.status == 'Completed' and isinstance(job.result, dict):
+        # Files the handler stored elsewhere, e.g. a SalesSummaryPdf
+        data['download_url'] = job.result.get('download_url')
+    if job.status == 'Failed' and job.error:
+        # Only the last line of the traceback; the full one is in the admin
+        data['error'] = job.error.strip().splitlines()[-1]
+    return data
@@ -0,0 +1,192 @@
+"""
+Kitchen display tickets.
+
+Every pending order has a KitchenTicket row holding what a kitchen screen
+shows for it: the order header and its items as JSON, with a per-item
+"bumped" flag the kitchen sets when an item is done. The rows are a
+projection maintained from Order/OrderItem changes (see signals.py), so
+screens read one small table and never join order items on refresh.
+
+Each change to a ticket increments its revision. The feed compares the
+revisions a screen has seen with the current ones and sends only the tickets
+that changed and the ids of those that left the queue.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import KitchenTicket, Order, OrderItem
+from .versioning import bump_version, get_version, versions_are_shared
+
+# Header fields copied from the order to its ticket
+TICKET_ORDER_FIELDS = ('reference_number', 'daily_order_number', 'order_type', 'table_number', 'customer_name', 'notes')
+
+
+# Attribute of the database connection holding the orders whose tickets wait
+# for the current transaction to commit
+PENDING_REFRESH_ATTR = 'posapp_kitchen_pending'
+
+
+def _refresh_pending(connection):
+    """on_commit callback refreshing every ticket touched before the commit"""
+    order_ids = getattr(connection, PENDING_REFRESH_ATTR, None)
+    if order_ids:
+        setattr(connection, PENDING_REFRESH_ATTR, set())
+        refresh_tickets(order_ids)
+
+
+def schedule_refresh(order_id):
+    """
+    Refresh an order's ticket once the current transaction commits
+
+    Changes to an order and its items in one transaction share one refresh:
+    every change registers a callback, and the first one to run refreshes
+    the tickets of all of them. The others find nothing left to do, and a
+    callback dropped with a rolled back savepoint loses no order.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh_tickets([order_id])
+        return
+    pending = getattr(connection, PENDING_REFRESH_ATTR, None)
+    if pending is None:
+        pending = set()
+        setattr(connection, PENDING_REFRESH_ATTR, pending)
+    pending.add(order_id)
+    transaction.on_commit(partial(_refresh_pending, connection))
+
+
+def _ticket_items(items, previous):
+    """Items as stored on a ticket, keeping bumps for items whose quantity is unchanged"""
+    bumped = {item['id']: item for item in previous}
+    return [
+        {
+            'id': item.id,
+            'product': item.product.name,
+            'quantity': item.quantity,
+            'notes': item.notes or '',
+            'bumped': bool(
+                item.id in bumped
+                and bumped[item.id]['quantity'] == item.quantity
+                and bumped[item.id]['bumped']
+            ),
+        }
+        for item in items
+    ]
+
+
+def refresh_tickets(order_ids):
+    """
+    Bring the tickets of the given orders in line with the orders
+
+    Pending orders get a ticket, others lose theirs. Tickets whose content
+    did not change keep their revision, so screens are not sent them again.
+
+    Returns:
+        Number of tickets created, changed or removed
+    """
+    order_ids = set(order_ids)
+    if not order_ids:
+        return 0
+
+    with transaction.atomic():
+        orders = {order.id: order for order in Order.objects.filter(id__in=order_ids, order_status='Pending')}
+        items = {}
+        for item in OrderItem.objects.filter(order_id__in=orders).select_related('product').order_by('id'):
+            items.setdefault(item.order_id, []).append(item)
+        tickets = {ticket.order_id: ticket for ticket in KitchenTicket.objects.select_for_update().filter(order_id__in=order_ids)}
+
+        removed = [order_id for order_id in tickets if order_id not in orders]
+        if removed:
+            KitchenTicket.objects.filter(order_id__in=removed).delete()
+
+        created, changed = [], []
+        for order_id, order in orders.items():
+            ticket = tickets.get(order_id)
+            values = {field: getattr(order, field) for field in TICKET_ORDER_FIELDS}
+            values['items'] = _ticket_items(items.get(order_id, []), ticket.items if ticket else [])
+            if ticket is None:
+                created.append(KitchenTicket(order_id=order_id, ordered_at=order.created_at, revision=1, **values))
+            elif any(getattr(ticket, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(ticket, field, value)
+                ticket.revision += 1
+                ticket.updated_at = timezone.now()
+                changed.append(ticket)
+
+        KitchenTicket.objects.bulk_create(created)
+        KitchenTicket.objects.bulk_update(changed, list(TICKET_ORDER_FIELDS) + ['items', 'revision', 'updated_at'])
+
+    count = len(created) + len(changed) + len(removed)
+    if count:
+        bump_version('kitchen')
+    return count
+
+
+def rebuild_tickets():
+    """
+    Rebuild every ticket from the pending orders, e.g. after deployment
+
+    Returns:
+        Number of tickets created, changed or removed
+    """
+    order_ids = set(Order.objects.filter(order_status='Pending').values_list('id', flat=True))
+    order_ids.update(KitchenTicket.objects.values_list('order_id', flat=True))
+    return refresh_tickets(order_ids)
+
+
+def bump(order_id, item_id=None, bumped=True):
+    """
+    Mark an item, or every item of a ticket, as done in the kitchen
+
+    Args:
+        order_id: Order whose ticket to change
+        item_id: OrderItem to bump, or None for all of the ticket's items
+        bumped: False to put items back in the queue
+
+    Returns:
+        The updated KitchenTicket, or None if the order has no ticket
+    """
+    with transaction.atomic():
+        ticket = KitchenTicket.objects.select_for_update().filter(order_id=order_id).first()
+        if ticket is None:
+            return None
+        items = [
+            dict(item, bumped=bumped) if item_id is None or item['id'] == item_id else item
+            for item in ticket.items
+        ]
+        if items != ticket.items:
+            ticket.items = items
+            ticket.revision += 1
+            ticket.save(update_fields=['items', 'revision', 'updated_at'])
+            transaction.on_commit(lambda: bump_version('kitchen'))
+    return ticket
+
+
+def ticket_changes(known):
+    """
+    Tickets that changed since a screen last saw them
+
+    Args:
+        known: Dict of order id to the revision the screen has
+
+    Returns:
+        A tuple (tickets, removed): dicts of the new or changed tickets, and
+        the order ids in known that no longer have a ticket
+    """
+    current = dict(KitchenTicket.objects.values_list('order_id', 'revision'))
+    removed = [order_id for order_id in known if order_id not in current]
+    changed = [order_id for order_id, revision in current.items() if known.get(order_id) != revision]
+    tickets = [ticket.as_dict() for ticket in KitchenTicket.objects.filter(order_id__in=changed)] if changed else []
+    return tickets, removed
+
+
+def feed_version():
+    """
+    Version counter of the ticket queue, or None if it cannot be trusted
+
+    When every worker shares the counter, a screen whose version matches has
+    nothing new and the tickets need not be read at all.
+    """
+    return get_version('kitchen') if versions_are_shared() else None
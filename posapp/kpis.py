@@ -0,0 +1,164 @@
+"""
+KPI queries for the dashboards.
+
+Each dashboard's figures come from one or two SQL statements using filtered
+aggregates (``Sum(..., filter=Q(...))``) instead of one query per figure, and
+are cached for a short time per scope (all orders, orders since an end day, a
+single user). Archived orders count too: once archive_orders has run, the
+same statements also run against the archive (see posapp.archive). The
+cache key includes the orders data version, so a new, changed or archived
+order is reflected as soon as the worker sees the bump.
+"""
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Func, IntegerField, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .archive import aggregate_orders, order_sources
+from .models import Category, Product
+from .versioning import get_version
+
+KPI_CACHE_TIMEOUT = 30
+
+NOT_CANCELLED = ~Q(order_status='Cancelled')
+
+
+def _cached(name, scope, builder):
+    key = f'posapp:kpi:{name}:{scope}:{get_version("orders")}'
+    return cache.get_or_set(key, builder, KPI_CACHE_TIMEOUT)
+
+
+def _table_count(model):
+    return Subquery(model.objects.order_by().values(count=Func('pk', function='COUNT')), output_field=IntegerField())
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _aggregate_since(since, filters=None, **aggregates):
+    """Aggregate the hot and archived orders created from since, or all of them"""
+    if since:
+        filters = Q(created_at__gte=since) if filters is None else filters & Q(created_at__gte=since)
+    return aggregate_orders(filters, since, **aggregates)
+
+
+def dashboard_kpis(since=None):
+    """
+    Counts and revenue for the main dashboard
+
+    Args:
+        since: Only count orders created from this time, or None for all
+
+    Returns:
+        A dict with total_products, total_categories, total_users,
+        total_orders, active_orders and total_revenue
+    """
+    def build():
+        kpis = _aggregate_since(
+            since,
+            total_orders=Count('id'),
+            active_orders=Count('id', filter=Q(order_status='Pending')),
+            total_revenue=Sum('total_amount', filter=NOT_CANCELLED),
+        )
+        # Any table can host the scalar subqueries; auth_user is never empty
+        # while someone is logged in to look at the dashboard
+        kpis.update(User.objects.order_by().values(
+            total_products=_table_count(Product),
+            total_categories=_table_count(Category),
+            total_users=_table_count(User),
+        )[0])
+        kpis['total_revenue'] = kpis['total_revenue'] or 0
+        return kpis
+
+    return _cached('dashboard', since.isoformat() if since else 'all', build)
+
+
+def reports_kpis(since=None):
+    """
+    Order counts and revenue for today, the last 7 and 30 days and overall,
+    excluding cancelled orders
+
+    Args:
+        since: Only count orders created from this time, or None for all
+
+    Returns:
+        A dict with orders_today/week/month/total and revenue_today/week/month/total
+    """
+    today = timezone.localdate()
+    today_start = _start_of_day(today)
+    # Datetime ranges rather than __date lookups, which wrap the column in a
+    # function for every row
+    periods = {
+        'today': Q(created_at__gte=today_start, created_at__lt=today_start + datetime.timedelta(days=1)),
+        'week': Q(created_at__gte=_start_of_day(today - datetime.timedelta(days=7))),
+        'month': Q(created_at__gte=_start_of_day(today - datetime.timedelta(days=30))),
+        'total': Q(),
+    }
+
+    def build():
+        aggregates = {}
+        for period, condition in periods.items():
+            aggregates[f'orders_{period}'] = Count('id', filter=condition)
+            aggregates[f'revenue_{period}'] = Sum('total_amount', filter=condition)
+        kpis = _aggregate_since(since, NOT_CANCELLED, **aggregates)
+        return {key: value or 0 for key, value in kpis.items()}
+
+    scope = since.isoformat() if since else 'all'
+    return _cached('reports', f'{scope}:{today.isoformat()}', build)
+
+
+def user_kpis(user, months=6):
+    """
+    Order statistics for one user's detail page
+
+    Returns:
+        A dict with total_orders, total_completed_orders, total_pending_orders,
+        daily_orders, daily_completed_orders, total_revenue, daily_revenue and
+        monthly_revenue, a list of {'month', 'revenue'} for the last months
+        calendar months, oldest first
+    """
+    today = timezone.localdate()
+    today_start = _start_of_day(today)
+    first_month = today.replace(day=1)
+    for _ in range(months - 1):
+        first_month = (first_month - datetime.timedelta(days=1)).replace(day=1)
+    first_month_start = _start_of_day(first_month)
+
+    def build():
+        completed = Q(order_status='Completed')
+        is_today = Q(created_at__gte=today_start)
+        kpis = aggregate_orders(
+            Q(user=user),
+            total_orders=Count('id'),
+            total_completed_orders=Count('id', filter=completed),
+            total_pending_orders=Count('id', filter=Q(order_status='Pending')),
+            daily_orders=Count('id', filter=is_today),
+            daily_completed_orders=Count('id', filter=is_today & completed),
+            total_revenue=Sum('total_amount', filter=completed),
+            daily_revenue=Sum('total_amount', filter=is_today & completed),
+        )
+        kpis['total_revenue'] = kpis['total_revenue'] or 0
+        kpis['daily_revenue'] = kpis['daily_revenue'] or 0
+
+        by_month = {}
+        for orders in order_sources(first_month_start):
+            rows = (orders.filter(completed, user=user, created_at__gte=first_month_start)
+                    .annotate(month=TruncMonth('created_at'))
+                    .values('month')
+                    .annotate(revenue=Sum('total_amount')))
+            for row in rows:
+                month = row['month'].date() if isinstance(row['month'], datetime.datetime) else row['month']
+                by_month[month] = by_month.get(month, 0) + (row['revenue'] or 0)
+        monthly_revenue = []
+        month = first_month
+        for _ in range(months):
+            monthly_revenue.append({'month': month.strftime('%b %Y'), 'revenue': by_month.get(month) or 0})
+            month = (month + datetime.timedelta(days=32)).replace(day=1)
+        kpis['monthly_revenue'] = monthly_revenue
+        return kpis
+
+    return _cached('user', f'{user.pk}:{today.isoformat()}', build)
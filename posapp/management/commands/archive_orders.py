@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from posapp.archive import archive_orders
+from posapp.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = 'Moves orders older than N closed business days into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=30,
+                            help='Number of most recent closed business days to keep in the hot tables')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of orders moved per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many orders would be archived')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the run for the run_jobs worker instead of archiving now')
+
+    def handle(self, *args, **options):
+        keep_days = options['keep_days']
+        if options['background'] and not options['dry_run']:
+            job = enqueue('archive_orders', {'keep_days': keep_days, 'batch_size': options['batch_size']},
+                          dedupe_key='archive_orders')
+            self.stdout.write(self.style.SUCCESS(f'Queued archive job #{job.id}'))
+            return
+
+        self.stdout.write(f'Archiving orders older than {keep_days} closed business days...')
+
+        cutoff, moved = archive_orders(
+            keep_days,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            progress=lambda total: self.stdout.write(f'  {total} orders archived'),
+        )
+
+        if cutoff is None:
+            self.stdout.write('Nothing to archive')
+        elif options['dry_run']:
+            self.stdout.write(f'{moved} orders created before {cutoff} would be archived')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully archived {moved} orders created before {cutoff}'))
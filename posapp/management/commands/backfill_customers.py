@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from posapp.customers import BACKFILL_BATCH_SIZE, backfill, recount
+from posapp.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = 'Links orders recorded before customers existed to a customer by phone number'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                            help='Number of orders linked per transaction')
+        parser.add_argument('--recount', action='store_true',
+                            help="Recompute every customer's visit count and lifetime spend from their orders instead")
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the backfill for the run_jobs worker instead of running it now')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            recounted = recount(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Recounted the orders of {recounted} customers'))
+            return
+
+        if options['background']:
+            job = enqueue('backfill_customers', {'batch_size': options['batch_size']},
+                          dedupe_key='backfill_customers')
+            self.stdout.write(self.style.SUCCESS(f'Queued customer backfill as job #{job.id}'))
+            return
+
+        self.stdout.write('Linking orders to customers...')
+
+        result = backfill(
+            batch_size=options['batch_size'],
+            progress=lambda total: self.stdout.write(f'  {total} orders linked'),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully linked {result['orders']} orders to {result['customers']} customers"
+        ))
@@ -0,0 +1,712 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import gzip
+import json
+import re
+import statistics
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.contrib.auth.models import User
+from django.contrib.messages.storage import default_storage
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.staticfiles import finders
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import CharField, IntegerField, Q, Value
+from django.db.models.functions import Cast, Concat, LPad, Lower, Mod
+from django.template import engines
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from posapp import affinity, analytics, audit, customers, forecasting, kpis, order_search
+from posapp import discounts as discount_rules
+from posapp.api.views import OrderViewSet
+from posapp.ingest import MAX_BATCH_ORDERS
+from posapp.models import Category, Customer, Discount, EndDay, Order, OrderItem, Product
+from posapp.pagination import KeysetPaginator
+from posapp.versioning import bump_version
+from posapp.views.dashboard_views import pos
+from posapp.views.order_views import create_order_api, order_edit
+
+# Every row created by the benchmark uses this prefix so --cleanup can find it
+BENCH_PREFIX = 'BENCH-'
+
+# Distinct customers the search scenario spreads the benchmark orders over
+BENCH_CUSTOMERS = 50000
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _rolled_back(func):
+    """Wrap func to run in a transaction that is always rolled back"""
+    def run():
+        try:
+            with transaction.atomic():
+                func()
+                raise _Rollback
+        except _Rollback:
+            pass
+    return run
+
+
+@contextmanager
+def _explicit_timestamps(model):
+    """Let bulk_create keep the created_at/updated_at values we set"""
+    fields = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now_add', False) or getattr(f, 'auto_now', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Runs performance benchmarks against the configured database'
+
+    scenarios = ('pagination', 'templates', 'kpis', 'ingest', 'discounts', 'page_weight', 'analytics', 'affinity', 'forecast', 'search')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=self.scenarios,
+                            help='Benchmark to run')
+        parser.add_argument('--rows', type=int, default=1000000,
+                            help='Number of benchmark rows to make sure exist before measuring')
+        parser.add_argument('--products', type=int, default=500,
+                            help='Number of benchmark products to make sure exist for the templates scenario')
+        parser.add_argument('--orders', type=int, default=100,
+                            help='Orders submitted per run for the ingest scenario')
+        parser.add_argument('--codes', type=int, default=10000,
+                            help='Number of benchmark discount codes to make sure exist for the discounts scenario')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of timed runs per measurement')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the benchmark rows when done')
+
+    def handle(self, *args, **options):
+        self.repeat = max(1, options['repeat'])
+        getattr(self, f"bench_{options['scenario']}")(options)
+
+    # Helpers
+
+    def measure(self, label, func):
+        """Time func over --repeat runs and print the median and query count"""
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        # A full query log would make the capture below count nothing
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            func()
+        median = statistics.median(timings)
+        self.stdout.write(f'  {label:<45} {median:>10.2f} ms  {len(captured):>4} queries')
+        return median
+
+    def bench_user(self):
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_active': False})
+        return user
+
+    def bench_end_days(self, days):
+        """Unsaved EndDays for the last days of benchmark orders, one per night, the last one after the newest order"""
+        user = self.bench_user()
+        newest = timezone.localdate(
+            Order.objects.filter(order_number__startswith=BENCH_PREFIX).order_by('-created_at').values_list('created_at', flat=True).first()
+        )
+        ends = []
+        for back in range(days - 1, -1, -1):
+            day = newest - timedelta(days=back)
+            end_of_day = timezone.make_aware(datetime(day.year, day.month, day.day, 3)) + timedelta(days=1)
+            ends.append(EndDay(ended_by=user, end_date=end_of_day, notes=BENCH_PREFIX))
+        return ends
+
+    def seed_orders(self, rows, batch_size=5000):
+        """Make sure at least rows benchmark orders exist, one minute apart"""
+        existing = Order.objects.filter(order_number__startswith=BENCH_PREFIX).count()
+        if existing >= rows:
+            return existing
+
+        self.stdout.write(f'Seeding {rows - existing} benchmark orders...')
+        user = self.bench_user()
+        newest = timezone.now() - timedelta(days=1)
+        statuses = ['Completed'] * 8 + ['Cancelled', 'Pending']
+        with _explicit_timestamps(Order):
+            for start in range(existing, rows, batch_size):
+                batch = []
+                for n in range(start, min(start + batch_size, rows)):
+                    created = newest - timedelta(minutes=n)
+                    batch.append(Order(
+                        order_number=f'{BENCH_PREFIX}{n}',
+                        reference_number=f'PB{n % 10000:04d}',
+                        user=user,
+                        subtotal=100,
+                        total_amount=100,
+                        payment_status='Paid',
+                        order_status=statuses[n % len(statuses)],
+                        created_at=created,
+                        updated_at=created,
+                    ))
+                Order.objects.bulk_create(batch)
+                self.stdout.write(f'  {min(start + batch_size, rows)} / {rows}')
+        return rows
+
+    def seed_order_items(self, products, batch_size=5000):
+        """
+        Make sure every completed benchmark order has items
+
+        Each order gets one of the first 50 products plus, depending on its
+        number, its neighbour, a product from the rest and a related one, so
+        some pairs are far more common than others.
+        """
+        orders = Order.objects.filter(
+            order_number__startswith=BENCH_PREFIX, order_status='Completed', items__isnull=True
+        ).values_list('id', 'order_number')
+        batch = []
+        seeded = 0
+        for order_id, order_number in orders.iterator(chunk_size=batch_size):
+            try:
+                n = int(order_number[len(BENCH_PREFIX):])
+            except ValueError:
+                continue
+            base = n % 50
+            picks = {base}
+            if n % 2 == 0:
+                picks.add((base + 1) % 50)
+            if n % 3 == 0:
+                picks.add(50 + n % (len(products) - 50))
+            if n % 5 == 0:
+                picks.add(base * 7 % 50)
+            for pick in picks:
+                product = products[pick]
+                batch.append(OrderItem(order_id=order_id, product=product, quantity=1 + n % 2,
+                                       unit_price=product.price, total_price=product.price * (1 + n % 2)))
+            seeded += 1
+            if len(batch) >= batch_size:
+                OrderItem.objects.bulk_create(batch)
+                batch = []
+                self.stdout.write(f'  items for {seeded} orders')
+        OrderItem.objects.bulk_create(batch)
+        return seeded
+
+    def cleanup_orders(self):
+        with audit.suppressed():
+            deleted, _ = Order.objects.filter(order_number__startswith=BENCH_PREFIX).delete()
+        self.stdout.write(f'Deleted {deleted} benchmark rows')
+
+    def seed_order_customers(self, batch_size=50000):
+        """
+        Give benchmark orders a customer name, phone number and table, and
+        link them to customers
+
+        The values are derived from the order id inside the UPDATE, so a
+        million orders take one statement per batch.
+        """
+        orders = Order.objects.filter(order_number__startswith=BENCH_PREFIX)
+        missing = orders.filter(customer_phone__isnull=True)
+        if missing.exists():
+            self.stdout.write('Giving benchmark orders customers...')
+            # Mod is a float on SQLite
+            customer = Cast(Cast(Mod('id', Value(BENCH_CUSTOMERS)), IntegerField()), CharField())
+            name = Concat(Value(f'{BENCH_PREFIX}Customer '), customer)
+            ids = list(missing.order_by('id').values_list('id', flat=True)[::batch_size]) + [None]
+            for start, end in zip(ids, ids[1:]):
+                batch = missing.filter(id__gte=start) if end is None else missing.filter(id__gte=start, id__lt=end)
+                batch.update(
+                    customer_name=name,
+                    search_name=Lower(name),
+                    customer_phone=Concat(Value('0399'), LPad(customer, 7, Value('0'))),
+                    table_number=Cast(Cast(Mod('id', Value(40)), IntegerField()) + 1, CharField()),
+                )
+        linked = customers.backfill(
+            batch_size=5000,
+            progress=lambda total: self.stdout.write(f'  {total} orders linked to customers'),
+            filters=Q(order_number__startswith=BENCH_PREFIX),
+        )
+        return linked['orders']
+
+    def cleanup_customers(self):
+        deleted, _ = Customer.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        self.stdout.write(f'Deleted {deleted} benchmark customers')
+
+    def seed_products(self, count):
+        """Make sure at least count available benchmark products exist"""
+        existing = Product.objects.filter(name__startswith=BENCH_PREFIX).count()
+        if existing >= count:
+            return existing
+
+        self.stdout.write(f'Seeding {count - existing} benchmark products...')
+        category, _ = Category.objects.get_or_create(name=f'{BENCH_PREFIX}Category')
+        Product.objects.bulk_create([
+            Product(
+                name=f'{BENCH_PREFIX}Product {n}',
+                product_code=f'{BENCH_PREFIX}{n}',
+                category=category,
+                price=100 + n % 50,
+                stock_quantity=n % 20,
+                running_item=n % 7 == 0,
+            )
+            for n in range(existing, count)
+        ])
+        # bulk_create skips the signals that normally bump the catalog version
+        bump_version('products', 'categories')
+        return count
+
+    def cleanup_products(self):
+        # Orders first, their items protect the products
+        self.cleanup_orders()
+        with audit.suppressed():
+            deleted, _ = Product.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            Category.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        self.stdout.write(f'Deleted {deleted} benchmark products')
+
+    def seed_discounts(self, count):
+        """Make sure at least count active benchmark discount codes exist"""
+        existing = Discount.objects.filter(code__startswith=BENCH_PREFIX).count()
+        if existing >= count:
+            return existing
+
+        self.stdout.write(f'Seeding {count - existing} benchmark discount codes...')
+        today = timezone.now().date()
+        Discount.objects.bulk_create([
+            Discount(
+                name=f'{BENCH_PREFIX}Discount {n}',
+                code=f'{BENCH_PREFIX}{n}',
+                type='Percentage' if n % 2 else 'Fixed',
+                value=5 + n % 20,
+                # A tenth are outside their window, so validation rejects some
+                start_date=today + timedelta(days=1) if n % 10 == 0 else today - timedelta(days=30),
+                end_date=today + timedelta(days=30),
+                min_subtotal=500 if n % 5 == 0 else None,
+            )
+            for n in range(existing, count)
+        ])
+        # bulk_create skips the signal that rebuilds the discount table
+        bump_version('discounts')
+        return count
+
+    def cleanup_discounts(self):
+        with audit.suppressed():
+            deleted, _ = Discount.objects.filter(code__startswith=BENCH_PREFIX).delete()
+        self.stdout.write(f'Deleted {deleted} benchmark discount codes')
+
+    def render_view(self, view, *args):
+        """Call a view the way a logged-in GET request would, returning the rendered response"""
+        request = RequestFactory().get('/')
+        request.user = self.bench_user()
+        request.session = SessionStore()
+        request._messages = default_storage(request)
+        response = view(request, *args)
+        if response.status_code != 200:
+            raise RuntimeError(f'{view.__name__} returned {response.status_code}')
+        return response
+
+    # Scenarios
+
+    def bench_pagination(self, options):
+        """OFFSET pagination with COUNT(*) against keyset pagination on (created_at, id)"""
+        total = self.seed_orders(options['rows'])
+        per_page = 10
+        orders = Order.objects.filter(order_number__startswith=BENCH_PREFIX).order_by('-created_at', '-id')
+        depths = [1, 100, total // per_page // 2, total // per_page]
+
+        self.stdout.write(f'\nPagination over {total} orders, {per_page} per page')
+        self.stdout.write('  Paginator (COUNT + OFFSET):')
+        for page_number in depths:
+            self.measure(
+                f'page {page_number}',
+                lambda page_number=page_number: list(Paginator(orders, per_page).get_page(page_number))
+            )
+
+        self.stdout.write('  KeysetPaginator (seek, capped count):')
+        paginator = KeysetPaginator(orders, per_page, count_limit=1000)
+        for page_number in depths:
+            # Cursor pointing just past the last row of the previous page
+            offset = (page_number - 1) * per_page
+            cursor = None
+            if offset:
+                anchor = orders[offset - 1]
+                cursor = paginator.encode_cursor(anchor, 'next')
+
+            def fetch(cursor=cursor):
+                page = KeysetPaginator(orders, per_page, count_limit=1000).get_page(cursor)
+                return list(page), page.count
+
+            self.measure(f'page {page_number}', fetch)
+
+        self.measure('last page (cursor=last)', lambda: list(paginator.get_page('last')))
+
+        if options['cleanup']:
+            self.cleanup_orders()
+
+    def bench_templates(self, options):
+        """Render time of the POS screen and the order form with and without template caching"""
+        count = self.seed_products(options['products'])
+        products = Product.objects.filter(name__startswith=BENCH_PREFIX)[:5]
+        order, _ = Order.objects.get_or_create(
+            order_number=f'{BENCH_PREFIX}template', defaults={'user': self.bench_user()}
+        )
+        if not order.items.exists():
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1,
+                                         unit_price=product.price, total_price=product.price)
+
+        loaders = [loader for loader in engines['django'].engine.template_loaders if hasattr(loader, 'reset')]
+
+        def uncached(view, *args):
+            # Drop the compiled templates, as the plain loaders would
+            for loader in loaders:
+                loader.reset()
+            return self.render_view(view, *args)
+
+        pages = [('pos.html', pos, ()), ('orders/order_form.html', order_edit, (order.id,))]
+        self.stdout.write(f'\nTemplate rendering with {count} benchmark products')
+        for name, view, args in pages:
+            self.stdout.write(f'  {name}:')
+            with override_settings(POS_SHARED_VERSIONS=False):
+                self.measure('parsed per request, no fragment cache', lambda: uncached(view, *args))
+                self.measure('cached loader, no fragment cache', lambda: self.render_view(view, *args))
+            with override_settings(POS_SHARED_VERSIONS=True):
+                # Warm the fragments before timing
+                self.render_view(view, *args)
+                self.measure('cached loader and fragments', lambda: self.render_view(view, *args))
+
+        if options['cleanup']:
+            self.cleanup_products()
+
+    def bench_kpis(self, options):
+        """Dashboard KPI queries, uncached and from the KPI cache"""
+        total = self.seed_orders(options['rows'])
+        user = self.bench_user()
+        pages = [
+            ('dashboard', kpis.dashboard_kpis),
+            ('reports dashboard', kpis.reports_kpis),
+            ('user detail', lambda: kpis.user_kpis(user)),
+        ]
+
+        def uncached(func):
+            cache.clear()
+            return func()
+
+        self.stdout.write(f'\nDashboard KPIs over {total} orders')
+        for label, func in pages:
+            self.measure(f'{label}, uncached', lambda func=func: uncached(func))
+            self.measure(f'{label}, cached', func)
+
+        if options['cleanup']:
+            self.cleanup_orders()
+
+    def bench_discounts(self, options):
+        """Discount code validation, one query per code against the compiled table"""
+        total = self.seed_discounts(options['codes'])
+        codes = [f'{BENCH_PREFIX}{n}' for n in range(0, total, max(1, total // 1000))]
+
+        def queried():
+            # What each view did before the discount table
+            today = timezone.now().date()
+            for code in codes:
+                try:
+                    discount = Discount.objects.get(code=code, is_active=True)
+                except Discount.DoesNotExist:
+                    continue
+                if (discount.start_date and discount.start_date > today) or (discount.end_date and discount.end_date < today):
+                    continue
+
+        def compiled():
+            for code in codes:
+                discount_rules.validate(code, subtotal=1000)
+
+        def rebuild():
+            bump_version('discounts')
+            discount_rules.validate(codes[0])
+
+        # Build the table outside the timed runs; rebuilds are measured below
+        discount_rules.validate(codes[0])
+
+        self.stdout.write(f'\nValidating {len(codes)} codes out of {total} active discounts')
+        for label, func in [('query per code', queried), ('compiled table', compiled)]:
+            median = self.measure(label, func)
+            self.stdout.write(f'  {"":<45} {median * 1000 / len(codes):>10.1f} us/code')
+        self.measure('rebuilding the table after a change', rebuild)
+
+        if options['cleanup']:
+            self.cleanup_discounts()
+
+    def bench_page_weight(self, options):
+        """Bytes sent per POS screen load, with the styles and scripts inline against bundled and cached"""
+        # Plain storage so the page links the source files by name
+        with override_settings(STORAGES={**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        }}, POS_SHARED_VERSIONS=False):
+            html = self.render_view(pos).content
+
+        assets = []
+        for url in re.findall(rb'<(?:script|link)\b[^>]*\b(?:src|href)="([^"]+)"', html):
+            url = url.decode()
+            path = url.startswith(settings.STATIC_URL) and finders.find(url[len(settings.STATIC_URL):])
+            if path:
+                with open(path, 'rb') as f:
+                    assets.append((url[len(settings.STATIC_URL):], f.read()))
+
+        def compressed(content):
+            sizes = [len(gzip.compress(content, 9))]
+            if brotli is not None:
+                sizes.append(len(brotli.compress(content)))
+            return min(sizes)
+
+        self.stdout.write('\nPOS screen page weight (CDN libraries excluded, they are the same either way)')
+        self.stdout.write(f'  {"":<45} {"raw":>10} {"gzip":>10} {"brotli":>10}')
+        for name, content in [('page HTML', html)] + assets:
+            br = len(brotli.compress(content)) if brotli is not None else '-'
+            self.stdout.write(f'  {name:<45} {len(content):>10} {len(gzip.compress(content, 9)):>10} {br:>10}')
+
+        asset_bytes = sum(len(content) for _, content in assets)
+        self.stdout.write('  Bytes per load:')
+        # The stylesheets and base.js used to be part of the page itself and
+        # nothing was compressed or cached for long
+        self.stdout.write(f'  {"inline, uncompressed (before)":<45} {len(html) + asset_bytes:>10}')
+        self.stdout.write(f'  {"bundled, precompressed, first load":<45} '
+                          f'{len(html) + sum(compressed(content) for _, content in assets):>10}')
+        self.stdout.write(f'  {"bundled, hashed names cached (repeat load)":<45} {len(html):>10}')
+
+    def bench_ingest(self, options):
+        """Order submission throughput, one request per order against the batch API"""
+        self.seed_products(options['products'])
+        products = list(Product.objects.filter(name__startswith=BENCH_PREFIX).order_by('id')[:20])
+        # Enough stock that no run is rejected; every run is rolled back
+        Product.objects.filter(id__in=[product.id for product in products]).update(stock_quantity=1000000)
+        user = self.bench_user()
+        count = options['orders']
+        payloads = []
+        for n in range(count):
+            items = [
+                {'product_id': product.id, 'quantity': 1 + n % 3, 'unit_price': str(product.price),
+                 'total_price': str(product.price * (1 + n % 3))}
+                for product in products[n % len(products):n % len(products) + 3]
+            ]
+            subtotal = sum(float(item['total_price']) for item in items)
+            payloads.append({
+                'customer_name': f'{BENCH_PREFIX}{n}',
+                'subtotal': f'{subtotal:.2f}',
+                'order_type': 'Take Away',
+                'items': items,
+            })
+
+        factory = APIRequestFactory()
+        batch_view = OrderViewSet.as_view({'post': 'batch'})
+
+        def single():
+            for payload in payloads:
+                request = factory.post('/api/orders/', json.dumps(payload), content_type='application/json')
+                request.user = user
+                response = create_order_api(request)
+                if response.status_code != 200:
+                    raise RuntimeError(f'create_order_api returned {response.status_code}: {response.content}')
+
+        def batch():
+            for start in range(0, count, MAX_BATCH_ORDERS):
+                chunk = payloads[start:start + MAX_BATCH_ORDERS]
+                request = factory.post('/api/orders/batch/', {'orders': chunk}, format='json')
+                force_authenticate(request, user=user)
+                response = batch_view(request)
+                if response.status_code != 200 or response.data['created'] != len(chunk):
+                    raise RuntimeError(f'batch returned {response.status_code}: {response.data}')
+
+        self.stdout.write(f'\nSubmitting {count} orders of up to 3 items, stock checked and reduced')
+        for label, func in [('one request per order', single), (f'batch requests of {MAX_BATCH_ORDERS}', batch)]:
+            median = self.measure(label, _rolled_back(func))
+            self.stdout.write(f'  {"":<45} {count / median * 1000:>10.0f} orders/s')
+
+        if options['cleanup']:
+            self.cleanup_products()
+
+    def bench_analytics(self, options):
+        """Sales analytics over every benchmark order: a Python loop, NumPy, and NumPy with cached business days"""
+        total = self.seed_orders(options['rows'])
+        oldest = Order.objects.filter(order_number__startswith=BENCH_PREFIX).order_by('created_at').values_list('created_at', flat=True).first()
+        start_date, end_date = timezone.localdate(oldest), timezone.localdate()
+        orders = Order.objects.filter(created_at__date__gte=start_date).exclude(order_status='Cancelled').order_by()
+
+        def python_loop():
+            # Heatmap only, what a plain loop over the rows would do
+            counts = [0] * analytics.SLOTS
+            revenue = [0] * analytics.SLOTS
+            for created, amount in orders.values_list('created_at', 'total_amount').iterator(chunk_size=analytics.CHUNK_SIZE):
+                local = timezone.localtime(created)
+                slot = local.weekday() * 24 + local.hour
+                counts[slot] += 1
+                revenue[slot] += amount
+            return counts, revenue
+
+        self.stdout.write(f'\nSales analytics from {start_date} to {end_date}, {total} benchmark orders')
+        self.measure('Python loop over values_list (heatmap only)', python_loop)
+        with override_settings(POS_SHARED_VERSIONS=False):
+            self.measure('NumPy columns, nothing cached', lambda: analytics.sales_analytics(start_date, end_date))
+
+        # One end day per night, rolled back afterwards
+        end_days = []
+        day = start_date
+        while day < end_date:
+            end_of_day = timezone.make_aware(datetime(day.year, day.month, day.day, 3)) + timedelta(days=1)
+            end_days.append(EndDay(ended_by=self.bench_user(), end_date=end_of_day, notes=BENCH_PREFIX))
+            day += timedelta(days=1)
+        try:
+            with transaction.atomic(), _explicit_timestamps(EndDay), override_settings(POS_SHARED_VERSIONS=True):
+                EndDay.objects.bulk_create(end_days)
+                # Fill the cache of every closed business day before timing
+                analytics.sales_analytics(start_date, end_date)
+                self.measure(f'NumPy columns, {len(end_days)} closed days cached', lambda: analytics.sales_analytics(start_date, end_date))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if options['cleanup']:
+            self.cleanup_orders()
+
+    def bench_affinity(self, options):
+        """Frequently bought together: full rebuild against order history size, one more day, and lookups"""
+        total = self.seed_orders(options['rows'])
+        self.seed_products(max(options['products'], 100))
+        products = list(Product.objects.filter(name__startswith=BENCH_PREFIX).order_by('id'))
+        if self.seed_order_items(products):
+            self.stdout.write('Seeded the benchmark order items')
+
+        user = self.bench_user()
+        orders_per_day = 24 * 60
+        end_days = self.bench_end_days
+
+        self.stdout.write(f'\nProduct affinity over up to {total} benchmark orders, one per minute')
+        sizes = sorted({max(total // 100, orders_per_day), max(total // 10, orders_per_day), total})
+        for size in sizes:
+            days = -(-size // orders_per_day)
+            try:
+                with transaction.atomic(), _explicit_timestamps(EndDay):
+                    EndDay.objects.bulk_create(end_days(days))
+                    self.measure(f'rebuild, {days} business days (~{min(days * orders_per_day, total)} orders)',
+                                 lambda: affinity.update_affinity(rebuild=True))
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        # Counting one more closed day onto the largest history
+        days = -(-total // orders_per_day)
+        try:
+            with transaction.atomic(), _explicit_timestamps(EndDay):
+                ends = end_days(days)
+                EndDay.objects.bulk_create(ends[:-1])
+                affinity.update_affinity(rebuild=True)
+                last = ends[-1]
+
+                def one_more_day():
+                    EndDay.objects.bulk_create([EndDay(ended_by=user, end_date=last.end_date, notes=BENCH_PREFIX)])
+                    affinity.update_affinity()
+
+                self.measure('one more closed day, incremental', _rolled_back(one_more_day))
+
+                # Lookups never touch the database once the table is loaded
+                baskets = [[product.id for product in products[n:n + 3]] for n in range(0, 50, 3)]
+                affinity.suggestions(baskets[0])
+                median = self.measure(f'{len(baskets) * 100} basket lookups',
+                                      lambda: [affinity.suggestions(basket) for _ in range(100) for basket in baskets])
+                self.stdout.write(f'  {"":<45} {median * 1000 / (len(baskets) * 100):>10.2f} us/lookup')
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if options['cleanup']:
+            self.cleanup_products()
+
+    def bench_forecast(self, options):
+        """Stock forecasts: sales velocity rebuild and one more day, then forecasts of every product"""
+        total = self.seed_orders(options['rows'])
+        self.seed_products(max(options['products'], 100))
+        products = list(Product.objects.filter(name__startswith=BENCH_PREFIX).order_by('id'))
+        if self.seed_order_items(products):
+            self.stdout.write('Seeded the benchmark order items')
+
+        user = self.bench_user()
+        days = -(-total // (24 * 60))
+        self.stdout.write(f'\nStock forecasts over {total} benchmark orders ({days} business days), {len(products)} products')
+        try:
+            with transaction.atomic(), _explicit_timestamps(EndDay):
+                ends = self.bench_end_days(days)
+                EndDay.objects.bulk_create(ends[:-1])
+                self.measure(f'velocity rebuild, {days - 1} business days', lambda: forecasting.update_velocity(rebuild=True))
+                last = ends[-1]
+
+                def one_more_day():
+                    EndDay.objects.bulk_create([EndDay(ended_by=user, end_date=last.end_date, notes=BENCH_PREFIX)])
+                    forecasting.update_velocity()
+
+                self.measure('one more closed day, incremental', _rolled_back(one_more_day))
+
+                def cold():
+                    # A new version misses every cached forecast
+                    bump_version('forecast')
+                    forecasting.forecasts()
+
+                self.measure('forecasts of every product, computed', cold)
+                self.measure('forecasts of every product, cached', forecasting.forecasts)
+
+                def one_sale():
+                    # Only the product whose stock changed is computed again
+                    product = products[0]
+                    Product.objects.filter(pk=product.pk).update(stock_quantity=product.stock_quantity + self.repeat)
+                    product.stock_quantity += self.repeat
+                    forecasting.forecasts()
+
+                forecasting.forecasts()
+                self.measure('forecasts after one stock change', one_sale)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if options['cleanup']:
+            self.cleanup_products()
+
+    def bench_search(self, options):
+        """Order list search: icontains over four fields against the index lookup picked by the search text"""
+        total = self.seed_orders(options['rows'])
+        self.seed_order_customers()
+        orders = Order.objects.order_by('-created_at')
+        # The oldest benchmark order, so a scan has to read every newer order first
+        oldest = (Order.objects.filter(order_number__startswith=BENCH_PREFIX).order_by('created_at')
+                  .values('reference_number', 'customer_phone', 'customer_name', 'table_number').first())
+        searches = [
+            ('reference number', oldest['reference_number']),
+            ('reference number prefix', oldest['reference_number'][:4]),
+            ('phone number', oldest['customer_phone']),
+            ('table number', oldest['table_number']),
+            ('customer name', oldest['customer_name']),
+            ('no match', 'nobody here'),
+        ]
+
+        def legacy_filter(query):
+            return (
+                Q(reference_number__icontains=query) |
+                Q(customer_name__icontains=query) |
+                Q(customer_phone__icontains=query) |
+                Q(table_number__icontains=query)
+            )
+
+        self.stdout.write(f'\nFirst page of a search over {total} benchmark orders')
+        for label, query in searches:
+            self.stdout.write(f'  {label} ({query}):')
+            self.measure('icontains on four fields', lambda query=query: list(orders.filter(legacy_filter(query))[:10]))
+            self.measure('indexed lookup', lambda query=query: list(orders.filter(order_search.search_filter(query))[:10]))
+
+        if options['cleanup']:
+            self.cleanup_orders()
+            self.cleanup_customers()
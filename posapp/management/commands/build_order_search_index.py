@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+from posapp.order_search import SEARCH_NAME_BATCH_SIZE, backfill_search_names, create_fulltext_indexes
+
+
+class Command(BaseCommand):
+    help = 'Fills in the normalized customer names the order search matches, and optionally creates FULLTEXT indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SEARCH_NAME_BATCH_SIZE,
+                            help='Number of orders updated per query')
+        parser.add_argument('--fulltext', action='store_true',
+                            help='Also create the MySQL FULLTEXT indexes on customer names; '
+                                 'then set POS_ORDER_SEARCH_FULLTEXT = True')
+        parser.add_argument('--drop-fulltext', action='store_true',
+                            help='Drop the FULLTEXT indexes instead')
+
+    def handle(self, *args, **options):
+        if options['drop_fulltext']:
+            try:
+                tables = create_fulltext_indexes(drop=True)
+            except NotSupportedError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Dropped the FULLTEXT indexes on {', '.join(tables)}"))
+            return
+
+        self.stdout.write('Normalizing customer names of existing orders...')
+        updated = backfill_search_names(
+            batch_size=options['batch_size'],
+            progress=lambda total: self.stdout.write(f'  {total} orders updated'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated} orders'))
+
+        if options['fulltext']:
+            try:
+                tables = create_fulltext_indexes()
+            except NotSupportedError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Created the FULLTEXT indexes on {', '.join(tables)}"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from posapp.affinity import update_affinity
+from posapp.tasks import enqueue_product_affinity
+
+
+class Command(BaseCommand):
+    help = 'Counts the closed business days not counted yet into the frequently bought together suggestions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Start over from the first end day instead of adding the new days')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the run for the run_jobs worker instead of counting now')
+
+    def handle(self, *args, **options):
+        if options['background']:
+            job = enqueue_product_affinity(rebuild=options['rebuild'])
+            self.stdout.write(self.style.SUCCESS(f'Queued product affinity job #{job.id}'))
+            return
+
+        result = update_affinity(
+            rebuild=options['rebuild'],
+            progress=lambda done, total: self.stdout.write(f'  {done} / {total} business days'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted {result['days']} business days ({result['orders']} orders), stored {result['pairs']} suggestions"
+        ))
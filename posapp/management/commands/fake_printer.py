@@ -0,0 +1,54 @@
+import os
+import socketserver
+import threading
+
+from django.core.management.base import BaseCommand
+from posapp.escpos import plain_text
+
+
+class Command(BaseCommand):
+    help = 'Stands in for a network receipt printer: saves every job it receives and shows its text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9100)
+        parser.add_argument('--output-dir', default='printed',
+                            help='Directory the received jobs are saved in, one .bin file per job')
+        parser.add_argument('--quiet', action='store_true',
+                            help='Do not print the text of received jobs')
+
+    def handle(self, *args, **options):
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+        command = self
+        lock = threading.Lock()
+        counter = [len(os.listdir(output_dir))]
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                # A job is everything sent on one connection, like a raw
+                # port 9100 printer
+                chunks = []
+                while True:
+                    chunk = self.request.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                data = b''.join(chunks)
+                with lock:
+                    counter[0] += 1
+                    path = os.path.join(output_dir, f'job-{counter[0]:05d}.bin')
+                    with open(path, 'wb') as output:
+                        output.write(data)
+                    command.stdout.write(f'Received {len(data)} bytes from {self.client_address[0]}, saved to {path}')
+                    if not options['quiet']:
+                        command.stdout.write(plain_text(data))
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        with socketserver.ThreadingTCPServer((options['host'], options['port']), Handler) as server:
+            self.stdout.write(f"Fake printer listening on {options['host']}:{options['port']}, saving jobs to {output_dir}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS('Fake printer stopped'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from posapp.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Deletes stored API responses whose Idempotency-Key has expired'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
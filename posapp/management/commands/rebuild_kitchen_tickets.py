@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from posapp.kitchen import rebuild_tickets
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the kitchen display tickets from the pending orders'
+
+    def handle(self, *args, **options):
+        changed = rebuild_tickets()
+        self.stdout.write(self.style.SUCCESS(f'Created, updated or removed {changed} kitchen tickets'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from posapp.tables import rebuild_tables
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds table occupancy from the pending Dine In orders'
+
+    def handle(self, *args, **options):
+        occupied = rebuild_tables()
+        self.stdout.write(self.style.SUCCESS(f'{occupied} tables occupied'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from posapp.pending_orders import recount
+
+
+class Command(BaseCommand):
+    help = "Recomputes each user's pending order count from their orders"
+
+    def handle(self, *args, **options):
+        recounted = recount()
+        self.stdout.write(self.style.SUCCESS(f'Recounted pending orders for {recounted} users'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from posapp.forecasting import update_velocity
+from posapp.tasks import enqueue_stock_forecast
+
+
+class Command(BaseCommand):
+    help = 'Counts the closed business days not counted yet into the sales velocity behind the stock forecasts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Start over from the first end day instead of adding the new days')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the run for the run_jobs worker instead of counting now')
+
+    def handle(self, *args, **options):
+        if options['background']:
+            job = enqueue_stock_forecast(rebuild=options['rebuild'])
+            self.stdout.write(self.style.SUCCESS(f'Queued stock forecast job #{job.id}'))
+            return
+
+        result = update_velocity(
+            rebuild=options['rebuild'],
+            progress=lambda done, total: self.stdout.write(f'  {done} / {total} business days'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted {result['days']} business days, sales velocity of {result['products']} products"
+        ))
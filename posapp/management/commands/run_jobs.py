@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import timedelta
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from posapp.jobs import HEARTBEAT_SECONDS, claim_job, requeue_stale_jobs, run_job, run_job_by_id
+
+
+def _run_in_thread(job):
+    """Run a job on a pool thread, releasing that thread's database connection afterwards"""
+    try:
+        run_job(job)
+    finally:
+        connection.close()
+    return job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (sales summaries, exports, backfills)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Number of jobs run concurrently')
+        parser.add_argument('--processes', action='store_true',
+                            help='Use a process pool instead of threads, for CPU-bound jobs')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds without a heartbeat after which a running job is requeued')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        worker_name = f'{socket.gethostname()}:{os.getpid()}'
+        if options['stale_after'] <= HEARTBEAT_SECONDS:
+            raise CommandError(f'--stale-after must be longer than the {HEARTBEAT_SECONDS} second job heartbeat')
+        stale_after = timedelta(seconds=options['stale_after'])
+
+        requeued = requeue_stale_jobs(stale_after)
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale jobs')
+
+        if options['processes']:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='posapp-job')
+
+        self.stdout.write(f'Job worker {worker_name} started with {workers} {"processes" if options["processes"] else "threads"}')
+
+        running = set()
+        last_stale_check = time.monotonic()
+        try:
+            while True:
+                # Fill every free slot before waiting
+                while len(running) < workers:
+                    job = claim_job(worker_name)
+                    if job is None:
+                        break
+                    self.stdout.write(f'Running {job.name} #{job.id} (attempt {job.attempts})')
+                    if options['processes']:
+                        # The pool forks its workers on submit; a child closing
+                        # an inherited connection would end the parent's session
+                        connections.close_all()
+                        running.add(executor.submit(run_job_by_id, job.id))
+                    else:
+                        running.add(executor.submit(_run_in_thread, job))
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                else:
+                    done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    running = set(running)
+                    for future in done:
+                        future.result()
+
+                if time.monotonic() - last_stale_check > stale_after.total_seconds():
+                    requeue_stale_jobs(stale_after)
+                    last_stale_check = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping job worker, waiting for running jobs to finish...')
+        finally:
+            executor.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS('Job worker stopped'))
@@ -0,0 +1,49 @@
+from datetime import timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from posapp.printing import claim_print_job, requeue_stale_print_jobs, run_print_job
+
+
+class Command(BaseCommand):
+    help = 'Sends queued print jobs to the receipt and kitchen printers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=0.5,
+                            help='Seconds to wait between polls when the spool is empty')
+        parser.add_argument('--timeout', type=float, default=5.0,
+                            help='Seconds to wait for a network printer before retrying later')
+        parser.add_argument('--stale-after', type=int, default=120,
+                            help='Seconds after which a job left printing by a dead worker is requeued')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the spool is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options['stale_after'])
+        requeued = requeue_stale_print_jobs(stale_after)
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale print jobs')
+
+        self.stdout.write('Print spool started')
+        # claim_print_job holds back a printer's jobs while an earlier one is
+        # waiting for a retry, so tickets reach each printer in the order they
+        # were queued
+        last_stale_check = time.monotonic()
+        try:
+            while True:
+                job = claim_print_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                else:
+                    run_print_job(job, timeout=options['timeout'])
+                    self.stdout.write(f'{job.kind} #{job.id} on {job.printer.name}: {job.status}')
+
+                if time.monotonic() - last_stale_check > stale_after.total_seconds():
+                    requeue_stale_print_jobs(stale_after)
+                    last_stale_check = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Print spool stopped'))
@@ -1,37 +1,24 @@
 from django.core.management.base import BaseCommand
-from posapp.models import Order
-import random
-import string
+from posapp.jobs import enqueue
+from posapp.tasks import generate_missing_reference_numbers
 
 class Command(BaseCommand):
     help = 'Generates reference numbers for orders that do not have one'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the backfill for the run_jobs worker instead of running it now')
+
     def handle(self, *args, **options):
-        self.stdout.write('Generating reference numbers for existing orders...')
-        
-        # Get all orders that don't have a reference number
-        orders_without_reference = Order.objects.filter(reference_number__isnull=True) | Order.objects.filter(reference_number='')
-        count = orders_without_reference.count()
+        if options['background']:
+            job = enqueue('update_reference_numbers', dedupe_key='update_reference_numbers')
+            self.stdout.write(self.style.SUCCESS(f'Queued reference number backfill as job #{job.id}'))
+            return
         
-        self.stdout.write(f'Found {count} orders without reference numbers')
-        
-        # Keep track of used reference numbers to avoid duplicates
-        existing_refs = set(Order.objects.exclude(reference_number__isnull=True).exclude(reference_number='').values_list('reference_number', flat=True))
+        self.stdout.write('Generating reference numbers for existing orders...')
         
-        updated = 0
-        for order in orders_without_reference:
-            # Generate a unique reference number with format PB + 4 digits
-            while True:
-                # Generate random 4-digit number
-                random_digits = ''.join(random.choices(string.digits, k=4))
-                reference_number = f'PB{random_digits}'
-                
-                # Check if the reference number already exists
-                if reference_number not in existing_refs:
-                    order.reference_number = reference_number
-                    existing_refs.add(reference_number)
-                    order.save(update_fields=['reference_number'])
-                    updated += 1
-                    break
+        updated = generate_missing_reference_numbers(
+            progress=lambda percent, message: self.stdout.write(f'  {message}')
+        )
         
-        self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated} orders with new reference numbers')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated} orders with new reference numbers'))
@@ -0,0 +1,15 @@
+from .audit import current_request
+
+
+class AuditContextMiddleware:
+    """Make the current request available to audit entries recorded by model signals"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
@@ -20,6 +20,7 @@ class UserProfile(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     role = models.ForeignKey(UserRole, on_delete=models.PROTECT)
     is_active = models.BooleanField(default=True)
+    pending_order_count = models.IntegerField(default=0, editable=False, help_text="Maintained by posapp.pending_orders")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -49,6 +50,7 @@ class Product(models.Model):
     is_available = models.BooleanField(default=True)
     is_archived = models.BooleanField(default=False, help_text="If checked, product is archived and hidden from active listings")
     running_item = models.BooleanField(default=False, help_text="If checked, stock will not decrease when ordered")
+    reorder_threshold = models.PositiveIntegerField(default=10, help_text="Raise a low stock alert when stock falls below this; 0 for no alerts")
     image = models.BinaryField(null=True, blank=True)
     image_name = models.CharField(max_length=255, null=True, blank=True)
     image_type = models.CharField(max_length=50, null=True, blank=True)
@@ -79,6 +81,28 @@ class Product(models.Model):
             return f"/product_image/{self.id}/?v={unique_id}"
         return None
 
+class Customer(models.Model):
+    """A repeat customer, identified by phone number (see posapp.customers)
+
+    The aggregates are kept in step with the customer's orders as they are
+    saved, so showing them never reads the orders.
+    """
+    phone_key = models.CharField(max_length=20, unique=True, help_text="Phone number reduced to its significant digits, the lookup key")
+    phone = models.CharField(max_length=20, help_text="Phone number as last entered")
+    name = models.CharField(max_length=100, blank=True, default='')
+    delivery_address = models.TextField(blank=True, default='', help_text="Address of the last delivery order")
+    visit_count = models.PositiveIntegerField(default=0, help_text="Orders placed, not counting cancelled ones")
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['phone_key']
+
+    def __str__(self):
+        return f"{self.name} ({self.phone})" if self.name else self.phone
+
 class Order(models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('Pending', 'Pending'),
@@ -94,10 +118,14 @@ class Order(models.Model):
     
     order_number = models.CharField(max_length=50, unique=True, help_text="Internal system reference (not displayed to users)")
     daily_order_number = models.IntegerField(default=0, help_text="Daily order number that resets after end day")
-    reference_number = models.CharField(max_length=10, null=True, blank=True, help_text="Unique reference number with format PB plus 4 digits")
+    reference_number = models.CharField(max_length=10, null=True, blank=True, db_index=True, help_text="Unique reference number with format PB plus 4 digits")
     user = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True)
     customer_name = models.CharField(max_length=100, blank=True, null=True)
     customer_phone = models.CharField(max_length=20, blank=True, null=True)
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders',
+                                 help_text="Customer matched on customer_phone, see posapp.customers")
+    search_name = models.CharField(max_length=100, null=True, blank=True, db_index=True, editable=False,
+                                   help_text="customer_name normalized for prefix search, see posapp.order_search")
     discount = models.ForeignKey('Discount', on_delete=models.SET_NULL, null=True, blank=True)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -111,14 +139,15 @@ class Order(models.Model):
     payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='Pending')
     order_status = models.CharField(max_length=10, choices=ORDER_STATUS_CHOICES, default='Pending')
     notes = models.TextField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     order_type = models.CharField(max_length=20, default='Dine In', blank=True, null=True)
     delivery_charges = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     delivery_address = models.TextField(blank=True, null=True)
-    table_number = models.CharField(max_length=10, blank=True, null=True, help_text="Table number for Dine In orders")
+    table_number = models.CharField(max_length=10, blank=True, null=True, db_index=True, help_text="Table number for Dine In orders")
     service_charge_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0, help_text="Service charge percentage for Dine In orders")
     service_charge_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Service charge amount calculated from percentage")
+    client_uuid = models.UUIDField(null=True, blank=True, unique=True, editable=False, help_text="Generated by the POS terminal so a queued offline order is only created once")
 
     def __str__(self):
         return self.reference_number
@@ -165,6 +194,12 @@ class Discount(models.Model):
     is_active = models.BooleanField(default=True)
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True,
+                                       help_text="Order subtotal needed for the discount to apply")
+    products = models.ManyToManyField(Product, blank=True, related_name='discounts',
+                                      help_text="Only discount these products; leave empty for the whole order")
+    categories = models.ManyToManyField(Category, blank=True, related_name='discounts',
+                                        help_text="Only discount products in these categories")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -227,7 +262,8 @@ class AuditLog(models.Model):
     details = models.TextField(blank=True, null=True)
     ip_address = models.CharField(max_length=50, blank=True, null=True)
     user_agent = models.CharField(max_length=255, blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is recorded, not when the audit writer inserts it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return f"{self.action} by {self.user.username if self.user else 'Unknown'}"
@@ -295,7 +331,7 @@ class BillAdjustment(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Total bill amount")
     notes = models.TextField(blank=True, null=True, help_text="Additional notes about the adjustment")
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name='bill_adjustments')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
@@ -333,7 +369,7 @@ class AdvanceAdjustment(models.Model):
     """Model for advance adjustments"""
     name = models.CharField(max_length=255, help_text="Name of the person or entity")
     amount = models.DecimalField(max_digits=10, decimal_places=2, help_text="Advance amount")
-    date = models.DateField(default=timezone.now, editable=False, help_text="Date of advance (automatically set to today)")
+    date = models.DateField(default=timezone.now, editable=False, db_index=True, help_text="Date of advance (automatically set to today)")
     notes = models.TextField(blank=True, null=True, help_text="Additional notes about the adjustment")
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name='advance_adjustments')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -382,4 +418,393 @@ class SalesSummary(models.Model):
         return f"Sales Summary for {self.end_day}"
     
     def get_absolute_url(self):
-        return reverse('sales_summary_detail', kwargs={'pk': self.pk}) 
\ No newline at end of file
+        return reverse('sales_summary_detail', kwargs={'pk': self.pk}) 
+
+class SalesSummaryPdf(models.Model):
+    """PDF of a closed day's SalesSummary, written once by the sales_summary job (see posapp.pdfs)"""
+    summary = models.OneToOneField(SalesSummary, on_delete=models.CASCADE, primary_key=True, related_name='pdf')
+    content = models.BinaryField()
+    etag = models.CharField(max_length=40, help_text="SHA-1 of the content")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"PDF of {self.summary}"
+    
+    def get_absolute_url(self):
+        return reverse('sales_summary_pdf', kwargs={'pk': self.summary_id})
+
+class ArchivedOrder(models.Model):
+    """Cold copy of an order moved out of the hot Order table by archive_orders.
+
+    Keeps the original primary key and field names so archived rows can be
+    rendered with the same templates and filtered with the same lookups.
+    Relations are kept without database constraints so the archive tables
+    can live in a separate database (see ``POS_ARCHIVE_DATABASE``).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order_number = models.CharField(max_length=50)
+    daily_order_number = models.IntegerField(default=0)
+    reference_number = models.CharField(max_length=10, null=True, blank=True, db_index=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    customer_name = models.CharField(max_length=100, blank=True, null=True)
+    customer_phone = models.CharField(max_length=20, blank=True, null=True)
+    customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    search_name = models.CharField(max_length=100, null=True, blank=True, db_index=True, editable=False)
+    discount = models.ForeignKey('Discount', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount_code = models.CharField(max_length=50, blank=True, null=True, default='')
+    discount_type = models.CharField(max_length=20, blank=True, null=True, default='fixed')
+    discount_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, default=0)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    payment_method = models.CharField(max_length=50, default='Cash')
+    payment_status = models.CharField(max_length=10, choices=Order.PAYMENT_STATUS_CHOICES, default='Pending')
+    order_status = models.CharField(max_length=10, choices=Order.ORDER_STATUS_CHOICES, default='Pending')
+    notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField()
+    order_type = models.CharField(max_length=20, default='Dine In', blank=True, null=True)
+    delivery_charges = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    delivery_address = models.TextField(blank=True, null=True)
+    table_number = models.CharField(max_length=10, blank=True, null=True, db_index=True)
+    service_charge_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    service_charge_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    client_uuid = models.UUIDField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.reference_number or self.order_number
+
+    def get_subtotal(self):
+        """Calculate subtotal from archived order items"""
+        from decimal import Decimal
+        return self.items.aggregate(total=models.Sum(models.F('unit_price') * models.F('quantity')))['total'] or Decimal('0.00')
+
+class ArchivedOrderItem(models.Model):
+    """Cold copy of an OrderItem belonging to an ArchivedOrder"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    product_name = models.CharField(max_length=255, blank=True, null=True, help_text="Product name at the time the order was archived")
+    quantity = models.IntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    original_quantity = models.IntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.order.reference_number} - {self.product_name}"
+
+class ArchivedPaymentTransaction(models.Model):
+    """Cold copy of a PaymentTransaction belonging to an ArchivedOrder"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='transactions')
+    transaction_number = models.CharField(max_length=100)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=50)
+    transaction_status = models.CharField(max_length=10, choices=PaymentTransaction.TRANSACTION_STATUS_CHOICES, default='Pending')
+    transaction_note = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.transaction_number
+
+class NumberSequence(models.Model):
+    """Counter that hands out numbers which are never reused (see posapp.numbering)
+
+    Counting rows cannot number orders once archive_orders has moved some of
+    them out of the hot table. posapp.jobs also locks a row of its own to
+    deduplicate queued jobs.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0, help_text="Last number handed out")
+
+    def __str__(self):
+        return f"{self.name} ({self.value})"
+
+class BackgroundJob(models.Model):
+    """Unit of long-running work queued for the run_jobs worker (see posapp.jobs)"""
+    STATUS_CHOICES = (
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    )
+    
+    name = models.CharField(max_length=100, help_text="Registered handler name")
+    payload = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=150, null=True, blank=True, db_index=True,
+                                  help_text="Only one queued or running job may hold a given key")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Completion percentage")
+    progress_message = models.CharField(max_length=255, blank=True, default='')
+    result = models.JSONField(blank=True, null=True)
+    result_file = models.BinaryField(null=True, blank=True)
+    result_file_name = models.CharField(max_length=255, null=True, blank=True)
+    result_file_type = models.CharField(max_length=100, null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='background_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('Completed', 'Failed')
+    
+    def get_absolute_url(self):
+        return reverse('job_detail', kwargs={'job_id': self.pk})
+
+class IdempotencyKey(models.Model):
+    """Stored response for a client-supplied Idempotency-Key, replayed on retries"""
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    request_path = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64, help_text="SHA-256 of the request body")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Empty until the request has completed")
+    response_body = models.TextField(blank=True, default='')
+    response_content_type = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} ({self.request_path})"
+    
+    @property
+    def is_completed(self):
+        return self.response_status is not None
+
+
+class KitchenTicket(models.Model):
+    """Kitchen display copy of a pending order, maintained by posapp.kitchen
+
+    Items are stored as JSON with a per-item ``bumped`` flag so kitchen
+    screens never have to join order items. ``revision`` increases with
+    every change and lets screens receive only the tickets that changed.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='kitchen_ticket')
+    reference_number = models.CharField(max_length=10, null=True, blank=True)
+    daily_order_number = models.IntegerField(default=0)
+    order_type = models.CharField(max_length=20, blank=True, null=True)
+    table_number = models.CharField(max_length=10, blank=True, null=True)
+    customer_name = models.CharField(max_length=100, blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    items = models.JSONField(default=list, help_text="List of {id, product, quantity, notes, bumped}")
+    revision = models.PositiveIntegerField(default=1)
+    ordered_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['ordered_at']
+
+    def __str__(self):
+        return f"Ticket {self.reference_number}"
+
+    @property
+    def is_ready(self):
+        return bool(self.items) and all(item['bumped'] for item in self.items)
+
+    def as_dict(self):
+        return {
+            'order_id': self.order_id,
+            'reference_number': self.reference_number,
+            'number': self.daily_order_number,
+            'order_type': self.order_type,
+            'table_number': self.table_number,
+            'customer_name': self.customer_name,
+            'notes': self.notes,
+            'items': self.items,
+            'revision': self.revision,
+            'ordered_at': self.ordered_at.isoformat(),
+            'is_ready': self.is_ready,
+        }
+
+
+
+class Table(models.Model):
+    """A dine-in table and the pending order seated at it, maintained by posapp.tables
+
+    Rows are created the first time an order is placed for a table number.
+    """
+    number = models.CharField(max_length=10, unique=True)
+    current_order = models.OneToOneField(
+        Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='seated_table',
+        help_text="Pending Dine In order at this table, empty when the table is free"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['number']
+
+    def __str__(self):
+        return f"Table {self.number}"
+
+    @property
+    def is_occupied(self):
+        return self.current_order_id is not None
+
+
+class Printer(models.Model):
+    """A receipt or kitchen printer that print jobs are sent to (see posapp.printing)
+
+    ``target`` is where the ESC/POS bytes go: ``tcp://host:9100`` for a
+    network printer, or ``file:///dev/usb/lp0`` for a printer device or a
+    file standing in for one.
+    """
+    ROLE_CHOICES = (
+        ('Receipt', 'Receipt'),
+        ('Kitchen', 'Kitchen'),
+    )
+
+    name = models.CharField(max_length=100, unique=True)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='Receipt',
+                            help_text="Kitchen printers get kitchen copies, receipt printers everything else")
+    target = models.CharField(max_length=255, help_text="tcp://host:port or file:///path")
+    columns = models.PositiveSmallIntegerField(default=48, help_text="Characters per line, 48 on 80mm paper, 32 on 58mm")
+    dot_width = models.PositiveSmallIntegerField(default=576, help_text="Printable width in dots, 576 on 80mm paper, 384 on 58mm")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.role})"
+
+
+class PrintJob(models.Model):
+    """Rendered receipt waiting in the print spool for the run_print_spool worker"""
+    STATUS_CHOICES = (
+        ('Queued', 'Queued'),
+        ('Printing', 'Printing'),
+        ('Printed', 'Printed'),
+        ('Failed', 'Failed'),
+    )
+
+    printer = models.ForeignKey(Printer, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=30, help_text="Receipt kind, e.g. order_receipt")
+    description = models.CharField(max_length=255, blank=True, default='')
+    data = models.BinaryField(help_text="ESC/POS bytes sent to the printer")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True, null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='print_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    printed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['printer', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} on {self.printer.name} ({self.status})"
+
+
+class ProductAffinityMatrix(models.Model):
+    """Co-occurrence counts of products in the orders of the closed business days counted so far (see posapp.affinity)
+
+    There is a single row, updated by the product_affinity job.
+    """
+    pairs = models.BinaryField(help_text="NumPy .npz of the sorted pair keys and their order counts")
+    counted_until = models.DateTimeField(null=True, blank=True, help_text="End of the last business day counted")
+    days_counted = models.PositiveIntegerField(default=0)
+    orders_counted = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Product affinity over {self.days_counted} business days"
+
+
+class ProductAffinity(models.Model):
+    """A product often bought with another; the top few per product, written by posapp.affinity"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='affinities')
+    related_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(help_text="0 for the product most often bought with this one")
+    orders = models.PositiveIntegerField(help_text="Orders containing both products")
+    confidence = models.FloatField(help_text="Share of the product's orders that also contain the related product")
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_product_affinity_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} -> {self.related_product} ({self.confidence:.0%})"
+
+
+class StockAlert(models.Model):
+    """A product's stock falling below its reorder threshold, raised by the stock change itself (see posapp.stock_alerts)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_alerts')
+    threshold = models.PositiveIntegerField(help_text="Reorder threshold the stock fell below")
+    stock_quantity = models.IntegerField(help_text="Stock right after it fell below the threshold")
+    # True while open and NULL once resolved: NULLs never collide, so the
+    # unique constraint allows any number of resolved alerts but one open
+    # alert per product, on every database
+    is_open = models.BooleanField(null=True, default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                    help_text="Manager who dismissed the alert; empty when restocking resolved it")
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'is_open'], name='unique_open_stock_alert'),
+        ]
+        indexes = [
+            models.Index(fields=['is_open', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product}: {self.stock_quantity} left (threshold {self.threshold})"
+
+
+class SalesVelocity(models.Model):
+    """Daily sales of every product by weekday, exponentially weighted over the closed business days counted so far (see posapp.forecasting)
+
+    There is a single row, updated by the stock_forecast job.
+    """
+    velocities = models.BinaryField(help_text="NumPy .npz of the product ids, the weighted mean and variance of their daily sales per weekday and the days seen per weekday")
+    counted_until = models.DateTimeField(null=True, blank=True, help_text="End of the last business day counted")
+    days_counted = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'sales velocities'
+
+    def __str__(self):
+        return f"Sales velocity over {self.days_counted} business days"
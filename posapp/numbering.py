@@ -0,0 +1,96 @@
+"""
+Order and reference numbers.
+
+``order_number`` comes from the ``order_number`` NumberSequence, which
+starts from the highest number held by a hot or archived order the first
+time it is used. Counting the orders would hand numbers out again once
+archive_orders has moved orders out of the hot table.
+
+Reference numbers (PB plus 4 digits) are drawn at random and checked
+against the hot and the archived orders. There are only 10,000 of them,
+so once the archive holds nearly all of them a reference only has to be
+free among the hot orders.
+"""
+import random
+import string
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, F, Max
+from django.db.models.functions import Cast
+
+from .archive import archive_database
+from .models import ArchivedOrder, NumberSequence, Order
+
+ORDER_NUMBER_SEQUENCE = 'order_number'
+
+REFERENCE_PREFIX = 'PB'
+REFERENCE_DIGITS = 4
+
+# Draws checked against the archive before a reference only has to be free
+# among the hot orders
+REFERENCE_ARCHIVE_ROUNDS = 3
+
+
+def _highest_order_number():
+    """The highest numeric order_number of the hot and archived orders"""
+    highest = 0
+    for model, using in ((Order, 'default'), (ArchivedOrder, archive_database())):
+        value = (model.objects.using(using).filter(order_number__regex=r'^[0-9]+$')
+                 .aggregate(highest=Max(Cast('order_number', BigIntegerField())))['highest'])
+        highest = max(highest, value or 0)
+    return highest
+
+
+def next_order_numbers(count=1):
+    """
+    Reserve count consecutive order numbers
+
+    The sequence row stays locked until the caller's transaction ends, so
+    concurrent orders are numbered one after the other and an order that is
+    rolled back gives its number back.
+
+    Returns:
+        The numbers as zero padded strings, in order
+    """
+    sequence = NumberSequence.objects.filter(name=ORDER_NUMBER_SEQUENCE)
+    with transaction.atomic():
+        if not sequence.update(value=F('value') + count):
+            try:
+                with transaction.atomic():
+                    NumberSequence.objects.create(name=ORDER_NUMBER_SEQUENCE, value=_highest_order_number() + count)
+            except IntegrityError:
+                # Another order started the sequence first
+                sequence.update(value=F('value') + count)
+        last = sequence.values_list('value', flat=True).get()
+    return [f'{number:05d}' for number in range(last - count + 1, last + 1)]
+
+
+def _random_reference():
+    return f"{REFERENCE_PREFIX}{''.join(random.choices(string.digits, k=REFERENCE_DIGITS))}"
+
+
+def _taken_references(candidates, archived):
+    taken = set(Order.objects.filter(reference_number__in=candidates).values_list('reference_number', flat=True))
+    if archived:
+        taken.update(ArchivedOrder.objects.using(archive_database())
+                     .filter(reference_number__in=candidates).values_list('reference_number', flat=True))
+    return taken
+
+
+def new_references(count=1):
+    """
+    Draw count distinct reference numbers not held by another order
+
+    Returns:
+        A list of reference numbers
+    """
+    references = set()
+    rounds = 0
+    while len(references) < count:
+        needed = count - len(references)
+        # Spare candidates, so a few collisions do not cost another round of queries
+        candidates = {_random_reference() for _ in range(needed * 2 + 8)} - references
+        free = candidates - _taken_references(candidates, archived=rounds < REFERENCE_ARCHIVE_ROUNDS)
+        references.update(list(free)[:needed])
+        rounds += 1
+    return list(references)
@@ -0,0 +1,171 @@
+"""
+Order search.
+
+Searching orders by ORing ``icontains`` over the reference, customer and
+table fields cannot use an index, so it reads every order in range; with
+admin history that is the whole hot table plus the archive. Instead, the
+shape of the search text picks one lookup that an index can answer:
+
+- ``PB1234``: exact reference number, ``PB12``: reference number prefix
+- A phone number: the customers whose phone key starts with it (see
+  posapp.customers), then their orders through the customer index
+- Other digits: exact table number, or the reference number for 4 digits
+- Anything else: customer name prefix on ``search_name``, the name
+  lowercased with its whitespace collapsed, or exact table number
+
+Set ``POS_ORDER_SEARCH_FULLTEXT`` on MySQL once the FULLTEXT indexes exist
+(``manage.py build_order_search_index --fulltext``) to match names on any
+word instead of their start.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import NotSupportedError, connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.lookups import GreaterThan
+
+from . import customers
+from .archive import archive_database
+from .models import ArchivedOrder, Order
+from .numbering import REFERENCE_DIGITS, REFERENCE_PREFIX
+
+logger = logging.getLogger('posapp')
+
+# Rows updated per query by backfill_search_names
+SEARCH_NAME_BATCH_SIZE = 1000
+
+FULLTEXT_INDEX_NAME = 'posapp_customer_name_fulltext'
+
+# Shortest word InnoDB indexes by default (innodb_ft_min_token_size)
+FULLTEXT_MIN_WORD = 3
+
+_REFERENCE_RE = re.compile(rf'^{REFERENCE_PREFIX}(\d{{1,{REFERENCE_DIGITS}}})$', re.IGNORECASE)
+_TABLE_RE = re.compile(r'^[\w-]{1,10}$')
+
+
+def normalize_name(name):
+    """A customer name as stored in search_name"""
+    return ' '.join(str(name or '').split()).casefold()[:100]
+
+
+class MatchAgainst(Func):
+    """MySQL ``MATCH (column) AGAINST (query IN BOOLEAN MODE)`` relevance"""
+    output_field = FloatField()
+
+    def __init__(self, column, query):
+        super().__init__(F(column), Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError('Full text search of orders requires MySQL')
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        column, query = self.get_source_expressions()
+        column_sql, column_params = compiler.compile(column)
+        query_sql, query_params = compiler.compile(query)
+        return f'MATCH ({column_sql}) AGAINST ({query_sql} IN BOOLEAN MODE)', [*column_params, *query_params]
+
+
+def fulltext_enabled():
+    """Whether names are matched with the FULLTEXT indexes"""
+    if not getattr(settings, 'POS_ORDER_SEARCH_FULLTEXT', False):
+        return False
+    aliases = {'default', archive_database()}
+    return all(connections[alias].vendor == 'mysql' for alias in aliases)
+
+
+def _name_filter(query):
+    words = re.findall(r'\w+', query)
+    if fulltext_enabled() and words and all(len(word) >= FULLTEXT_MIN_WORD for word in words):
+        # Every word must start a word of the name
+        match = ' '.join(f'+{word}*' for word in words)
+        return Q(GreaterThan(MatchAgainst('customer_name', match), 0))
+    return Q(search_name__startswith=normalize_name(query))
+
+
+def search_filter(query):
+    """
+    The filter matching orders to search text
+
+    Applies to Order and ArchivedOrder alike, so it can be passed to
+    posapp.archive.order_history.
+
+    Returns:
+        A Q object; empty when query is blank
+    """
+    query = ' '.join((query or '').split())
+    if not query:
+        return Q()
+
+    reference = _REFERENCE_RE.match(query)
+    if reference:
+        reference_number = query.upper()
+        if len(reference.group(1)) == REFERENCE_DIGITS:
+            return Q(reference_number=reference_number)
+        return Q(reference_number__startswith=reference_number)
+
+    phone_key = customers.search_key(query)
+    if phone_key:
+        return Q(customer_id__in=customers.matching_ids(phone_key))
+
+    if query.isdigit():
+        filters = Q(table_number=query)
+        if len(query) == REFERENCE_DIGITS:
+            # The reference number typed without its prefix
+            filters |= Q(reference_number=f'{REFERENCE_PREFIX}{query}')
+        return filters
+
+    filters = _name_filter(query)
+    if _TABLE_RE.match(query):
+        filters |= Q(table_number=query)
+    return filters
+
+
+def backfill_search_names(batch_size=SEARCH_NAME_BATCH_SIZE, progress=None):
+    """
+    Fill in search_name for the hot and archived orders saved before it existed
+
+    Returns:
+        Number of orders updated
+    """
+    updated = 0
+    for model, using in ((Order, 'default'), (ArchivedOrder, archive_database())):
+        pending = model.objects.using(using).filter(search_name__isnull=True).order_by('id')
+        after_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=after_id).only('id', 'customer_name')[:batch_size])
+            if not batch:
+                break
+            for order in batch:
+                order.search_name = normalize_name(order.customer_name)
+            # bulk_update skips the Order signals, which have nothing to do here
+            model.objects.using(using).bulk_update(batch, ['search_name'])
+            after_id = batch[-1].id
+            updated += len(batch)
+            if progress:
+                progress(updated)
+    return updated
+
+
+def create_fulltext_indexes(drop=False):
+    """
+    Create (or drop) the FULLTEXT indexes on the hot and archived customer names
+
+    Returns:
+        The tables changed
+    """
+    changed = []
+    for model, using in ((Order, 'default'), (ArchivedOrder, archive_database())):
+        connection = connections[using]
+        if connection.vendor != 'mysql':
+            raise NotSupportedError(f"FULLTEXT indexes need MySQL, database '{using}' is {connection.vendor}")
+        table = connection.ops.quote_name(model._meta.db_table)
+        index = connection.ops.quote_name(FULLTEXT_INDEX_NAME)
+        with connection.cursor() as cursor:
+            if drop:
+                cursor.execute(f'DROP INDEX {index} ON {table}')
+            else:
+                cursor.execute(f'CREATE FULLTEXT INDEX {index} ON {table} (customer_name)')
+        changed.append(model._meta.db_table)
+        logger.info(f"{'Dropped' if drop else 'Created'} the FULLTEXT index on {model._meta.db_table}")
+    return changed
@@ -0,0 +1,267 @@
+"""
+Keyset (seek) pagination for the list views.
+
+Django's Paginator counts the whole filtered set and reads deep pages with
+OFFSET, so both get slower as history grows. KeysetPaginator instead filters
+on the sort key of the last row shown, e.g. ``(created_at, id) < (t, 42)``,
+which the database answers from an index no matter how deep the page is.
+
+Pages are addressed by opaque, signed cursors passed in the ``cursor`` query
+parameter. Totals are optional and can be capped, so a list over a million
+orders never has to count them all.
+"""
+from django.core import signing
+from django.db import models
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils.dateparse import parse_date, parse_datetime
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'posapp.pagination'
+
+# Plain cursor value addressing the last page, used by the "last" link
+LAST_CURSOR = 'last'
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator, iterable like a Paginator page"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous, next_cursor, previous_cursor, params=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def count(self):
+        return self.paginator.count
+
+    @property
+    def count_is_capped(self):
+        return self.paginator.count_is_capped
+
+    def _url(self, cursor):
+        params = self.params.copy() if self.params is not None else QueryDict(mutable=True)
+        # Drop any page-number parameter left over from old links, and the
+        # fragment flag so links always lead to the full page
+        for key in (CURSOR_PARAM, 'page', 'partial'):
+            params.pop(key, None)
+        if cursor:
+            params[CURSOR_PARAM] = cursor
+        return f'?{params.urlencode()}'
+
+    @property
+    def first_url(self):
+        return self._url(None)
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor) if self._has_next else None
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor) if self._has_previous else None
+
+    @property
+    def last_url(self):
+        return self._url(LAST_CURSOR)
+
+
+class KeysetPaginator:
+    """
+    Paginate one or more querysets by a unique sort key
+
+    Args:
+        queryset: A QuerySet, or an object exposing ``querysets`` (such as
+            archive.OrderHistory) whose querysets are in sort order: every row
+            of the first sorts before every row of the second
+        per_page: Rows per page
+        ordering: Field names with an optional '-' prefix for descending; the
+            combination must be unique, so end with the primary key
+        count_limit: None to skip counting, 0 for an exact count, or a cap
+            above which the count is reported as "N+"
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count_limit=None):
+        self.querysets = list(getattr(queryset, 'querysets', [queryset]))
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count_limit = count_limit
+        self._count = None
+        self.count_is_capped = False
+
+    @property
+    def fields(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    @property
+    def count(self):
+        """Total rows, capped at count_limit, or None when counting is disabled"""
+        if self.count_limit is None:
+            return None
+        if self._count is None:
+            total = 0
+            for queryset in self.querysets:
+                if self.count_limit:
+                    # COUNT over a LIMITed subquery stops scanning at the cap
+                    total += queryset.order_by()[:self.count_limit + 1 - total].count()
+                    if total > self.count_limit:
+                        self.count_is_capped = True
+                        total = self.count_limit
+                        break
+                else:
+                    total += queryset.count()
+            self._count = total
+        return self._count
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return signing.dumps({'d': direction, 'v': values}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """
+        Returns:
+            A tuple of (direction, values), or None if the cursor is missing or invalid;
+            direction is 'next', 'prev' or 'last'
+        """
+        if not cursor:
+            return None
+        if cursor == LAST_CURSOR:
+            return LAST_CURSOR, None
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            direction, raw_values = data['d'], data['v']
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+        if direction not in ('next', 'prev') or len(raw_values) != len(self.ordering):
+            return None
+
+        model = self.querysets[0].model
+        values = []
+        for (name, _), raw in zip(self.fields, raw_values):
+            field = model._meta.get_field(name)
+            if isinstance(field, models.DateTimeField):
+                value = parse_datetime(raw) if raw else None
+            elif isinstance(field, models.DateField):
+                value = parse_date(raw) if raw else None
+            else:
+                value = raw
+            if value is None:
+                return None
+            values.append(value)
+        return direction, values
+
+    def _seek_filter(self, values, forward):
+        """Rows strictly after values in sort order (before them when not forward)"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        # The redundant bound on the leading column lets the database turn the
+        # OR chain into a single index range scan
+        name, descending = self.fields[0]
+        leading = Q(**{f'{name}__{"lte" if descending == forward else "gte"}': values[0]})
+        return leading & condition
+
+    def _ordering(self, forward):
+        if forward:
+            return self.ordering
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering)
+
+    def _fetch(self, values, forward, limit):
+        querysets = self.querysets if forward else list(reversed(self.querysets))
+        rows = []
+        for queryset in querysets:
+            if values is not None:
+                queryset = queryset.filter(self._seek_filter(values, forward))
+            rows.extend(queryset.order_by(*self._ordering(forward))[:limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def get_page(self, cursor=None, params=None):
+        """
+        Get the page addressed by a cursor, falling back to the first page
+
+        Args:
+            cursor: Cursor from a previous page, usually request.GET['cursor']
+            params: Optional QueryDict used to build next/previous URLs
+
+        Returns:
+            A KeysetPage
+        """
+        decoded = self.decode_cursor(cursor)
+        limit = self.per_page + 1
+
+        if decoded is None:
+            rows = self._fetch(None, True, limit)
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = False
+        elif decoded[0] == 'next':
+            rows = self._fetch(decoded[1], True, limit)
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = True
+        else:
+            # 'prev' seeks backwards from a cursor, 'last' from the end
+            rows = self._fetch(decoded[1], False, limit)
+            has_previous = len(rows) > self.per_page
+            rows = list(reversed(rows[:self.per_page]))
+            has_next = decoded[0] == 'prev'
+
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'prev') if rows and has_previous else None
+        return KeysetPage(rows, self, has_next, has_previous, next_cursor, previous_cursor, params)
+
+
+def paginate(request, queryset, per_page, ordering=('-created_at', '-id'), count_limit=None):
+    """
+    Keyset-paginate a queryset for a function-based list view
+
+    Returns:
+        The KeysetPage addressed by the request's cursor parameter
+    """
+    paginator = KeysetPaginator(queryset, per_page, ordering, count_limit)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM), request.GET)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin replacing Paginator with KeysetPaginator
+
+    Templates keep using ``page_obj`` and ``is_paginated``.
+    """
+    keyset_ordering = ('-created_at', '-id')
+    count_limit = None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering, self.count_limit)
+        page = paginator.get_page(self.request.GET.get(CURSOR_PARAM), self.request.GET)
+        return paginator, page, page.object_list, page.has_other_pages()
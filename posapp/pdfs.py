@@ -0,0 +1,240 @@
+"""
+PDF sales summaries.
+
+The summary of a closed business day never changes, so its PDF is written
+once by the ``sales_summary`` background job, right after the SalesSummary
+itself, and stored in SalesSummaryPdf. The download view serves the stored
+bytes with an ETag and immutable caching. Open ranges (the sales receipt for
+any start and end) are rendered on request from the cached report figures
+into a spooled temporary file and streamed.
+
+Both use the same layout, fed by a dict of figures (see summary_figures and
+receipt_figures).
+"""
+from decimal import Decimal
+import hashlib
+from io import BytesIO
+import logging
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from . import settings_store
+from .models import BusinessLogo, SalesSummaryPdf
+
+logger = logging.getLogger('posapp')
+
+# Try to import reportlab for PDF export, but make it optional
+PDF_EXPORT_AVAILABLE = False
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    PDF_EXPORT_AVAILABLE = True
+except ImportError:
+    logger.warning("reportlab not installed. PDF export will be disabled.")
+except Exception as e:
+    logger.warning(f"reportlab error: {e}")
+
+PDF_CONTENT_TYPE = 'application/pdf'
+
+LOGO_MAX_WIDTH = 60
+LOGO_MAX_HEIGHT = 25
+
+
+def summary_figures(summary):
+    """Figures of a stored SalesSummary, as used by write_sales_summary_pdf"""
+    return {
+        'start_date': summary.start_date,
+        'end_date': summary.end_date,
+        'ended_by': summary.end_day.ended_by.username,
+        'orders_count': summary.orders_count,
+        'total_sales': summary.total_sales,
+        'total_service_charge': None,
+        'total_paid': summary.total_paid,
+        'total_pending': summary.total_pending,
+        'total_bill_adjustments': summary.total_bill_adjustments,
+        'total_advance_adjustments': summary.total_advance_adjustments,
+        'total_adjustments': summary.total_adjustments,
+        'net_revenue': summary.net_revenue,
+        'products_sold': (summary.summary_data or {}).get('products_sold', []),
+    }
+
+
+def receipt_figures(context):
+    """Figures of the sales_receipt context, as used by write_sales_summary_pdf"""
+    return {
+        'start_date': context['start_date'],
+        'end_date': context['end_date'],
+        'ended_by': None,
+        'orders_count': context['completed_order_count'],
+        'total_sales': context['total_sales'],
+        'total_service_charge': context['total_service_charge'],
+        'total_paid': context['total_paid'],
+        'total_pending': context['total_pending'],
+        'total_bill_adjustments': context['total_bill_adjustments'],
+        'total_advance_adjustments': context['total_advance_adjustments'],
+        'total_adjustments': context['total_adjustments'],
+        'net_revenue': context['net_revenue'],
+        'products_sold': context['products_sold'],
+    }
+
+
+def _local(moment):
+    return timezone.localtime(moment).strftime('%Y-%m-%d %H:%M') if timezone.is_aware(moment) else moment.strftime('%Y-%m-%d %H:%M')
+
+
+def _logo():
+    """The business logo as a flowable, or None"""
+    logo = BusinessLogo.objects.order_by('-uploaded_at').first()
+    if not logo or not logo.image:
+        return None
+    try:
+        reader = ImageReader(BytesIO(bytes(logo.image)))
+        width, height = reader.getSize()
+        scale = min(LOGO_MAX_WIDTH * mm / width, LOGO_MAX_HEIGHT * mm / height, 1)
+        return Image(reader, width=width * scale, height=height * scale)
+    except Exception as e:
+        logger.warning(f"Could not add business logo #{logo.id} to PDF: {str(e)}")
+        return None
+
+
+def _text(text, style):
+    """A paragraph of plain text, which Paragraph would read as markup"""
+    return Paragraph(escape(str(text)), style)
+
+
+def _figures_table(rows, bold_last=False):
+    table = Table(rows, colWidths=[110 * mm, 60 * mm], hAlign='LEFT')
+    style = [
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('LINEBELOW', (0, 0), (-1, -2), 0.25, colors.lightgrey),
+    ]
+    if bold_last:
+        style += [('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'), ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black)]
+    table.setStyle(TableStyle(style))
+    return table
+
+
+def write_sales_summary_pdf(figures, output, title='Sales Summary Report'):
+    """
+    Write a sales summary PDF
+
+    Args:
+        figures: Dict from summary_figures or receipt_figures
+        output: Binary file object the PDF is written to
+        title: Heading and document title
+    """
+    business = settings_store.get_values([
+        'business_name', 'business_address', 'business_phone', 'currency_symbol',
+        'receipt_show_logo', 'receipt_footer',
+    ])
+    currency = business['currency_symbol'] or 'Rs.'
+    styles = getSampleStyleSheet()
+
+    def money(value):
+        return f'{currency} {Decimal(value or 0):,.2f}'
+
+    story = []
+    logo = _logo() if business['receipt_show_logo'] else None
+    if logo:
+        story.append(logo)
+    story.append(_text(business['business_name'] or 'POS System', styles['Title']))
+    for line in (business['business_address'], f"Tel: {business['business_phone']}" if business['business_phone'] else ''):
+        if line:
+            story.append(_text(line, styles['Normal']))
+    story.append(Spacer(1, 6 * mm))
+
+    story.append(Paragraph(title, styles['Heading1']))
+    story.append(Paragraph(f"Period: {_local(figures['start_date'])} to {_local(figures['end_date'])}", styles['Normal']))
+    if figures['ended_by']:
+        story.append(_text(f"Ended by: {figures['ended_by']}", styles['Normal']))
+    story.append(Paragraph(f"Generated: {_local(timezone.now())}", styles['Normal']))
+
+    sales = [
+        ['Total Orders', str(figures['orders_count'])],
+        ['Completed Sales', money(figures['total_sales'])],
+    ]
+    if figures['total_service_charge'] is not None:
+        sales.append(['Service Charges', money(figures['total_service_charge'])])
+    sales += [
+        ['Paid Amount', money(figures['total_paid'])],
+        ['Pending Amount', money(figures['total_pending'])],
+    ]
+    story += [Paragraph('Sales', styles['Heading2']), _figures_table(sales)]
+
+    story += [
+        Paragraph('Adjustments', styles['Heading2']),
+        _figures_table([
+            ['Bill Adjustments', money(figures['total_bill_adjustments'])],
+            ['Advance Adjustments', money(figures['total_advance_adjustments'])],
+            ['Total Adjustments', money(figures['total_adjustments'])],
+        ], bold_last=True),
+    ]
+
+    net_revenue = Decimal(figures['net_revenue'] or 0)
+    revenue = [
+        ['Sales Revenue', money(figures['total_sales'])],
+        ['Adjustments', f"-{money(figures['total_adjustments'])}"],
+        ['Net Revenue', money(net_revenue)],
+    ]
+    story += [Paragraph('Net Revenue', styles['Heading2']), _figures_table(revenue, bold_last=True)]
+    if net_revenue < 0:
+        story.append(Paragraph(f'<b>Short amount: {escape(money(abs(net_revenue)))}</b>', styles['Normal']))
+
+    story.append(Paragraph('Products Sold', styles['Heading2']))
+    if figures['products_sold']:
+        rows = [['Item', 'Qty', 'Amount']]
+        rows += [
+            [_text(product['product__name'] or '', styles['Normal']), str(product['total_quantity'] or '-'), money(product['total_sales'])]
+            for product in figures['products_sold']
+        ]
+        table = Table(rows, colWidths=[100 * mm, 25 * mm, 45 * mm], repeatRows=1, hAlign='LEFT')
+        table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke]),
+        ]))
+        story.append(table)
+    else:
+        story.append(Paragraph('No products sold in this period.', styles['Normal']))
+
+    if business['receipt_footer']:
+        story += [Spacer(1, 8 * mm), _text(business['receipt_footer'], styles['Italic'])]
+
+    document = SimpleDocTemplate(
+        output, pagesize=A4, title=title, author=business['business_name'] or 'POS System',
+        leftMargin=20 * mm, rightMargin=20 * mm, topMargin=15 * mm, bottomMargin=15 * mm,
+    )
+    document.build(story)
+
+
+def sales_summary_filename(summary):
+    return f"sales_summary_{timezone.localtime(summary.end_date):%Y%m%d_%H%M}.pdf"
+
+
+def store_sales_summary_pdf(summary):
+    """
+    Write and store the PDF of a closed day's SalesSummary
+
+    Returns:
+        The SalesSummaryPdf, or the existing one if it was already written
+    """
+    existing = SalesSummaryPdf.objects.filter(summary=summary).first()
+    if existing:
+        return existing
+
+    output = BytesIO()
+    write_sales_summary_pdf(summary_figures(summary), output)
+    content = output.getvalue()
+    document, _ = SalesSummaryPdf.objects.get_or_create(
+        summary=summary,
+        defaults={'content': content, 'etag': hashlib.sha1(content).hexdigest()},
+    )
+    logger.info(f"Stored PDF for sales summary {summary.id} ({len(content)} bytes)")
+    return document
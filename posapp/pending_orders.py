@@ -0,0 +1,129 @@
+"""
+Per-user count of pending orders, shown in the navbar and checked on logout.
+
+UserProfile.pending_order_count is kept in step with the user's orders by
+the Order signals in signals.py. It moves with F() updates inside the
+transaction that changes the order, so concurrent terminals cannot make it
+drift, and reading it never counts orders.
+
+When the cache is shared between workers, counts are also cached under a
+per-user version counter that is bumped after each change, so most pages
+read the count without touching the database.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Order, UserProfile
+from .versioning import bump_version, get_version, versions_are_shared
+
+COUNT_KEY_PREFIX = 'posapp:pending_orders:'
+# Superseded keys are never read again; this only lets them age out
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+def _namespace(user_id):
+    return f'pending_orders:{user_id}'
+
+
+def pending_owner(order):
+    """Id of the user whose pending count includes order, or None"""
+    return order.user_id if order.order_status == 'Pending' else None
+
+
+# Marks an order loaded without its user or status, whose owner is unknown
+UNKNOWN = object()
+
+
+def track(order):
+    """Remember whose count includes order, to compare against on its next save"""
+    if order.pk is None:
+        order._pending_owner = None
+    elif 'order_status' in order.__dict__ and 'user_id' in order.__dict__:
+        order._pending_owner = pending_owner(order)
+    else:
+        order._pending_owner = UNKNOWN
+
+
+def order_saved(order, created):
+    """Move a saved order between users' counts as its status or user changed"""
+    previous = None if created else getattr(order, '_pending_owner', UNKNOWN)
+    current = pending_owner(order)
+    if previous is UNKNOWN:
+        recount([order.user_id])
+    elif previous != current:
+        adjust(previous, -1)
+        adjust(current, 1)
+    order._pending_owner = current
+
+
+def order_deleted(order):
+    """Take a deleted order out of its user's count"""
+    previous = getattr(order, '_pending_owner', UNKNOWN)
+    if previous is UNKNOWN:
+        if 'user_id' in order.__dict__:
+            recount([order.user_id])
+    else:
+        adjust(previous, -1)
+
+
+def orders_created(orders):
+    """Count orders inserted with bulk_create, which skips the Order signals"""
+    for user_id, count in Counter(pending_owner(order) for order in orders).items():
+        adjust(user_id, count)
+
+
+def adjust(user_id, delta):
+    """Add delta to a user's pending count; call inside the order's transaction"""
+    if user_id is None or not delta:
+        return
+    UserProfile.objects.filter(user_id=user_id).update(pending_order_count=F('pending_order_count') + delta)
+    transaction.on_commit(lambda: bump_version(_namespace(user_id)))
+
+
+def _stored_count(user_id):
+    count = UserProfile.objects.filter(user_id=user_id).values_list('pending_order_count', flat=True).first()
+    if count is None:
+        # Users without a profile have no counter
+        count = Order.objects.filter(user_id=user_id, order_status='Pending').count()
+    return count
+
+
+def pending_order_count(user):
+    """Number of pending orders created by user"""
+    if not versions_are_shared():
+        return _stored_count(user.pk)
+    key = f'{COUNT_KEY_PREFIX}{user.pk}:{get_version(_namespace(user.pk))}'
+    count = cache.get(key)
+    if count is None:
+        count = _stored_count(user.pk)
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def recount(user_ids=None):
+    """
+    Recompute pending counts from the orders, e.g. after deployment
+
+    Args:
+        user_ids: Users to recount, or None for all users with a profile
+
+    Returns:
+        Number of profiles recounted
+    """
+    profiles = UserProfile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+    actual = (
+        Order.objects.filter(user_id=OuterRef('user_id'), order_status='Pending')
+        .order_by().values('user_id').annotate(count=Count('id')).values('count')
+    )
+    with transaction.atomic():
+        recounted = list(profiles.values_list('user_id', flat=True))
+        # Counted inside the UPDATE rather than read first and written back
+        profiles.update(pending_order_count=Coalesce(Subquery(actual), 0))
+        transaction.on_commit(lambda: bump_version(*[_namespace(user_id) for user_id in recounted]))
+    return len(recounted)
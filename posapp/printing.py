@@ -0,0 +1,434 @@
+"""
+Direct printing of receipts on ESC/POS thermal printers.
+
+Printing from the browser means laying out an HTML page and going through
+the print dialog for every ticket. Instead, the print views render the same
+receipt data the HTML receipts show (the *_receipt_context helpers in the
+views) straight to ESC/POS bytes (posapp.escpos), once per active Printer of
+the right role, and queue them as PrintJob rows. The ``run_print_spool``
+management command sends queued jobs to the printers' targets:
+
+    tcp://host:port   a network printer (raw printing, usually port 9100)
+    file:///path      a printer device such as /dev/usb/lp0, or a plain file
+
+``manage.py fake_printer`` listens like a network printer and saves what it
+receives, and a file target collects jobs in a file, so the whole path can be
+tried without a printer.
+
+The spool claims, retries and requeues jobs with the queue helpers of
+posapp.jobs. A job that cannot be delivered is retried with backoff until
+max_attempts, and the later jobs of its printer wait for it, so every printer
+prints its tickets in the order they were queued. Set
+``POS_PRINT_EAGER = True`` to send jobs as soon as they are queued, when no
+spool worker is running.
+"""
+import logging
+import socket
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse
+from django.utils import timezone
+
+from . import escpos
+from .jobs import claim_next, requeue_stale, retry_at
+from .models import Printer, PrintJob
+
+logger = logging.getLogger('posapp')
+
+ORDER_RECEIPT = 'order_receipt'
+KITCHEN_RECEIPT = 'kitchen_receipt'
+SALES_RECEIPT = 'sales_receipt'
+ADJUSTMENT_RECEIPT = 'adjustment_receipt'
+
+# Delay before the first retry, doubled on every further attempt. Short, a
+# cashier is waiting for the receipt
+RETRY_BACKOFF_SECONDS = 5
+
+DEFAULT_PORT = 9100
+
+
+class PrinterNotConfigured(Exception):
+    """No active printer can print this kind of receipt"""
+
+
+def _money(value):
+    return f'{value or 0:.2f}'
+
+
+def _local(moment, fmt):
+    if moment is None:
+        return ''
+    if timezone.is_aware(moment):
+        moment = timezone.localtime(moment)
+    return moment.strftime(fmt)
+
+
+def _business_header(ticket, context):
+    if context.get('receipt_show_logo'):
+        ticket.raster(escpos.logo_raster(ticket.dot_width))
+    ticket.text(context.get('business_name') or '', align=escpos.CENTER, bold=True, double=True)
+    if context.get('business_address'):
+        ticket.text(context['business_address'], align=escpos.CENTER)
+    if context.get('business_phone'):
+        ticket.text(f"Tel: {context['business_phone']}", align=escpos.CENTER)
+    if context.get('receipt_header'):
+        ticket.text(context['receipt_header'], align=escpos.CENTER)
+    ticket.rule()
+
+
+def _footer(ticket, context, default):
+    ticket.text(context.get('receipt_footer') or default, align=escpos.CENTER)
+
+
+def render_order_receipt(context, printer):
+    """Customer receipt from the order_receipt context"""
+    order = context['order']
+    ticket = escpos.Ticket(printer.columns, printer.dot_width)
+    _business_header(ticket, context)
+
+    ticket.text(f'RECEIPT #{order.reference_number}', bold=True)
+    ticket.text(f"Date: {_local(order.created_at, '%Y-%m-%d %H:%M')}")
+    if context.get('receipt_show_cashier') and order.user:
+        ticket.text(f'Cashier: {order.user.username}')
+    ticket.text(f'Status: {order.order_status}')
+    ticket.text(f'Payment: {order.payment_method} ({order.payment_status})')
+    if order.order_type:
+        ticket.text(f'Order Type: {order.order_type}')
+    if order.order_type == 'Dine In' and order.table_number:
+        ticket.text(f'Table #: {order.table_number}', bold=True)
+    ticket.rule()
+
+    widths = (4, 9, 10)
+    ticket.columns_row(('ITEM', 'QTY', 'PRICE', 'TOTAL'), widths, bold=True)
+    ticket.rule()
+    for item in context['order_items']:
+        ticket.columns_row(
+            (item.product.name, item.quantity, _money(item.unit_price), _money(item.total_price)), widths
+        )
+    ticket.rule()
+
+    ticket.row('Subtotal:', _money(context['subtotal']))
+    if context['discount_amount'] > 0:
+        ticket.row('Discount:', _money(context['discount_amount']))
+        discount_info = context.get('discount_info')
+        if discount_info:
+            ticket.text(f"{discount_info['name']} ({discount_info['value']})", align=escpos.CENTER)
+    ticket.row(f"{context['tax_name']} ({context['tax_rate']}%):", _money(order.tax_amount))
+    if order.order_type == 'Delivery' and order.delivery_charges > 0:
+        ticket.row('Delivery Charges:', _money(order.delivery_charges))
+    if order.order_type == 'Dine In' and order.service_charge_amount > 0:
+        ticket.row(f'Service Charge ({order.service_charge_percent}%):', _money(order.service_charge_amount), bold=True)
+    ticket.rule('=')
+    ticket.text(f"TOTAL: {context['currency_symbol']} {_money(order.total_amount)}", align=escpos.RIGHT, bold=True, double=True)
+    ticket.rule()
+
+    if order.notes:
+        ticket.text(f'Notes: {order.notes}').rule()
+    if order.order_type == 'Delivery' and order.delivery_address:
+        ticket.text(f'Delivery Address: {order.delivery_address}').rule()
+
+    _footer(ticket, context, 'Thank you for your purchase!\nPlease come again!')
+    return ticket.feed(3).cut().getvalue()
+
+
+def render_kitchen_receipt(context, printer):
+    """Kitchen copy from the kitchen_receipt context, in large type"""
+    order = context['order']
+    ticket = escpos.Ticket(printer.columns, printer.dot_width)
+    ticket.text(f'ORDER #{order.reference_number}', align=escpos.CENTER, bold=True, double=True)
+    ticket.text(f"Date: {_local(order.created_at, '%d/%m/%Y')}", align=escpos.CENTER)
+    ticket.text(f"Time: {_local(order.created_at, '%H:%M:%S')}", align=escpos.CENTER)
+    ticket.text(f'Order Type: {order.order_type}', align=escpos.CENTER, bold=True)
+    if order.order_type == 'Dine In' and order.table_number:
+        ticket.text(f'TABLE: {order.table_number}', align=escpos.CENTER, bold=True, double=True)
+    ticket.text('*** KITCHEN COPY ***', align=escpos.CENTER, bold=True)
+    ticket.rule()
+
+    for item in context['order_items']:
+        ticket.text(f'{item.quantity} x {item.product.name}', bold=True, double=True)
+        if item.notes:
+            ticket.text(f'  {item.notes}')
+    ticket.rule()
+
+    if order.notes:
+        ticket.text('NOTES:', bold=True).text(order.notes, bold=True).rule()
+    if order.order_type == 'Delivery' and order.delivery_address:
+        ticket.text('DELIVERY ADDRESS:', bold=True).text(order.delivery_address, bold=True).rule()
+
+    ticket.text('*** KITCHEN COPY ***', align=escpos.CENTER, bold=True)
+    ticket.text(f"Printed: {_local(timezone.now(), '%H:%M:%S')}", align=escpos.CENTER)
+    return ticket.feed(3).cut().getvalue()
+
+
+def render_sales_receipt(context, printer, user=None):
+    """Sales summary from the sales_receipt context"""
+    currency = context.get('currency_symbol') or ''
+    ticket = escpos.Ticket(printer.columns, printer.dot_width)
+    _business_header(ticket, context)
+
+    ticket.text('SALES SUMMARY REPORT', align=escpos.CENTER, bold=True)
+    ticket.text(f"Start: {_local(context['start_date'], '%Y-%m-%d %H:%M')}")
+    ticket.text(f"End: {_local(context['end_date'], '%Y-%m-%d %H:%M')}")
+    ticket.text(f"Printed: {_local(timezone.now(), '%Y-%m-%d %H:%M')}")
+    if user is not None:
+        ticket.text(f'Staff: {user.username}')
+    ticket.rule()
+
+    ticket.text('SALES', bold=True)
+    ticket.row('Total Orders:', context['completed_order_count'], bold=True)
+    ticket.row('Completed Sales:', f"{currency} {_money(context['total_sales'])}", bold=True)
+    ticket.row('Service Charges:', f"{currency} {_money(context['total_service_charge'])}")
+    ticket.row('Paid Amount:', f"{currency} {_money(context['total_paid'])}")
+    ticket.row('Pending Amount:', f"{currency} {_money(context['total_pending'])}")
+    ticket.rule()
+
+    ticket.text('ADJUSTMENTS', bold=True)
+    ticket.row('Bill Adjustments:', f"{currency} {_money(context['total_bill_adjustments'])}")
+    ticket.row('Advance Adjustments:', f"{currency} {_money(context['total_advance_adjustments'])}")
+    ticket.row('Total Adjustments:', f"{currency} {_money(context['total_adjustments'])}", bold=True)
+    ticket.rule()
+
+    ticket.text('NET REVENUE', bold=True)
+    ticket.row('Sales Revenue:', f"{currency} {_money(context['total_sales'])}")
+    ticket.row('Service Charge:', f"{currency} {_money(context['total_service_charge'])}")
+    ticket.row('Adjustments:', f"-{currency} {_money(context['total_adjustments'])}")
+    ticket.row('NET REVENUE:', f"{currency} {_money(context['net_revenue'])}", bold=True)
+    if context['is_shortage']:
+        ticket.row('SHORT AMOUNT:', f"{currency} {_money(context['shortage_amount'])}", bold=True)
+    ticket.rule()
+
+    ticket.text('PRODUCTS SOLD', bold=True)
+    if context['products_sold']:
+        widths = (6, 14)
+        ticket.columns_row(('ITEM', 'QTY', 'AMOUNT'), widths, bold=True)
+        for product in context['products_sold']:
+            ticket.columns_row(
+                (product['product__name'], product['total_quantity'] or '-',
+                 f"{currency} {_money(product['total_sales'])}"), widths
+            )
+    else:
+        ticket.text('No products sold in this period.', align=escpos.CENTER)
+    ticket.rule()
+
+    _footer(ticket, context, 'Thank you for your business!')
+    return ticket.feed(3).cut().getvalue()
+
+
+def render_adjustment_receipt(context, printer, user=None):
+    """Adjustment report from the adjustment_receipt context"""
+    ticket = escpos.Ticket(printer.columns, printer.dot_width)
+    _business_header(ticket, context)
+
+    ticket.text('ADJUSTMENT REPORT', align=escpos.CENTER, bold=True)
+    ticket.text(f"Period: {_local(context['start_date'], '%Y-%m-%d %H:%M')} to "
+                f"{_local(context['end_date'], '%Y-%m-%d %H:%M')}")
+    ticket.text(f"Generated: {_local(timezone.now(), '%Y-%m-%d %H:%M')}")
+    if user is not None:
+        ticket.text(f'Generated by: {user.username}')
+    ticket.rule()
+
+    ticket.text('Bill Adjustments', bold=True)
+    if context['bill_adjustments']:
+        widths = (5, 11)
+        for adjustment in context['bill_adjustments']:
+            ticket.columns_row(
+                (f"{_local(adjustment['created_at'], '%m/%d/%y %H:%M')} {adjustment['name']}",
+                 adjustment['quantity'] or '-', f"-{_money(adjustment['price'])}"), widths
+            )
+        ticket.row('Bill Adjustments Total:', f"-{_money(context['bill_total'])}", bold=True)
+    else:
+        ticket.text('No bill adjustments for this period.', align=escpos.CENTER)
+    ticket.rule()
+
+    ticket.text('Advance Adjustments', bold=True)
+    if context['advance_adjustments']:
+        for adjustment in context['advance_adjustments']:
+            ticket.row(f"{_local(adjustment['created_at'], '%m/%d/%y %H:%M')} {adjustment['name']}",
+                       f"-{_money(adjustment['amount'])}")
+        ticket.row('Advance Adjustments Total:', f"-{_money(context['advance_total'])}", bold=True)
+    else:
+        ticket.text('No advance adjustments for this period.', align=escpos.CENTER)
+    ticket.rule()
+
+    ticket.row('TOTAL ADJUSTMENTS:', f"-{_money(context['total_adjustments'])}", bold=True)
+    ticket.rule()
+
+    _footer(ticket, context, 'Thank you for your business!')
+    return ticket.feed(3).cut().getvalue()
+
+
+RENDERERS = {
+    ORDER_RECEIPT: lambda context, printer, user: render_order_receipt(context, printer),
+    KITCHEN_RECEIPT: lambda context, printer, user: render_kitchen_receipt(context, printer),
+    SALES_RECEIPT: render_sales_receipt,
+    ADJUSTMENT_RECEIPT: render_adjustment_receipt,
+}
+
+
+def printers_for(kind):
+    """Active printers a kind of receipt is printed on"""
+    role = 'Kitchen' if kind == KITCHEN_RECEIPT else 'Receipt'
+    return list(Printer.objects.filter(role=role, is_active=True))
+
+
+def print_receipt(kind, context, user=None, description=''):
+    """
+    Render a receipt for every printer of its role and queue the jobs
+
+    Args:
+        kind: ORDER_RECEIPT, KITCHEN_RECEIPT, SALES_RECEIPT or ADJUSTMENT_RECEIPT
+        context: The context the receipt's HTML view renders
+        user: User who asked for the print
+        description: Shown in the admin, e.g. the order reference
+
+    Returns:
+        List of the queued PrintJobs
+
+    Raises:
+        PrinterNotConfigured: If no active printer takes this kind of receipt
+    """
+    printers = printers_for(kind)
+    if not printers:
+        raise PrinterNotConfigured(f"No active {'kitchen' if kind == KITCHEN_RECEIPT else 'receipt'} printer is configured")
+
+    created_by = user if user is not None and user.is_authenticated else None
+    # One row per printer; bulk_create would not return the ids on MySQL
+    jobs = [
+        PrintJob.objects.create(
+            printer=printer,
+            kind=kind,
+            description=description[:255],
+            data=RENDERERS[kind](context, printer, created_by),
+            created_by=created_by,
+        )
+        for printer in printers
+    ]
+    logger.info(f"Queued {kind} '{description}' on {len(jobs)} printer(s)")
+
+    if getattr(settings, 'POS_PRINT_EAGER', False):
+        for job in jobs:
+            _mark_printing(job)
+            run_print_job(job)
+    return jobs
+
+
+def print_response(kind, context, user, description=''):
+    """
+    JSON answer for the print views: the queued jobs, or why nothing was
+    queued (409 when no printer is set up)
+    """
+    try:
+        jobs = print_receipt(kind, context, user, description)
+    except PrinterNotConfigured as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
+    return JsonResponse({
+        'status': 'success',
+        'message': f"Sent to {', '.join(job.printer.name for job in jobs)}",
+        'jobs': [{'id': job.id, 'printer': job.printer.name, 'status': job.status} for job in jobs],
+    })
+
+
+def send(target, data, timeout=5):
+    """
+    Deliver ESC/POS bytes to a printer target
+
+    Args:
+        target: tcp://host[:port] or file:///path (a bare path is a file)
+        data: Bytes to send
+        timeout: Seconds to wait for a network printer
+
+    Raises:
+        OSError: If the printer cannot be reached or written to
+        ValueError: If the target is not understood
+    """
+    parsed = urlparse(target)
+    if parsed.scheme == 'tcp':
+        if not parsed.hostname:
+            raise ValueError(f"Printer target '{target}' has no host")
+        with socket.create_connection((parsed.hostname, parsed.port or DEFAULT_PORT), timeout=timeout) as sock:
+            sock.sendall(data)
+    elif parsed.scheme in ('file', ''):
+        path = unquote(parsed.path) if parsed.scheme else target
+        # Append, so a file standing in for a printer collects every job
+        with open(path, 'ab') as output:
+            output.write(data)
+    else:
+        raise ValueError(f"Unsupported printer target '{target}'")
+
+
+def _mark_printing(job):
+    job.status = 'Printing'
+    job.attempts += 1
+    job.save(update_fields=['status', 'attempts', 'updated_at'])
+
+
+def claim_print_job():
+    """
+    Take the next due print job off the spool
+
+    A job is only due once every job queued before it on the same printer has
+    been printed or has failed, so a job waiting for a retry holds back the
+    tickets after it.
+
+    Returns:
+        The PrintJob, now Printing, or None if nothing is due
+    """
+    earlier = PrintJob.objects.filter(
+        printer_id=OuterRef('printer_id'),
+        id__lt=OuterRef('id'),
+        status__in=('Queued', 'Printing'),
+    )
+    due = PrintJob.objects.select_related('printer').filter(
+        status='Queued',
+        run_after__lte=timezone.now()
+    ).exclude(Exists(earlier)).order_by('id')
+    return claim_next(due, _mark_printing)
+
+
+def requeue_stale_print_jobs(stale_after):
+    """
+    Put back jobs left Printing by a spool worker that died, or fail them
+    once they are out of attempts
+
+    The printer may have printed them already; a duplicate receipt beats a
+    lost one.
+
+    Returns:
+        Number of jobs requeued
+    """
+    requeued, failed = requeue_stale(
+        PrintJob.objects.all(), 'Printing', stale_after, 'The print spool stopped while sending the job'
+    )
+    if failed:
+        logger.warning(f"Failed {failed} stale print jobs that had no attempts left")
+    return requeued
+
+
+def run_print_job(job, timeout=5):
+    """
+    Send a claimed job to its printer and record the outcome
+
+    Never raises; failures are stored on the job and retried.
+    """
+    try:
+        if not job.printer.is_active:
+            raise ValueError(f'Printer {job.printer.name} is disabled')
+        send(job.printer.target, bytes(job.data), timeout=timeout)
+    except (OSError, ValueError) as e:
+        logger.error(f"Print job #{job.id} on {job.printer.name} failed on attempt {job.attempts}: {str(e)}")
+        job.error = str(e)
+        if job.attempts < job.max_attempts:
+            job.status = 'Queued'
+            job.run_after = retry_at(job.attempts, RETRY_BACKOFF_SECONDS)
+        else:
+            job.status = 'Failed'
+        job.save(update_fields=['status', 'error', 'run_after', 'updated_at'])
+        return job
+
+    job.status = 'Printed'
+    job.error = None
+    job.printed_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'printed_at', 'updated_at'])
+    return job
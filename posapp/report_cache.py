@@ -0,0 +1,127 @@
+"""
+Cached report payloads, invalidated by the writes that change them.
+
+A report is cached as plain data (dicts, lists, Decimals and datetimes, no
+QuerySets) under a key built from the report name, the exact datetime range
+and the scope of the user asking (e.g. a branch manager only sees orders
+since the last end of day). The key also embeds the version counters of the
+days the range covers, per kind of data the report reads ('orders',
+'adjustments'). A write bumps the counters of the day it belongs to (the
+order's or adjustment's created_at, see signals.py), so only reports whose
+range includes that day are rebuilt; the superseded entries age out.
+
+Every day also has a month counter, bumped along with it, so a range of a
+year reads at most a dozen month counters plus the days at either end.
+
+The counters and payloads live in the default cache, which must be shared
+between workers (CACHES in settings.py). Otherwise a write in one worker
+would not invalidate the reports cached by the others, so caching is
+disabled.
+"""
+from datetime import date, datetime, timedelta
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .versioning import bump_version, get_versions, versions_are_shared
+
+ORDERS = 'orders'
+ADJUSTMENTS = 'adjustments'
+
+# Entries are never deleted, a bump just makes the reports use new keys
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+
+KEY_PREFIX = 'posapp:report:'
+
+
+def _as_day(moment):
+    if isinstance(moment, datetime):
+        return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+    return moment
+
+
+def _day_tag(kind, day):
+    return f'report:{kind}:{day.isoformat()}'
+
+
+def _month_tag(kind, day):
+    return f'report:{kind}:{day:%Y-%m}'
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def window_tags(kinds, start, end):
+    """
+    Version counters a report over a range depends on
+
+    Whole months are covered by their month counter, the days at either end
+    by their day counters.
+    """
+    start, end = _as_day(start), _as_day(end)
+    tags = []
+    day = start
+    while day <= end:
+        month_end = _next_month(day) - timedelta(days=1)
+        if day.day == 1 and month_end <= end:
+            tags.extend(_month_tag(kind, day) for kind in kinds)
+            day = month_end + timedelta(days=1)
+        else:
+            tags.extend(_day_tag(kind, day) for kind in kinds)
+            day += timedelta(days=1)
+    return tags
+
+
+def mark_changed(kind, *moments):
+    """
+    Invalidate the reports covering the given moments, once the current
+    transaction commits
+
+    Args:
+        kind: ORDERS or ADJUSTMENTS
+        moments: created_at of the rows written
+    """
+    tags = set()
+    for moment in moments:
+        if moment is None:
+            continue
+        day = _as_day(moment)
+        tags.update((_day_tag(kind, day), _month_tag(kind, day)))
+    if tags:
+        transaction.on_commit(lambda: bump_version(*tags))
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def cached_report(name, start, end, kinds, build, **scope):
+    """
+    A report payload from the cache, built and stored if missing
+
+    Args:
+        name: Report name
+        start, end: Range the report covers (dates or datetimes)
+        kinds: Kinds of data the report reads, e.g. (ORDERS, ADJUSTMENTS)
+        build: Callable returning the payload as plain data
+        scope: Anything else the payload depends on, e.g. the user's role
+
+    Returns:
+        The payload
+    """
+    if not versions_are_shared():
+        return build()
+    versions = get_versions(*window_tags(kinds, start, end))
+    parts = json.dumps([name, start, end, scope, versions], default=_json_value, sort_keys=True)
+    key = KEY_PREFIX + hashlib.sha1(parts.encode()).hexdigest()
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, REPORT_CACHE_TIMEOUT)
+    return payload
@@ -0,0 +1,39 @@
+from django.conf import settings
+
+ARCHIVE_MODELS = {'archivedorder', 'archivedorderitem', 'archivedpaymenttransaction'}
+
+
+class ArchiveRouter:
+    """
+    Route the order archive tables to POS_ARCHIVE_DATABASE.
+
+    With the default configuration the archive lives in the main database and
+    this router is a no-op.
+    """
+
+    def _archive_database(self):
+        return getattr(settings, 'POS_ARCHIVE_DATABASE', 'default')
+
+    def _is_archive(self, model):
+        return model._meta.app_label == 'posapp' and model._meta.model_name in ARCHIVE_MODELS
+
+    def db_for_read(self, model, **hints):
+        if self._is_archive(model):
+            return self._archive_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if self._is_archive(model):
+            return self._archive_database()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Archive relations are kept without database constraints
+        if self._is_archive(obj1) or self._is_archive(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'posapp' and model_name in ARCHIVE_MODELS:
+            return db == self._archive_database()
+        return None
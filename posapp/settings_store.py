@@ -0,0 +1,185 @@
+"""
+Typed access to the key/value Setting rows.
+
+Every view used to read settings with its own queries: a get or a create per
+missing key, and an update_or_create (two queries) per key on save. Here the
+whole table, which holds a few dozen rows, is loaded once, missing keys are
+inserted with their defaults in a single bulk_create, and each value is
+parsed to its type in SCHEMA. The parsed values are kept until the
+'settings' version counter changes (bumped by save() and by Setting saves
+and deletes elsewhere, e.g. the admin; see signals.py).
+
+When the cache is not shared between workers a bump made by another worker
+is invisible here, so the values are also reloaded every MAX_AGE seconds.
+"""
+from decimal import Decimal, InvalidOperation
+import threading
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Setting
+from .versioning import bump_version, get_version, versions_are_shared
+
+TEXT = 'text'
+DECIMAL = 'decimal'
+BOOL = 'bool'
+
+# Key: (type, default as stored, description)
+SCHEMA = {
+    'business_name': (TEXT, '', 'Your business name'),
+    'business_address': (TEXT, '', 'Full business address'),
+    'business_phone': (TEXT, '', 'Contact phone number'),
+    'business_email': (TEXT, '', 'Contact email address'),
+    'business_website': (TEXT, '', 'Business website URL'),
+    'business_tagline': (TEXT, '', 'Your business tagline or slogan'),
+    'currency_symbol': (TEXT, '', 'Currency symbol (e.g., $, €, £)'),
+    'currency_position': (TEXT, '', 'Currency symbol position (before or after the amount)'),
+    'tax_rate': (DECIMAL, '0', 'Tax rate (%) applied by the order API'),
+    'tax_rate_card': (DECIMAL, '5.0', 'Tax rate (%) for card payments'),
+    'tax_rate_cash': (DECIMAL, '15.0', 'Tax rate (%) for cash payments'),
+    'default_service_charge': (DECIMAL, '5.0', 'Default service charge (%) for Dine In orders'),
+    'enable_tax': (BOOL, 'False', 'Enable Tax'),
+    'receipt_header': (TEXT, '', 'Text to show at the top of receipts'),
+    'receipt_footer': (TEXT, '', 'Text to show at the bottom of receipts'),
+    'receipt_show_logo': (BOOL, 'False', 'Show business logo on receipts'),
+    'receipt_show_cashier': (BOOL, 'False', 'Show cashier name on receipts'),
+    'receipt_paper_size': (TEXT, '', 'Receipt Paper Size'),
+    'receipt_custom_css': (TEXT, '', 'Receipt Custom Css'),
+    'theme_color': (TEXT, 'default', 'Select a color theme for the application'),
+    'reorder_lead_days': (DECIMAL, '2', 'Days between ordering stock and receiving it'),
+    'reorder_cover_days': (DECIMAL, '7', 'Days of sales a stock order should cover'),
+}
+
+# Seconds the values are trusted when other workers' changes cannot be seen
+MAX_AGE = 30
+
+_lock = threading.Lock()
+# (version, loaded at, {key: parsed value})
+_values = (None, 0, {})
+
+
+def _spec(key):
+    return SCHEMA.get(key, (TEXT, '', key.replace('_', ' ').title()))
+
+
+def parse(key, raw):
+    """
+    A stored setting value as its schema type
+
+    Empty or malformed numbers fall back to the key's default.
+    """
+    kind, default, _ = _spec(key)
+    if kind == DECIMAL:
+        try:
+            return Decimal(raw or default)
+        except InvalidOperation:
+            return Decimal(default)
+    if kind == BOOL:
+        return raw == 'True'
+    return raw if raw is not None else default
+
+
+def serialize(key, value):
+    """A value as stored in Setting.setting_value"""
+    if _spec(key)[0] == BOOL:
+        return 'True' if value and value != 'False' else 'False'
+    return '' if value is None else str(value)
+
+
+def ensure_defaults(keys=None):
+    """
+    Insert the settings that do not exist yet with their defaults
+
+    Args:
+        keys: Keys to check, all of SCHEMA by default
+
+    Returns:
+        Number of settings created
+    """
+    keys = list(SCHEMA if keys is None else keys)
+    existing = set(Setting.objects.filter(setting_key__in=keys).values_list('setting_key', flat=True))
+    missing = [
+        Setting(setting_key=key, setting_value=_spec(key)[1], setting_description=_spec(key)[2])
+        for key in keys if key not in existing
+    ]
+    if missing:
+        # Another worker may be inserting the same defaults. No version bump:
+        # a worker that has not seen these rows reads the same defaults
+        Setting.objects.bulk_create(missing, ignore_conflicts=True)
+    return len(missing)
+
+
+def _load():
+    rows = dict(Setting.objects.values_list('setting_key', 'setting_value'))
+    if any(key not in rows for key in SCHEMA):
+        ensure_defaults()
+        rows = dict(Setting.objects.values_list('setting_key', 'setting_value'))
+    return {key: parse(key, raw) for key, raw in rows.items()}
+
+
+def _current_values():
+    global _values
+    version = get_version('settings')
+    values = _values
+    fresh = values[0] == version
+    if fresh and not versions_are_shared():
+        fresh = time.monotonic() - values[1] < MAX_AGE
+    if fresh:
+        return values[2]
+    with _lock:
+        # Another thread may have reloaded them meanwhile
+        if _values is not values and _values[0] == version:
+            return _values[2]
+        _values = (version, time.monotonic(), _load())
+        return _values[2]
+
+
+def get_values(keys):
+    """
+    Typed values of the given settings
+
+    Keys missing from the database (and from SCHEMA) read as their default.
+
+    Returns:
+        Dict of key to value
+    """
+    values = _current_values()
+    return {key: values[key] if key in values else parse(key, None) for key in keys}
+
+
+def get_value(key):
+    """Typed value of a single setting"""
+    return get_values([key])[key]
+
+
+def save(data):
+    """
+    Store settings, in one query per kind of change
+
+    Args:
+        data: Dict of key to value, e.g. a settings form's cleaned_data
+
+    Returns:
+        Number of settings created or changed
+    """
+    stored = {key: serialize(key, value) for key, value in data.items()}
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {s.setting_key: s for s in Setting.objects.select_for_update().filter(setting_key__in=stored)}
+        changed = []
+        for key, setting in existing.items():
+            if setting.setting_value != stored[key]:
+                setting.setting_value = stored[key]
+                setting.updated_at = now
+                changed.append(setting)
+        created = [
+            Setting(setting_key=key, setting_value=value, setting_description=_spec(key)[2])
+            for key, value in stored.items() if key not in existing
+        ]
+        Setting.objects.bulk_update(changed, ['setting_value', 'updated_at'])
+        Setting.objects.bulk_create(created, ignore_conflicts=True)
+        if changed or created:
+            transaction.on_commit(lambda: bump_version('settings'))
+    return len(changed) + len(created)
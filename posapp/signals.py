@@ -1,9 +1,13 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import m2m_changed, post_init, post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, UserRole, Order, OrderItem, AuditLog, EndDay
-import random
-import string
+from .models import (
+    UserProfile, UserRole, Order, OrderItem, EndDay, Product, Category, Discount, Setting,
+    BillAdjustment, AdvanceAdjustment,
+)
+from .versioning import bump_version
+from django.db import transaction
+from . import audit, customers, kitchen, numbering, order_search, pending_orders, report_cache, stock_alerts, tables
 from django.utils import timezone
 
 # Create a user profile when a new user is created
@@ -42,41 +46,194 @@ def generate_order_number(sender, instance, **kwargs):
     
     # Generate reference number if it doesn't exist
     if not instance.reference_number:
-        # Generate a unique reference number with format PB + 4 digits
-        while True:
-            # Generate random 4-digit number
-            random_digits = ''.join(random.choices(string.digits, k=4))
-            reference_number = f'PB{random_digits}'
-            
-            # Check if the reference number already exists
-            if not Order.objects.filter(reference_number=reference_number).exists():
-                instance.reference_number = reference_number
-                break
+        # Unique reference number with format PB + 4 digits, checked against archived orders too
+        instance.reference_number = numbering.new_references()[0]
     
     # Only set the persistent order number if it doesn't exist yet
     if not instance.order_number:
-        # Generate the persistent unique order number (never resets)
-        # Get count of existing orders and increment by 1
-        order_count = Order.objects.count() + 1
-        # Format as simple numeric order number
-        instance.order_number = f'{order_count:05d}'
+        # The persistent unique order number (never resets), from a sequence
+        # because archiving takes orders out of the hot table
+        instance.order_number = numbering.next_order_numbers()[0]
+
+# Keep the normalized name the order search matches in step with customer_name
+@receiver(pre_save, sender=Order)
+def normalize_search_name(sender, instance, **kwargs):
+    instance.search_name = order_search.normalize_name(instance.customer_name)
+
+# Audit log
+# Fields whose changes are logged; saves that change none of them, like the
+# last_login update on every login, are not logged at all
+AUDITED_FIELDS = {
+    User: ('username', 'email', 'first_name', 'last_name', 'password', 'is_active', 'is_staff', 'is_superuser'),
+    Order: ('order_status', 'payment_status', 'payment_method', 'order_type', 'discount_id',
+            'discount_amount', 'tax_amount', 'total_amount'),
+    OrderItem: ('quantity', 'unit_price'),
+    Product: ('name', 'price', 'stock_quantity', 'is_available', 'is_archived', 'running_item', 'category_id'),
+    Discount: ('name', 'code', 'type', 'value', 'is_active', 'start_date', 'end_date'),
+}
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Order)
+@receiver(post_init, sender=OrderItem)
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=Discount)
+def remember_audited_fields(sender, instance, **kwargs):
+    audit.track(instance, AUDITED_FIELDS[sender])
+
+def _item_description(item):
+    product_field = OrderItem._meta.get_field('product')
+    # Avoid a query just for the log message
+    product = item.product.name if product_field.is_cached(item) else f'product #{item.product_id}'
+    return f'{item.quantity} x {product}'
 
-# Log user activity
 @receiver(post_save, sender=User)
-def log_user_activity(sender, instance, created, **kwargs):
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Discount)
+def log_saved(sender, instance, created, **kwargs):
+    entity = sender.__name__
     if created:
-        AuditLog.objects.create(
-            user=None,  # System activity
-            action='User Created',
-            entity='User',
-            entity_id=instance.id,
-            details=f'User {instance.username} was created'
-        )
+        if sender is OrderItem:
+            audit.record('Order Item Added', 'Order', instance.order_id, _item_description(instance))
+        else:
+            audit.record(f'{entity} Created', entity, instance.pk, f'{entity} {instance} was created')
+    else:
+        changes = audit.changed_fields(instance)
+        if not changes:
+            return
+        details = audit.describe_changes(changes)
+        if sender is OrderItem:
+            audit.record('Order Item Updated', 'Order', instance.order_id, f'{_item_description(instance)}: {details}')
+        elif sender is Product and set(changes) == {'stock_quantity'}:
+            audit.record('Stock Changed', entity, instance.pk, f'{instance}: {details}')
+        else:
+            audit.record(f'{entity} Updated', entity, instance.pk, f'{entity} {instance}: {details}')
+    # Later saves of the same instance are compared against what was just saved
+    audit.track(instance, AUDITED_FIELDS[sender])
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Discount)
+def log_deleted(sender, instance, **kwargs):
+    if sender is OrderItem:
+        audit.record('Order Item Removed', 'Order', instance.order_id, _item_description(instance))
+    else:
+        audit.record(f'{sender.__name__} Deleted', sender.__name__, instance.pk, f'{sender.__name__} {instance} was deleted')
+
+# Low stock alerts (posapp.stock_alerts), raised by the save that changes the
+# stock. The stock before is the value tracked for the audit log, which
+# log_saved resets after the save, so the change is read before it.
+@receiver(pre_save, sender=Product)
+def remember_stock_change(sender, instance, **kwargs):
+    change = audit.changed_fields(instance).get('stock_quantity') if instance.pk else None
+    instance._stock_change = None
+    if change:
+        try:
+            # Views assign the posted string
+            before, after = int(change[0]), int(change[1])
+        except (TypeError, ValueError):
+            return
+        if before != after:
+            instance._stock_change = (before, after)
+
+@receiver(post_save, sender=Product)
+def raise_stock_alerts(sender, instance, **kwargs):
+    change = getattr(instance, '_stock_change', None)
+    if change and not instance.running_item:
+        stock_alerts.stock_changed([(instance.pk, int(instance.reorder_threshold or 0), *change)])
+
+# Bump list data versions so cached list fragments are revalidated
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderItem)
+@receiver(post_save, sender=EndDay)
+def bump_orders_version(sender, **kwargs):
+    # After commit, so a request reading in between cannot cache the old rows
+    # under the new version
+    transaction.on_commit(lambda: bump_version('orders'))
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def bump_catalog_versions(sender, **kwargs):
+    # Product rows show the category name and category cards count products
+    transaction.on_commit(lambda: bump_version('products', 'categories'))
+
+# Rebuild the compiled discount table (posapp.discounts)
+@receiver([post_save, post_delete], sender=Discount)
+@receiver(m2m_changed, sender=Discount.products.through)
+@receiver(m2m_changed, sender=Discount.categories.through)
+def bump_discounts_version(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(lambda: bump_version('discounts'))
+
+# Reload the parsed settings (posapp.settings_store); its own saves bump too
+@receiver([post_save, post_delete], sender=Setting)
+def bump_settings_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version('settings'))
+
+# Invalidate cached reports covering the day of the changed row
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_order_reports(sender, instance, **kwargs):
+    report_cache.mark_changed(report_cache.ORDERS, instance.created_at)
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_order_item_reports(sender, instance, **kwargs):
+    if OrderItem.order.is_cached(instance):
+        created_at = instance.order.created_at
     else:
-        AuditLog.objects.create(
-            user=None,  # System activity
-            action='User Updated',
-            entity='User',
-            entity_id=instance.id,
-            details=f'User {instance.username} was updated'
-        ) 
\ No newline at end of file
+        # None when the order itself is being deleted, which covers it
+        created_at = Order.objects.filter(pk=instance.order_id).values_list('created_at', flat=True).first()
+    report_cache.mark_changed(report_cache.ORDERS, created_at)
+
+@receiver([post_save, post_delete], sender=BillAdjustment)
+@receiver([post_save, post_delete], sender=AdvanceAdjustment)
+def invalidate_adjustment_reports(sender, instance, **kwargs):
+    report_cache.mark_changed(report_cache.ADJUSTMENTS, instance.created_at)
+
+# Keep kitchen display tickets in line with their orders
+@receiver(post_save, sender=Order)
+def refresh_kitchen_ticket(sender, instance, **kwargs):
+    kitchen.schedule_refresh(instance.pk)
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def refresh_kitchen_ticket_items(sender, instance, **kwargs):
+    kitchen.schedule_refresh(instance.order_id)
+
+@receiver(post_delete, sender=Order)
+def remove_kitchen_ticket(sender, instance, **kwargs):
+    # The ticket goes with the order; tell screens the queue changed
+    transaction.on_commit(lambda: bump_version('kitchen'))
+
+# Seat and free tables as orders are placed, completed or cancelled
+@receiver(post_save, sender=Order)
+def update_table_occupancy(sender, instance, **kwargs):
+    tables.sync_order(instance)
+
+@receiver(post_delete, sender=Order)
+def free_table(sender, instance, **kwargs):
+    # The table's current_order was cleared by SET_NULL
+    transaction.on_commit(lambda: bump_version('tables'))
+
+# Keep each user's pending order count in step with their orders
+@receiver(post_init, sender=Order)
+def remember_pending_owner(sender, instance, **kwargs):
+    pending_orders.track(instance)
+
+@receiver(post_save, sender=Order)
+def update_pending_count(sender, instance, created, **kwargs):
+    pending_orders.order_saved(instance, created)
+
+@receiver(post_delete, sender=Order)
+def remove_from_pending_count(sender, instance, **kwargs):
+    pending_orders.order_deleted(instance)
+
+# Keep each customer's visit count and lifetime spend in step with their orders
+@receiver(post_init, sender=Order)
+def remember_customer_share(sender, instance, **kwargs):
+    customers.track(instance)
+
+@receiver(post_save, sender=Order)
+def update_customer_aggregates(sender, instance, created, **kwargs):
+    customers.order_saved(instance, created)
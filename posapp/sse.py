@@ -0,0 +1,75 @@
+"""
+Server-sent event feeds that push changes to open screens.
+
+A feed is a function taking the id of the last event a client received and
+returning (message, event_id) for whatever changed since, with message None
+when nothing did. The event id must describe the client's state well enough
+to compute that delta, since a reconnecting EventSource sends it back in
+Last-Event-ID.
+
+Under ASGI (posproject/asgi.py) the response streams, checking the feed
+every POLL_INTERVAL seconds. Under WSGI, where a stream would hold a worker
+for as long as the screen is open, the response carries the pending changes
+and ends; the browser reconnects after RETRY milliseconds, which turns the
+same protocol into a short poll.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+# Seconds between checks for changes while a stream is open
+POLL_INTERVAL = 1
+# Seconds of silence after which a comment is sent to keep proxies from
+# closing the connection
+KEEPALIVE = 15
+# Streams are closed after this many seconds and the browser reconnects;
+# Django 4.2 does not notice clients that went away mid-stream
+MAX_AGE = 300
+# Milliseconds the browser waits before reconnecting
+RETRY = 3000
+
+
+def message(event, event_id, data):
+    """One SSE message carrying data as JSON"""
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def _stream(feed, event_id):
+    yield f'retry: {RETRY}\n\n'
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < MAX_AGE:
+        text, event_id = await sync_to_async(feed)(event_id)
+        if text:
+            yield text
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= KEEPALIVE:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def feed_response(request, feed):
+    """
+    Response serving a feed to the user of an async view
+
+    Returns:
+        A text/event-stream response, or a 403 for anonymous users
+    """
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return HttpResponse(status=403)
+
+    event_id = request.headers.get('Last-Event-ID')
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_stream(feed, event_id), content_type='text/event-stream')
+    else:
+        text, _ = await sync_to_async(feed)(event_id)
+        response = HttpResponse(f'retry: {RETRY}\n\n{text or ""}', content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,72 @@
+// Behaviour shared by every page (posapp/base.html): alert dismissal and
+// the collapsible sidebar
+
+// Auto dismiss alerts after 5 seconds
+document.addEventListener('DOMContentLoaded', function() {
+    const alerts = document.querySelectorAll('.alert');
+    alerts.forEach(alert => {
+        setTimeout(() => {
+            const closeButton = alert.querySelector('.btn-close');
+            if (closeButton) {
+                closeButton.click();
+            }
+        }, 5000);
+    });
+
+    // Sidebar toggle functionality
+    const toggleSidebar = document.getElementById('toggleSidebar');
+    const sidebar = document.getElementById('sidebar');
+    const mainContent = document.getElementById('mainContent');
+    const sidebarOverlay = document.getElementById('sidebarOverlay');
+
+    // Make sidebar collapsed by default
+    if (localStorage.getItem('sidebarExpanded') !== 'true') {
+        localStorage.setItem('sidebarExpanded', 'false');
+    }
+
+    // Apply saved state (should be collapsed by default now)
+    const sidebarState = localStorage.getItem('sidebarExpanded');
+    if (sidebarState === 'true') {
+        sidebar.classList.add('expanded');
+        mainContent.classList.add('contracted');
+    }
+
+    // Toggle sidebar only when clicking the hamburger icon
+    toggleSidebar.addEventListener('click', function(event) {
+        event.stopPropagation();
+        sidebar.classList.toggle('expanded');
+        mainContent.classList.toggle('contracted');
+        // Save state to localStorage
+        localStorage.setItem('sidebarExpanded', sidebar.classList.contains('expanded'));
+    });
+
+    // Disable expanding sidebar when clicking on it
+    // Only hamburger should control expansion
+
+    // Close sidebar when clicking overlay on mobile
+    if (sidebarOverlay) {
+        sidebarOverlay.addEventListener('click', function() {
+            sidebar.classList.remove('expanded');
+            localStorage.setItem('sidebarExpanded', 'false');
+        });
+    }
+
+    // Handle responsiveness
+    function handleResize() {
+        const width = window.innerWidth;
+
+        if (width < 576) {
+            // Mobile: always start with sidebar closed
+            if (sidebar.classList.contains('expanded') && !localStorage.getItem('sidebarManuallyExpanded')) {
+                sidebar.classList.remove('expanded');
+                mainContent.classList.remove('contracted');
+            }
+        }
+    }
+
+    // Initial check
+    handleResize();
+
+    // Listen for window resize
+    window.addEventListener('resize', handleResize);
+});
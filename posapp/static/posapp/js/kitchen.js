@@ -0,0 +1,121 @@
+// Kitchen display screen.
+//
+// Keeps the ticket queue in sync through the kitchen feed (server-sent
+// events). Each 'tickets' message either resets the queue or carries the
+// tickets that changed and the ids of those that were completed or
+// cancelled. EventSource reconnects by itself and sends the last event id,
+// from which the server works out what this screen still needs.
+(function(window, document) {
+    'use strict';
+
+    const config = window.KITCHEN_CONFIG;
+    const tickets = {};
+
+    const queue = document.getElementById('kitchen-queue');
+    const empty = document.getElementById('kitchen-empty');
+    const status = document.getElementById('kitchen-status');
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text == null ? '' : String(text);
+        return div.innerHTML;
+    }
+
+    function elapsed(orderedAt) {
+        const minutes = Math.max(0, Math.floor((Date.now() - new Date(orderedAt).getTime()) / 60000));
+        return minutes + ' min';
+    }
+
+    function renderTicket(ticket) {
+        const items = ticket.items.map(item =>
+            '<li class="list-group-item kitchen-item' + (item.bumped ? ' bumped' : '') + '" data-item-id="' + item.id + '"' +
+            ' data-bumped="' + item.bumped + '">' +
+            '<strong>' + item.quantity + ' &times;</strong> ' + escapeHtml(item.product) +
+            (item.notes ? '<div class="small text-muted">' + escapeHtml(item.notes) + '</div>' : '') +
+            '</li>'
+        ).join('');
+        const where = ticket.table_number ? 'Table ' + escapeHtml(ticket.table_number) : escapeHtml(ticket.order_type);
+
+        const card = document.createElement('div');
+        card.className = 'card shadow kitchen-ticket' + (ticket.is_ready ? ' is-ready' : '');
+        card.dataset.orderId = ticket.order_id;
+        card.innerHTML =
+            '<div class="card-header py-2">' +
+            '<span class="font-weight-bold">#' + escapeHtml(ticket.number || ticket.reference_number) + ' &middot; ' + where + '</span>' +
+            '<span class="small text-muted" data-ordered-at="' + escapeHtml(ticket.ordered_at) + '">' + elapsed(ticket.ordered_at) + '</span>' +
+            '</div>' +
+            (ticket.customer_name ? '<div class="px-3 pt-2 small">' + escapeHtml(ticket.customer_name) + '</div>' : '') +
+            '<ul class="list-group list-group-flush">' + items + '</ul>' +
+            (ticket.notes ? '<div class="px-3 py-2 small text-danger">' + escapeHtml(ticket.notes) + '</div>' : '') +
+            '<div class="card-footer py-2 text-end">' +
+            '<button type="button" class="btn btn-sm ' + (ticket.is_ready ? 'btn-outline-secondary' : 'btn-success') + ' kitchen-bump-all"' +
+            ' data-bumped="' + ticket.is_ready + '">' + (ticket.is_ready ? 'Recall' : 'Bump') + '</button>' +
+            '</div>';
+        return card;
+    }
+
+    function render() {
+        const sorted = Object.values(tickets).sort((a, b) => a.ordered_at.localeCompare(b.ordered_at));
+        queue.replaceChildren.apply(queue, sorted.map(renderTicket));
+        empty.classList.toggle('d-none', sorted.length > 0);
+    }
+
+    function applyChanges(data) {
+        if (data.reset) {
+            Object.keys(tickets).forEach(orderId => { delete tickets[orderId]; });
+        }
+        data.tickets.forEach(ticket => { tickets[ticket.order_id] = ticket; });
+        data.removed.forEach(orderId => { delete tickets[orderId]; });
+        render();
+    }
+
+    function setStatus(text, className) {
+        status.textContent = text;
+        status.className = 'badge ' + className;
+    }
+
+    function bump(orderId, itemId, bumped) {
+        const body = { bumped: bumped };
+        if (itemId) {
+            body.item_id = itemId;
+        }
+        fetch(config.bumpUrl.replace('/0/', '/' + orderId + '/'), {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': config.csrfToken },
+            body: JSON.stringify(body)
+        }).then(response => response.json()).then(data => {
+            // Show the change now; the feed confirms it with the same revision
+            if (data.status === 'success') {
+                tickets[data.ticket.order_id] = data.ticket;
+                render();
+            }
+        }).catch(error => console.warn('Bump failed:', error));
+    }
+
+    queue.addEventListener('click', event => {
+        const card = event.target.closest('.kitchen-ticket');
+        if (!card) {
+            return;
+        }
+        const item = event.target.closest('.kitchen-item');
+        const button = event.target.closest('.kitchen-bump-all');
+        if (item) {
+            bump(card.dataset.orderId, item.dataset.itemId, item.dataset.bumped !== 'true');
+        } else if (button) {
+            bump(card.dataset.orderId, null, button.dataset.bumped !== 'true');
+        }
+    });
+
+    const source = new EventSource(config.feedUrl);
+    source.addEventListener('tickets', event => applyChanges(JSON.parse(event.data)));
+    source.addEventListener('open', () => setStatus('Live', 'bg-success'));
+    // Closed streams are reopened after the retry delay the server sends
+    source.addEventListener('error', () => setStatus('Reconnecting...', 'bg-warning'));
+
+    setInterval(() => {
+        document.querySelectorAll('[data-ordered-at]').forEach(span => {
+            span.textContent = elapsed(span.dataset.orderedAt);
+        });
+    }, 30000);
+})(window, document);
@@ -0,0 +1,243 @@
+// Offline order queue for the POS screen.
+//
+// When an order cannot reach the server, pos.js stores it here in IndexedDB
+// under its client_uuid. Queued orders are sent to the sync API in batches
+// whenever the browser comes back online (and on a timer, since the 'online'
+// event only reports the network interface, not the server). The server
+// reports orders it already has as duplicates, so a batch that was sent but
+// whose answer got lost is simply sent again.
+//
+// Events dispatched on document:
+//   posoffline:change  - detail.pending is the number of queued orders
+//   posoffline:synced  - detail has created, duplicates, rejected and
+//                        conflicts (stock shortfalls) from the last sync
+(function(window, document) {
+    'use strict';
+
+    const DB_NAME = 'posapp-offline';
+    const DB_VERSION = 1;
+    const STORE = 'orders';
+    const SYNC_URL = '/api/orders/sync/';
+    // Must not exceed ingest.MAX_BATCH_ORDERS on the server
+    const SYNC_BATCH_SIZE = 50;
+    const SYNC_INTERVAL = 30000;
+    const DISCOUNTS_KEY = 'posapp-offline-discounts';
+
+    let dbPromise = null;
+    let syncing = null;
+
+    function isSupported() {
+        return 'indexedDB' in window && 'fetch' in window;
+    }
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const store = request.result.createObjectStore(STORE, { keyPath: 'client_uuid' });
+                    store.createIndex('queued_at', 'queued_at');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => {
+                    dbPromise = null;
+                    reject(request.error);
+                };
+            });
+        }
+        return dbPromise;
+    }
+
+    // Run fn(store) in a transaction; resolves with fn's request result once
+    // the transaction has committed
+    function withStore(mode, fn) {
+        return openDb().then(db => new Promise((resolve, reject) => {
+            const tx = db.transaction(STORE, mode);
+            const request = fn(tx.objectStore(STORE));
+            tx.oncomplete = () => resolve(request ? request.result : undefined);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        }));
+    }
+
+    function emit(name, detail) {
+        document.dispatchEvent(new CustomEvent(name, { detail: detail }));
+    }
+
+    function pendingCount() {
+        return withStore('readonly', store => store.count());
+    }
+
+    function emitChange() {
+        return pendingCount().then(pending => {
+            emit('posoffline:change', { pending: pending });
+            return pending;
+        });
+    }
+
+    function enqueueOrder(order) {
+        const entry = {
+            client_uuid: order.client_uuid,
+            order: order,
+            queued_at: Date.now()
+        };
+        return withStore('readwrite', store => store.put(entry)).then(emitChange);
+    }
+
+    function queuedOrders() {
+        return withStore('readonly', store => store.index('queued_at').getAll());
+    }
+
+    function removeQueued(clientUuids) {
+        return withStore('readwrite', store => {
+            clientUuids.forEach(clientUuid => store.delete(clientUuid));
+            return null;
+        });
+    }
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        if (match) {
+            return decodeURIComponent(match[1]);
+        }
+        return window.POS_CONFIG ? POS_CONFIG.csrfToken : '';
+    }
+
+    function postBatch(entries) {
+        return fetch(SYNC_URL, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken()
+            },
+            body: JSON.stringify({ orders: entries.map(entry => entry.order) })
+        }).then(response => {
+            // An expired session answers with the login page; keep the queue
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!response.ok || contentType.indexOf('application/json') === -1) {
+                throw new Error('Sync failed with status ' + response.status);
+            }
+            return response.json();
+        });
+    }
+
+    function syncQueued() {
+        const summary = { created: 0, duplicates: 0, rejected: [], conflicts: [] };
+
+        function syncFrom(entries, start) {
+            if (start >= entries.length) {
+                return Promise.resolve(summary);
+            }
+            const batch = entries.slice(start, start + SYNC_BATCH_SIZE);
+            const byUuid = {};
+            batch.forEach(entry => { byUuid[entry.client_uuid] = entry; });
+
+            return postBatch(batch).then(response => {
+                const done = [];
+                response.results.forEach(result => {
+                    if (result.status === 'created') {
+                        summary.created += 1;
+                    } else if (result.status === 'duplicate') {
+                        summary.duplicates += 1;
+                    } else {
+                        // Resending will not help; hand it to the cashier
+                        summary.rejected.push({ order: byUuid[result.client_uuid], message: result.message });
+                    }
+                    (result.conflicts || []).forEach(conflict => {
+                        summary.conflicts.push(Object.assign({ reference_number: result.reference_number }, conflict));
+                    });
+                    if (result.client_uuid) {
+                        done.push(result.client_uuid);
+                    }
+                });
+                return removeQueued(done);
+            }).then(() => syncFrom(entries, start + SYNC_BATCH_SIZE));
+        }
+
+        return queuedOrders().then(entries => syncFrom(entries, 0));
+    }
+
+    function sync() {
+        if (!isSupported()) {
+            return Promise.resolve(null);
+        }
+        if (syncing) {
+            return syncing;
+        }
+        syncing = syncQueued()
+            .then(summary => {
+                if (summary.created || summary.duplicates || summary.rejected.length) {
+                    emit('posoffline:synced', summary);
+                }
+                return summary;
+            })
+            .catch(error => {
+                // Still offline or the server is unreachable; try again later
+                console.warn('Offline order sync failed:', error);
+                return null;
+            })
+            .then(summary => {
+                syncing = null;
+                return emitChange().then(() => summary);
+            });
+        return syncing;
+    }
+
+    // Discount codes validated while online, so the same codes can still be
+    // applied offline
+    function rememberDiscount(discount) {
+        try {
+            const discounts = JSON.parse(localStorage.getItem(DISCOUNTS_KEY) || '{}');
+            discounts[discount.code] = discount;
+            localStorage.setItem(DISCOUNTS_KEY, JSON.stringify(discounts));
+        } catch (e) {
+            console.warn('Could not remember discount code:', e);
+        }
+    }
+
+    function cachedDiscount(code) {
+        let discount = null;
+        try {
+            discount = JSON.parse(localStorage.getItem(DISCOUNTS_KEY) || '{}')[code] || null;
+        } catch (e) {
+            discount = null;
+        }
+        if (!discount) {
+            return { valid: false, message: 'Discount codes cannot be checked while offline' };
+        }
+        if ((discount.product_ids || []).length || (discount.category_ids || []).length) {
+            // The amount depends on the items, which only the server can work out
+            return { valid: false, message: 'This discount code cannot be applied while offline' };
+        }
+        const today = new Date().toISOString().slice(0, 10);
+        if ((discount.start_date && discount.start_date > today) || (discount.end_date && discount.end_date < today)) {
+            return { valid: false, message: 'This discount code is not valid at this time' };
+        }
+        return { valid: true, discount: discount };
+    }
+
+    function start(serviceWorkerUrl) {
+        if (serviceWorkerUrl && 'serviceWorker' in navigator) {
+            navigator.serviceWorker.register(serviceWorkerUrl).catch(error => {
+                console.warn('Service worker registration failed:', error);
+            });
+        }
+        if (!isSupported()) {
+            return;
+        }
+        window.addEventListener('online', sync);
+        setInterval(sync, SYNC_INTERVAL);
+        sync();
+    }
+
+    window.PosOffline = {
+        isSupported: isSupported,
+        enqueueOrder: enqueueOrder,
+        pendingCount: pendingCount,
+        sync: sync,
+        rememberDiscount: rememberDiscount,
+        cachedDiscount: cachedDiscount,
+        start: start
+    };
+})(window, document);
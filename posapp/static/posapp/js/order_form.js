@@ -0,0 +1,1118 @@
+$(document).ready(function() {
+    // Store initial order ID to track if we're editing
+    const orderId = ORDER_FORM_CONFIG.orderId;
+    const isEditable = ORDER_FORM_CONFIG.isEditable;
+    let hasUnsavedChanges = ORDER_FORM_CONFIG.hasUnsavedChanges;
+    
+    // Store all changes to be sent on form submission, starting from any
+    // existing changes provided by the server
+    let itemChanges = Object.assign({}, ORDER_FORM_CONFIG.itemChanges);
+    
+    // Keep track of product stocks
+    let productStocks = {};
+    
+    // Track highest quantity reached for each item to properly handle stock
+    let itemMaxQuantities = {};
+    
+    // Handle order type change
+    $('#id_order_type').change(function() {
+        const orderType = $(this).val();
+        if (orderType === 'Dine In') {
+            $('#dineInSection').show();
+            $('#deliveryChargesSection').hide();
+            $('#deliveryAddressSection').hide();
+            $('#delivery-charges-row').hide();
+            $('#service-charge-row').show();
+            $('#service_charge_percent').prop('disabled', false);
+            $('#serviceChargeBadge').removeClass('d-none');
+        } else if (orderType === 'Delivery') {
+            $('#dineInSection').hide();
+            $('#deliveryChargesSection').show();
+            $('#deliveryAddressSection').show();
+            $('#delivery-charges-row').show();
+            $('#service-charge-row').hide();
+            $('#service_charge_percent').prop('disabled', true);
+            $('#serviceChargeBadge').addClass('d-none');
+        }
+        updateOrderTotals();
+    });
+    
+    // Handle delivery charges change
+    $('#id_delivery_charges').on('input', function() {
+        updateOrderTotals();
+        markAsUnsaved();
+    });
+    
+    // Also handle service charge direct input
+    $('#service_charge_percent').on('change input', function() {
+        const serviceChargePercent = parseFloat($(this).val()) || 0;
+        // Ensure it's properly set in the DOM
+        $('#service-charge-percent-display').text(serviceChargePercent.toFixed(1));
+        updateOrderTotals();
+        markAsUnsaved();
+    });
+    
+    // Service charge increment/decrement buttons
+    $('.increase-service-charge').on('click', function() {
+        let currentVal = parseFloat($('#service_charge_percent').val()) || 0;
+        // Increment by 0.5 and limit to 100
+        currentVal = Math.min(100, currentVal + 0.5);
+        $('#service_charge_percent').val(currentVal.toFixed(1));
+        updateOrderTotals();
+        markAsUnsaved();
+    });
+    
+    $('.decrease-service-charge').on('click', function() {
+        let currentVal = parseFloat($('#service_charge_percent').val()) || 0;
+        // Decrement by 0.5 but not below 0
+        currentVal = Math.max(0, currentVal - 0.5);
+        $('#service_charge_percent').val(currentVal.toFixed(1));
+        updateOrderTotals();
+        markAsUnsaved();
+    });
+    
+    // Handle table number change
+    $('#id_table_number').on('change input', function() {
+        markAsUnsaved();
+    });
+    
+    // Fetch initial stock quantities for all products
+    function fetchProductStocks() {
+        // Use AJAX to get current stock quantities for all products
+        $.ajax({
+            url: '/api/products/stock/',
+            type: 'GET',
+            dataType: 'json',
+            success: function(response) {
+                if (response.success && response.products) {
+                    response.products.forEach(product => {
+                        productStocks[product.id] = {
+                            stock_quantity: product.stock_quantity,
+                            running_item: product.running_item,
+                            is_available: product.is_available
+                        };
+                    });
+                    console.log("Product stocks loaded successfully");
+                } else {
+                    console.error("Error in product stock response:", response.message);
+                    showNotification("Could not load product stock information", "warning");
+                }
+            },
+            error: function(xhr, status, error) {
+                console.error("Error fetching product stocks:", error);
+                showNotification("Could not load product stock information", "warning");
+            }
+        });
+    }
+    
+    // Initialize the product stocks
+    fetchProductStocks();
+    
+    // Add product IDs to all increase buttons for existing items
+    $('#orderItemsTable tr[data-item-id]').each(function() {
+        const itemId = $(this).data('item-id');
+        if (itemId && !itemId.toString().startsWith('temp-')) {
+            const productId = $(this).find('td:first').data('product-id');
+            if (productId) {
+                $(this).find('.increase-item').data('product-id', productId);
+            }
+        }
+    });
+    
+    // Function to show notification alerts
+    function showNotification(message, type = 'info') {
+        // Create alert element
+        const alertDiv = $('<div class="alert alert-' + type + ' alert-dismissible fade show mt-3" role="alert">')
+            .text(message)
+            .append('<button type="button" class="close" data-dismiss="alert" aria-label="Close"><span aria-hidden="true">&times;</span></button>');
+        
+        // Add to the top of the card body
+        $('.card-body:first').prepend(alertDiv);
+        
+        // Auto dismiss after 3 seconds
+        setTimeout(function() {
+            alertDiv.alert('close');
+        }, 3000);
+    }
+    
+    // Function to mark the form as having unsaved changes
+    function markAsUnsaved() {
+        hasUnsavedChanges = true;
+        $('#unsavedChangesAlert').removeClass('d-none');
+    }
+    
+    // Update order totals based on current items and changes
+    function updateOrderTotals() {
+        // Calculate subtotal
+        let subtotal = 0;
+        
+        // Get all normal and temporary items
+        const $allItems = $('#orderItemsTable tbody tr:not(.table-danger)');
+        
+        // Calculate subtotal from all visible items
+        $allItems.each(function() {
+            const price = parseFloat($(this).find('.item-price').data('price'));
+            let quantity = 0;
+            
+            // Check if this is a normal item or a temporary item
+            const $quantityEl = $(this).find('.item-quantity, .temp-item-quantity');
+            if ($quantityEl.length) {
+                quantity = parseInt($quantityEl.text());
+            }
+            
+            if (!isNaN(price) && !isNaN(quantity)) {
+                subtotal += price * quantity;
+            }
+        });
+        
+        // Update subtotal display
+        $('#order-subtotal').text('Rs.' + subtotal.toFixed(2));
+        
+        // Calculate discount
+        let discountAmount = 0;
+        const discountType = $('#hidden_discount_type').val();
+        const discountValue = parseFloat($('#hidden_discount_value').val()) || 0;
+        
+        if (discountType === 'percentage') {
+            discountAmount = subtotal * (discountValue / 100);
+        } else {
+            discountAmount = discountValue;
+        }
+        
+        // Update discount display
+        $('#order-discount').text('-Rs.' + discountAmount.toFixed(2));
+        
+        // Calculate tax
+        const taxableAmount = subtotal - discountAmount;
+        const taxRate = parseFloat($('#tax-rate').text()) || 5.0; // Default to 5% if not specified
+        const taxAmount = taxableAmount * (taxRate / 100);
+        
+        // Update tax display
+        $('#order-tax').text('Rs.' + taxAmount.toFixed(2));
+        
+        // Calculate service charge for Dine In orders
+        let serviceChargeAmount = 0;
+        if ($('#id_order_type').val() === 'Dine In') {
+            const serviceChargePercent = parseFloat($('#service_charge_percent').val()) || 0;
+            serviceChargeAmount = subtotal * (serviceChargePercent / 100);
+            
+            // Update service charge display
+            $('#order-service-charge').text('Rs.' + serviceChargeAmount.toFixed(2));
+            $('#service-charge-percent-display').text(serviceChargePercent.toFixed(1));
+            
+            // Update hidden field
+            $('#hidden_service_charge_amount').val(serviceChargeAmount.toFixed(2));
+            
+            // Update service charge badge
+            $('#serviceChargeBadge').removeClass('d-none');
+            $('#serviceChargeText').text(serviceChargePercent.toFixed(1) + '%');
+        } else {
+            // Hide service charge for non-Dine In orders
+            $('#serviceChargeBadge').addClass('d-none');
+        }
+        
+        // Get delivery charges
+        const deliveryCharges = parseFloat($('#id_delivery_charges').val()) || 0;
+        $('#order-delivery-charges').text('Rs.' + deliveryCharges.toFixed(2));
+        
+        // Calculate total
+        const total = taxableAmount + taxAmount + serviceChargeAmount + deliveryCharges;
+        $('#order-total').text('Rs.' + total.toFixed(2));
+        
+        // Also update the summary badge
+        $('#summary-total').text('Rs.' + total.toFixed(2));
+        
+        // Update hidden fields
+        $('#hidden_discount_amount').val(discountAmount.toFixed(2));
+        
+        // Update text in the Discount card badge if discountAmount > 0
+        if (discountAmount > 0) {
+            $('#discountBadge').removeClass('d-none').text(`${discountType === 'percentage' ? discountValue + '%' : 'Rs.' + discountValue.toFixed(2)}`);
+        } else {
+            $('#discountBadge').addClass('d-none');
+        }
+        
+        // Update the count of items in order items badge
+        $('#itemCountBadge').text($allItems.length + ' item(s)');
+    }
+    
+    // Handle increasing item quantity
+    $(document).on('click', '.increase-item, .temp-increase-item', function() {
+        // Prevent duplicate trigger
+        if ($(this).data('processing')) return;
+        $(this).data('processing', true);
+        
+        const $tr = $(this).closest('tr');
+        const productId = $(this).data('product-id');
+        const itemId = $tr.data('item-id');
+        const isTemp = $(this).hasClass('temp-increase-item');
+        const quantitySpan = isTemp ? $tr.find('.temp-item-quantity') : $('#quantity-' + itemId);
+        const currentQty = parseInt(quantitySpan.text().trim());
+        const originalQty = isTemp ? 0 : parseInt(quantitySpan.data('original'));
+        
+        // Initialize max quantity tracking for this item if not already
+        if (!itemMaxQuantities[itemId]) {
+            itemMaxQuantities[itemId] = originalQty;
+        }
+        
+        // Check stock availability
+        const productStock = productStocks[productId];
+        
+        if (productStock) {
+            // Calculate how many net new items we need from stock
+            const maxQty = itemMaxQuantities[itemId];
+            const wouldExceedMax = (currentQty + 1) > maxQty;
+            
+            // Check if we can increment:
+            // 1. Running items can always be incremented
+            // 2. If we have stock available, we can increment
+            // 3. If we're below the original quantity, we can increment
+            // 4. If we're at or below our previous max quantity, we can increment (already reserved that stock)
+            const canIncrement = productStock.running_item || 
+                               (productStock.stock_quantity > 0 && wouldExceedMax) || 
+                               (currentQty < originalQty) ||
+                               (!wouldExceedMax);
+            
+            if (canIncrement) {
+                // Increment quantity
+                const newQty = currentQty + 1;
+                quantitySpan.text(newQty);
+                
+                // Update UI for existing items
+                if (!isTemp) {
+                    if (newQty !== originalQty) {
+                        quantitySpan.addClass('text-danger fw-bold');
+                        if (quantitySpan.find('small').length === 0) {
+                            quantitySpan.append('<small class="text-muted d-block" style="font-size: 10px;">was ' + originalQty + '</small>');
+                        }
+                        $tr.addClass('table-warning');
+                        
+                        // Update changes tracking
+                        itemChanges[itemId] = {
+                            quantity: newQty,
+                            originalQuantity: originalQty,
+                            delete: false
+                        };
+                    } else {
+                        quantitySpan.removeClass('text-danger fw-bold');
+                        quantitySpan.find('small').remove();
+                        $tr.removeClass('table-warning');
+                        delete itemChanges[itemId];
+                    }
+                } else {
+                    // For temporary items, update the subtotal directly
+                    const price = parseFloat($tr.find('.item-price').data('price'));
+                    $tr.find('.item-subtotal').text('Rs.' + (price * newQty).toFixed(2));
+                }
+                
+                // Update stock cache if not running item and we're using new stock
+                if (!productStock.running_item && wouldExceedMax) {
+                    productStock.stock_quantity--;
+                    // Update the max quantity we've reached
+                    itemMaxQuantities[itemId] = newQty;
+                }
+        
+                // Update totals
+                updateOrderTotals();
+                markAsUnsaved();
+            } else {
+                showNotification("Cannot add more. Stock limit reached.", "warning");
+            }
+        } else {
+            // Fallback to API check if no local data
+            $.ajax({
+                url: '/api/products/' + productId + '/check-stock/',
+                type: 'GET',
+                success: function(response) {
+                    if (response.success) {
+                        // Cache the response
+                        productStocks[productId] = {
+                            stock_quantity: response.available_stock,
+                            running_item: response.running_item,
+                            is_available: response.available
+                        };
+                        
+                        // Try incrementing again now that we have stock data
+                        $(this).data('processing', false).trigger('click');
+                    } else {
+                        showNotification("Cannot add more. Stock limit reached.", "warning");
+                    }
+                },
+                error: function() {
+                    showNotification("Error checking stock availability", "error");
+                },
+                context: this  // Preserve the 'this' context for the trigger call
+            });
+        }
+        
+        // Release lock after a short delay
+        setTimeout(() => {
+            $(this).data('processing', false);
+        }, 200);
+    });
+    
+    $(document).on('click', '.decrease-item, .temp-decrease-item', function() {
+        // Prevent duplicate trigger
+        if ($(this).data('processing')) return;
+        $(this).data('processing', true);
+        
+        const $tr = $(this).closest('tr');
+        const productId = $(this).data('product-id');
+        const itemId = $tr.data('item-id');
+        const isTemp = $(this).hasClass('temp-decrease-item');
+        const quantitySpan = isTemp ? $tr.find('.temp-item-quantity') : $('#quantity-' + itemId);
+        const currentQty = parseInt(quantitySpan.text().trim());
+        const originalQty = isTemp ? 0 : parseInt(quantitySpan.data('original'));
+        
+        if (currentQty > 1) {
+            // Decrease quantity
+            const newQty = currentQty - 1;
+            quantitySpan.text(newQty);
+            
+            // Update UI for existing items
+            if (!isTemp) {
+                if (newQty !== originalQty) {
+                    quantitySpan.addClass('text-danger fw-bold');
+                    if (quantitySpan.find('small').length === 0) {
+                        quantitySpan.append('<small class="text-muted d-block" style="font-size: 10px;">was ' + originalQty + '</small>');
+                    }
+                    $tr.addClass('table-warning');
+                    
+                    // Update changes tracking
+                    itemChanges[itemId] = {
+                        quantity: newQty,
+                        originalQuantity: originalQty,
+                        delete: false
+                    };
+                } else {
+                    quantitySpan.removeClass('text-danger fw-bold');
+                    quantitySpan.find('small').remove();
+                    $tr.removeClass('table-warning');
+                    delete itemChanges[itemId];
+                }
+            } else {
+                // For temporary items, update the subtotal directly
+                const price = parseFloat($tr.find('.item-price').data('price'));
+                $tr.find('.item-subtotal').text('Rs.' + (price * newQty).toFixed(2));
+            }
+            
+            // Check max quantity
+            const maxQty = itemMaxQuantities[itemId] || originalQty;
+            
+            // Only return stock if we're decreasing from the current max and above original quantity
+            if (productId && productStocks[productId] && !productStocks[productId].running_item) {
+                if (currentQty === maxQty && currentQty > originalQty) {
+                    productStocks[productId].stock_quantity++;
+                    // Update the max quantity we've reached
+                    itemMaxQuantities[itemId] = newQty;
+                }
+            }
+            
+            // Update totals
+            updateOrderTotals();
+            markAsUnsaved();
+        }
+        
+        // Release lock after a short delay
+        setTimeout(() => {
+            $(this).data('processing', false);
+        }, 200);
+    });
+    
+    // Handle delete button click
+    $(document).on('click', '.delete-item', function() {
+        const itemId = $(this).data('item-id');
+        const $tr = $('#orderItemsTable tr[data-item-id="' + itemId + '"]');
+        const productName = $tr.find('td:first').text().trim();
+        
+        // Show confirmation dialog
+        if (confirm(`Are you sure you want to remove "${productName}" from this order?`)) {
+            // Mark the item as to be deleted
+            $tr.addClass('table-danger text-decoration-line-through');
+            $tr.find('button').attr('disabled', true);
+            $tr.find('.restore-item').attr('disabled', false);
+            
+            // Add to changes list
+            const originalQuantity = parseInt($tr.find('.item-quantity').data('original'));
+            itemChanges[itemId] = {
+                delete: true,
+                originalQuantity: originalQuantity
+            };
+            
+            // Update totals and mark changes
+            updateOrderTotals();
+            markAsUnsaved();
+            
+            // Optionally hide the row for better UX
+            $tr.hide('slow');
+        }
+    });
+    
+    // Handle restoring deleted items
+    $(document).on('click', '.restore-item', function() {
+        const itemId = $(this).data('item-id');
+        const $tr = $('#orderItemsTable tr[data-item-id="' + itemId + '"]');
+        const originalQuantity = parseInt($tr.find('.item-quantity').data('original'));
+        
+        // Unmark deleted items
+        $tr.removeClass('table-danger text-decoration-line-through');
+        $tr.find('button').attr('disabled', false);
+        $tr.find('.item-quantity').removeClass('text-danger')
+           .text(originalQuantity)
+           .removeClass('text-danger fw-bold')
+           .find('small').remove();
+        
+        // Remove from changes if it's back to original state
+        delete itemChanges[itemId];
+        
+        // Update totals and mark changes
+        updateOrderTotals();
+        markAsUnsaved();
+    });
+    
+    // Handle temporary item interactions
+    // $(document).on('click', '.temp-increase-item', function() {
+    //    const $tr = $(this).closest('tr');
+    //    const qtySpan = $tr.find('.temp-item-quantity');
+    //    const currentQty = parseInt(qtySpan.text());
+    //    const productId = $(this).data('product-id');
+    //    
+    //    // Check if we have stock data locally first
+    //    const productStock = productStocks[productId];
+    //    
+    //    if (productStock) {
+    //        // Use cached stock information
+    //        if (productStock.running_item || productStock.stock_quantity > 0) {
+    //            // Increment quantity and update display
+    //            const newQty = currentQty + 1;
+    //            qtySpan.text(newQty);
+    //            
+    //            // Update subtotal
+    //            const price = parseFloat($tr.find('.item-price').data('price'));
+    //            $tr.find('.item-subtotal').text('Rs.' + (price * newQty).toFixed(2));
+    //            
+    //            // Update local stock cache if not a running item
+    //            if (!productStock.running_item) {
+    //                productStock.stock_quantity--;
+    //            }
+    //            
+    //            // Update totals and mark as unsaved
+    //            updateOrderTotals();
+    //            markAsUnsaved();
+    //        } else {
+    //            showNotification("Cannot add more. Stock limit reached.", "warning");
+    //        }
+    //    } else {
+    //        // Use server check if no local data
+    //        $.ajax({
+    //            url: '/api/products/' + productId + '/check-stock/',
+    //            type: 'GET',
+    //            success: function(response) {
+    //                if (response.success) {
+    //                    if (response.running_item || response.available_stock > 0) {
+    //                        const newQty = currentQty + 1;
+    //                        qtySpan.text(newQty);
+    //                        
+    //                        // Update subtotal
+    //                        const price = parseFloat($tr.find('.item-price').data('price'));
+    //                        $tr.find('.item-subtotal').text('Rs.' + (price * newQty).toFixed(2));
+    //                        
+    //                        // Cache the stock info
+    //                        productStocks[productId] = {
+    //                            stock_quantity: response.available_stock - 1, // Subtract 1 for the item we just added
+    //                            running_item: response.running_item,
+    //                            is_available: response.available
+    //                        };
+    //                        
+    //                        updateOrderTotals();
+    //                        markAsUnsaved();
+    //                    } else {
+    //                        showNotification("Cannot add more. Stock limit reached.", "warning");
+    //                    }
+    //                } else {
+    //                    showNotification(response.message || "Could not check stock availability", "warning");
+    //                }
+    //            },
+    //            error: function() {
+    //                showNotification("Error checking stock availability", "error");
+    //            }
+    //        });
+    //    }
+    //});
+    //
+    //$(document).on('click', '.temp-decrease-item', function() {
+    //    const $tr = $(this).closest('tr');
+    //    const qtySpan = $tr.find('.temp-item-quantity');
+    //    const currentQty = parseInt(qtySpan.text());
+    //    const productId = $(this).data('product-id');
+    //    
+    //    if (currentQty > 1) {
+    //        const newQty = currentQty - 1;
+    //        qtySpan.text(newQty);
+    //        
+    //        // Update subtotal
+    //        const price = parseFloat($tr.find('.item-price').data('price'));
+    //        $tr.find('.item-subtotal').text('Rs.' + (price * newQty).toFixed(2));
+    //        
+    //        // Update stock cache if not running item
+    //        if (productId && productStocks[productId] && !productStocks[productId].running_item) {
+    //            productStocks[productId].stock_quantity++;
+    //        }
+    //        
+    //        updateOrderTotals();
+    //        markAsUnsaved();
+    //    }
+    //});
+    
+    $(document).on('click', '.temp-delete-item', function() {
+        const $tr = $(this).closest('tr');
+        const productName = $tr.find('td:first').text().trim();
+        
+        // Show confirmation dialog
+        if (confirm(`Are you sure you want to remove "${productName}" from this order?`)) {
+            $tr.remove();
+            updateOrderTotals();
+            markAsUnsaved();
+            
+            // If no items left, show the no items row
+            if ($('#orderItemsTable tbody tr').length === 0) {
+                $('#orderItemsTable tbody').append('<tr id="noItemsRow"><td colspan="5" class="text-center">No items added yet</td></tr>');
+            }
+        }
+    });
+    
+    // Handle form submission - add hidden inputs for item changes
+    $('#orderForm').on('submit', function(e) {
+        // Add hidden inputs for all tracked changes
+        for (const [itemId, change] of Object.entries(itemChanges)) {
+            if (change.delete) {
+                $('<input>').attr({
+                    type: 'hidden',
+                    name: `item_changes[${itemId}][delete]`,
+                    value: 'true'
+                }).appendTo('#orderForm');
+            } else {
+                $('<input>').attr({
+                    type: 'hidden',
+                    name: `item_changes[${itemId}][quantity]`,
+                    value: change.quantity
+                }).appendTo('#orderForm');
+            }
+        }
+        
+        // Update quantities for new items (temp items)
+        $('.new-item').each(function() {
+            const tempId = $(this).data('temp-id');
+            const quantity = parseInt($(this).find('.temp-item-quantity').text());
+            
+            // Update the hidden input value for this item's quantity
+            $(this).find('input[name^="new_items"]').val(JSON.stringify({
+                product_id: $(this).data('product-id'),
+                quantity: quantity
+            }));
+        });
+        
+        // Reset unsaved changes flag to prevent "Leave site?" dialog after submission
+        hasUnsavedChanges = false;
+    });
+    
+    // Add new item handler - now without page refresh
+    $("#addProductBtn").on("click", function() {
+        const productSelect = $("#productSelect");
+        const productId = productSelect.val();
+        const quantity = parseInt($("#productQuantity").val()) || 1;
+        
+        if (productId) {
+            // Get product details from the selected option
+            const productOption = productSelect.find('option:selected');
+            const productName = productOption.text().split(' - ')[0];
+            const productPrice = parseFloat(productOption.text().split('Rs.')[1]);
+            
+            // Check if we have stock data locally first
+            const productStock = productStocks[productId];
+            
+            if (productStock) {
+                // Use cached stock information
+                if (productStock.running_item || productStock.stock_quantity >= quantity) {
+                    // Proceed with adding the item
+                    addItemToOrder(productId, productName, productPrice, quantity, productStock.running_item);
+                } else {
+                    showNotification(`Not enough stock for ${productName}. Only ${productStock.stock_quantity} available.`, "warning");
+                }
+            } else {
+                // Fallback to API check if local data is not available
+                $.ajax({
+                    url: '/api/products/' + productId + '/check-stock/',
+                    type: 'GET',
+                    data: { quantity: quantity },
+                    success: function(response) {
+                        if (response.success) {
+                            if (response.running_item || response.available_stock >= quantity) {
+                                // Proceed with adding the item
+                                addItemToOrder(productId, productName, productPrice, quantity, response.running_item);
+                                
+                                // Update our local cache
+                                productStocks[productId] = {
+                                    stock_quantity: response.available_stock,
+                                    running_item: response.running_item,
+                                    is_available: response.available
+                                };
+                            } else {
+                                showNotification(`Not enough stock for ${productName}. Only ${response.available_stock} available.`, "warning");
+                            }
+                        } else {
+                            showNotification(response.message || "Could not verify stock availability", "warning");
+                        }
+                    },
+                    error: function() {
+                        showNotification("Error checking stock availability", "error");
+                    }
+                });
+            }
+        } else {
+            showNotification("Please select a product", "warning");
+        }
+    });
+    
+    // Adding a frequently bought together suggestion goes through the same
+    // stock checks as picking the product
+    $(document).on('click', '.order-suggestion', function() {
+        $('#productSelect').val($(this).data('product-id'));
+        $('#productQuantity').val(1);
+        $('#addProductBtn').click();
+        $(this).remove();
+    });
+    
+    // Function to add an item to the order after stock check
+    function addItemToOrder(productId, productName, productPrice, quantity, isRunningItem) {
+        // Check if product already exists in the order
+        let existingRow = $('#orderItemsTable tbody tr').filter(function() {
+            return $(this).find('td:first').data('product-id') == productId &&
+                   !$(this).hasClass('table-danger'); // Exclude deleted items
+        }).first();
+            
+        if (existingRow.length) {
+            // Product exists, update quantity instead of adding new row
+            let quantitySpan = existingRow.find('.item-quantity, .temp-item-quantity');
+            let currentQty = parseInt(quantitySpan.text());
+            let newQty = currentQty + quantity;
+            
+            // Update quantity
+            quantitySpan.text(newQty);
+            
+            // Update subtotal
+            let subtotal = productPrice * newQty;
+            existingRow.find('.item-subtotal').text('Rs.' + subtotal.toFixed(2));
+            
+            // If it's an existing item (not temporary), handle original quantity
+            if (quantitySpan.hasClass('item-quantity')) {
+                let originalQty = parseInt(quantitySpan.data('original'));
+                if (newQty !== originalQty) {
+                    quantitySpan.addClass('text-danger fw-bold');
+                    if (quantitySpan.find('small').length === 0) {
+                        quantitySpan.append('<small class="text-muted d-block" style="font-size: 10px;">was ' + originalQty + '</small>');
+                    }
+                    existingRow.addClass('table-warning');
+                    
+                    // Update changes tracking
+                    itemChanges[existingRow.data('item-id')] = {
+                        quantity: newQty,
+                        originalQuantity: originalQty,
+                        delete: false
+                    };
+                }
+            }
+        } else {
+            // Remove "no items" row if present
+            $('#noItemsRow').remove();
+            
+            // Generate a temporary ID for the new item
+            const tempId = 'temp-' + Date.now();
+                
+            // Create the new row HTML
+            let newRow = `
+                <tr class="new-item" data-product-id="${productId}" data-temp-id="${tempId}">
+                    <td data-product-id="${productId}">
+                        ${productName}
+                        <input type="hidden" name="new_items[${tempId}]" value='${JSON.stringify({product_id: productId, quantity: quantity})}'>
+                    </td>
+                    <td class="item-price text-right" data-price="${productPrice}">Rs.${productPrice.toFixed(2)}</td>
+                    <td class="text-center">
+                        <div class="d-flex align-items-center justify-content-center">
+                                <div class="input-group" style="width: 130px;">
+                                <button type="button" class="btn btn-outline-secondary temp-decrease-item" data-product-id="${productId}">
+                                        <i class="fas fa-minus"></i>
+                                    </button>
+                                    <span class="form-control text-center temp-item-quantity">${quantity}</span>
+                                <button type="button" class="btn btn-outline-secondary temp-increase-item" data-product-id="${productId}">
+                                        <i class="fas fa-plus"></i>
+                                    </button>
+                                </div>
+                            </div>
+                        </td>
+                    <td class="item-subtotal text-right">Rs.${(productPrice * quantity).toFixed(2)}</td>
+                    <td class="text-center">
+                        <button type="button" class="btn btn-sm btn-outline-danger temp-delete-item">
+                            <i class="fas fa-trash"></i>
+                            </button>
+                        </td>
+                    </tr>
+                `;
+                
+            // Append the new row to the table
+            $('#orderItemsTable tbody').append(newRow);
+        }
+
+        // If not a running item, update local stock cache
+        if (!isRunningItem && productStocks[productId]) {
+            productStocks[productId].stock_quantity -= quantity;
+        }
+            
+        // Reset the form inputs
+            $("#productSelect").val('');
+            $("#productQuantity").val(1);
+            
+        // Update order totals
+            updateOrderTotals();
+        
+        // Mark form as having unsaved changes
+            markAsUnsaved();
+        }
+    
+    // Setup form field change detection
+    $("#orderForm input, #orderForm textarea, #orderForm select").on("change", function() {
+        markAsUnsaved();
+    });
+    
+    // Warn users about unsaved changes when leaving the page
+    window.addEventListener("beforeunload", function(e) {
+        if (hasUnsavedChanges) {
+            const message = "You have unsaved changes. Are you sure you want to leave?";
+            e.returnValue = message;
+            return message;
+        }
+    });
+    
+    // Initialize totals on page load
+    updateOrderTotals();
+
+    // Add product by code when Enter key is pressed in productCodeInput
+    $('#productCodeInput').on('keypress', function(e) {
+        if (e.which === 13) { // Enter key
+            e.preventDefault(); // Prevent form submission
+            const code = $(this).val().toLowerCase().trim();
+            if (!code) return;
+            let found = false;
+            $('#productSelect option').each(function() {
+                const productCode = ($(this).data('code') || '').toString().toLowerCase();
+                if (productCode && productCode === code) {
+                    $('#productSelect').val($(this).val());
+                    found = true;
+                    return false; // break
+                }
+            });
+            if (found) {
+                $('#addProductBtn').click();
+                $('#productCodeInput').val('');
+            } else {
+                showNotification('No product found with code: ' + code, 'warning');
+            }
+        }
+    });
+
+    function updateOrderTotals() {
+        // Calculate subtotal
+        let subtotal = 0;
+        
+        // Get all normal and temporary items
+        const $allItems = $('#orderItemsTable tbody tr:not(.table-danger)');
+        
+        // Calculate subtotal from all visible items
+        $allItems.each(function() {
+            const price = parseFloat($(this).find('.item-price').data('price'));
+            let quantity = 0;
+            
+            // Check if this is a normal item or a temporary item
+            const $quantityEl = $(this).find('.item-quantity, .temp-item-quantity');
+            if ($quantityEl.length) {
+                quantity = parseInt($quantityEl.text());
+            }
+            
+            if (!isNaN(price) && !isNaN(quantity)) {
+                subtotal += price * quantity;
+            }
+        });
+        
+        // Update subtotal display
+        $('#order-subtotal').text('Rs.' + subtotal.toFixed(2));
+        
+        // Calculate discount
+        let discountAmount = 0;
+        const discountType = $('#hidden_discount_type').val();
+        const discountValue = parseFloat($('#hidden_discount_value').val()) || 0;
+        
+        if (discountType === 'percentage') {
+            discountAmount = subtotal * (discountValue / 100);
+        } else {
+            discountAmount = discountValue;
+        }
+        
+        // Update discount display
+        $('#order-discount').text('-Rs.' + discountAmount.toFixed(2));
+        
+        // Calculate tax
+        const taxableAmount = subtotal - discountAmount;
+        const taxRate = parseFloat($('#tax-rate').text()) || 5.0; // Default to 5% if not specified
+        const taxAmount = taxableAmount * (taxRate / 100);
+        
+        // Update tax display
+        $('#order-tax').text('Rs.' + taxAmount.toFixed(2));
+        
+        // Calculate service charge for Dine In orders
+        let serviceChargeAmount = 0;
+        if ($('#id_order_type').val() === 'Dine In') {
+            const serviceChargePercent = parseFloat($('#service_charge_percent').val()) || 0;
+            serviceChargeAmount = subtotal * (serviceChargePercent / 100);
+            
+            // Update service charge display
+            $('#order-service-charge').text('Rs.' + serviceChargeAmount.toFixed(2));
+            $('#service-charge-percent-display').text(serviceChargePercent.toFixed(1));
+            
+            // Update hidden field
+            $('#hidden_service_charge_amount').val(serviceChargeAmount.toFixed(2));
+            
+            // Update service charge badge
+            $('#serviceChargeBadge').removeClass('d-none');
+            $('#serviceChargeText').text(serviceChargePercent.toFixed(1) + '%');
+        } else {
+            // Hide service charge for non-Dine In orders
+            $('#serviceChargeBadge').addClass('d-none');
+        }
+        
+        // Get delivery charges
+        const deliveryCharges = parseFloat($('#id_delivery_charges').val()) || 0;
+        $('#order-delivery-charges').text('Rs.' + deliveryCharges.toFixed(2));
+        
+        // Calculate total
+        const total = taxableAmount + taxAmount + serviceChargeAmount + deliveryCharges;
+        $('#order-total').text('Rs.' + total.toFixed(2));
+        
+        // Also update the summary badge
+        $('#summary-total').text('Rs.' + total.toFixed(2));
+        
+        // Update hidden fields
+        $('#hidden_discount_amount').val(discountAmount.toFixed(2));
+        
+        // Update text in the Discount card badge if discountAmount > 0
+        if (discountAmount > 0) {
+            $('#discountBadge').removeClass('d-none').text(`${discountType === 'percentage' ? discountValue + '%' : 'Rs.' + discountValue.toFixed(2)}`);
+        } else {
+            $('#discountBadge').addClass('d-none');
+        }
+        
+        // Update the count of items in order items badge
+        $('#itemCountBadge').text($allItems.length + ' item(s)');
+    }
+    
+    // Apply discount code functionality
+    $('#apply-discount-btn').click(function() {
+        const code = $('#discount-code').val().trim();
+        if (!code) {
+            $('#discount-message').html('<div class="alert alert-warning">Please enter a discount code</div>');
+            return;
+        }
+        
+        // Clear previous messages
+        $('#discount-message').empty();
+        
+        // Show loading message
+        $('#discount-message').html('<div class="alert alert-info">Validating discount code...</div>');
+        
+        // Call API to validate discount code
+        $.ajax({
+            url: '/api/discounts/validate/',
+            method: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify({ code: code }),
+            success: function(response) {
+                if (response.valid) {
+                    const discountData = response.discount;
+                    
+                    // Update hidden fields
+                    $('#hidden_discount_code').val(discountData.code);
+                    $('#hidden_discount_type').val(discountData.type.toLowerCase());
+                    $('#hidden_discount_value').val(discountData.value);
+                    $('#hidden_discount_id').val(discountData.id);
+                    
+                    // Show success message
+                    $('#discount-message').html(
+                        `<div class="alert alert-success">
+                            Discount "${discountData.name}" applied successfully!
+                        </div>`
+                    );
+                    
+                    // Show discount details
+                    let displayText = discountData.type.toLowerCase() === 'percentage' ? 
+                        `${discountData.value}% off (${discountData.name})` : 
+                        `Rs.${discountData.value.toFixed(2)} off (${discountData.name})`;
+                    
+                    $('#discount-type-display').text(displayText);
+                    
+                    // Show the current discount section
+                    $('#current-discount').removeClass('d-none');
+                    
+                    // Clear the input field
+                    $('#discount-code').val('');
+                    
+                    // Update totals
+                    updateOrderTotals();
+                    
+                    // Mark form as having unsaved changes
+                    markAsUnsaved();
+                } else {
+                    // Show error message
+                    $('#discount-message').html(`<div class="alert alert-danger">${response.message}</div>`);
+                }
+            },
+            error: function(xhr) {
+                let errorMsg = 'Error validating discount code';
+                if (xhr.responseJSON && xhr.responseJSON.message) {
+                    errorMsg = xhr.responseJSON.message;
+                }
+                
+                // Show error message
+                $('#discount-message').html(`<div class="alert alert-danger">${errorMsg}</div>`);
+            }
+        });
+    });
+    
+    // Apply manual discount
+    $('#apply-manual-discount-btn').click(function() {
+        const discountValue = parseFloat($('#manual-discount-value').val());
+        const selectedType = $('#manual-discount-type').val();
+        
+        // Validate input
+        if (isNaN(discountValue) || discountValue < 0) {
+            $('#manual-discount-message').html('<div class="alert alert-warning">Please enter a valid discount amount</div>');
+            return;
+        }
+        
+        // Clear previous messages
+        $('#manual-discount-message').empty();
+        
+        // For percentage discount, validate it's not over 100%
+        if (selectedType === 'percentage' && discountValue > 100) {
+            $('#manual-discount-message').html('<div class="alert alert-warning">Percentage discount cannot exceed 100%</div>');
+            return;
+        }
+        
+        // Apply the manual discount
+        $('#hidden_discount_code').val('MANUAL');
+        $('#hidden_discount_type').val(selectedType);
+        $('#hidden_discount_value').val(discountValue);
+        $('#hidden_discount_id').val('');
+        
+        // Show success message
+        $('#manual-discount-message').html(
+            `<div class="alert alert-success">
+                Manual discount applied successfully!
+            </div>`
+        );
+        
+        // Show discount details
+        let displayText = selectedType === 'percentage' ? 
+            `${discountValue}% off (Manual)` : 
+            `Rs.${discountValue.toFixed(2)} off (Manual)`;
+        
+        $('#discount-type-display').text(displayText);
+        
+        // Show the current discount section
+        $('#current-discount').removeClass('d-none');
+        
+        // Update totals
+        updateOrderTotals();
+        
+        // Mark form as having unsaved changes
+        markAsUnsaved();
+    });
+    
+    // Remove discount button
+    $(document).on('click', '.remove-discount', function() {
+        // Reset discount values
+        $('#hidden_discount_code').val('');
+        $('#hidden_discount_type').val('fixed');
+        $('#hidden_discount_value').val('0');
+        $('#hidden_discount_amount').val('0');
+        $('#hidden_discount_id').val('');
+        
+        // Clear inputs
+        $('#discount-code').val('');
+        $('#manual-discount-value').val('');
+        
+        // Hide discount display
+        $('#current-discount').addClass('d-none');
+        
+        // Show message
+        $('#discount-message').html(
+            `<div class="alert alert-info">
+                Discount has been removed.
+            </div>`
+        );
+        $('#manual-discount-message').html(
+            `<div class="alert alert-info">
+                Discount has been removed.
+            </div>`
+        );
+        
+        // Update totals
+        updateOrderTotals();
+        
+        // Mark form as having unsaved changes
+        markAsUnsaved();
+    });
+    
+    // Initialize discount tabs
+    const discountTabs = document.getElementById('discountTabs');
+    if (discountTabs) {
+        const tabsInstance = new bootstrap.Tab(discountTabs);
+    }
+    
+    // Initial update of order totals
+    updateOrderTotals();
+
+    // Add a new event handler for the service charge apply button
+    $('#apply-service-charge-btn').click(function() {
+        const serviceChargePercent = parseFloat($('#service_charge_percent').val());
+        
+        // Validate input
+        if (isNaN(serviceChargePercent) || serviceChargePercent < 0) {
+            $('#service-charge-message').html('<div class="alert alert-warning">Please enter a valid service charge percentage</div>');
+            return;
+        }
+        
+        // Clear previous messages
+        $('#service-charge-message').empty();
+        
+        // For percentage discount, validate it's not over 100%
+        if (serviceChargePercent > 100) {
+            $('#service-charge-message').html('<div class="alert alert-warning">Service charge percentage cannot exceed 100%</div>');
+            return;
+        }
+        
+        // Apply the service charge
+        $('#service_charge_percent').val(serviceChargePercent.toFixed(1));
+        
+        // Show success message
+        $('#service-charge-message').html(
+            `<div class="alert alert-success">
+                Service charge updated to ${serviceChargePercent.toFixed(1)}%.
+            </div>`
+        );
+        
+        // Update totals
+        updateOrderTotals();
+        
+        // Mark form as having unsaved changes
+        markAsUnsaved();
+    });
+});
@@ -0,0 +1,1505 @@
+$(document).ready(function() {
+    // Variables for cart functionality
+    let cart = [];
+    let subtotal = 0;
+    let tax = 0;
+    let discount = 0;
+    let discountType = '';
+    let discountId = '';
+    let discountCode = ''; // Add missing discountCode variable
+    let taxRate = parseFloat(POS_CONFIG.taxRate);
+    let timer;
+    let selectedOrderType = 'Dine In';
+    let selectedPaymentMethod = 'Cash'; // Add missing selectedPaymentMethod variable
+    let serviceChargeRate = parseFloat(POS_CONFIG.serviceChargeRate);
+    let serviceChargeThreshold = 1000;
+    let deliveryCharges = 0;
+    // Frequently bought together: {product id: [product ids, best first]}
+    const productSuggestions = JSON.parse(document.getElementById('product-suggestions').textContent);
+    const MAX_SUGGESTIONS = 4;
+    
+    // Display tax rate
+    $('#tax-rate-display').text(taxRate);
+    
+    // Initialize the responsive UI adjustments
+    initResponsiveUI();
+    
+    // Handle window resize events
+    $(window).on('resize', function() {
+        clearTimeout(timer);
+        timer = setTimeout(initResponsiveUI, 250);
+    });
+    
+    // Function to initialize responsive UI adjustments
+    function initResponsiveUI() {
+        const windowWidth = $(window).width();
+        
+        // Adjust product grid columns based on screen size
+        adjustProductGrid(windowWidth);
+        
+        // Adjust cart container height based on screen size
+        adjustCartContainer(windowWidth);
+        
+        // Hide text in buttons on very small screens
+        if (windowWidth < 576) {
+            $('.btn-outline-primary, .btn-outline-success').addClass('btn-sm');
+        } else {
+            $('.btn-outline-primary, .btn-outline-success').removeClass('btn-sm');
+        }
+        
+        // Set sticky behavior for cart on larger screens
+        if (windowWidth >= 992) {
+            const navbarHeight = $('.navbar').outerHeight(true);
+            const headerHeight = $('.d-flex.justify-content-between.align-items-center').outerHeight(true);
+            const topOffset = navbarHeight + headerHeight + 15;
+            
+            // Set top position for sticky cart
+            $('.sticky-lg-top').css('top', topOffset + 'px');
+            
+            // Ensure cart doesn't overflow viewport
+            const viewportHeight = window.innerHeight;
+            const cartCard = $('.col-lg-4 .card');
+            const maxCartHeight = viewportHeight - topOffset - 20;
+            
+            if (cartCard.height() > maxCartHeight) {
+                const cartBody = cartCard.find('.card-body');
+                const cartHeader = cartCard.find('.card-header');
+                const cartTotals = cartCard.find('.cart-totals');
+                
+                const availableHeight = maxCartHeight - cartHeader.outerHeight(true) - cartTotals.outerHeight(true) - 30;
+                $('.cart-container').css('max-height', availableHeight + 'px');
+            }
+        }
+    }
+    
+    // Function to adjust product grid based on screen width
+    function adjustProductGrid(windowWidth) {
+        let columnWidth;
+        
+        if (windowWidth >= 1600) {
+            columnWidth = 'minmax(200px, 1fr)';
+        } else if (windowWidth >= 1200) {
+            columnWidth = 'minmax(170px, 1fr)';
+        } else if (windowWidth >= 992) {
+            columnWidth = 'minmax(160px, 1fr)';
+        } else if (windowWidth >= 768) {
+            columnWidth = 'minmax(150px, 1fr)';
+        } else if (windowWidth >= 576) {
+            columnWidth = 'minmax(140px, 1fr)';
+        } else {
+            columnWidth = 'minmax(130px, 1fr)';
+        }
+        
+        $('.product-grid').css('grid-template-columns', `repeat(auto-fill, ${columnWidth})`);
+    }
+    
+    // Function to adjust cart container height
+    function adjustCartContainer(windowWidth) {
+        let maxCartHeight;
+        
+        if (windowWidth >= 1200) {
+            maxCartHeight = 450;
+        } else if (windowWidth >= 992) {
+            maxCartHeight = 400;
+        } else if (windowWidth >= 768) {
+            maxCartHeight = 350;
+        } else {
+            maxCartHeight = 300;
+        }
+        
+        $('.cart-container').css('max-height', maxCartHeight + 'px');
+    }
+    
+    // Set up CSRF token for all AJAX requests
+    $.ajaxSetup({
+        headers: {
+            'X-CSRFToken': $('input[name="csrfmiddlewaretoken"]').val()
+        }
+    });
+    
+    // Order submissions are retried on network errors and gateway timeouts.
+    // They carry an Idempotency-Key header, so a retry of an order the server
+    // already created gets the original response instead of a duplicate order
+    const ORDER_RETRY_DELAYS = [500, 1000, 2000, 4000];
+    const ORDER_REQUEST_TIMEOUT = 8000;
+    let orderIdempotencyKey = null;
+    
+    // The key doubles as the order's client_uuid, so it must be a UUID
+    function newIdempotencyKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c => {
+            const r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+    
+    function ajaxWithRetry(options, attempt = 0) {
+        return $.ajax($.extend({}, options, {
+            timeout: ORDER_REQUEST_TIMEOUT,
+            error: function(xhr, status, error) {
+                const retryable = xhr.status === 0 || xhr.status === 502 || xhr.status === 503 || xhr.status === 504;
+                if (retryable && attempt < ORDER_RETRY_DELAYS.length) {
+                    setTimeout(() => ajaxWithRetry(options, attempt + 1), ORDER_RETRY_DELAYS[attempt]);
+                } else if (options.error) {
+                    options.error(xhr, status, error);
+                }
+            }
+        }));
+    }
+    
+    // Initialize service charge visibility based on default order type
+    if (selectedOrderType === 'Dine In' && calculateSubtotal() >= 1000) {
+        $('#service-charge-row').show();
+    } else {
+        $('#service-charge-row').hide();
+    }
+    
+    // Initialize service charge info visibility
+    if (selectedOrderType === 'Dine In') {
+        $('#service-charge-info').show();
+    } else {
+        $('#service-charge-info').hide();
+    }
+    
+    // Tax rates from the page's POS_CONFIG
+    const cardTaxRate = parseFloat(POS_CONFIG.cardTaxRate);
+    const standardTaxRate = parseFloat(POS_CONFIG.standardTaxRate);
+    let currentTaxRate = standardTaxRate;  // Default tax rate
+    
+    // Helper function to show alerts
+    function showAlert(message, type = 'info') {
+        // Create toast notification
+        const toast = `
+            <div class="toast align-items-center text-white bg-${type} border-0 mb-2" role="alert" aria-live="assertive" aria-atomic="true">
+                <div class="d-flex">
+                    <div class="toast-body">
+                        ${message}
+                    </div>
+                    <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast" aria-label="Close"></button>
+                </div>
+            </div>
+        `;
+        
+        // Add toast to container
+        const toastContainer = document.querySelector('.toast-container');
+        if (!toastContainer) {
+            // Create toast container if it doesn't exist
+            const container = document.createElement('div');
+            container.className = 'toast-container position-fixed top-0 end-0 p-3';
+            document.body.appendChild(container);
+            container.innerHTML = toast;
+        } else {
+            toastContainer.innerHTML += toast;
+        }
+        
+        // Initialize and show the toast
+        const toastElement = document.querySelector('.toast:last-child');
+        const bsToast = new bootstrap.Toast(toastElement, { delay: 3000 });
+        bsToast.show();
+    }
+    
+    // Initialize product cards - ensure out-of-stock items are properly disabled
+    document.querySelectorAll('.product-card').forEach(productCard => {
+        const isRunning = productCard.dataset.running === 'true';
+        const stockElement = productCard.querySelector('.badge');
+        
+        if (!isRunning && stockElement) {
+            const stockValue = parseInt(stockElement.textContent);
+            if (stockValue <= 0) {
+                // Disable product card for zero stock non-running items
+                productCard.classList.add('disabled-product');
+                productCard.dataset.available = 'false';
+            }
+        }
+    });
+    
+    function updateCartDisplay() {
+        updateCart();
+    }
+    
+    function updateCart() {
+        const cartEl = $('#cart-items');
+        if (cart.length === 0) {
+            cartEl.html(`
+                <div class="empty-cart-message">
+                    <div class="text-center">
+                        <i class="fas fa-shopping-cart fa-3x mb-3 text-muted"></i>
+                        <p class="text-muted">Your cart is empty</p>
+                    </div>
+                </div>
+            `);
+            $('#btn-payment').prop('disabled', true);
+        } else {
+            let cartItems = '';
+            cart.forEach((item, index) => {
+                cartItems += `
+                    <div class="card mb-3 shadow-sm border-0 rounded-3">
+                        <div class="card-body p-3">
+                            <div class="d-flex align-items-center mb-2">
+                                <img src="${item.image}" 
+                                    class="rounded-3 me-3" alt="${item.name}" 
+                                    style="width: 60px; height: 60px; object-fit: cover;"
+                                    onerror="this.src='https://i.imgur.com/pTXpXpF.jpg';">
+                                <div class="flex-grow-1">
+                                    <h6 class="mb-0 fw-bold text-truncate">${item.name}</h6>
+                                    <span class="badge bg-light text-dark border">Rs.${item.price.toFixed(2)}</span>
+                                </div>
+                                <button class="btn btn-sm btn-outline-danger rounded-circle ms-2 btn-remove" data-index="${index}">
+                                    <i class="fas fa-trash"></i>
+                                </button>
+                            </div>
+                            <div class="d-flex justify-content-between align-items-center">
+                                <div class="input-group input-group-sm" style="width: 120px;">
+                                    <button class="btn btn-outline-secondary rounded-start-2 btn-decrease" data-index="${index}">
+                                        <i class="fas fa-minus"></i>
+                                    </button>
+                                    <input type="text" class="form-control text-center border-secondary" value="${item.quantity}" readonly>
+                                    <button class="btn btn-outline-secondary rounded-end-2 btn-increase" data-index="${index}">
+                                        <i class="fas fa-plus"></i>
+                                    </button>
+                                </div>
+                                <div class="fw-bold fs-5 text-primary">Rs.${(item.price * item.quantity).toFixed(2)}</div>
+                            </div>
+                        </div>
+                    </div>
+                `;
+            });
+            cartEl.html(cartItems);
+            $('#btn-payment').prop('disabled', false);
+        }
+        
+        updateTotals();
+        updateSuggestions();
+    }
+    
+    function updateSuggestions() {
+        const inCart = new Set(cart.map(item => String(item.id)));
+        const lists = cart.map(item => productSuggestions[item.id] || []);
+        const found = [];
+        // Each product in the cart gets its best match in before any gets its second
+        for (let rank = 0; found.length < MAX_SUGGESTIONS && lists.some(list => rank < list.length); rank++) {
+            lists.forEach(list => {
+                const id = String(list[rank]);
+                if (rank >= list.length || inCart.has(id) || found.includes(id) || found.length >= MAX_SUGGESTIONS) {
+                    return;
+                }
+                // Only products on the grid that can still be sold
+                const card = document.querySelector(`.product-card[data-id="${id}"]`);
+                if (card && card.dataset.available === 'true') {
+                    found.push(id);
+                }
+            });
+        }
+        
+        const listEl = $('#cart-suggestion-list').empty();
+        found.forEach(id => {
+            const card = $(`.product-card[data-id="${id}"]`);
+            $('<button type="button" class="btn btn-sm btn-outline-primary cart-suggestion"></button>')
+                .attr('data-id', id)
+                .text(`+ ${card.data('name')}`)
+                .appendTo(listEl);
+        });
+        $('#cart-suggestions').toggleClass('d-none', found.length === 0);
+    }
+    
+    // Adding a suggestion works like tapping its product card
+    $(document).on('click', '.cart-suggestion', function() {
+        $(`.product-card[data-id="${$(this).attr('data-id')}"]`).trigger('click');
+    });
+    
+    function updateTotals() {
+        const subtotal = calculateSubtotal();
+        const tax = subtotal * (currentTaxRate / 100);
+        
+        // Calculate discount
+        let discountAmount = 0;
+        if (discountType === 'percentage') {
+            discountAmount = subtotal * (discount / 100);
+        } else {
+            discountAmount = discount;
+        }
+        
+        // Update service charge visibility based on subtotal threshold
+        if (selectedOrderType === 'Dine In' && subtotal >= 1000) {
+            $('#service-charge-row').show();
+        } else {
+            $('#service-charge-row').hide();
+        }
+        
+        // Calculate service charge (only for Dine In with subtotal >= 1000)
+        let serviceChargeAmount = 0;
+        if (selectedOrderType === 'Dine In' && subtotal >= 1000) {
+            // Get the service charge percent from the input field
+            const serviceChargePercent = parseFloat($('#serviceChargePercent').val()) / 100;
+            serviceChargeAmount = subtotal * serviceChargePercent;
+            
+            // Update service charge display
+            $('#summary-service-charge').text('Rs.' + serviceChargeAmount.toFixed(2));
+        }
+        
+        // Include delivery charges and service charges in total
+        const total = subtotal + tax + deliveryCharges + serviceChargeAmount - discountAmount;
+        
+        // Update tax rate display
+        $('#tax-rate-display').text(currentTaxRate);
+        $('#summary-tax-rate-display').text(currentTaxRate);
+        
+        $('#cart-subtotal').text('Rs.' + subtotal.toFixed(2));
+        $('#cart-tax').text('Rs.' + tax.toFixed(2));
+        $('#cart-discount').text('Rs.' + discountAmount.toFixed(2));
+        $('#cart-total').text('Rs.' + total.toFixed(2));
+        
+        // Update payment modal
+        $('#summary-subtotal').text('Rs.' + subtotal.toFixed(2));
+        $('#summary-tax').text('Rs.' + tax.toFixed(2));
+        $('#summary-service-charge').text('Rs.' + serviceChargeAmount.toFixed(2));
+        $('#summary-delivery-charges').text('Rs.' + deliveryCharges.toFixed(2));
+        $('#summary-discount').text('Rs.' + discountAmount.toFixed(2));
+        $('#summary-total').text('Rs.' + total.toFixed(2));
+        
+        // Show/hide discount details based on whether a discount is applied
+        if (discount > 0) {
+            $('#discount-details').removeClass('d-none');
+        } else {
+            $('#discount-details').addClass('d-none');
+        }
+    }
+    
+    function calculateSubtotal() {
+        return cart.reduce((sum, item) => sum + (item.price * item.quantity), 0);
+    }
+    
+    // Add item to cart
+    function addToCart(productId, name, price, image) {
+        // Get the product element
+        const productEl = document.querySelector(`.product-card[data-id="${productId}"]`);
+        const isAvailable = productEl.dataset.available === 'true';
+        const isRunning = productEl.dataset.running === 'true';
+        
+        // Check if product is available
+        if (!isAvailable) {
+            showAlert("This product is not available for ordering.", "danger");
+            return;
+        }
+        
+        // For non-running items, check current stock before proceeding
+        if (!isRunning) {
+            const currentStock = parseInt(productEl.querySelector('.badge').textContent);
+            if (currentStock <= 0) {
+                showAlert("This product is out of stock.", "warning");
+                return;
+            }
+        }
+        
+        // Get the current item in cart if exists
+        const existingItem = cart.find(item => item.id === productId);
+        
+        // If item exists, increment quantity, else add new item
+        if (existingItem) {
+            // For non-running items, check stock before adding
+            if (!isRunning) {
+                const currentStock = parseInt(productEl.querySelector('.badge').textContent);
+                
+                // Check stock availability
+                if (currentStock <= 0) {
+                    showAlert("Cannot add more. Stock limit reached.", "warning");
+                    return;
+                }
+                
+                // Update the stock display in real-time
+                const newStockValue = currentStock - 1;
+                productEl.querySelector('.badge').textContent = newStockValue;
+                
+                // If stock reaches zero, disable the product card
+                if (newStockValue <= 0) {
+                    productEl.classList.add('disabled-product');
+                    productEl.dataset.available = 'false';
+                }
+            }
+            existingItem.quantity++;
+            existingItem.total = existingItem.quantity * existingItem.price;
+        } else {
+            // For non-running items, update stock display immediately
+            if (!isRunning) {
+                const currentStock = parseInt(productEl.querySelector('.badge').textContent);
+                const newStockValue = currentStock - 1;
+                
+                // Update the stock display
+                productEl.querySelector('.badge').textContent = newStockValue;
+                
+                // If stock reaches zero, disable the product card
+                if (newStockValue <= 0) {
+                    productEl.classList.add('disabled-product');
+                    productEl.dataset.available = 'false';
+                }
+            }
+            
+            cart.push({
+                id: productId,
+                name: name,
+                price: parseFloat(price),
+                quantity: 1,
+                total: parseFloat(price),
+                image: image
+            });
+        }
+        
+        updateCartDisplay();
+    }
+    
+    // Event Handlers
+    // Add product to cart
+    $(document).on('click', '.product-card', function() {
+        const productId = $(this).data('id');
+        const productName = $(this).data('name');
+        const productPrice = parseFloat($(this).data('price'));
+        const productImage = $(this).data('image-url');
+        
+        addToCart(productId, productName, productPrice, productImage);
+    });
+    
+    // Increase quantity
+    $(document).on('click', '.btn-increase', function() {
+        const index = $(this).data('index');
+        const item = cart[index];
+        
+        // Get the product element to check stock
+        const productEl = document.querySelector(`.product-card[data-id="${item.id}"]`);
+        const isRunning = productEl.dataset.running === 'true';
+        
+        // For non-running items, check stock before adding more
+        if (!isRunning) {
+            const currentStock = parseInt(productEl.querySelector('.badge').textContent);
+            if (currentStock <= 0) {
+                showAlert("Cannot add more. Stock limit reached.", "warning");
+                return;
+            }
+            
+            // Update the stock display in real-time
+            const newStockValue = currentStock - 1;
+            productEl.querySelector('.badge').textContent = newStockValue;
+            
+            // If stock reaches zero, disable the product card
+            if (newStockValue <= 0) {
+                productEl.classList.add('disabled-product');
+                productEl.dataset.available = 'false';
+            }
+        }
+        
+        // Increment quantity
+        item.quantity += 1;
+        updateCart();
+    });
+    
+    // Function to restore stock when items are removed
+    function restoreStock(productId, quantity) {
+        // Only restore stock for non-running items
+        const productEl = document.querySelector(`.product-card[data-id="${productId}"]`);
+        if (productEl) {
+            const isRunning = productEl.dataset.running === 'true';
+            if (!isRunning) {
+                // Get current stock value
+                const currentStockElement = productEl.querySelector('.badge');
+                const currentStock = parseInt(currentStockElement.textContent);
+                
+                // Update stock display
+                const newStock = currentStock + quantity;
+                currentStockElement.textContent = newStock;
+                
+                // If product was disabled due to zero stock, re-enable it
+                if (currentStock <= 0 && newStock > 0) {
+                    productEl.classList.remove('disabled-product');
+                    productEl.dataset.available = 'true';
+                }
+            }
+        }
+    }
+    
+    // Decrease quantity
+    $(document).on('click', '.btn-decrease', function() {
+        const index = $(this).data('index');
+        const item = cart[index];
+        
+        if (item.quantity > 1) {
+            // Decrease quantity by 1
+            item.quantity -= 1;
+            // Restore 1 stock
+            restoreStock(item.id, 1);
+        } else {
+            // Restore all stock
+            restoreStock(item.id, item.quantity);
+            // Remove item from cart
+            cart.splice(index, 1);
+        }
+        updateCart();
+    });
+    
+    // Remove item
+    $(document).on('click', '.btn-remove', function() {
+        const index = $(this).data('index');
+        const item = cart[index];
+        
+        // Restore all stock for this item
+        restoreStock(item.id, item.quantity);
+        
+        // Remove from cart
+        cart.splice(index, 1);
+        updateCart();
+    });
+    
+    // Clear cart
+    $('#btn-clear').click(function() {
+        if (cart.length > 0 && confirm('Are you sure you want to clear the cart?')) {
+            // Restore stock for all items
+            cart.forEach(item => {
+                restoreStock(item.id, item.quantity);
+            });
+            
+            // Clear cart
+            cart = [];
+            updateCart();
+        }
+    });
+    
+    // Category filter
+    $('.category-btn').click(function() {
+        $('.category-btn').removeClass('active');
+        $(this).addClass('active');
+        
+        const category = $(this).data('category');
+        if (category === 'all') {
+            $('.product-item').show();
+        } else {
+            $('.product-item').hide();
+            $(`.product-item[data-category="${category}"]`).show();
+        }
+    });
+    
+    // Search products
+    $('#product-search').on('input', function() {
+        const searchTerm = $(this).val().toLowerCase();
+        $('.product-item').each(function() {
+            const productName = $(this).find('.card-title').text().toLowerCase();
+            const productCode = $(this).find('.product-card').data('code').toString().toLowerCase();
+            if (productName.includes(searchTerm) || productCode.includes(searchTerm)) {
+                $(this).show();
+            } else {
+                $(this).hide();
+            }
+        });
+    });
+    
+    // Add product by code when Enter key is pressed in search bar
+    $('#product-search').on('keypress', function(e) {
+        if (e.which === 13) { // Enter key
+            const searchTerm = $(this).val().toLowerCase().trim();
+            if (searchTerm) {
+                let foundProduct = false;
+                
+                // Look for exact product code match
+                $('.product-card').each(function() {
+                    const productCode = $(this).data('code').toString().toLowerCase();
+                    if (productCode === searchTerm) {
+                        const productId = $(this).data('id');
+                        const productName = $(this).data('name');
+                        const productPrice = parseFloat($(this).data('price'));
+                        const productImage = $(this).data('image-url');
+                        
+                        // Add to cart
+                        addToCart(productId, productName, productPrice, productImage);
+                        
+                        // Clear search
+                        $('#product-search').val('');
+                        
+                        // Show all products again
+                        $('.product-item').show();
+                        
+                        // Focus search again
+                        $('#product-search').focus();
+                        
+                        foundProduct = true;
+                        return false; // Break the loop
+                    }
+                });
+                
+                if (!foundProduct) {
+                    showAlert("No product found with code: " + searchTerm, "warning");
+                }
+            }
+        }
+    });
+    
+    // Payment Modal
+    $('#btn-payment').click(function() {
+        updateTotals();
+        
+        // For dine-in orders, check if the table is already in use
+        if (selectedOrderType === 'Dine In') {
+            const tableNumber = $('#tableNumber').val();
+            if (tableNumber) {
+                // Check table availability before opening payment modal
+                fetchActiveTables().then(response => {
+                    const activeTables = response.active_tables || [];
+                    
+                    if (activeTables.includes(tableNumber)) {
+                        // Table is already in use, show warning
+                        $('#tableNumber').addClass('is-invalid border-danger');
+                        
+                        // Add invalid feedback if it doesn't exist
+                        if (!$('#tableNumber').next('.invalid-feedback').length) {
+                            $('#tableNumber').after(`<div class="invalid-feedback">This table already has a pending order. Please select a different table.</div>`);
+                        }
+                        
+                        // Open payment modal but scroll to and highlight the table field
+                        $('#paymentModal').modal('show');
+                        setTimeout(() => {
+                            $('#tableNumber').focus();
+                            $('#tableNumberError').removeClass('d-none').text('Table #' + tableNumber + ' already has a pending order. Please select a different table.');
+                        }, 500);
+                    } else {
+                        // Table is available, show payment modal
+                        $('#tableNumber').removeClass('is-invalid border-danger');
+                        $('#tableNumber').next('.invalid-feedback').remove();
+                        $('#paymentModal').modal('show');
+                    }
+                }).catch(error => {
+                    console.error('Error checking table availability:', error);
+                    // If the check fails, still allow opening the payment modal
+                    $('#paymentModal').modal('show');
+                });
+            } else {
+                // No table number specified, show the modal
+                $('#paymentModal').modal('show');
+            }
+        } else {
+            // Not a dine-in order, show the modal without checking
+            $('#paymentModal').modal('show');
+        }
+    });
+    
+    // Select payment method
+    $(document).on('click', '.payment-method', function() {
+        $('.payment-method').removeClass('selected');
+        $(this).addClass('selected');
+        
+        selectedPaymentMethod = $(this).data('method');
+        
+        // Update tax rate based on payment method
+        if (selectedPaymentMethod === 'Card') {
+            currentTaxRate = cardTaxRate;
+        } else {
+            currentTaxRate = standardTaxRate;
+        }
+        
+        // Update totals with new tax rate
+        updateTotals();
+    });
+    
+    // Select order type
+    $(document).on('click', '.order-type', function() {
+        // Add click animation effect
+        $(this).addClass('pulse-effect');
+        setTimeout(() => {
+            $(this).removeClass('pulse-effect');
+        }, 300);
+        
+        $('.order-type').removeClass('selected');
+        $(this).addClass('selected');
+        
+        selectedOrderType = $(this).data('type');
+        
+        // Show/hide delivery options based on selection
+        if (selectedOrderType === 'Delivery') {
+            $('#delivery-options').removeClass('d-none');
+            $('#delivery-charges-row').removeClass('d-none');
+            // Hide table number section for delivery orders
+            $('#table-number-section').addClass('d-none');
+            // Hide service charge for delivery orders
+            $('#service-charge-row').addClass('d-none');
+            // Update delivery charges
+            deliveryCharges = parseFloat($('#deliveryCharges').val()) || 0;
+            // Clear any table number validation errors
+            $('#tableNumber').removeClass('is-invalid');
+            $('#tableNumberError').addClass('d-none');
+        } else {
+            $('#delivery-options').addClass('d-none');
+            $('#delivery-charges-row').addClass('d-none');
+            // Show table number section for dine-in orders
+            $('#table-number-section').removeClass('d-none');
+            deliveryCharges = 0;
+            
+            // For Dine In orders, show service charge and highlight that table number is required
+            if (selectedOrderType === 'Dine In') {
+                // Show service charge for Dine In orders if subtotal is above 1000
+                if (calculateSubtotal() >= 1000) {
+                    $('#service-charge-row').removeClass('d-none');
+                } else {
+                    $('#service-charge-row').addClass('d-none');
+                }
+                
+                // Add visual indication that the field is required
+                $('#tableNumber').attr('placeholder', 'Enter table number (required)');
+                $('#tableNumber').focus();
+            } else {
+                // Hide service charge for Take Away orders
+                $('#service-charge-row').addClass('d-none');
+            }
+        }
+        
+        // Show/hide service charge info based on order type
+        if (selectedOrderType === 'Dine In') {
+            $('#service-charge-info').show();
+        } else {
+            $('#service-charge-info').hide();
+        }
+        
+        // Update totals with delivery charges and service charges
+        updateTotals();
+    });
+    
+    // Update delivery charges when value changes
+    $(document).on('change', '#deliveryCharges', function() {
+        deliveryCharges = parseFloat($(this).val()) || 0;
+        updateTotals();
+    });
+    
+    // Complete payment
+    $('#completePaymentBtn').click(function() {
+        const orderNotes = $('#orderNotes').val();
+        const customerName = $('#customerName').val();
+        const customerPhone = $('#customerPhone').val();
+        const total = parseFloat($('#summary-total').text().replace('Rs.', ''));
+        
+        // Validate table number for Dine In orders
+        if (selectedOrderType === 'Dine In') {
+            const tableNumber = $('#tableNumber').val();
+            if (!tableNumber) {
+                // Show validation error
+                $('#tableNumber').addClass('is-invalid');
+                $('#tableNumberError').removeClass('d-none');
+                $('#tableNumber').focus();
+                return; // Prevent form submission
+            } else {
+                // Clear validation error if previously set
+                $('#tableNumber').removeClass('is-invalid');
+                $('#tableNumberError').addClass('d-none');
+                
+                // Check table availability again before proceeding
+                fetchActiveTables().then(response => {
+                    const activeTables = response.active_tables || [];
+                    
+                    if (activeTables.includes(tableNumber)) {
+                        // Table is already in use, show warning directly in the payment modal
+                        $('#tableNumber').addClass('is-invalid border-danger');
+                        
+                        // Add invalid feedback if it doesn't exist
+                        if (!$('#tableNumber').next('.invalid-feedback').length) {
+                            $('#tableNumber').after(`<div class="invalid-feedback">This table already has a pending order. Please select a different table.</div>`);
+                        }
+                        
+                        // Show error message directly in the payment modal
+                        $('#tableNumberError').removeClass('d-none').text('Table #' + tableNumber + ' already has a pending order. Please select a different table.');
+                        
+                        // Scroll to and focus on the table number field
+                        $('#tableNumber').focus();
+                        return; // Prevent form submission
+                    } else {
+                        // Continue with order processing
+                        processOrder();
+                    }
+                }).catch(error => {
+                    console.error('Error checking table availability:', error);
+                    // If the check fails, continue with order processing
+                    processOrder();
+                });
+                
+                return; // Return here because we're handling the form submission in the promises
+            }
+        }
+        
+        // Validate the delivery address for delivery orders
+        if (selectedOrderType === 'Delivery') {
+            const deliveryAddress = $('#deliveryAddress').val().trim();
+            if (!deliveryAddress) {
+                // Show error for delivery address
+                $('#deliveryAddress').addClass('is-invalid');
+                $('#deliveryAddressError').removeClass('d-none');
+                return;
+            } else {
+                // Clear validation error if previously set
+                $('#deliveryAddress').removeClass('is-invalid');
+                $('#deliveryAddressError').addClass('d-none');
+            }
+        }
+
+        // For non-dine-in orders, process order directly
+        processOrder();
+        
+        // Function to process the order
+        function processOrder() {
+            // Continue with payment processing
+            const subtotal = parseFloat($('#summary-subtotal').text().replace('Rs.', ''));
+            
+            // Create order data - ensure all numeric values are correctly formatted
+            const taxAmount = parseFloat($('#summary-tax').text().replace('Rs.', ''));
+            const discountAmount = parseFloat($('#summary-discount').text().replace('Rs.', ''));
+            const serviceChargeAmount = selectedOrderType === 'Dine In' ? parseFloat($('#summary-service-charge').text().replace('Rs.', '')) : 0;
+            
+            const orderData = {
+                customer_name: customerName,
+                customer_phone: customerPhone,
+                subtotal: subtotal.toFixed(2),
+                tax_amount: taxAmount.toFixed(2),
+                discount_amount: discountAmount.toFixed(2),
+                service_charge_percent: selectedOrderType === 'Dine In' && subtotal >= 1000 ? $('#serviceChargePercent').val() : '0',
+                service_charge_amount: serviceChargeAmount.toFixed(2),
+                total_amount: total.toFixed(2),
+                payment_method: selectedPaymentMethod,
+                payment_status: 'Pending',
+                order_status: 'Pending',
+                notes: orderNotes,
+                discount_code: discountCode,
+                discount_type: discountType,
+                discount_value: discount,
+                discount_id: discountId,
+                // Add a flag to indicate that stock is already updated in UI
+                stock_already_reduced: true,
+                items: cart.map(item => ({
+                    product_id: item.id,
+                    quantity: item.quantity,
+                    unit_price: item.price.toFixed(2),
+                    total_price: (item.price * item.quantity).toFixed(2)
+                })),
+                delivery_charges: deliveryCharges.toFixed(2),
+                order_type: selectedOrderType,
+                delivery_address: selectedOrderType === 'Delivery' ? $('#deliveryAddress').val() : '',
+                table_number: selectedOrderType === 'Dine In' ? $('#tableNumber').val() : ''
+            };
+            
+            function orderSaved(response) {
+                // Close payment modal
+                $('#paymentModal').modal('hide');
+                
+                // Store order number for reference
+                const orderNumber = response.reference_number;
+                const orderNumberDisplay = response.display_number || '0';
+                
+                console.log("DEBUG: Order details received:", response);
+                console.log("DEBUG: Order display number:", orderNumberDisplay);
+
+                // Calculate discount amount for display
+                let discountAmount = 0;
+                if (discountType === 'percentage') {
+                    discountAmount = subtotal * (discount / 100);
+                } else {
+                    discountAmount = discount;
+                }
+                
+                // Calculate tax amount for display
+                const taxAmount = parseFloat(orderData.tax_amount);
+                const total = parseFloat(orderData.total_amount);
+                
+                // Create receipt content - improved to match kitchen_receipt.html format
+                const receiptHTML = `
+                    <div id="receipt-container" class="print-only">
+                        <div class="receipt-preview" style="width: 80mm; padding: 5mm; font-family: 'Arial', 'Helvetica', sans-serif; font-size: 13px; line-height: 1.3; color: #000000;">
+                            <!-- Header -->
+                            <div style="text-align: center; margin-bottom: 8px; color: #000000;">
+                                <h2 style="font-size: 16px; font-weight: bold; margin: 0 0 5px 0; color: #000000;">ORDER #${orderNumberDisplay}</h2>
+                                <p style="margin: 3px 0; font-size: 12px; color: #000000;">Date: ${new Date().toLocaleDateString()}</p>
+                                <p style="margin: 3px 0; font-size: 12px; color: #000000;">Time: ${new Date().toLocaleTimeString()}</p>
+                                <p style="margin: 3px 0; font-size: 12px; color: #000000;">Order Type: <strong style="color: #000000;">${selectedOrderType}</strong></p>
+                                ${selectedOrderType === 'Dine In' && $('#tableNumber').val() ? 
+                                    `<p style="margin: 3px 0; font-size: 14px; color: #000000;"><strong style="color: #000000;">TABLE: ${$('#tableNumber').val()}</strong></p>` : ''}
+                                <h3 style="font-size: 14px; font-weight: bold; margin: 8px 0; text-decoration: underline; color: #000000;">*** KITCHEN COPY ***</h3>
+                            </div>
+                            
+                            <div style="border-top: 1px dashed #000; margin: 8px 0; clear: both;"></div>
+                            
+                            <!-- Order Items -->
+                            <table style="width: 100%; border-collapse: collapse; font-size: 13px; margin: 8px 0; color: #000000;">
+                                <thead>
+                                    <tr>
+                                        <th style="text-align: left; padding: 4px 2px; width: 25%; color: #000000;">QTY</th>
+                                        <th style="text-align: left; padding: 4px 2px; color: #000000;">ITEM</th>
+                                    </tr>
+                                </thead>
+                                <tbody>
+                                    <tr><td colspan="2" style="border-top: 1px dashed #000; margin: 8px 0;"></td></tr>
+                                    ${cart.map(item => `
+                                        <tr>
+                                            <td style="font-weight: bold; padding: 4px 2px; font-size: 15px; color: #000000;">${item.quantity}</td>
+                                            <td style="font-weight: bold; padding: 4px 2px; font-size: 14px; color: #000000;">${item.name}</td>
+                                        </tr>
+                                    `).join('')}
+                                    <tr><td colspan="2" style="border-top: 1px dashed #000; margin: 8px 0;"></td></tr>
+                                </tbody>
+                            </table>
+                            
+                            <!-- Notes if any -->
+                            ${orderNotes ? `
+                                <div style="margin: 8px 0; font-size: 13px; color: #000000;">
+                                    <p style="margin: 3px 0; font-size: 14px; text-decoration: underline; color: #000000;"><strong style="color: #000000;">NOTES:</strong></p>
+                                    <p style="margin: 3px 0; padding: 5px; border: 1px solid #000; color: #000000;"><strong style="color: #000000;">${orderNotes}</strong></p>
+                                </div>
+                                <div style="border-top: 1px dashed #000; margin: 8px 0; clear: both;"></div>
+                            ` : ''}
+                            
+                            <!-- Delivery Address if applicable -->
+                            ${selectedOrderType === 'Delivery' && $('#deliveryAddress').val() ? `
+                                <div style="margin: 8px 0; font-size: 13px; color: #000000;">
+                                    <p style="margin: 3px 0; font-size: 14px; text-decoration: underline; color: #000000;"><strong style="color: #000000;">DELIVERY ADDRESS:</strong></p>
+                                    <p style="margin: 3px 0; padding: 5px; border: 1px solid #000; color: #000000;"><strong style="color: #000000;">${$('#deliveryAddress').val()}</strong></p>
+                                </div>
+                                <div style="border-top: 1px dashed #000; margin: 8px 0; clear: both;"></div>
+                            ` : ''}
+                            
+                            <div style="text-align: center; margin: 8px 0; font-size: 13px; color: #000000;">
+                                <p style="margin: 3px 0; font-size: 15px; font-weight: bold; color: #000000;">*** KITCHEN COPY ***</p>
+                                <p style="margin: 3px 0; color: #000000;">Printed: ${new Date().toLocaleTimeString()}</p>
+                            </div>
+                        </div>
+                    </div>
+                `;
+                
+                // Add the receipt to the body
+                $('body').append(receiptHTML);
+                
+                // Trigger print
+                window.print();
+                
+                // Remove the receipt element after printing
+                setTimeout(() => {
+                    $('#receipt-container').remove();
+                }, 1000);
+                
+                // Show success message with link to orders
+                $('#successModalContent').html(`
+                    <div class="text-center mb-4">
+                        <i class="fas fa-check-circle text-success fa-4x mb-3"></i>
+                        <h4>Processed Successfully!</h4>
+                        <p>The order has been processed successfully.</p>
+                        <p>Order #: <strong>${orderNumberDisplay}</strong></p>
+                        <p>Order Type: <strong>${selectedOrderType}</strong></p>
+                        ${selectedOrderType === 'Dine In' && $('#tableNumber').val() ? 
+                            `<p>Table #: <strong>${$('#tableNumber').val()}</strong></p>` : ''}
+                        <div class="mt-4">
+                            <a href="/orders/" class="btn btn-primary">View in Orders</a>
+                        </div>
+                    </div>
+                `);
+                
+                $('#successModal').modal('show');
+                
+                // Clear cart
+                cart = [];
+                updateCart();
+            }
+            
+            function orderFailed(xhr) {
+                if (xhr.status) {
+                    // The server answered, so the next attempt is a new request
+                    orderIdempotencyKey = null;
+                }
+                
+                // Try to get detailed error message from response
+                let errorMessage = 'There was an error processing the payment. Please try again.';
+                let isTableNumberError = false;
+                
+                try {
+                    const response = JSON.parse(xhr.responseText);
+                    if (response && response.message) {
+                        errorMessage = response.message;
+                        
+                        // Check if this is a table number error
+                        if (errorMessage.includes('Table #') && errorMessage.includes('already has a pending order')) {
+                            isTableNumberError = true;
+                        }
+                    }
+                } catch (e) {
+                    console.error('Could not parse error response:', e);
+                }
+                
+                // If it's a table number error, show it directly in the payment modal
+                if (isTableNumberError) {
+                    // Show the error in the payment modal, focus on table field
+                    $('#tableNumber').addClass('is-invalid border-danger');
+                    $('#tableNumberError').removeClass('d-none').text(errorMessage);
+                    
+                    // If payment modal is closed, reopen it and focus on table number field
+                    if (!$('#paymentModal').hasClass('show')) {
+                        $('#paymentModal').modal('show');
+                        setTimeout(() => {
+                            $('#tableNumber').focus();
+                        }, 500);
+                    } else {
+                        // Just focus on the table number field
+                        $('#tableNumber').focus();
+                    }
+                } else {
+                    // For other errors, show the error modal
+                    // Close payment modal
+                    $('#paymentModal').modal('hide');
+                    
+                    // Show generic error
+                    $('#errorModalContent').html(`
+                        <div class="alert alert-danger">
+                            <i class="fas fa-exclamation-circle me-2"></i>
+                            ${errorMessage}
+                        </div>
+                    `);
+                    
+                    $('#errorModalTitle').text('Order Error');
+                    $('#errorModal').modal('show');
+                }
+            }
+            
+            // Save order to server, reusing the key of an earlier attempt
+            // that never got an answer
+            if (!orderIdempotencyKey) {
+                orderIdempotencyKey = newIdempotencyKey();
+            }
+            // Identifies the order if it has to be queued and synced later
+            orderData.client_uuid = orderIdempotencyKey;
+            
+            ajaxWithRetry({
+                url: '/api/orders/',
+                type: 'POST',
+                headers: {
+                    'Idempotency-Key': orderIdempotencyKey
+                },
+                contentType: 'application/json',
+                data: JSON.stringify(orderData),
+                dataType: 'json',
+                success: function(response) {
+                    console.log('Order saved:', response);
+                    orderIdempotencyKey = null;
+                    orderSaved(response);
+                },
+                error: function(xhr, status, error) {
+                    console.error('Error saving order:', error);
+                    if (!xhr.status && window.PosOffline && PosOffline.isSupported()) {
+                        // No answer after all retries: keep the order on this
+                        // terminal and send it when the connection is back
+                        PosOffline.enqueueOrder(orderData).then(() => {
+                            orderIdempotencyKey = null;
+                            orderSaved({ reference_number: null, display_number: 'OFFLINE' });
+                            showAlert('No connection. The order was saved on this terminal and will be sent automatically.', 'warning');
+                        }).catch(queueError => {
+                            console.error('Could not queue order:', queueError);
+                            orderFailed(xhr);
+                        });
+                        return;
+                    }
+                    orderFailed(xhr);
+                }
+            });
+        }
+    });
+    
+    // Apply a validated discount, or show why the code was refused
+    function applyDiscountResponse(response, offline) {
+        if (response.valid) {
+            const discountData = response.discount;
+            discountCode = discountData.code;
+            discountType = discountData.type.toLowerCase();
+            discount = parseFloat(discountData.value);
+            discountId = discountData.id;  // Store the discount ID
+            const isScoped = (discountData.product_ids || []).length || (discountData.category_ids || []).length;
+            if (isScoped && response.discount_amount !== undefined) {
+                // Only some items are discounted; use the amount the server worked out
+                discountType = 'fixed';
+                discount = parseFloat(response.discount_amount);
+            }
+            if (window.PosOffline && !offline) {
+                PosOffline.rememberDiscount(discountData);
+            }
+            
+            // Show success message
+            $('#discount-message').html(
+                `<div class="alert alert-success">
+                    Discount "${discountData.name}" applied successfully!
+                </div>`
+            );
+            
+            // Show discount details
+            $('#discount-type-display').text(
+                discountType === 'percentage' ? 
+                `${discount}% off (${discountData.name})` : 
+                `Rs.${discount.toFixed(2)} off (${discountData.name})`
+            );
+            
+            // Clear the input field
+            $('#discount-code').val('');
+            
+            // Update totals
+            updateTotals();
+        } else {
+            // Show error message
+            $('#discount-message').html(`<div class="alert alert-danger">${response.message}</div>`);
+            
+            // Reset discount
+            resetDiscount();
+            updateTotals();
+        }
+    }
+    
+    // Apply discount code
+    $('#apply-discount-btn').click(function() {
+        const code = $('#discount-code').val().trim();
+        if (!code) {
+            $('#discount-message').html('<div class="alert alert-warning">Please enter a discount code</div>');
+            return;
+        }
+        
+        // Clear previous messages
+        $('#discount-message').empty();
+        
+        // Show loading message
+        $('#discount-message').html('<div class="alert alert-info">Validating discount code...</div>');
+        
+        // Call API to validate discount code
+        $.ajax({
+            url: '/api/discounts/validate/',
+            method: 'POST',
+            contentType: 'application/json',
+            // The cart lets the server check minimum spend and item rules
+            data: JSON.stringify({
+                code: code,
+                subtotal: calculateSubtotal().toFixed(2),
+                items: cart.map(item => ({ product_id: item.id, total_price: item.total.toFixed(2) }))
+            }),
+            success: function(response) {
+                console.log("Discount API response:", response);
+                applyDiscountResponse(response, false);
+            },
+            error: function(xhr) {
+                console.log("Discount API error:", xhr);
+                
+                if (!xhr.status && window.PosOffline) {
+                    // Offline: accept codes validated earlier on this terminal
+                    applyDiscountResponse(PosOffline.cachedDiscount(code), true);
+                    return;
+                }
+                
+                let errorMsg = 'Error validating discount code';
+                if (xhr.responseJSON && xhr.responseJSON.message) {
+                    errorMsg = xhr.responseJSON.message;
+                }
+                
+                // Show error message
+                $('#discount-message').html(`<div class="alert alert-danger">${errorMsg}</div>`);
+                
+                // Reset discount
+                resetDiscount();
+                updateTotals();
+            }
+        });
+    });
+    
+    // Apply manual discount
+    $('#apply-manual-discount-btn').click(function() {
+        const discountValue = parseFloat($('#manual-discount-value').val());
+        const selectedType = $('#manual-discount-type').val();
+        
+        // Validate input
+        if (isNaN(discountValue) || discountValue < 0) {
+            $('#manual-discount-message').html('<div class="alert alert-warning">Please enter a valid discount amount</div>');
+            return;
+        }
+        
+        // Clear previous messages
+        $('#manual-discount-message').empty();
+        
+        // Apply the manual discount
+        discountCode = 'MANUAL';
+        discountType = selectedType;
+        discount = discountValue;
+        
+        // For percentage discount, validate it's not over 100%
+        if (discountType === 'percentage' && discount > 100) {
+            $('#manual-discount-message').html('<div class="alert alert-warning">Percentage discount cannot exceed 100%</div>');
+            resetDiscount();
+            return;
+        }
+        
+        // Show success message
+        $('#manual-discount-message').html(
+            `<div class="alert alert-success">
+                Manual discount applied successfully!
+            </div>`
+        );
+        
+        // Show discount details
+        $('#discount-type-display').text(
+            discountType === 'percentage' ? 
+            `${discount}% off (Manual)` : 
+            `Rs.${discount.toFixed(2)} off (Manual)`
+        );
+        
+        // Make discount details visible
+        $('#discount-details').removeClass('d-none');
+        
+        // Update totals
+        updateTotals();
+    });
+    
+    // Remove discount button click handler
+    $(document).on('click', '.remove-discount', function() {
+        // Reset discount values
+        resetDiscount();
+        
+        // Show message
+        $('#discount-message').html(
+            `<div class="alert alert-info">
+                Discount has been removed successfully.
+            </div>`
+        );
+        $('#manual-discount-message').html(
+            `<div class="alert alert-info">
+                Discount has been removed successfully.
+            </div>`
+        );
+        
+        // Update totals to reflect removed discount
+        updateTotals();
+    });
+    
+    // Function to reset discount state
+    function resetDiscount() { 
+        discountCode = '';
+        discount = 0;
+        discountType = 'fixed';
+        discountId = '';  // Reset discount ID
+        
+        // Reset manual discount input
+        $('#manual-discount-value').val(''); 
+        
+        // Hide discount details
+        $('#discount-details').addClass('d-none');
+    }
+    
+    // Reset discount message when modal is opened
+    $('#btn-payment').click(function() {
+        $('#discount-message').empty();
+        $('#manual-discount-message').empty();
+        if (!discountCode) {
+            $('#discount-code').val('');
+            $('#manual-discount-value').val('');
+        }
+    });
+    
+    // Listen for table number input changes to reset validation
+    $('#tableNumber').on('input', function() {
+        $(this).removeClass('is-invalid border-danger');
+        $(this).next('.invalid-feedback').remove();
+    });
+    
+    // Initialize cart
+    updateCart();
+    
+    // Initialize table number section based on default order type
+    $('#paymentModal').on('show.bs.modal', function() {
+        // Default order type is "Dine In" - make sure table number is visible
+        if (selectedOrderType === 'Dine In') {
+            $('#table-number-section').removeClass('d-none');
+        } else {
+            $('#table-number-section').addClass('d-none');
+        }
+    });
+
+    // Repeat customers: typing a phone number suggests the customers it
+    // matches, looked up on the customers' phone index; picking one fills in
+    // their details
+    const CUSTOMER_LOOKUP_DELAY = 250;
+    const CUSTOMER_LOOKUP_MIN_DIGITS = 3;
+    let customerLookupTimer;
+    let customerLookupRequest;
+    
+    function hideCustomerSuggestions() {
+        $('#customerSuggestions').addClass('d-none').empty();
+    }
+    
+    function customerStats(customer) {
+        const visits = customer.visit_count === 1 ? '1 visit' : `${customer.visit_count} visits`;
+        return `${visits}, Rs.${parseFloat(customer.lifetime_spend).toFixed(2)} spent`;
+    }
+    
+    function showCustomerSuggestions(customers) {
+        const list = $('#customerSuggestions').empty();
+        customers.forEach(customer => {
+            $('<button type="button" class="list-group-item list-group-item-action py-2"></button>')
+                .append($('<div class="fw-bold"></div>').text(customer.name ? `${customer.phone} - ${customer.name}` : customer.phone))
+                .append($('<small class="text-muted"></small>').text(customerStats(customer)))
+                .data('customer', customer)
+                .appendTo(list);
+        });
+        list.toggleClass('d-none', customers.length === 0);
+    }
+    
+    $('#customerPhone').on('input', function() {
+        const phone = $(this).val();
+        clearTimeout(customerLookupTimer);
+        $('#customerSummary').addClass('d-none');
+        if (phone.replace(/\D/g, '').length < CUSTOMER_LOOKUP_MIN_DIGITS) {
+            hideCustomerSuggestions();
+            return;
+        }
+        customerLookupTimer = setTimeout(() => {
+            if (customerLookupRequest) {
+                customerLookupRequest.abort();
+            }
+            customerLookupRequest = $.ajax({
+                url: POS_CONFIG.customerLookupUrl,
+                type: 'GET',
+                data: { phone: phone },
+                dataType: 'json'
+            }).done(response => showCustomerSuggestions(response.customers))
+              .fail(hideCustomerSuggestions);
+        }, CUSTOMER_LOOKUP_DELAY);
+    });
+    
+    // mousedown rather than click, so the phone field's blur does not hide
+    // the list before the pick registers
+    $('#customerSuggestions').on('mousedown', '.list-group-item', function(event) {
+        event.preventDefault();
+        const customer = $(this).data('customer');
+        $('#customerPhone').val(customer.phone);
+        if (customer.name) {
+            $('#customerName').val(customer.name);
+        }
+        if (customer.delivery_address && !$('#deliveryAddress').val()) {
+            $('#deliveryAddress').val(customer.delivery_address);
+        }
+        $('#customerSummary').text(`Returning customer: ${customerStats(customer)}`).removeClass('d-none');
+        hideCustomerSuggestions();
+    });
+    
+    $('#customerPhone').on('blur', hideCustomerSuggestions);
+    
+    // Occupied tables pushed by the table feed, and when the feed last
+    // answered; without a recent answer the server is asked directly
+    let liveActiveTables = null;
+    let tableFeedSeenAt = 0;
+    const TABLE_FEED_MAX_AGE = 10000;
+    
+    function startTableFeed() {
+        if (!window.EventSource || !POS_CONFIG.tableFeedUrl) {
+            return;
+        }
+        const source = new EventSource(POS_CONFIG.tableFeedUrl);
+        source.addEventListener('open', () => { tableFeedSeenAt = Date.now(); });
+        source.addEventListener('tables', event => {
+            liveActiveTables = JSON.parse(event.data).active_tables;
+            tableFeedSeenAt = Date.now();
+        });
+        // Under WSGI every response ends and the browser reconnects, so the
+        // list is trusted for a while after the feed last answered
+        setInterval(() => {
+            if (source.readyState === EventSource.OPEN) {
+                tableFeedSeenAt = Date.now();
+            }
+        }, 1000);
+    }
+    
+    // Create a function to fetch active tables 
+    function fetchActiveTables() {
+        if (liveActiveTables && Date.now() - tableFeedSeenAt < TABLE_FEED_MAX_AGE) {
+            return $.Deferred().resolve({ active_tables: liveActiveTables }).promise();
+        }
+        return $.ajax({
+            url: '/api/tables/active/',
+            type: 'GET',
+            dataType: 'json'
+        });
+    }
+    
+    // Function to check and highlight tables that are already in use
+    function checkTableAvailability(tableNumber) {
+        if (!tableNumber) return Promise.resolve(true);
+        
+        return fetchActiveTables().then(response => {
+            const activeTables = response.active_tables || [];
+            
+            if (activeTables.includes(tableNumber)) {
+                // Table is already in use, show warning
+                $('#tableNumber').addClass('is-invalid border-danger');
+                
+                // Add invalid feedback if it doesn't exist
+                if (!$('#tableNumber').next('.invalid-feedback').length) {
+                    $('#tableNumber').after(`<div class="invalid-feedback">This table already has a pending order. Please select a different table.</div>`);
+                }
+                
+                return false;
+            } else {
+                // Table is available
+                $('#tableNumber').removeClass('is-invalid border-danger');
+                $('#tableNumber').next('.invalid-feedback').remove();
+                return true;
+            }
+        }).catch(error => {
+            console.error('Error checking table availability:', error);
+            return true; // Allow proceeding if the check fails
+        });
+    }
+
+    // Clear the warning border when user starts typing in the table number
+    $(document).on('input', '#tableNumber', function() {
+        $(this).removeClass('border-warning');
+        if ($(this).val().trim()) {
+            $(this).removeClass('is-invalid');
+            $('#tableNumberError').addClass('d-none');
+        }
+    });
+
+    // Tax rate change handler
+    $(document).on('change', '#manual-discount-type, #manual-discount-value', function() {
+        updateTotals();
+    });
+    
+    // Service charge change handler
+    $(document).on('input', '#serviceChargePercent', function() {
+        let value = parseFloat($(this).val());
+        if (isNaN(value) || value < 0) {
+            $(this).val(0);
+            showAlert("Service charge cannot be negative", "warning");
+        } else if (value > 100) {
+            $(this).val(100);
+            showAlert("Service charge cannot exceed 100%", "warning");
+        }
+        updateTotals();
+    });
+    
+    // Orders queued while offline
+    document.addEventListener('posoffline:change', function(event) {
+        const pending = event.detail.pending;
+        $('#offline-queue-count').text(pending);
+        $('#offline-queue-badge').toggleClass('d-none', pending === 0);
+    });
+    
+    document.addEventListener('posoffline:synced', function(event) {
+        const summary = event.detail;
+        if (summary.created) {
+            showAlert(`${summary.created} offline order(s) sent to the server`, 'success');
+        }
+        summary.rejected.forEach(rejected => {
+            const customer = rejected.order && rejected.order.order.customer_name;
+            showAlert(`An offline order${customer ? ' for ' + customer : ''} was refused: ${rejected.message}. Please enter it again.`, 'danger');
+        });
+        summary.conflicts.forEach(conflict => {
+            if (conflict.table_number) {
+                showAlert(`Order ${conflict.reference_number}: table ${conflict.table_number} was taken by another order while offline. Please seat it at another table.`, 'warning');
+                return;
+            }
+            showAlert(`Order ${conflict.reference_number}: ${conflict.requested} x ${conflict.product_name} sold offline but only ${conflict.available} in stock. Please check stock.`, 'warning');
+        });
+    });
+    
+    if (window.PosOffline) {
+        PosOffline.start(POS_CONFIG.serviceWorkerUrl);
+    }
+    
+    startTableFeed();
+});
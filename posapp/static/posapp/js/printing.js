@@ -0,0 +1,73 @@
+// Direct printing on the thermal printers (see posapp/printing.py).
+//
+// Any element with data-print-url sends that receipt to the printers when
+// clicked, instead of opening the browser's print dialog. The URL is one of
+// the *_print views; data-print-params (a query string, e.g. the report's
+// start_date and end_date) is posted along with it. The element's text shows
+// the outcome for a few seconds.
+(function(window, document) {
+    'use strict';
+
+    const RESET_AFTER = 3000;
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function showStatus(element, text) {
+        if (!element.dataset.printLabel) {
+            element.dataset.printLabel = element.innerHTML;
+        }
+        element.textContent = text;
+        clearTimeout(element.printResetTimer);
+        element.printResetTimer = setTimeout(() => {
+            element.innerHTML = element.dataset.printLabel;
+            element.disabled = false;
+        }, RESET_AFTER);
+    }
+
+    function send(url, params) {
+        return fetch(url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'X-CSRFToken': csrfToken()
+            },
+            body: params || ''
+        }).then(response => {
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType.indexOf('application/json') === -1) {
+                throw new Error('Printing failed with status ' + response.status);
+            }
+            return response.json();
+        });
+    }
+
+    document.addEventListener('click', event => {
+        const element = event.target.closest('[data-print-url]');
+        if (!element) {
+            return;
+        }
+        event.preventDefault();
+        if (element.disabled) {
+            return;
+        }
+        element.disabled = true;
+        showStatus(element, 'Sending...');
+        send(element.dataset.printUrl, element.dataset.printParams)
+            .then(result => {
+                showStatus(element, result.status === 'success' ? result.message : 'Not printed');
+                if (result.status !== 'success') {
+                    window.alert(result.message);
+                }
+            })
+            .catch(error => {
+                showStatus(element, 'Not printed');
+                window.alert(error.message);
+            });
+    });
+
+    window.PosPrinting = { send: send };
+})(window, document);
@@ -0,0 +1,58 @@
+// Low stock alerts for managers, on every page of posapp/base.html.
+//
+// Keeps the navbar count in sync through the stock alert feed (server-sent
+// events). Each 'stock_alerts' message carries the open alerts; alerts not
+// seen before in this browser session are also shown as a notification.
+(function(window, document) {
+    'use strict';
+
+    const nav = document.getElementById('stockAlertsNav');
+    if (!nav || !window.EventSource) {
+        return;
+    }
+    const count = document.getElementById('stockAlertsCount');
+    const container = document.querySelector('.notification-container');
+    const SEEN_KEY = 'stockAlertsSeen';
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text == null ? '' : String(text);
+        return div.innerHTML;
+    }
+
+    function seenAlerts() {
+        try {
+            return JSON.parse(window.sessionStorage.getItem(SEEN_KEY)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function notify(alert) {
+        if (!container) {
+            return;
+        }
+        const div = document.createElement('div');
+        div.className = 'alert alert-warning alert-dismissible fade show';
+        div.setAttribute('role', 'alert');
+        div.innerHTML = '<strong><i class="fas fa-box-open me-2"></i> Low stock:</strong> ' +
+            escapeHtml(alert.product_name) + ' has ' + escapeHtml(alert.stock_quantity) +
+            ' left (reorder threshold ' + escapeHtml(alert.threshold) + ').' +
+            '<button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>';
+        container.appendChild(div);
+    }
+
+    function update(alerts) {
+        count.textContent = alerts.length;
+        nav.classList.toggle('d-none', alerts.length === 0);
+        nav.querySelector('a').title = alerts.map(alert => alert.product_name + ': ' + alert.stock_quantity).join('\n') || 'Low stock alerts';
+
+        const seen = seenAlerts();
+        alerts.filter(alert => seen.indexOf(alert.id) === -1).forEach(notify);
+        // Only the open alerts are remembered, so the list stays short
+        window.sessionStorage.setItem(SEEN_KEY, JSON.stringify(alerts.map(alert => alert.id)));
+    }
+
+    const source = new EventSource(nav.dataset.feedUrl);
+    source.addEventListener('stock_alerts', event => update(JSON.parse(event.data).alerts));
+})(window, document);
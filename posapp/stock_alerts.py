@@ -0,0 +1,117 @@
+"""
+Low stock alerts.
+
+A product's stock falling below its reorder threshold raises a StockAlert
+as part of the change itself: Product saves compare the stock before and
+after (see signals.py), and the bulk order insert (posapp.ingest), which
+reduces stock with a single UPDATE, passes the stock it already holds
+locked. Nothing scans the products to find low stock.
+
+A product has at most one open alert, enforced by a unique constraint, so
+an alert raised while one is open is dropped by the insert. Restocking to
+the threshold or above resolves it; a manager can also dismiss it.
+
+The open alerts are cached until the 'stock_alerts' or 'products' version
+changes, and pushed to managers' screens by the stock_alert_feed view.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StockAlert
+from .versioning import bump_version, get_versions, versions_are_shared
+
+logger = logging.getLogger('posapp')
+
+# Open alerts shown and pushed at most, newest first
+MAX_OPEN_ALERTS = 50
+
+ALERTS_KEY_PREFIX = 'posapp:stock_alerts:'
+ALERTS_CACHE_TIMEOUT = 60 * 60
+
+
+def stock_changed(changes):
+    """
+    Raise and resolve alerts for stock changes
+
+    Call in the transaction that changes the stock, after the change.
+
+    Args:
+        changes: Iterable of (product id, reorder threshold, stock before,
+            stock after)
+
+    Returns:
+        Ids of the products whose stock fell below their threshold
+    """
+    raised, restocked = [], []
+    for product_id, threshold, before, after in changes:
+        if not threshold or before == after:
+            continue
+        if before >= threshold > after:
+            raised.append(StockAlert(product_id=product_id, threshold=threshold, stock_quantity=after))
+        elif after >= threshold > before:
+            restocked.append(product_id)
+
+    if raised:
+        # A product that already has an open alert keeps it
+        StockAlert.objects.bulk_create(raised, ignore_conflicts=True)
+        logger.info(f"Low stock alerts raised for products {', '.join(str(alert.product_id) for alert in raised)}")
+    if restocked:
+        StockAlert.objects.filter(product_id__in=restocked, is_open=True).update(is_open=None, resolved_at=timezone.now())
+    if raised or restocked:
+        transaction.on_commit(lambda: bump_version('stock_alerts'))
+    return [alert.product_id for alert in raised]
+
+
+def resolve(alert_id, user):
+    """
+    Dismiss an open alert
+
+    Returns:
+        Whether the alert was open
+    """
+    resolved = StockAlert.objects.filter(id=alert_id, is_open=True).update(
+        is_open=None, resolved_at=timezone.now(), resolved_by=user
+    )
+    if resolved:
+        transaction.on_commit(lambda: bump_version('stock_alerts'))
+    return bool(resolved)
+
+
+def _load_open_alerts():
+    rows = (StockAlert.objects.filter(is_open=True).order_by('-created_at')
+            .values('id', 'product_id', 'product__name', 'product__stock_quantity', 'threshold', 'stock_quantity', 'created_at')
+            [:MAX_OPEN_ALERTS])
+    return [
+        {
+            'id': row['id'],
+            'product_id': row['product_id'],
+            'product_name': row['product__name'],
+            'threshold': row['threshold'],
+            'stock_at_alert': row['stock_quantity'],
+            'stock_quantity': row['product__stock_quantity'],
+            'created_at': row['created_at'],
+        }
+        for row in rows
+    ]
+
+
+def open_alerts():
+    """
+    The open alerts, newest first
+
+    Returns:
+        A list of dicts: id, product_id, product_name, threshold,
+        stock_at_alert, stock_quantity (current) and created_at
+    """
+    if not versions_are_shared():
+        # Another worker's alerts would not change the versions seen here
+        return _load_open_alerts()
+    key = ALERTS_KEY_PREFIX + ':'.join(str(version) for version in get_versions('stock_alerts', 'products'))
+    alerts = cache.get(key)
+    if alerts is None:
+        alerts = _load_open_alerts()
+        cache.set(key, alerts, ALERTS_CACHE_TIMEOUT)
+    return alerts
@@ -0,0 +1,152 @@
+"""
+End-of-day sales summaries.
+
+Building a SalesSummary aggregates every order and adjustment of the business
+day, so it runs as the ``sales_summary`` background job instead of inside the
+end_day request.
+"""
+import logging
+
+from django.db.models import Sum
+
+from .models import Order, OrderItem, BillAdjustment, AdvanceAdjustment, EndDay, SalesSummary
+
+logger = logging.getLogger('posapp')
+
+
+def get_end_day_period(end_day):
+    """
+    Get the time range covered by an end day
+
+    Returns:
+        A tuple of (start_date, end_date); the period starts at the previous
+        end day, or at midnight if this is the first one
+    """
+    prev_end_day = EndDay.objects.filter(end_date__lt=end_day.end_date).order_by('-end_date').first()
+
+    if prev_end_day:
+        start_date = prev_end_day.end_date
+    else:
+        # If no previous end day, use the start of day for end_day
+        start_date = end_day.end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return start_date, end_day.end_date
+
+
+def business_days_after(moment):
+    """
+    The closed business days ending after a moment, oldest first
+
+    Args:
+        moment: End of the last business day already handled, or None for all
+
+    Returns:
+        A list of (start_date, end_date); no period starts before moment, so
+        nothing up to it is read twice
+    """
+    end_days = EndDay.objects.order_by('end_date')
+    if moment:
+        end_days = end_days.filter(end_date__gt=moment)
+    periods = []
+    for end_day in end_days:
+        start, end = get_end_day_period(end_day)
+        if moment and start < moment:
+            start = moment
+        periods.append((start, end))
+    return periods
+
+
+def create_sales_summary(end_day):
+    """
+    Build and save the SalesSummary for an end day
+
+    Returns:
+        The SalesSummary, or the existing one if it was already built
+    """
+    existing = SalesSummary.objects.filter(end_day=end_day).first()
+    if existing:
+        return existing
+
+    start_date, end_date = get_end_day_period(end_day)
+
+    # Get all completed orders in the date range
+    completed_orders = Order.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date,
+        order_status='Completed'
+    )
+
+    # Calculate the total sales amount
+    total_sales = completed_orders.aggregate(
+        total=Sum('total_amount')
+    )['total'] or 0
+
+    # Calculate the total paid amount
+    total_paid = completed_orders.filter(
+        payment_status='Paid'
+    ).aggregate(
+        total=Sum('total_amount')
+    )['total'] or 0
+
+    # Calculate the total pending amount
+    total_pending = completed_orders.filter(
+        payment_status='Pending'
+    ).aggregate(
+        total=Sum('total_amount')
+    )['total'] or 0
+
+    # Calculate the total bill adjustments in the date range
+    total_bill_adjustments = BillAdjustment.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date
+    ).aggregate(
+        total=Sum('price')
+    )['total'] or 0
+
+    # Calculate the total advance adjustments in the date range
+    total_advance_adjustments = AdvanceAdjustment.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date
+    ).aggregate(
+        total=Sum('amount')
+    )['total'] or 0
+
+    # Calculate the total adjustments
+    total_adjustments = total_bill_adjustments + total_advance_adjustments
+
+    # Calculate the net revenue
+    net_revenue = total_sales - total_adjustments
+
+    # Get products sold
+    products_sold = OrderItem.objects.filter(
+        order__in=completed_orders
+    ).values(
+        'product__name'
+    ).annotate(
+        total_quantity=Sum('quantity'),
+        total_sales=Sum('total_price')
+    ).order_by('-total_quantity')
+
+    # Create the sales summary record
+    sales_summary = SalesSummary.objects.create(
+        end_day=end_day,
+        start_date=start_date,
+        end_date=end_date,
+        total_sales=total_sales,
+        total_paid=total_paid,
+        total_pending=total_pending,
+        total_bill_adjustments=total_bill_adjustments,
+        total_advance_adjustments=total_advance_adjustments,
+        total_adjustments=total_adjustments,
+        net_revenue=net_revenue,
+        orders_count=completed_orders.count(),
+        summary_data={
+            # Decimals are stored as strings, JSONField cannot encode them
+            'products_sold': [
+                dict(product, total_sales=str(product['total_sales']))
+                for product in products_sold
+            ],
+        }
+    )
+    logger.info(f"Created sales summary record for end day {end_day.id}")
+    return sales_summary
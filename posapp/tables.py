@@ -0,0 +1,194 @@
+"""
+Dine-in table occupancy.
+
+Every table number used for a Dine In order has a Table row pointing at the
+pending order seated there. Order creation claims the table first: the row
+is locked with select_for_update, so two terminals seating the same table at
+once are serialised and the second one is turned away instead of both
+orders landing on one table. The Order signal in signals.py then seats or
+releases tables as orders are created, completed, cancelled or change type.
+
+occupancy() serves the map of occupied tables from memory while the
+'tables' version counter is unchanged, so terminals checking a table do not
+scan orders at all.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, Table
+from .versioning import bump_version, get_version, versions_are_shared
+
+logger = logging.getLogger('posapp')
+
+# (version, occupancy) last read by this process
+_occupancy = (None, None)
+
+
+class TableOccupiedError(Exception):
+    """The table already has a pending order; the message is shown to the cashier"""
+
+    def __init__(self, table_number, order_id):
+        self.message = f'Table #{table_number} already has a pending order. Please select a different table.'
+        super().__init__(self.message)
+        self.table_number = table_number
+        self.order_id = order_id
+
+
+def table_number_of(order):
+    """The table an order should occupy, or None for orders that do not hold one"""
+    if order.order_type != 'Dine In' or order.order_status != 'Pending':
+        return None
+    return (order.table_number or '').strip() or None
+
+
+def lock_tables(numbers):
+    """
+    Lock the Table rows for the given numbers, creating missing ones
+
+    Must be called inside a transaction; the rows stay locked until it ends.
+
+    Returns:
+        A dict of table number to Table
+    """
+    numbers = set(numbers)
+    if not numbers:
+        return {}
+    # Concurrent creators of the same table are resolved by the unique number
+    Table.objects.bulk_create(
+        [Table(number=number) for number in numbers - set(Table.objects.filter(number__in=numbers).values_list('number', flat=True))],
+        ignore_conflicts=True,
+    )
+    return {table.number: table for table in Table.objects.select_for_update().filter(number__in=numbers)}
+
+
+def occupant(table, order_id=None):
+    """
+    Id of the pending order seated at a locked table, other than order_id
+
+    A table still pointing at an order that has since left it (e.g. changed
+    with a bulk update, which skips signals) counts as free.
+    """
+    if table.current_order_id is None or table.current_order_id == order_id:
+        return None
+    still_seated = Order.objects.filter(
+        pk=table.current_order_id, order_type='Dine In', order_status='Pending', table_number=table.number
+    ).exists()
+    return table.current_order_id if still_seated else None
+
+
+def claim(table_number, order_id=None):
+    """
+    Lock a table for an order about to be seated there
+
+    Must be called inside the transaction that saves the order.
+
+    Args:
+        table_number: Table the order is for
+        order_id: The order, when it already exists and may be seated there
+
+    Raises:
+        TableOccupiedError: If another pending order is seated at the table
+    """
+    table_number = (table_number or '').strip()
+    if not table_number:
+        return
+    table = lock_tables([table_number])[table_number]
+    seated = occupant(table, order_id)
+    if seated is not None:
+        raise TableOccupiedError(table_number, seated)
+
+
+def _changed():
+    transaction.on_commit(lambda: bump_version('tables'))
+
+
+def sync_order(order):
+    """
+    Seat or release an order's table to match the order; run on every save
+
+    A table already taken by another order is left alone and logged: orders
+    are meant to claim() their table before they are saved.
+    """
+    number = table_number_of(order)
+    with transaction.atomic():
+        released = Table.objects.filter(current_order_id=order.pk).exclude(number=number or '').update(
+            current_order=None, updated_at=timezone.now()
+        )
+        if released:
+            _changed()
+        if number is None:
+            return
+        table = lock_tables([number])[number]
+        if table.current_order_id == order.pk:
+            return
+        seated = occupant(table, order.pk)
+        if seated is not None:
+            logger.warning(f"Order #{order.pk} is for table {number}, which order #{seated} already occupies")
+            return
+        table.current_order_id = order.pk
+        table.save(update_fields=['current_order', 'updated_at'])
+        _changed()
+
+
+def seat_orders(orders):
+    """
+    Seat orders inserted with bulk_create, which skips the Order signals
+
+    The orders' tables must have been locked with lock_tables and checked
+    to be free in the same transaction.
+    """
+    seating = {table_number_of(order): order for order in orders if table_number_of(order)}
+    if not seating:
+        return
+    tables = lock_tables(seating)
+    for number, order in seating.items():
+        tables[number].current_order_id = order.pk
+        tables[number].updated_at = timezone.now()
+    Table.objects.bulk_update(tables.values(), ['current_order', 'updated_at'])
+    _changed()
+
+
+def rebuild_tables():
+    """
+    Seat every pending Dine In order and free all other tables, e.g. after
+    deployment
+
+    When several pending orders name one table, the oldest keeps it.
+
+    Returns:
+        Number of occupied tables
+    """
+    seating = {}
+    for order in Order.objects.filter(order_type='Dine In', order_status='Pending').order_by('created_at'):
+        seating.setdefault(table_number_of(order), order)
+    seating.pop(None, None)
+
+    with transaction.atomic():
+        lock_tables(seating)
+        # Cleared first, since an order may have moved to another table
+        Table.objects.exclude(current_order=None).update(current_order=None, updated_at=timezone.now())
+        seat_orders(seating.values())
+        _changed()
+    return len(seating)
+
+
+def occupancy():
+    """
+    Occupied tables
+
+    Returns:
+        A dict of table number to the id of the pending order seated there.
+        Callers must not modify it; it is shared until the tables change.
+    """
+    global _occupancy
+    shared = versions_are_shared()
+    if shared:
+        version = get_version('tables')
+        if _occupancy[0] == version:
+            return _occupancy[1]
+    tables = dict(Table.objects.exclude(current_order=None).values_list('number', 'current_order_id'))
+    if shared:
+        _occupancy = (version, tables)
+    return tables
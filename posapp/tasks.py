@@ -0,0 +1,191 @@
+"""
+Background job handlers.
+
+Imported from PosappConfig.ready so every handler is registered before
+anything is enqueued. See posapp.jobs for the queue itself.
+"""
+import random
+import string
+
+from django.utils.dateparse import parse_datetime
+
+from .affinity import update_affinity
+from .archive import archive_orders
+from .customers import backfill as backfill_customers
+from .exports import (
+    EXCEL_CONTENT_TYPE, build_orders_workbook, build_order_items_workbook
+)
+from .jobs import enqueue, job_handler
+from .forecasting import update_velocity
+from .kitchen import refresh_tickets
+from .models import Order, EndDay, SalesSummary
+from .pdfs import PDF_EXPORT_AVAILABLE, store_sales_summary_pdf
+from .summaries import create_sales_summary
+from .versioning import bump_version
+
+# Orders updated per query by the reference number backfill
+REFERENCE_BATCH_SIZE = 500
+
+
+def enqueue_sales_summary(end_day, user=None):
+    """Queue the SalesSummary build for an end day, once"""
+    return enqueue(
+        'sales_summary',
+        {'end_day_id': end_day.id},
+        user=user,
+        dedupe_key=f'sales_summary:{end_day.id}'
+    )
+
+
+def enqueue_sales_summary_pdf(summary, user=None):
+    """Queue the PDF of a SalesSummary built before PDFs were stored, once"""
+    return enqueue(
+        'sales_summary_pdf',
+        {'sales_summary_id': summary.id},
+        user=user,
+        dedupe_key=f'sales_summary_pdf:{summary.id}'
+    )
+
+
+def enqueue_product_affinity(user=None, rebuild=False):
+    """Queue counting the closed business days into the product affinity matrix"""
+    return enqueue(
+        'product_affinity',
+        {'rebuild': rebuild},
+        user=user,
+        dedupe_key='product_affinity'
+    )
+
+
+def enqueue_stock_forecast(user=None, rebuild=False):
+    """Queue counting the closed business days into the sales velocity of the stock forecasts"""
+    return enqueue(
+        'stock_forecast',
+        {'rebuild': rebuild},
+        user=user,
+        dedupe_key='stock_forecast'
+    )
+
+
+@job_handler('sales_summary')
+def sales_summary_job(job, end_day_id):
+    end_day = EndDay.objects.get(id=end_day_id)
+    summary = create_sales_summary(end_day)
+    if PDF_EXPORT_AVAILABLE:
+        # The day is closed, so the PDF can be written once and kept
+        job.set_progress(50, 'Writing PDF')
+        store_sales_summary_pdf(summary)
+    # Count the day's baskets for the frequently bought together suggestions
+    enqueue_product_affinity(job.job.created_by)
+    # and its sales for the stock forecasts
+    enqueue_stock_forecast(job.job.created_by)
+    return {'sales_summary_id': summary.id, 'url': summary.get_absolute_url()}
+
+
+@job_handler('sales_summary_pdf')
+def sales_summary_pdf_job(job, sales_summary_id):
+    document = store_sales_summary_pdf(SalesSummary.objects.get(id=sales_summary_id))
+    return {'sales_summary_id': sales_summary_id, 'download_url': document.get_absolute_url()}
+
+
+@job_handler('product_affinity')
+def product_affinity_job(job, rebuild=False):
+    job.set_progress(0, 'Counting business days')
+    return update_affinity(
+        rebuild=rebuild,
+        progress=lambda done, total: job.set_progress(int(done * 100 / total), f'Counted {done} of {total} business days')
+    )
+
+
+@job_handler('stock_forecast')
+def stock_forecast_job(job, rebuild=False):
+    job.set_progress(0, 'Counting business days')
+    return update_velocity(
+        rebuild=rebuild,
+        progress=lambda done, total: job.set_progress(int(done * 100 / total), f'Counted {done} of {total} business days')
+    )
+
+
+@job_handler('export_orders_excel')
+def export_orders_excel_job(job, start, end, status=None):
+    job.set_progress(0, 'Collecting orders')
+    filename, content = build_orders_workbook(
+        parse_datetime(start), parse_datetime(end), status, progress=job.set_progress
+    )
+    job.save_file(filename, content, EXCEL_CONTENT_TYPE)
+    return {'filename': filename}
+
+
+@job_handler('export_order_items_excel')
+def export_order_items_excel_job(job, start, end, category=None):
+    job.set_progress(0, 'Collecting products sold')
+    filename, content = build_order_items_workbook(
+        parse_datetime(start), parse_datetime(end), category, progress=job.set_progress
+    )
+    job.save_file(filename, content, EXCEL_CONTENT_TYPE)
+    return {'filename': filename}
+
+
+def generate_missing_reference_numbers(progress=None):
+    """
+    Give every order without a reference number a unique PB + 4 digit one
+
+    Args:
+        progress: Optional callable receiving (percent, message) after each batch
+
+    Returns:
+        Number of orders updated
+    """
+    orders_without_reference = Order.objects.filter(reference_number__isnull=True) | Order.objects.filter(reference_number='')
+    order_ids = list(orders_without_reference.values_list('id', flat=True))
+    count = len(order_ids)
+
+    # Keep track of used reference numbers to avoid duplicates
+    existing_refs = set(Order.objects.exclude(reference_number__isnull=True).exclude(reference_number='').values_list('reference_number', flat=True))
+
+    updated = 0
+    for offset in range(0, count, REFERENCE_BATCH_SIZE):
+        batch = []
+        for order_id in order_ids[offset:offset + REFERENCE_BATCH_SIZE]:
+            # Generate a unique reference number with format PB + 4 digits
+            while True:
+                reference_number = f"PB{''.join(random.choices(string.digits, k=4))}"
+                if reference_number not in existing_refs:
+                    break
+            existing_refs.add(reference_number)
+            batch.append(Order(id=order_id, reference_number=reference_number))
+
+        Order.objects.bulk_update(batch, ['reference_number'])
+        bump_version('orders')
+        # bulk_update skips the signals that keep kitchen tickets current
+        refresh_tickets(order.id for order in batch)
+        updated += len(batch)
+        if progress:
+            progress(int(updated * 100 / count), f'Updated {updated} of {count} orders')
+
+    return updated
+
+
+@job_handler('update_reference_numbers')
+def update_reference_numbers_job(job):
+    return {'updated': generate_missing_reference_numbers(progress=job.set_progress)}
+
+
+@job_handler('archive_orders')
+def archive_orders_job(job, keep_days, batch_size=500):
+    job.set_progress(0, 'Archiving orders')
+    cutoff, moved = archive_orders(
+        keep_days,
+        batch_size=batch_size,
+        progress=lambda total: job.set_progress(0, f'Archived {total} orders')
+    )
+    return {'cutoff': cutoff.isoformat() if cutoff else None, 'archived': moved}
+
+
+@job_handler('backfill_customers')
+def backfill_customers_job(job, batch_size=500):
+    job.set_progress(0, 'Linking orders to customers')
+    return backfill_customers(
+        batch_size=batch_size,
+        progress=lambda total: job.set_progress(0, f'Linked {total} orders')
+    )
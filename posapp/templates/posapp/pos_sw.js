@@ -0,0 +1,121 @@
+{% load static %}// Service worker for the POS screen, served by views.pos_service_worker.
+//
+// Keeps the POS page, its scripts and the product images in a cache so the
+// screen still opens when the connection drops. The page itself is fetched
+// from the network first so prices and stock are current whenever the server
+// is reachable. Orders are never handled here: pos.js queues them in
+// IndexedDB (offline.js) and replays them to the sync API.
+const POS_URL = '{% url "pos" %}';
+const STATIC_URLS = [
+    '{% static "posapp/css/base.css" %}',
+    '{% static "posapp/css/pos.css" %}',
+    '{% static "posapp/js/base.js" %}',
+    '{% static "posapp/js/pos.js" %}',
+    '{% static "posapp/js/offline.js" %}'
+];
+const PRECACHE_URLS = [POS_URL, ...STATIC_URLS];
+// Named after the content-hashed static URLs, so a deploy that changes any
+// of them starts a new cache and activate drops the old one with the files
+// of the previous release
+const CACHE_NAME = 'posapp-pos-' + STATIC_URLS.join('|');
+// How long the page may take before the cached copy is shown instead
+const NETWORK_TIMEOUT = 4000;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            // Precaching is best effort; the page is cached on its next visit
+            .then(cache => Promise.all(PRECACHE_URLS.map(url => fetch(url).then(response => {
+                if (isCacheable(response)) {
+                    return cache.put(url, response);
+                }
+            }).catch(() => null))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith('posapp-') && name !== CACHE_NAME)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+function isCacheable(response) {
+    // A redirect means the session expired; never cache the login page as
+    // the POS screen
+    return response && (response.ok || response.type === 'opaque') && !response.redirected;
+}
+
+function networkFirst(request) {
+    return caches.open(CACHE_NAME).then(cache => new Promise(resolve => {
+        let settled = false;
+        const fallback = () => {
+            if (settled) {
+                return;
+            }
+            settled = true;
+            resolve(cache.match(request, { ignoreSearch: true }).then(cached => cached || fetch(request)));
+        };
+        const timer = setTimeout(fallback, NETWORK_TIMEOUT);
+
+        fetch(request).then(response => {
+            if (isCacheable(response)) {
+                cache.put(request, response.clone());
+            }
+            if (!settled) {
+                settled = true;
+                clearTimeout(timer);
+                resolve(response);
+            }
+        }).catch(() => {
+            clearTimeout(timer);
+            fallback();
+        });
+    }));
+}
+
+function staleWhileRevalidate(request, matchOptions) {
+    return caches.open(CACHE_NAME).then(cache => cache.match(request, matchOptions).then(cached => {
+        const network = fetch(request).then(response => {
+            if (isCacheable(response)) {
+                const copy = response.clone();
+                // Replace rather than add to copies stored under other query strings
+                cache.delete(request, matchOptions).then(() => cache.put(request, copy));
+            }
+            return response;
+        });
+        if (cached) {
+            network.catch(() => null);
+            return cached;
+        }
+        return network;
+    }));
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    if (url.origin === self.location.origin) {
+        if (url.pathname === POS_URL) {
+            event.respondWith(networkFirst(request));
+        } else if (url.pathname.startsWith('{% get_static_prefix %}')) {
+            event.respondWith(staleWhileRevalidate(request));
+        } else if (url.pathname.startsWith('/product_image/')) {
+            // Image URLs carry a random cache-busting query string
+            event.respondWith(staleWhileRevalidate(request, { ignoreSearch: true }));
+        }
+        // Anything else, including the APIs, goes straight to the network
+    } else if (request.destination === 'script' || request.destination === 'style' || request.destination === 'font') {
+        // jQuery, Bootstrap and Font Awesome from their CDNs
+        event.respondWith(staleWhileRevalidate(request));
+    }
+});
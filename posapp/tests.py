@@ -0,0 +1,331 @@
+from datetime import timedelta
+from decimal import Decimal
+import io
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import kitchen, kpis, settings_store
+from .archive import ARCHIVE_CUTOFF_KEY
+from .idempotency import REPLAYED_HEADER
+from .jobs import enqueue
+from .models import (
+    BackgroundJob, Category, Discount, IdempotencyKey, KitchenTicket, Order, OrderItem, Printer, PrintJob,
+    Product, Setting
+)
+from .printing import claim_print_job, requeue_stale_print_jobs, run_print_job
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Pages render without collectstatic having built the manifest
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STORAGES=PLAIN_STORAGES, POS_AUDIT_EAGER=True)
+class KpiQueryCountTests(TestCase):
+    """
+    The dashboard, reports dashboard and user detail KPIs take a fixed number
+    of queries (see posapp.kpis), however many orders there are
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Food')
+        Product.objects.create(name='Burger', product_code='1001', category=category, price=100, stock_quantity=50)
+        # Otherwise the first page view creates the default settings
+        settings_store.ensure_defaults()
+        cls.add_orders(12)
+
+    @classmethod
+    def add_orders(cls, count):
+        now = timezone.now()
+        statuses = ['Completed', 'Completed', 'Pending', 'Cancelled']
+        for n in range(count):
+            order = Order.objects.create(
+                user=cls.admin,
+                order_status=statuses[n % len(statuses)],
+                payment_status='Paid',
+                total_amount=Decimal('100.00') + n,
+            )
+            # Spread over the last months, so every period has orders
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=n * 9))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def page_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_dashboard_kpis(self):
+        # Archive cutoff, order aggregates, table counts
+        with self.assertNumQueries(3):
+            figures = kpis.dashboard_kpis()
+        self.assertEqual(figures['total_orders'], 12)
+        self.assertEqual(figures['active_orders'], 3)
+        self.assertEqual(figures['total_revenue'], sum(Decimal('100.00') + n for n in range(12) if n % 4 != 3))
+        with self.assertNumQueries(0):
+            kpis.dashboard_kpis()
+
+    def test_reports_kpis(self):
+        # Archive cutoff, order aggregates
+        with self.assertNumQueries(2):
+            figures = kpis.reports_kpis()
+        self.assertEqual(figures['orders_total'], 9)
+        self.assertEqual(figures['orders_today'], 1)
+        with self.assertNumQueries(0):
+            kpis.reports_kpis()
+
+    def test_user_kpis(self):
+        # Archive cutoff and order aggregates, then the same for the months
+        with self.assertNumQueries(4):
+            figures = kpis.user_kpis(self.admin)
+        self.assertEqual(figures['total_orders'], 12)
+        self.assertEqual(figures['total_completed_orders'], 6)
+        self.assertEqual(len(figures['monthly_revenue']), 6)
+        with self.assertNumQueries(0):
+            kpis.user_kpis(self.admin)
+
+    def test_archive_adds_one_query_per_statement(self):
+        Setting.set_value(ARCHIVE_CUTOFF_KEY, (timezone.now() - timedelta(days=30)).isoformat())
+        with self.assertNumQueries(4):
+            kpis.dashboard_kpis()
+        with self.assertNumQueries(3):
+            kpis.reports_kpis()
+        with self.assertNumQueries(6):
+            kpis.user_kpis(self.admin)
+
+    def test_dashboard_page(self):
+        with self.assertNumQueries(17):
+            self.client.get(reverse('dashboard'))
+
+    def test_reports_dashboard_page(self):
+        with self.assertNumQueries(7):
+            self.client.get(reverse('reports_dashboard'))
+
+    def test_user_detail_page(self):
+        with self.assertNumQueries(9):
+            self.client.get(reverse('user_detail', args=[self.admin.pk]))
+
+    def test_page_queries_do_not_grow_with_orders(self):
+        urls = [reverse('dashboard'), reverse('reports_dashboard'), reverse('user_detail', args=[self.admin.pk])]
+        before = [self.page_queries(url) for url in urls]
+        self.add_orders(40)
+        self.assertEqual([self.page_queries(url) for url in urls], before)
+
+
+class PrintSpoolTests(TestCase):
+    """Jobs reach each printer in the order they were queued, retries included"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.counter = Printer.objects.create(name='Counter', target='tcp://127.0.0.1:9')
+        cls.kitchen = Printer.objects.create(name='Kitchen', role='Kitchen', target='tcp://127.0.0.1:9')
+
+    def queue(self, printer, kind):
+        return PrintJob.objects.create(printer=printer, kind=kind, data=b'ticket')
+
+    def test_retry_holds_back_later_jobs_of_its_printer(self):
+        first = self.queue(self.counter, 'order_receipt')
+        second = self.queue(self.counter, 'order_receipt')
+        other = self.queue(self.kitchen, 'kitchen_ticket')
+
+        job = claim_print_job()
+        self.assertEqual(job, first)
+        run_print_job(job, timeout=0.5)
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ('Queued', 1))
+
+        # The counter's second ticket waits for the first one's retry
+        self.assertEqual(claim_print_job(), other)
+        self.assertIsNone(claim_print_job())
+
+        PrintJob.objects.filter(pk=first.pk).update(run_after=timezone.now())
+        self.assertEqual(claim_print_job(), first)
+        PrintJob.objects.filter(pk=first.pk).update(status='Failed')
+        self.assertEqual(claim_print_job(), second)
+
+    def test_stale_job_fails_once_out_of_attempts(self):
+        job = self.queue(self.counter, 'order_receipt')
+        PrintJob.objects.filter(pk=job.pk).update(
+            status='Printing', attempts=5, updated_at=timezone.now() - timedelta(minutes=10)
+        )
+        self.assertEqual(requeue_stale_print_jobs(timedelta(minutes=2)), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Failed')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, POS_AUDIT_EAGER=True)
+class IdempotencyTests(TestCase):
+    """Successful order submissions are replayed, refused ones can be retried"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Food')
+        cls.product = Product.objects.create(
+            name='Burger', product_code='1001', category=category, price=100, stock_quantity=50
+        )
+        settings_store.ensure_defaults()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.order = {
+            'items': [{'product_id': self.product.id, 'quantity': 1, 'unit_price': '100', 'total_price': '100'}],
+            'subtotal': '100',
+            'stock_already_reduced': True,
+        }
+
+    def submit(self, order, key):
+        return self.client.post('/api/orders/', json.dumps(order), content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_success_is_replayed(self):
+        first = self.submit(self.order, 'key-1')
+        again = self.submit(self.order, 'key-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.get(REPLAYED_HEADER), 'true')
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_refused_request_releases_the_key(self):
+        refused = self.submit(dict(self.order, service_charge_percent='-1'), 'key-2')
+        self.assertEqual(refused.status_code, 400)
+        self.assertIsNone(IdempotencyKey.objects.get(key='key-2').response_status)
+
+        corrected = self.submit(self.order, 'key-2')
+        self.assertEqual(corrected.status_code, 200)
+        self.assertIsNone(corrected.get(REPLAYED_HEADER))
+        self.assertEqual(self.submit(self.order, 'key-2').get(REPLAYED_HEADER), 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class EnqueueTests(TestCase):
+    """A dedupe_key is held by one queued or running job at a time"""
+
+    def test_dedupe_key(self):
+        job = enqueue('update_reference_numbers', dedupe_key='refs')
+        self.assertEqual(enqueue('update_reference_numbers', dedupe_key='refs'), job)
+        BackgroundJob.objects.filter(pk=job.pk).update(status='Completed')
+        self.assertNotEqual(enqueue('update_reference_numbers', dedupe_key='refs'), job)
+        self.assertEqual(BackgroundJob.objects.filter(dedupe_key='refs').count(), 2)
+
+
+class RunJobsProcessesTests(TransactionTestCase):
+    """run_jobs --processes keeps its own database session while children run jobs"""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Worker processes cannot share an in-memory test database')
+
+    def test_runs_every_queued_job(self):
+        jobs = [enqueue('update_reference_numbers') for _ in range(2)]
+        call_command('run_jobs', processes=True, once=True, workers=2, stdout=io.StringIO())
+        self.assertEqual(
+            list(BackgroundJob.objects.filter(id__in=[job.id for job in jobs]).values_list('status', flat=True)),
+            ['Completed', 'Completed']
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STORAGES=PLAIN_STORAGES, POS_AUDIT_EAGER=True)
+class OrderEditDiscountTests(TestCase):
+    """Editing an order applies its discount code's conditions again"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Food')
+        cls.product = Product.objects.create(
+            name='Burger', product_code='1001', category=category, price=100, stock_quantity=50
+        )
+        cls.discount = Discount.objects.create(
+            name='Big order', code='BIG', type='Fixed', value=50, min_subtotal=300
+        )
+        settings_store.ensure_defaults()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.order = Order.objects.create(user=self.admin, order_type='Delivery', discount=self.discount)
+        self.item = OrderItem.objects.create(
+            order=self.order, product=self.product, quantity=4, unit_price=100, total_price=400
+        )
+
+    def edit(self, quantity):
+        return self.client.post(reverse('order_edit', args=[self.order.pk]), {
+            'order_type': 'Delivery',
+            'delivery_charges': '0',
+            f'item_changes[{self.item.pk}][quantity]': quantity,
+            'discount_code': 'BIG',
+            'discount_id': self.discount.pk,
+        })
+
+    def test_discount_kept_above_minimum(self):
+        self.edit(3)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.discount, self.discount)
+        self.assertEqual(self.order.discount_amount, 50)
+
+    def test_discount_removed_below_minimum(self):
+        self.edit(2)
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.discount)
+        self.assertEqual(self.order.discount_amount, 0)
+        self.assertEqual(self.order.subtotal, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, POS_AUDIT_EAGER=True)
+class KitchenRefreshTests(TestCase):
+    """A transaction's order and item changes refresh the kitchen ticket once, after commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Food')
+        cls.product = Product.objects.create(
+            name='Burger', product_code='1001', category=category, price=100, stock_quantity=50
+        )
+
+    def add_item(self, order):
+        return OrderItem.objects.create(order=order, product=self.product, quantity=1, unit_price=100, total_price=100)
+
+    def test_one_refresh_per_transaction(self):
+        with mock.patch.object(kitchen, 'refresh_tickets', wraps=kitchen.refresh_tickets) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    order = Order.objects.create(user=self.admin)
+                    self.add_item(order)
+                    self.add_item(order)
+                self.assertFalse(KitchenTicket.objects.filter(order=order).exists())
+        self.assertEqual(refresh.call_count, 1)
+        ticket = KitchenTicket.objects.get(order=order)
+        self.assertEqual((ticket.revision, len(ticket.items)), (1, 2))
+
+    def test_rolled_back_savepoint_keeps_earlier_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                order = Order.objects.create(user=self.admin)
+                try:
+                    with transaction.atomic():
+                        self.add_item(order)
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.add_item(order)
+        self.assertEqual(len(KitchenTicket.objects.get(order=order).items), 1)
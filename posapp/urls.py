@@ -2,7 +2,7 @@ from django.urls import path
 from django.shortcuts import render
 from .views import (
     LoginView, LogoutView, change_password,
-    dashboard, pos, end_day, sales_summary
+    dashboard, pos, pos_service_worker, end_day, sales_summary
 )
 from .views.product_views import (
     product_list, product_detail, product_create, 
@@ -15,10 +15,10 @@ from .views.category_views import (
 )
 from .views.order_views import (
     order_list, order_detail, order_create, 
-    order_edit, order_delete, order_receipt,
-    add_order_item, delete_order_item, create_order_api,
+    order_edit, order_delete, order_receipt, order_receipt_print,
+    add_order_item, delete_order_item, create_order_api, sync_orders_api,
     complete_order, mark_order_paid, increase_order_item,
-    kitchen_receipt, get_active_tables
+    kitchen_receipt, kitchen_receipt_print, get_active_tables
 )
 from .views.discount_views import (
     discount_list, discount_detail, discount_create,
@@ -27,7 +27,9 @@ from .views.discount_views import (
 from .views.reports_views import (
     reports_dashboard, sales_report,
     export_orders_excel, export_order_items_excel,
-    sales_receipt, sales_summary_history, sales_summary_detail
+    sales_receipt, sales_receipt_print, sales_receipt_pdf,
+    sales_summary_history, sales_summary_detail, sales_summary_pdf,
+    sales_analytics_report, sales_analytics_api
 )
 from .views.user_views import (
     user_list, user_detail, user_create,
@@ -46,8 +48,17 @@ from .views.adjustment_views import (
     BillAdjustmentImageDeleteView,
     AdvanceAdjustmentListView, AdvanceAdjustmentDetailView,
     AdvanceAdjustmentCreateView, AdvanceAdjustmentUpdateView, AdvanceAdjustmentDeleteView,
-    adjustment_receipt
+    adjustment_receipt, adjustment_receipt_print
 )
+from .views.job_views import (
+    job_detail, job_status_api, job_download
+)
+from .views.kitchen_views import (
+    kitchen_display, kitchen_feed, kitchen_bump
+)
+from .views.table_views import table_feed
+from .views.stock_views import stock_alert_feed, stock_alert_resolve
+from .views.customer_views import customer_lookup, customer_history_api
 from .views.image_views import (
     serve_product_image,
     serve_business_logo,
@@ -67,6 +78,7 @@ urlpatterns = [
     # Dashboard
     path('', dashboard, name='dashboard'),
     path('pos/', pos, name='pos'),
+    path('pos/sw.js', pos_service_worker, name='pos_service_worker'),
     path('end-day/', end_day, name='end_day'),
     path('sales-summary/', sales_summary, name='sales_summary'),
     path('sales-summary/<int:end_day_id>/', sales_summary, name='sales_summary'),
@@ -97,17 +109,27 @@ urlpatterns = [
     path('orders/<int:order_id>/complete/', complete_order, name='order_complete'),
     path('orders/<int:order_id>/mark-paid/', mark_order_paid, name='order_mark_paid'),
     path('orders/<int:order_id>/receipt/', order_receipt, name='order_receipt'),
+    path('orders/<int:order_id>/receipt/print/', order_receipt_print, name='order_receipt_print'),
     path('orders/<int:order_id>/kitchen/', kitchen_receipt, name='kitchen_receipt'),
+    path('orders/<int:order_id>/kitchen/print/', kitchen_receipt_print, name='kitchen_receipt_print'),
     path('orders/<int:order_id>/add-item/', add_order_item, name='add_order_item'),
     path('orders/<int:order_id>/delete-item/<int:item_id>/', delete_order_item, name='delete_order_item'),
     path('orders/<int:order_id>/increase-item/<int:item_id>/', increase_order_item, name='increase_order_item'),
     
     # API endpoints
     path('api/orders/', create_order_api, name='create_order_api'),
+    path('api/orders/sync/', sync_orders_api, name='sync_orders_api'),
     path('api/discounts/validate/', validate_discount_code, name='validate_discount_code'),
     path('api/products/<int:product_id>/check-stock/', check_product_stock, name='check_product_stock'),
     path('api/products/stock/', get_products_stock, name='get_products_stock'),
     path('api/tables/active/', get_active_tables, name='get_active_tables'),
+    path('api/tables/feed/', table_feed, name='table_feed'),
+    path('api/stock-alerts/feed/', stock_alert_feed, name='stock_alert_feed'),
+    path('api/customers/lookup/', customer_lookup, name='customer_lookup'),
+    path('api/customers/<int:customer_id>/', customer_history_api, name='customer_history_api'),
+    path('stock-alerts/<int:alert_id>/resolve/', stock_alert_resolve, name='stock_alert_resolve'),
+    path('api/jobs/<int:job_id>/', job_status_api, name='job_status_api'),
+    path('api/reports/sales/analytics/', sales_analytics_api, name='sales_analytics_api'),
     
     # Discount management
     path('discounts/', discount_list, name='discount_list'),
@@ -120,12 +142,21 @@ urlpatterns = [
     path('reports/', reports_dashboard, name='reports_dashboard'),
     path('reports/sales/', sales_report, name='sales_report'),
     path('reports/sales/receipt/', sales_receipt, name='sales_receipt'),
+    path('reports/sales/receipt/print/', sales_receipt_print, name='sales_receipt_print'),
+    path('reports/sales/receipt/pdf/', sales_receipt_pdf, name='sales_receipt_pdf'),
     path('reports/sales/history/', sales_summary_history, name='sales_summary_history'),
     path('reports/sales/history/<int:pk>/', sales_summary_detail, name='sales_summary_detail'),
+    path('reports/sales/history/<int:pk>/pdf/', sales_summary_pdf, name='sales_summary_pdf'),
+    path('reports/sales/analytics/', sales_analytics_report, name='sales_analytics_report'),
     path('reports/export/orders/', export_orders_excel, name='export_orders_excel'),
     path('reports/export/order_items/', export_order_items_excel, name='export_order_items_excel'),
     path('reports/adjustments/', adjustment_report, name='adjustment_report'),
     path('reports/adjustments/receipt/', adjustment_receipt, name='adjustment_receipt'),
+    path('reports/adjustments/receipt/print/', adjustment_receipt_print, name='adjustment_receipt_print'),
+    
+    # Background jobs
+    path('jobs/<int:job_id>/', job_detail, name='job_detail'),
+    path('jobs/<int:job_id>/download/', job_download, name='job_download'),
     
     # User management
     path('users/', user_list, name='user_list'),
@@ -140,6 +171,11 @@ urlpatterns = [
     path('settings/receipt/', receipt_settings, name='receipt_settings'),
     path('settings/theme/', theme_settings, name='theme_settings'),
     
+    # Kitchen display
+    path('kitchen/', kitchen_display, name='kitchen_display'),
+    path('kitchen/feed/', kitchen_feed, name='kitchen_feed'),
+    path('kitchen/tickets/<int:order_id>/bump/', kitchen_bump, name='kitchen_bump'),
+    
     # Images served from database
     path('product_image/<int:product_id>/', serve_product_image, name='serve_product_image'),
     path('business_logo/<int:logo_id>/', serve_business_logo, name='serve_business_logo'),
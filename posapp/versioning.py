@@ -0,0 +1,81 @@
+"""
+Cache-backed version counters for groups of data.
+
+Each namespace ('orders', 'products', ...) has a counter that is bumped
+whenever data in it changes (see signals.py). Anything derived from that data,
+like list ETags, can embed the counter and be invalidated without tracking
+individual keys.
+
+Counters start from the current time in nanoseconds, so a counter that was
+evicted from the cache never restarts at a value that was handed out before.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+VERSION_KEY_PREFIX = 'posapp:version:'
+
+
+def _key(namespace):
+    return f'{VERSION_KEY_PREFIX}{namespace}'
+
+
+def get_version(namespace):
+    """Current version counter for a namespace"""
+    key = _key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(*namespaces):
+    """Current version counters for several namespaces in one cache round trip"""
+    keys = {_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys.keys())
+    return [found[key] if key in found else get_version(namespace) for key, namespace in keys.items()]
+
+
+def bump_version(*namespaces):
+    """Mark the data in the given namespaces as changed"""
+    for namespace in namespaces:
+        key = _key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not cached yet, start a fresh counter
+            cache.set(key, time.time_ns(), None)
+
+
+def versions_are_shared():
+    """
+    Whether every worker process sees the same counters
+
+    With a process-local cache a bump in one worker is invisible to the
+    others, so anything that trusts the counters to detect changes must be
+    disabled. POS_SHARED_VERSIONS overrides the detection.
+    """
+    override = getattr(settings, 'POS_SHARED_VERSIONS', None)
+    if override is not None:
+        return override
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+# Fragments keyed by a version are never invalidated, a bump just makes the
+# template look up a new key; the timeout lets the superseded ones age out
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def fragment_cache_timeout():
+    """
+    Timeout for {% cache %} fragments keyed by version counters
+
+    Returns:
+        FRAGMENT_CACHE_TIMEOUT, or 0 (render without caching) when the
+        counters are not shared and a fragment could outlive its data
+    """
+    return FRAGMENT_CACHE_TIMEOUT if versions_are_shared() else 0
@@ -7,12 +7,17 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.db.models import Q, Sum, Value, F, DecimalField
 from django.db.models.functions import Coalesce
 from django.http import JsonResponse, HttpResponseRedirect
+from django.views.decorators.http import require_POST
 from django.forms import inlineformset_factory
 from django import forms
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
 
-from posapp.models import BillAdjustment, BillAdjustmentImage, AdvanceAdjustment, EndDay, Setting, BusinessLogo
+from posapp.pagination import KeysetPaginationMixin
+from posapp.models import BillAdjustment, BillAdjustmentImage, AdvanceAdjustment, EndDay, BusinessLogo
+from posapp import printing, report_cache, settings_store
+from posapp.decorators import management_required
 
 # Custom mixin to check if user is admin or branch manager
 class AdminOrBranchManagerRequiredMixin(UserPassesTestMixin):
@@ -45,7 +50,7 @@ class BillAdjustmentForm(forms.ModelForm):
         }
 
 # Bill Adjustment Views
-class BillAdjustmentListView(LoginRequiredMixin, AdminOrBranchManagerRequiredMixin, ListView):
+class BillAdjustmentListView(LoginRequiredMixin, AdminOrBranchManagerRequiredMixin, KeysetPaginationMixin, ListView):
     model = BillAdjustment
     template_name = 'posapp/adjustments/bill_adjustment_list.html'
     context_object_name = 'bill_adjustments'
@@ -211,11 +216,12 @@ class BillAdjustmentImageDeleteView(LoginRequiredMixin, AdminRequiredMixin, Dele
             return HttpResponseRedirect(reverse_lazy('bill_adjustment_list'))
 
 # Advance Adjustment Views
-class AdvanceAdjustmentListView(LoginRequiredMixin, AdminOrBranchManagerRequiredMixin, ListView):
+class AdvanceAdjustmentListView(LoginRequiredMixin, AdminOrBranchManagerRequiredMixin, KeysetPaginationMixin, ListView):
     model = AdvanceAdjustment
     template_name = 'posapp/adjustments/advance_adjustment_list.html'
     context_object_name = 'advance_adjustments'
     ordering = ['-date']
+    keyset_ordering = ('-date', '-id')
     paginate_by = 10
     
     def get_queryset(self):
@@ -340,6 +346,41 @@ def adjustment_dashboard(request):
     
     return render(request, 'posapp/adjustments/adjustment_dashboard.html', context)
 
+def _adjustment_report_data(start_date, end_date):
+    """Adjustments shown by adjustment_report and adjustment_receipt, as plain data that can be cached"""
+    # Get bill adjustments for the date range with exact timestamp filtering
+    bill_adjustments = list(BillAdjustment.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date
+    ).order_by('-created_at').values(
+        'id', 'name', 'quantity', 'price', 'created_at', username=F('created_by__username')
+    ))
+    
+    # Get advance adjustments for the date range
+    # For advance adjustments, we need to check the created_at timestamp instead of just date
+    advance_adjustments = list(AdvanceAdjustment.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date
+    ).order_by('-created_at').values(
+        'id', 'name', 'amount', 'created_at', username=F('created_by__username')
+    ))
+    
+    # Templates read adjustment.created_by.username
+    for adjustment in bill_adjustments + advance_adjustments:
+        adjustment['created_by'] = {'username': adjustment.pop('username')}
+    
+    # Calculate totals
+    bill_total = sum((adjustment['price'] for adjustment in bill_adjustments), Decimal('0'))
+    advance_total = sum((adjustment['amount'] for adjustment in advance_adjustments), Decimal('0'))
+    
+    return {
+        'bill_adjustments': bill_adjustments,
+        'advance_adjustments': advance_adjustments,
+        'bill_total': bill_total,
+        'advance_total': advance_total,
+        'total_adjustments': bill_total + advance_total,
+    }
+
 # Adjustment Report
 @login_required
 def adjustment_report(request):
@@ -403,30 +444,13 @@ def adjustment_report(request):
         start_date = last_end_day_time
         end_date = timezone.make_aware(datetime.combine(today, datetime.max.time()))
     
-    # Get bill adjustments for the date range with exact timestamp filtering
-    bill_adjustments = BillAdjustment.objects.filter(
-        created_at__gte=start_date,
-        created_at__lte=end_date
-    ).order_by('-created_at')
-    
-    # Get advance adjustments for the date range
-    # For advance adjustments, we need to check the created_at timestamp instead of just date
-    advance_adjustments = AdvanceAdjustment.objects.filter(
-        created_at__gte=start_date,
-        created_at__lte=end_date
-    ).order_by('-created_at')
-    
-    # Calculate totals
-    bill_total = bill_adjustments.aggregate(Sum('price'))['price__sum'] or 0
-    advance_total = advance_adjustments.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_adjustments = bill_total + advance_total
+    report = report_cache.cached_report(
+        'adjustment_report', start_date, end_date, [report_cache.ADJUSTMENTS],
+        lambda: _adjustment_report_data(start_date, end_date),
+    )
     
     context = {
-        'bill_adjustments': bill_adjustments,
-        'advance_adjustments': advance_adjustments,
-        'bill_total': bill_total,
-        'advance_total': advance_total,
-        'total_adjustments': total_adjustments,
+        **report,
         'start_date': start_date,
         'end_date': end_date,
         'start_date_str': start_date.strftime('%Y-%m-%d %H:%M:%S'),
@@ -437,25 +461,25 @@ def adjustment_report(request):
     
     return render(request, 'posapp/adjustments/adjustment_report.html', context)
 
-@login_required
-def adjustment_receipt(request):
-    """Display a printable receipt for adjustment report"""
-    if not (request.user.is_superuser or 
-            request.user.profile.role.name == 'Admin' or 
-            request.user.profile.role.name == 'Branch Manager'):
-        messages.error(request, 'You do not have permission to access this page.')
-        return redirect('dashboard')
-    
+def _adjustment_receipt_context(params, user):
+    """
+    Adjustments and settings shown by adjustment_receipt and printed by
+    adjustment_receipt_print
+
+    Args:
+        params: Query or form data with the optional start_date and end_date
+        user: Branch managers only get the adjustments since the last end of day
+    """
     # Check if user is admin or branch manager
-    is_admin = request.user.is_superuser or request.user.profile.role.name == 'Admin'
+    is_admin = user.is_superuser or user.profile.role.name == 'Admin'
     
     # Get the last end day timestamp
     last_end_day = EndDay.get_last_end_day()
     last_end_day_time = last_end_day.end_date if last_end_day else None
     
     # Get date range from request
-    start_date_param = request.GET.get('start_date')
-    end_date_param = request.GET.get('end_date')
+    start_date_param = params.get('start_date')
+    end_date_param = params.get('end_date')
     
     # Set default date range to current month if not provided
     today = timezone.now()
@@ -500,57 +524,31 @@ def adjustment_receipt(request):
         start_date = last_end_day_time
         end_date = timezone.make_aware(datetime.combine(today, datetime.max.time()))
     
-    # Get bill adjustments for the date range with exact timestamp filtering
-    bill_adjustments = BillAdjustment.objects.filter(
-        created_at__gte=start_date,
-        created_at__lte=end_date
-    ).order_by('-created_at')
-    
-    # Get advance adjustments for the date range
-    # For advance adjustments, we need to check the created_at timestamp instead of just date
-    advance_adjustments = AdvanceAdjustment.objects.filter(
-        created_at__gte=start_date,
-        created_at__lte=end_date
-    ).order_by('-created_at')
-    
-    # Calculate totals
-    bill_total = bill_adjustments.aggregate(Sum('price'))['price__sum'] or 0
-    advance_total = advance_adjustments.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_adjustments = bill_total + advance_total
+    report = report_cache.cached_report(
+        'adjustment_report', start_date, end_date, [report_cache.ADJUSTMENTS],
+        lambda: _adjustment_report_data(start_date, end_date),
+    )
     
     # Get business information for the receipt
-    business_settings = {'business_name': 'POS System', 'business_address': '', 'business_phone': '', 'business_email': ''}
-    for setting in Setting.objects.filter(
-        setting_key__in=['business_name', 'business_address', 'business_phone', 'business_email']
-    ):
-        business_settings[setting.setting_key] = setting.setting_value
+    values = settings_store.get_values([
+        'business_name', 'business_address', 'business_phone', 'business_email',
+        'currency_symbol', 'receipt_show_logo', 'receipt_header', 'receipt_footer'
+    ])
+    business_settings = {key: values[key] for key in ('business_name', 'business_address', 'business_phone', 'business_email')}
+    business_settings['business_name'] = business_settings['business_name'] or 'POS System'
     
     # Get business logo URL
     logo_url = BusinessLogo.get_logo_url()
     
-    # Get currency symbol
-    try:
-        currency_setting = Setting.objects.get(setting_key='currency_symbol')
-        currency_symbol = currency_setting.setting_value
-    except:
-        currency_symbol = 'Rs.'
+    currency_symbol = values['currency_symbol'] or 'Rs.'
     
     # Get receipt settings
-    try:
-        receipt_show_logo = Setting.objects.get(setting_key='receipt_show_logo').setting_value == 'True'
-        receipt_header = Setting.objects.get(setting_key='receipt_header').setting_value
-        receipt_footer = Setting.objects.get(setting_key='receipt_footer').setting_value
-    except:
-        receipt_show_logo = False
-        receipt_header = ''
-        receipt_footer = ''
+    receipt_show_logo = values['receipt_show_logo']
+    receipt_header = values['receipt_header']
+    receipt_footer = values['receipt_footer']
     
     context = {
-        'bill_adjustments': bill_adjustments,
-        'advance_adjustments': advance_adjustments,
-        'bill_total': bill_total,
-        'advance_total': advance_total,
-        'total_adjustments': total_adjustments,
+        **report,
         'report_date': timezone.now(),
         'start_date': start_date,
         'end_date': end_date,
@@ -567,4 +565,30 @@ def adjustment_receipt(request):
         'receipt_footer': receipt_footer,
     }
     
-    return render(request, 'posapp/adjustments/adjustment_receipt.html', context) 
\ No newline at end of file
+    return context
+
+
+@login_required
+def adjustment_receipt(request):
+    """Display a printable receipt for adjustment report"""
+    if not (request.user.is_superuser or 
+            request.user.profile.role.name == 'Admin' or 
+            request.user.profile.role.name == 'Branch Manager'):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('dashboard')
+    
+    context = _adjustment_receipt_context(request.GET, request.user)
+    
+    return render(request, 'posapp/adjustments/adjustment_receipt.html', context)
+
+
+@login_required
+@management_required
+@require_POST
+def adjustment_receipt_print(request):
+    """Send the adjustment report receipt straight to the receipt printers"""
+    context = _adjustment_receipt_context(request.POST, request.user)
+    return printing.print_response(
+        printing.ADJUSTMENT_RECEIPT, context, request.user,
+        f"Adjustments {context['start_date']:%Y-%m-%d %H:%M} to {context['end_date']:%Y-%m-%d %H:%M}"
+    ) 
\ No newline at end of file
@@ -9,7 +9,8 @@ from django.views import View
 from django.views.decorators.csrf import csrf_protect
 from django.contrib.auth.models import User
 from ..forms import CustomAuthenticationForm
-from ..models import AuditLog, UserProfile, UserRole, Order
+from ..pending_orders import pending_order_count
+from ..models import AuditLog, UserProfile, UserRole
 
 class LoginView(View):
     template_name = 'posapp/auth/login.html'
@@ -74,12 +75,7 @@ class LogoutView(View):
         
         if not is_admin:
             # Check for incomplete orders (Pending orders)
-            has_incomplete_orders = Order.objects.filter(
-                user=request.user, 
-                order_status='Pending'
-            ).exists()
-            
-            if has_incomplete_orders:
+            if pending_order_count(request.user) > 0:
                 messages.error(request, "You cannot logout until all your orders are completed. Please complete your pending orders first.")
                 return redirect('order_list')
         
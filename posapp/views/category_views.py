@@ -2,17 +2,20 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Count, Q
 from ..models import Category
+from ..pagination import paginate
+from ..fragments import conditional_fragment, is_fragment_request, render_list_fragment
 
 @login_required
+@conditional_fragment('categories')
 def category_list(request):
     """Display list of all categories"""
     # Get search parameters
     search_query = request.GET.get('search', '')
     
     # Filter categories based on search
-    categories = Category.objects.all().order_by('name')
+    categories = Category.objects.annotate(product_count=Count('product')).order_by('name')
     
     if search_query:
         categories = categories.filter(
@@ -21,18 +24,16 @@ def category_list(request):
         )
     
     # Pagination
-    paginator = Paginator(categories, 10)  # Show 10 categories per page
-    page_number = request.GET.get('page')
-    categories_page = paginator.get_page(page_number)
+    categories_page = paginate(request, categories, 10, ordering=('name', 'id'))  # Show 10 categories per page
     
     context = {
         'categories': categories_page,
         'search_query': search_query,
     }
     
-    # Check if this is an AJAX request
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return render(request, 'posapp/categories/category_list.html', context)
+    # AJAX search only needs the cards and pagination
+    if is_fragment_request(request):
+        return render_list_fragment(request, 'posapp/categories/partials/category_cards.html', categories_page)
     
     return render(request, 'posapp/categories/category_list.html', context)
 
@@ -0,0 +1,29 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .. import customers
+
+__all__ = ['customer_lookup', 'customer_history_api']
+
+
+@login_required
+@require_GET
+def customer_lookup(request):
+    """
+    Customers whose phone number starts with the ``phone`` parameter
+
+    Serves the type-ahead on the POS customer phone field; see
+    posapp.customers.lookup.
+    """
+    return JsonResponse({'customers': customers.lookup(request.GET.get('phone', ''))})
+
+
+@login_required
+@require_GET
+def customer_history_api(request, customer_id):
+    """A customer's visit count, lifetime spend and most recent orders"""
+    history = customers.customer_history(customer_id)
+    if history is None:
+        return JsonResponse({'error': 'Customer not found'}, status=404)
+    return JsonResponse(history)
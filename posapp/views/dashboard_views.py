@@ -6,11 +6,15 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from django.utils import timezone
 from datetime import timedelta
-from decimal import Decimal
-from ..models import Category, Product, Order, UserProfile, Setting, BusinessSettings, EndDay, BillAdjustment, AdvanceAdjustment, OrderItem, SalesSummary
+from ..models import Category, Product, Order, UserProfile, BusinessSettings, EndDay, BillAdjustment, AdvanceAdjustment, OrderItem, SalesSummary
+from .. import affinity, forecasting, settings_store, stock_alerts
+from ..summaries import get_end_day_period
+from ..tasks import enqueue_sales_summary
+from ..versioning import fragment_cache_timeout, get_versions
+from ..kpis import dashboard_kpis
 import logging
 
-__all__ = ['is_admin', 'is_branch_manager', 'can_access_management', 'dashboard', 'pos', 'end_day', 'sales_summary']
+__all__ = ['is_admin', 'is_branch_manager', 'can_access_management', 'dashboard', 'pos', 'pos_service_worker', 'end_day', 'sales_summary']
 
 # Set up logger
 logger = logging.getLogger('posapp')
@@ -69,69 +73,44 @@ def dashboard(request):
     last_end_day = EndDay.get_last_end_day()
     last_end_day_time = last_end_day.end_date if last_end_day else None
     
-    # Fetch summary data
-    total_products = Product.objects.count()
-    total_categories = Category.objects.count()
-    total_users = User.objects.count()
-    
-    # Filter orders based on role and last end day
-    if is_admin:
-        # Admin sees all orders
-        all_orders = Order.objects.all()
-        active_orders = Order.objects.filter(order_status='Pending').count()
-        total_revenue = Order.objects.exclude(order_status='Cancelled').aggregate(total=Sum('total_amount'))['total'] or 0
-        recent_orders = Order.objects.all().order_by('-created_at')[:5]
-    else:
-        # Branch manager sees only orders since last end day
-        if last_end_day_time:
-            all_orders = Order.objects.filter(created_at__gte=last_end_day_time)
-            active_orders = Order.objects.filter(
-                created_at__gte=last_end_day_time,
-                order_status='Pending'
-            ).count()
-            total_revenue = Order.objects.filter(
-                created_at__gte=last_end_day_time
-            ).exclude(order_status='Cancelled').aggregate(total=Sum('total_amount'))['total'] or 0
-            recent_orders = Order.objects.filter(
-                created_at__gte=last_end_day_time
-            ).order_by('-created_at')[:5]
-        else:
-            # If no end day record exists, show all
-            all_orders = Order.objects.all()
-            active_orders = Order.objects.filter(order_status='Pending').count()
-            total_revenue = Order.objects.exclude(order_status='Cancelled').aggregate(total=Sum('total_amount'))['total'] or 0
-            recent_orders = Order.objects.all().order_by('-created_at')[:5]
+    # Admin sees all orders; branch manager only orders since last end day
+    since = None if is_admin else last_end_day_time
+    kpis = dashboard_kpis(since)
     
-    # Count total orders
-    total_orders = all_orders.count()
+    if since:
+        recent_orders = Order.objects.filter(created_at__gte=since).order_by('-created_at')[:5]
+    else:
+        recent_orders = Order.objects.all().order_by('-created_at')[:5]
     
     # Recent products (latest 5)
-    recent_products = Product.objects.all().order_by('-created_at')[:5]
+    recent_products = Product.objects.select_related('category').order_by('-created_at')[:5]
+    
+    # Open low stock alerts, cached until stock or alerts change
+    open_stock_alerts = stock_alerts.open_alerts()
+    
+    # Products due for reordering or forecast to run out within 3 days
+    running_out = forecasting.running_out(within_hours=72, limit=8)
     
     # Top selling products - since sold_count doesn't exist, 
     # we'll just use the most expensive products instead
-    top_products = Product.objects.all().order_by('-price')[:5]
+    top_products = Product.objects.select_related('category').order_by('-price')[:5]
     
     # All categories
-    categories = Category.objects.all()
+    categories = Category.objects.annotate(product_count=Count('product'))
     
     # All users with their roles
     users = User.objects.select_related('profile__role').all()
     
     # Get business information
-    business_settings = {}
-    for setting in Setting.objects.filter(setting_key__in=['business_name', 'business_address', 'business_phone', 'tax_rate']):
-        business_settings[setting.setting_key] = setting.setting_value
+    business_settings = settings_store.get_values(['business_name', 'business_address', 'business_phone', 'tax_rate'])
     
     context = {
-        'total_products': total_products,
-        'total_categories': total_categories,
-        'total_users': total_users,
-        'total_orders': total_orders,
-        'active_orders': active_orders,
-        'total_revenue': total_revenue,
+        **kpis,
         'recent_products': recent_products,
         'recent_orders': recent_orders,
+        'stock_alerts': open_stock_alerts,
+        'running_out': running_out,
+        'forecast_horizon_days': forecasting.HORIZON_DAYS,
         'top_products': top_products,
         'categories': categories,
         'users': users,
@@ -146,20 +125,19 @@ def dashboard(request):
 def pos(request):
     # Fetch only available products and all categories for the POS interface
     # Exclude archived products
-    products = Product.objects.filter(is_available=True, is_archived=False)
+    # Both are lazy, so they are only queried when the cached grid and
+    # category tabs have to be rendered again
+    products = Product.objects.filter(is_available=True, is_archived=False).select_related('category')
     categories = Category.objects.all()
+    products_version, categories_version = get_versions('products', 'categories')
     
     # Get tax rates from business settings
-    from ..views.settings_views import get_or_create_settings
-    
-    business_settings = get_or_create_settings([
+    business_settings = settings_store.get_values([
         'tax_rate_card', 'tax_rate_cash', 'default_service_charge'
     ])
-    
-    # Get tax rates with fallback values
-    card_tax_rate = float(Decimal(business_settings['tax_rate_card'].setting_value or '5.0'))
-    standard_tax_rate = float(Decimal(business_settings['tax_rate_cash'].setting_value or '15.0'))
-    default_service_charge = float(Decimal(business_settings['default_service_charge'].setting_value or '5.0'))
+    card_tax_rate = float(business_settings['tax_rate_card'])
+    standard_tax_rate = float(business_settings['tax_rate_cash'])
+    default_service_charge = float(business_settings['default_service_charge'])
     
     context = {
         'products': products,
@@ -167,10 +145,27 @@ def pos(request):
         'card_tax_rate': card_tax_rate,
         'standard_tax_rate': standard_tax_rate,
         'default_service_charge': default_service_charge,
+        'products_version': products_version,
+        'categories_version': categories_version,
+        'fragment_cache_timeout': fragment_cache_timeout(),
+        # Frequently bought together, looked up in the browser as the cart changes
+        'product_suggestions': affinity.suggestion_table(),
     }
     
     return render(request, 'posapp/pos.html', context)
 
+def pos_service_worker(request):
+    """
+    Service worker that keeps the POS screen usable offline
+
+    Served from under /pos/ so its scope covers the POS screen. Not behind
+    login_required: a redirect to the login page would fail registration.
+    """
+    response = render(request, 'posapp/pos_sw.js', content_type='application/javascript')
+    # Browsers check for a new worker on navigation; never serve a stale one
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 @login_required
 def end_day(request):
     """End day functionality for admin and branch managers"""
@@ -212,6 +207,9 @@ def end_day(request):
             notes=notes
         )
         
+        # The stored SalesSummary is built by the background worker
+        enqueue_sales_summary(end_day, request.user)
+        
         messages.success(request, f"Day ended successfully at {timezone.localtime().strftime('%Y-%m-%d %H:%M')}.")
         
         # Redirect to the sales summary report with the end day id
@@ -287,15 +285,7 @@ def sales_summary(request, end_day_id=None):
     
     # If we have an end_day_id, get the end date and previous end date for the redirect
     if end_day:
-        prev_end_day = EndDay.objects.filter(end_date__lt=end_day.end_date).order_by('-end_date').first()
-        
-        if prev_end_day:
-            start_date = prev_end_day.end_date
-        else:
-            # If no previous end day, use the start of day for end_day
-            start_date = end_day.end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        end_date = end_day.end_date
+        start_date, end_date = get_end_day_period(end_day)
     else:
         # If no end day provided, use the last end day
         last_end_day = EndDay.get_last_end_day()
@@ -319,93 +309,9 @@ def sales_summary(request, end_day_id=None):
     start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
     end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
     
-    # Check if we need to save the summary for this end_day
+    # Build the stored summary in the background if it does not exist yet
     if end_day and not hasattr(end_day, 'sales_summary'):
-        try:
-            # Get all completed orders in the date range
-            completed_orders = Order.objects.filter(
-                created_at__gte=start_date,
-                created_at__lte=end_date,
-                order_status='Completed'
-            )
-            
-            # Calculate the total sales amount
-            total_sales = completed_orders.aggregate(
-                total=Sum('total_amount')
-            )['total'] or 0
-            
-            # Calculate the total paid amount
-            total_paid = completed_orders.filter(
-                payment_status='Paid'
-            ).aggregate(
-                total=Sum('total_amount')
-            )['total'] or 0
-            
-            # Calculate the total pending amount
-            total_pending = completed_orders.filter(
-                payment_status='Pending'
-            ).aggregate(
-                total=Sum('total_amount')
-            )['total'] or 0
-            
-            # Get all bill adjustments in the date range
-            bill_adjustments = BillAdjustment.objects.filter(
-                created_at__gte=start_date,
-                created_at__lte=end_date
-            )
-            
-            # Calculate the total bill adjustments
-            total_bill_adjustments = bill_adjustments.aggregate(
-                total=Sum('price')
-            )['total'] or 0
-            
-            # Get all advance adjustments in the date range
-            advance_adjustments = AdvanceAdjustment.objects.filter(
-                created_at__gte=start_date,
-                created_at__lte=end_date
-            )
-            
-            # Calculate the total advance adjustments
-            total_advance_adjustments = advance_adjustments.aggregate(
-                total=Sum('amount')
-            )['total'] or 0
-            
-            # Calculate the total adjustments
-            total_adjustments = total_bill_adjustments + total_advance_adjustments
-            
-            # Calculate the net revenue
-            net_revenue = total_sales - total_adjustments
-            
-            # Get products sold
-            products_sold = OrderItem.objects.filter(
-                order__in=completed_orders
-            ).values(
-                'product__name'
-            ).annotate(
-                total_quantity=Sum('quantity'),
-                total_sales=Sum('total_price')
-            ).order_by('-total_quantity')
-            
-            # Create the sales summary record
-            sales_summary = SalesSummary.objects.create(
-                end_day=end_day,
-                start_date=start_date,
-                end_date=end_date,
-                total_sales=total_sales,
-                total_paid=total_paid,
-                total_pending=total_pending,
-                total_bill_adjustments=total_bill_adjustments,
-                total_advance_adjustments=total_advance_adjustments,
-                total_adjustments=total_adjustments,
-                net_revenue=net_revenue,
-                orders_count=completed_orders.count(),
-                summary_data={
-                    'products_sold': list(products_sold.values()),
-                }
-            )
-            logger.info(f"Created sales summary record for end day {end_day.id}")
-        except Exception as e:
-            logger.error(f"Error creating sales summary: {str(e)}")
+        enqueue_sales_summary(end_day, request.user)
     
     # Redirect to the sales receipt page with the date range
     return redirect(f"/reports/sales/receipt/?start_date={start_date_str}&end_date={end_date_str}") 
\ No newline at end of file
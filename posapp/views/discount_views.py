@@ -9,7 +9,8 @@ import json
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+from .. import discounts as discount_rules
 
 @login_required
 def discount_list(request):
@@ -136,7 +137,12 @@ def discount_delete(request, discount_id):
 @csrf_exempt
 @require_POST
 def validate_discount_code(request):
-    """API endpoint to validate a discount code"""
+    """API endpoint to validate a discount code
+
+    Optionally takes the order's subtotal and items ({product_id,
+    total_price}) to check minimum spend and product/category scoped rules,
+    and then also returns the discount amount.
+    """
     try:
         data = json.loads(request.body)
         code = data.get('code')
@@ -145,31 +151,20 @@ def validate_discount_code(request):
             return JsonResponse({"valid": False, "message": "Discount code is required"}, status=400)
         
         try:
-            discount = Discount.objects.get(code=code, is_active=True)
-            
-            # Check if the discount is valid (within date range)
-            today = timezone.now().date()
-            
-            if (discount.start_date and discount.start_date > today) or \
-               (discount.end_date and discount.end_date < today):
-                return JsonResponse(
-                    {"valid": False, "message": "This discount code is not valid at this time"}
-                )
-            
-            # Return discount details
-            discount_data = {
-                "id": discount.id,
-                "name": discount.name,
-                "code": discount.code,
-                "type": discount.type,
-                "value": float(discount.value),
-                "start_date": discount.start_date.isoformat() if discount.start_date else None,
-                "end_date": discount.end_date.isoformat() if discount.end_date else None
-            }
-            
-            return JsonResponse({"valid": True, "discount": discount_data})
-        except Discount.DoesNotExist:
-            return JsonResponse({"valid": False, "message": "Invalid discount code"})
+            subtotal = Decimal(str(data['subtotal'])) if data.get('subtotal') is not None else None
+        except InvalidOperation:
+            return JsonResponse({"valid": False, "message": "Invalid subtotal"}, status=400)
+        items = data.get('items')
+        
+        # Checked against the compiled discount table, without queries
+        rule, message = discount_rules.validate(code, subtotal, items)
+        if rule is None:
+            return JsonResponse({"valid": False, "message": message})
+        
+        response = {"valid": True, "discount": rule.as_dict()}
+        if subtotal is not None:
+            response["discount_amount"] = float(discount_rules.order_amount(rule, subtotal, items))
+        return JsonResponse(response)
     except json.JSONDecodeError:
         return JsonResponse({"valid": False, "message": "Invalid JSON data"}, status=400)
     except Exception as e:
@@ -0,0 +1,39 @@
+from django.shortcuts import render, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, Http404, JsonResponse
+
+from ..models import BackgroundJob
+from ..decorators import management_required
+from ..jobs import job_status
+
+__all__ = ['job_detail', 'job_status_api', 'job_download']
+
+@login_required
+@management_required
+def job_detail(request, job_id):
+    """Progress page for a background job, polls job_status_api until it finishes"""
+    job = get_object_or_404(BackgroundJob, id=job_id)
+    return render(request, 'posapp/jobs/job_detail.html', {
+        'job': job,
+        'status': job_status(job),
+    })
+
+@login_required
+@management_required
+def job_status_api(request, job_id):
+    """Current status, progress and result of a background job"""
+    job = get_object_or_404(BackgroundJob.objects.defer('result_file'), id=job_id)
+    return JsonResponse(job_status(job))
+
+@login_required
+@management_required
+def job_download(request, job_id):
+    """Serve the file produced by a completed background job"""
+    job = get_object_or_404(BackgroundJob, id=job_id, status='Completed')
+    
+    if not job.result_file:
+        raise Http404("This job did not produce a file")
+    
+    response = HttpResponse(bytes(job.result_file), content_type=job.result_file_type or 'application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="{job.result_file_name or "download"}"'
+    return response
@@ -0,0 +1,109 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.views.decorators.http import require_POST
+
+from .. import kitchen, sse
+
+__all__ = ['kitchen_display', 'kitchen_feed', 'kitchen_bump']
+
+
+def _event_id(version, known):
+    """Encode what a screen has seen as an SSE event id: 'version;id.rev,id.rev'"""
+    tickets = ','.join(f'{order_id}.{revision}' for order_id, revision in sorted(known.items()))
+    return f'{version or ""};{tickets}'
+
+
+def _parse_event_id(event_id):
+    """
+    Returns:
+        A tuple (version, known), known being None when there is no usable
+        state and the screen needs the full queue
+    """
+    if not event_id or ';' not in event_id:
+        return None, None
+    version, _, tickets = event_id.partition(';')
+    known = {}
+    try:
+        for entry in filter(None, tickets.split(',')):
+            order_id, _, revision = entry.partition('.')
+            known[int(order_id)] = int(revision)
+        version = int(version) if version else None
+    except ValueError:
+        return None, None
+    return version, known
+
+
+def _feed_message(event_id):
+    """
+    The SSE message bringing a screen from event_id up to date
+
+    Returns:
+        A tuple (message, event_id); message is None when nothing changed
+    """
+    version, known = _parse_event_id(event_id)
+    # Read the version before the tickets, so a change made in between is
+    # picked up by the next check
+    current_version = kitchen.feed_version()
+    if known is not None and current_version is not None and current_version == version:
+        return None, event_id
+
+    reset = known is None
+    tickets, removed = kitchen.ticket_changes(known or {})
+    if not reset and not tickets and not removed:
+        return None, event_id
+
+    known = {order_id: revision for order_id, revision in (known or {}).items() if order_id not in removed}
+    known.update((ticket['order_id'], ticket['revision']) for ticket in tickets)
+    event_id = _event_id(current_version, known)
+    return sse.message('tickets', event_id, {'reset': reset, 'tickets': tickets, 'removed': removed}), event_id
+
+
+@login_required
+def kitchen_display(request):
+    """Kitchen screen showing the ticket queue, updated from kitchen_feed"""
+    return render(request, 'posapp/kitchen/display.html')
+
+
+async def kitchen_feed(request):
+    """
+    Server-sent events feed of ticket changes
+
+    The first message has the whole queue; later ones only the tickets that
+    changed and the ids of those that left it. The event id encodes what the
+    screen has seen, so a reconnecting EventSource (Last-Event-ID) continues
+    with deltas.
+
+    See posapp.sse for how the feed is served under ASGI and WSGI.
+    """
+    return await sse.feed_response(request, _feed_message)
+
+
+@login_required
+@require_POST
+def kitchen_bump(request, order_id):
+    """
+    Mark a ticket's items as done, or back in the queue
+
+    Takes item_id (omit for the whole ticket) and bumped ('false' to undo)
+    as form or JSON fields.
+    """
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or '{}')
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    else:
+        data = request.POST
+    try:
+        item_id = int(data['item_id']) if data.get('item_id') not in (None, '') else None
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'item_id must be a number'}, status=400)
+    bumped = str(data.get('bumped', 'true')).lower() not in ('false', '0')
+
+    ticket = kitchen.bump(order_id, item_id, bumped)
+    if ticket is None:
+        return JsonResponse({'status': 'error', 'message': 'This order is not in the kitchen queue'}, status=404)
+    return JsonResponse({'status': 'success', 'ticket': ticket.as_dict()})
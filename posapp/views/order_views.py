@@ -1,8 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db.models import F, Q, Sum
 from django.utils import timezone
 from django.http import JsonResponse
 # PDF export is disabled
@@ -20,15 +19,28 @@ from django.urls import reverse
 from django.db import transaction
 import logging
 
-from ..models import Order, OrderItem, Product, Setting, Category, Discount, BusinessLogo, EndDay
+from ..models import Order, OrderItem, Product, Category, Discount, BusinessLogo, EndDay
 from ..forms import OrderForm
-from ..views.settings_views import get_or_create_settings
 from ..decorators import management_required
+from ..archive import order_history, get_order_or_archived
+from ..pagination import paginate
+from ..fragments import conditional_fragment, is_fragment_request, render_list_fragment
+from ..versioning import fragment_cache_timeout, get_version
+from ..idempotency import idempotent
+from .. import affinity, customers, printing, settings_store
+from ..discounts import get_rule as get_discount_rule
+from ..tables import occupancy
+from ..ingest import MAX_BATCH_ORDERS, OrderValidationError, create_order_from_payload, sync_orders
+from ..order_search import search_filter
 
 # Set up logger
 logger = logging.getLogger('posapp')
 
+# Order lists stop counting after this many rows and show "1000+"
+ORDER_COUNT_LIMIT = 1000
+
 @login_required
+@conditional_fragment('orders')
 def order_list(request):
     """Display list of all orders"""
     # Get history parameter (only used by admins)
@@ -56,11 +68,15 @@ def order_list(request):
     last_end_day = EndDay.get_last_end_day()
     last_end_day_time = last_end_day.end_date if last_end_day else None
     
+    # Admin history reads through the archive layer, which only touches the
+    # archive tables when the date range reaches below the archive cutoff
+    use_archive = is_admin and show_history
+    
     # Start with all orders for admins or branch managers, or only user's orders for regular users
     if is_admin:
         # Admins can see all orders (especially with history=1)
         if show_history:
-            orders = Order.objects.all().order_by('-created_at')
+            orders = None
         else:
             # Without history parameter, show only orders since last end day
             if last_end_day_time:
@@ -83,41 +99,30 @@ def order_list(request):
         else:
             orders = Order.objects.filter(user=request.user).order_by('-created_at')
     
-    if search_query:
-        # Check if the search query consists only of digits (likely a table number)
-        if search_query.isdigit():
-            # For numeric searches (like table numbers), use both exact and contains matching
-            orders = orders.filter(
-                Q(reference_number__icontains=search_query) |
-                Q(customer_name__icontains=search_query) |
-                Q(customer_phone__icontains=search_query) |
-                Q(table_number__icontains=search_query) |
-                Q(table_number__exact=search_query)  # Add exact matching for table numbers
-            )
-        else:
-            # For text searches, use contains matching
-            orders = orders.filter(
-                Q(reference_number__icontains=search_query) |
-                Q(customer_name__icontains=search_query) |
-                Q(customer_phone__icontains=search_query) |
-                Q(table_number__icontains=search_query)
-            )
+    # The shape of the search text picks a lookup an index can answer,
+    # see posapp.order_search
+    filters = search_filter(search_query)
     
     if status_filter:
-        orders = orders.filter(order_status=status_filter)
+        filters &= Q(order_status=status_filter)
     
-    if date_from:
-        date_from_obj = datetime.datetime.strptime(date_from, '%Y-%m-%d').date()
-        orders = orders.filter(created_at__date__gte=date_from_obj)
+    date_from_obj = datetime.datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+    date_to_obj = datetime.datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
     
-    if date_to:
-        date_to_obj = datetime.datetime.strptime(date_to, '%Y-%m-%d').date()
-        orders = orders.filter(created_at__date__lte=date_to_obj)
+    if use_archive:
+        orders = order_history(filters, date_from_obj, date_to_obj)
+    else:
+        orders = orders.filter(filters).select_related('user')
+        
+        if date_from_obj:
+            orders = orders.filter(created_at__date__gte=date_from_obj)
+        
+        if date_to_obj:
+            orders = orders.filter(created_at__date__lte=date_to_obj)
     
-    # Pagination
-    paginator = Paginator(orders, 10)  # Show 10 orders per page
-    page_number = request.GET.get('page')
-    orders_page = paginator.get_page(page_number)
+    # Keyset pagination, newest first; the total is capped so deep history
+    # never needs a full COUNT
+    orders_page = paginate(request, orders, 10, count_limit=ORDER_COUNT_LIMIT)
     
     context = {
         'orders': orders_page,
@@ -132,16 +137,16 @@ def order_list(request):
         'last_end_day': last_end_day,
     }
     
-    # Check if this is an AJAX request
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return render(request, 'posapp/orders/order_list.html', context)
+    # AJAX search only needs the rows and pagination
+    if is_fragment_request(request):
+        return render_list_fragment(request, 'posapp/orders/partials/order_rows.html', orders_page)
     
     return render(request, 'posapp/orders/order_list.html', context)
 
 @login_required
 def order_detail(request, order_id):
     """Display details of a specific order"""
-    order = get_object_or_404(Order, id=order_id)
+    order = get_order_or_archived(order_id)
     
     # Check if the user has permission to view this order
     is_admin = request.user.is_superuser or (hasattr(request.user, 'profile') and request.user.profile.role.name == 'Admin')
@@ -151,7 +156,7 @@ def order_detail(request, order_id):
         messages.error(request, "You don't have permission to view this order.")
         return redirect('order_list')
     
-    order_items = OrderItem.objects.filter(order=order)
+    order_items = order.items.all()
     
     # Calculate subtotal
     subtotal = sum(item.unit_price * item.quantity for item in order_items)
@@ -171,13 +176,9 @@ def order_detail(request, order_id):
     taxable_amount = subtotal - discount_amount
     
     # Get tax rates from settings
-    business_settings = get_or_create_settings([
-        'tax_rate_card', 'tax_rate_cash'
-    ])
-    
-    # Get tax rates with fallback values
-    tax_rate_card = Decimal(business_settings['tax_rate_card'].setting_value or '5.0')
-    tax_rate_cash = Decimal(business_settings['tax_rate_cash'].setting_value or '15.0')
+    business_settings = settings_store.get_values(['tax_rate_card', 'tax_rate_cash'])
+    tax_rate_card = business_settings['tax_rate_card']
+    tax_rate_cash = business_settings['tax_rate_cash']
     
     # Calculate tax based on payment method
     tax_rate = tax_rate_card if order.payment_method.lower() == 'card' else tax_rate_cash
@@ -226,6 +227,7 @@ def order_create(request):
             order.discount_amount = 0
             order.total_amount = 0
             order.order_status = 'Pending'
+            order.customer = customers.upsert(order.customer_phone, order.customer_name, order.delivery_address)
             
             # Save order to generate ID
             order.save()
@@ -250,6 +252,21 @@ def order_create(request):
     
     return render(request, 'posapp/orders/order_form.html', context)
 
+def _rule_discount(rule, order, subtotal):
+    """
+    Amount of a discount rule on the order's current items
+
+    Returns:
+        A tuple of (amount, why the discount does not apply or None)
+    """
+    items = None
+    if rule.is_scoped:
+        items = list(order.items.values('product_id', 'total_price', category_id=F('product__category_id')))
+    error = rule.check(subtotal, items)
+    if error:
+        return Decimal('0'), error
+    return rule.amount(subtotal, items), None
+
 @login_required
 def order_edit(request, order_id):
     """Edit an existing order."""
@@ -276,7 +293,8 @@ def order_edit(request, order_id):
         is_editable = False
         messages.warning(request, "This order cannot be fully edited because it is already paid or completed.")
     
-    # Get all products and order items
+    # Get all products and order items; the product picker is a cached
+    # fragment, so the products are only queried when it is rendered again
     all_products = Product.objects.filter(is_available=True)
     all_order_items = OrderItem.objects.filter(order=order)
     
@@ -287,19 +305,18 @@ def order_edit(request, order_id):
     discount_amount = 0
     
     if order.payment_status != 'paid' and order.discount:
-        if order.discount.type == 'Percentage':
+        discount_rule = get_discount_rule(order.discount_id)
+        if discount_rule:
+            discount_amount, _ = _rule_discount(discount_rule, order, subtotal)
+        elif order.discount.type == 'Percentage':
             discount_amount = (subtotal * Decimal(order.discount.value)) / 100
         elif order.discount.type == 'Fixed':
             discount_amount = Decimal(order.discount.value)
     
     # Get tax rates from settings
-    business_settings = get_or_create_settings([
-        'tax_rate_card', 'tax_rate_cash'
-    ])
-    
-    # Get tax rates with fallback values
-    tax_rate_card = Decimal(business_settings['tax_rate_card'].setting_value or '5.0')
-    tax_rate_cash = Decimal(business_settings['tax_rate_cash'].setting_value or '15.0')
+    business_settings = settings_store.get_values(['tax_rate_card', 'tax_rate_cash'])
+    tax_rate_card = business_settings['tax_rate_card']
+    tax_rate_cash = business_settings['tax_rate_cash']
     
     # Calculate tax based on payment method
     tax_rate = tax_rate_card if order.payment_method.lower() == 'card' else tax_rate_cash
@@ -486,6 +503,11 @@ def order_edit(request, order_id):
             # Save the order
             order_instance = order_form.save(commit=False)
             
+            # Link the order to the customer with its (possibly corrected) phone number
+            order_instance.customer = customers.upsert(
+                order_instance.customer_phone, order_instance.customer_name, order_instance.delivery_address
+            )
+            
             # Process discount data from form
             discount_code = request.POST.get('discount_code', '')
             discount_type = request.POST.get('discount_type', 'fixed')
@@ -499,10 +521,12 @@ def order_edit(request, order_id):
             order_instance.discount_value = Decimal(discount_value) if discount_value else Decimal('0')
             
             # If discount_id is provided and not empty, link to Discount object
+            discount_rule = None
             if discount_id and discount_id != '':
                 try:
-                    discount = Discount.objects.get(pk=int(discount_id))
-                    order_instance.discount = discount
+                    # Active discounts come from the compiled discount table
+                    discount_rule = get_discount_rule(int(discount_id))
+                    order_instance.discount = discount_rule.discount if discount_rule else Discount.objects.get(pk=int(discount_id))
                 except (Discount.DoesNotExist, ValueError):
                     order_instance.discount = None
             else:
@@ -513,7 +537,16 @@ def order_edit(request, order_id):
             
             # Recalculate discount
             discount_amount = 0
-            if order_instance.discount:
+            if discount_rule:
+                # The edited order must still meet the discount's conditions,
+                # as when the code was first applied
+                discount_amount, discount_error = _rule_discount(discount_rule, order_instance, updated_subtotal)
+                if discount_error:
+                    messages.warning(request, f"Discount {discount_rule.code} was removed: {discount_error}")
+                    order_instance.discount = None
+                    order_instance.discount_code = ''
+                    order_instance.discount_value = Decimal('0')
+            elif order_instance.discount:
                 if order_instance.discount.type == 'Percentage':
                     discount_amount = updated_subtotal * (order_instance.discount.value / Decimal('100.0'))
                 else:
@@ -587,6 +620,11 @@ def order_edit(request, order_id):
     # Get delivery charges for display in the form
     delivery_charges = order.delivery_charges if hasattr(order, 'delivery_charges') else Decimal('0.00')
     
+    # Frequently bought together with what is already in the order
+    suggested_ids = affinity.suggestions([item['product'].id for item in order_items])
+    suggested = Product.objects.in_bulk(suggested_ids) if suggested_ids else {}
+    suggested_products = [suggested[product_id] for product_id in suggested_ids if product_id in suggested]
+    
     context = {
         'form': order_form,
         'order': order,
@@ -607,6 +645,9 @@ def order_edit(request, order_id):
         'original_total': original_total,
         'has_changes': has_changes,
         'is_editable': is_editable,
+        'suggested_products': suggested_products,
+        'products_version': get_version('products'),
+        'fragment_cache_timeout': fragment_cache_timeout(),
     }
     
     return render(request, 'posapp/orders/order_form.html', context)
@@ -654,31 +695,15 @@ def order_delete(request, order_id):
     
     return redirect('order_detail', order_id=order_id)
 
-@login_required
-def order_receipt(request, order_id):
-    """Display a printable receipt for an order"""
-    order = get_object_or_404(Order, id=order_id)
-    order_items = OrderItem.objects.filter(order=order)
+def _order_receipt_context(order):
+    """Receipt figures and settings shown by order_receipt and printed by order_receipt_print"""
+    order_items = order.items.all()
     
     # Calculate subtotal and discount amount
     subtotal = sum([item.unit_price * item.quantity for item in order_items])
     discount_amount = 0
     discount_info = None
     
-    # Debug discount information
-    print(f"DEBUG: Order #{order.reference_number} Discount Check:")
-    print(f"  - Has discount object: {order.discount is not None}")
-    print(f"  - discount_code: {getattr(order, 'discount_code', 'None')}")
-    print(f"  - discount_type: {getattr(order, 'discount_type', 'None')}")
-    print(f"  - discount_value: {getattr(order, 'discount_value', 'None')}")
-    print(f"  - discount_amount: {order.discount_amount}")
-    
-    # Debug delivery information
-    print(f"DEBUG: Order #{order.reference_number} Delivery Info:")
-    print(f"  - order_type: {getattr(order, 'order_type', 'None')}")
-    print(f"  - delivery_charges: {getattr(order, 'delivery_charges', 'None')}")
-    print(f"  - delivery_address: {getattr(order, 'delivery_address', 'None')}")
-    
     if order.discount:
         # Create discount info dictionary
         discount_info = {
@@ -718,37 +743,37 @@ def order_receipt(request, order_id):
         }
     
     # Get business settings
-    business_settings = get_or_create_settings([
+    business_settings = settings_store.get_values([
         'business_name', 'business_address', 'business_phone', 
         'business_email', 'currency_symbol', 'tax_rate_card', 'tax_rate_cash'
     ])
     
-    business_name = business_settings['business_name'].setting_value
-    business_address = business_settings['business_address'].setting_value
-    business_phone = business_settings['business_phone'].setting_value
-    business_email = business_settings['business_email'].setting_value
-    currency_symbol = business_settings['currency_symbol'].setting_value or '$'
+    business_name = business_settings['business_name']
+    business_address = business_settings['business_address']
+    business_phone = business_settings['business_phone']
+    business_email = business_settings['business_email']
+    currency_symbol = business_settings['currency_symbol'] or '$'
     
-    # Get tax rates from settings with fallback values
-    tax_rate_card = Decimal(business_settings['tax_rate_card'].setting_value or '5.0')
-    tax_rate_cash = Decimal(business_settings['tax_rate_cash'].setting_value or '15.0')
+    # Get tax rates from settings
+    tax_rate_card = business_settings['tax_rate_card']
+    tax_rate_cash = business_settings['tax_rate_cash']
     
     # Get business logo from BusinessLogo model
     business_logo = BusinessLogo.get_logo_url()
     
     # Get receipt settings
-    receipt_settings = get_or_create_settings([
+    receipt_settings = settings_store.get_values([
         'receipt_header', 'receipt_footer', 'receipt_show_logo',
         'receipt_show_cashier', 'receipt_paper_size',
         'receipt_custom_css'
     ])
     
-    receipt_header = receipt_settings['receipt_header'].setting_value
-    receipt_footer = receipt_settings['receipt_footer'].setting_value
-    receipt_show_logo = receipt_settings['receipt_show_logo'].setting_value == 'True'
-    receipt_show_cashier = receipt_settings['receipt_show_cashier'].setting_value == 'True'
-    receipt_paper_size = receipt_settings['receipt_paper_size'].setting_value
-    receipt_custom_css = receipt_settings['receipt_custom_css'].setting_value
+    receipt_header = receipt_settings['receipt_header']
+    receipt_footer = receipt_settings['receipt_footer']
+    receipt_show_logo = receipt_settings['receipt_show_logo']
+    receipt_show_cashier = receipt_settings['receipt_show_cashier']
+    receipt_paper_size = receipt_settings['receipt_paper_size']
+    receipt_custom_css = receipt_settings['receipt_custom_css']
     
     # Calculate tax based on payment method
     tax_rate = tax_rate_card if order.payment_method.lower() == 'card' else tax_rate_cash
@@ -760,8 +785,8 @@ def order_receipt(request, order_id):
     # Set tax amount based on the calculated rate
     tax_amount = (subtotal - discount_amount) * (tax_rate / Decimal('100.0'))
     
-    # Update order tax_amount and total_amount if necessary
-    if order.tax_amount != tax_amount:
+    # Update order tax_amount and total_amount if necessary (archived orders are read-only)
+    if order.tax_amount != tax_amount and not getattr(order, 'is_archived', False):
         order.tax_amount = tax_amount
         order.total_amount = subtotal - discount_amount + tax_amount + delivery_charges
         order.save()
@@ -792,32 +817,35 @@ def order_receipt(request, order_id):
         'delivery_charges': delivery_charges
     }
     
-    return render(request, 'posapp/orders/order_receipt.html', context)
+    return context
 
 @login_required
-def kitchen_receipt(request, order_id):
-    """Display a printable kitchen copy for an order
-    
-    Shows order details including:
-    - Order reference number
-    - Date and time
-    - Order type (Dine In or Delivery)
-    - Table number (for Dine In orders)
-    - Order items with quantities
-    - Order notes
-    - Delivery address (for Delivery orders)
-    """
-    order = get_object_or_404(Order, id=order_id)
+def order_receipt(request, order_id):
+    """Display a printable receipt for an order"""
+    order = get_order_or_archived(order_id)
+    return render(request, 'posapp/orders/order_receipt.html', _order_receipt_context(order))
+
+@login_required
+@require_POST
+def order_receipt_print(request, order_id):
+    """Send an order's receipt straight to the receipt printers"""
+    order = get_order_or_archived(order_id)
+    return printing.print_response(
+        printing.ORDER_RECEIPT, _order_receipt_context(order), request.user, f"Receipt #{order.reference_number}"
+    )
+
+def _kitchen_receipt_context(order):
+    """Order details shown by kitchen_receipt and printed by kitchen_receipt_print"""
     order_items = OrderItem.objects.filter(order=order)
     
     # Get business settings
-    business_settings = get_or_create_settings([
+    business_settings = settings_store.get_values([
         'business_name', 'business_address', 'business_phone', 
     ])
     
-    business_name = business_settings['business_name'].setting_value
-    business_address = business_settings['business_address'].setting_value
-    business_phone = business_settings['business_phone'].setting_value
+    business_name = business_settings['business_name']
+    business_address = business_settings['business_address']
+    business_phone = business_settings['business_phone']
     
     context = {
         'order': order,
@@ -827,7 +855,32 @@ def kitchen_receipt(request, order_id):
         'business_phone': business_phone,
     }
     
-    return render(request, 'posapp/orders/kitchen_receipt.html', context)
+    return context
+
+@login_required
+def kitchen_receipt(request, order_id):
+    """Display a printable kitchen copy for an order
+    
+    Shows order details including:
+    - Order reference number
+    - Date and time
+    - Order type (Dine In or Delivery)
+    - Table number (for Dine In orders)
+    - Order items with quantities
+    - Order notes
+    - Delivery address (for Delivery orders)
+    """
+    order = get_object_or_404(Order, id=order_id)
+    return render(request, 'posapp/orders/kitchen_receipt.html', _kitchen_receipt_context(order))
+
+@login_required
+@require_POST
+def kitchen_receipt_print(request, order_id):
+    """Send an order's kitchen copy straight to the kitchen printers"""
+    order = get_object_or_404(Order, id=order_id)
+    return printing.print_response(
+        printing.KITCHEN_RECEIPT, _kitchen_receipt_context(order), request.user, f"Kitchen #{order.reference_number}"
+    )
 
 @login_required
 def add_order_item(request, order_id):
@@ -1218,205 +1271,23 @@ def increase_order_item(request, order_id, item_id):
         messages.info(request, 'Item quantity will be increased when you save the order.')
         return redirect('order_edit', order_id=order_id)
 
-def calculate_order_totals(order, save=True):
-    """Calculate order totals: subtotal, discount, tax, and total"""
-    # Get all order items - we need to recalculate everything from scratch
-    order_items = OrderItem.objects.filter(order=order)
-    
-    # Calculate subtotal
-    subtotal = order.get_subtotal()
-    
-    # Calculate discount
-    discount_amount = 0
-    if order.discount:
-        if order.discount.type == 'Percentage':
-            discount_amount = subtotal * (order.discount.value / Decimal('100.0'))
-        else:
-            discount_amount = order.discount.value
-    
-    # Get tax rates from settings
-    business_settings = get_or_create_settings([
-        'tax_rate_card', 'tax_rate_cash'
-    ])
-    
-    # Get tax rates with fallback values
-    tax_rate_card = Decimal(business_settings['tax_rate_card'].setting_value or '5.0')
-    tax_rate_cash = Decimal(business_settings['tax_rate_cash'].setting_value or '15.0')
-    
-    # Calculate tax based on payment method
-    tax_rate = tax_rate_card if order.payment_method.lower() == 'card' else tax_rate_cash
-    tax_name = "Tax"
-    
-    taxable_amount = subtotal - discount_amount
-    tax_amount = (taxable_amount * tax_rate) / Decimal('100.0')
-    
-    # Calculate service charge for Dine In orders
-    service_charge_amount = Decimal('0.00')
-    if order.order_type == 'Dine In' and order.service_charge_percent > 0:
-        service_charge_amount = subtotal * (order.service_charge_percent / Decimal('100.0'))
-    
-    # Calculate the final total including service charge and delivery charges
-    delivery_charges = order.delivery_charges if hasattr(order, 'delivery_charges') else Decimal('0.00')
-    total_amount = subtotal - discount_amount + tax_amount + service_charge_amount + delivery_charges
-    
-    # Update order fields if requested
-    if save:
-        order.subtotal = subtotal
-        order.discount_amount = discount_amount
-        order.tax_amount = tax_amount
-        order.service_charge_amount = service_charge_amount
-        order.total_amount = total_amount
-        order.save()
-    
-    # Return the calculated values
-    return {
-        'subtotal': float(subtotal),
-        'discount_amount': float(discount_amount),
-        'tax_amount': float(tax_amount),
-        'service_charge_amount': float(service_charge_amount),
-        'total_amount': float(total_amount),
-        # Include simple keys for Ajax responses
-        'tax': float(tax_amount),
-        'total': float(total_amount)
-    }
-
-def update_order_totals(order):
-    """Update order totals based on items - wrapper for backwards compatibility"""
-    return calculate_order_totals(order, save=True)
-
 @login_required
 @csrf_exempt  # For simplicity in this example - consider proper CSRF protection in production
 @require_POST
+@idempotent
 def create_order_api(request):
     try:
         data = json.loads(request.body)
         
-        # Validate service charge
-        service_charge_percent = Decimal(str(data.get('service_charge_percent', '0')))
-        if service_charge_percent < 0:
-            return JsonResponse({'status': 'error', 'message': 'Service charge cannot be negative'}, status=400)
-        if service_charge_percent > 100:
-            return JsonResponse({'status': 'error', 'message': 'Service charge cannot exceed 100%'}, status=400)
-        
-        items = data.get('items', [])
-        
         # Use atomic transaction for the entire order creation process
         with transaction.atomic():
-            # Check stock availability for all items first
-            for item in items:
-                product_id = item['product_id']
-                quantity = int(item['quantity'])
-                
-                # Skip stock check if stock already updated in UI
-                if data.get('stock_already_reduced', False):
-                    continue
-                
-                try:
-                    product = Product.objects.select_for_update().get(id=product_id)
-                    
-                    # Skip stock check for running items
-                    if not product.is_running and product.stock < quantity:
-                        return JsonResponse({
-                            'status': 'error',
-                            'message': f'Insufficient stock for {product.name}. Available: {product.stock}',
-                            'product_id': product_id
-                        }, status=400)
-                except Product.DoesNotExist:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': f'Product with ID {product_id} does not exist',
-                    }, status=400)
-            
-            # Extract customer info
-            customer_name = data.get('customer_name', '')
-            customer_phone = data.get('customer_phone', '')
-            
-            # Get order data
-            subtotal = Decimal(str(data.get('subtotal', '0')))
-            tax_amount = Decimal(str(data.get('tax_amount', '0')))
-            discount_amount = Decimal(str(data.get('discount_amount', '0')))
-            discount_code = data.get('discount_code', '')
-            discount_type = data.get('discount_type', '')
-            discount_value = data.get('discount_value', 0)
-            
-            # Service charge (only for Dine In with subtotal >= 1000)
-            order_type = data.get('order_type', 'Take Away')
-            service_charge_percent = Decimal('0.00')
-            service_charge_amount = Decimal('0.00')
-            
-            if order_type == 'Dine In' and subtotal >= 1000:
-                service_charge_percent = Decimal(str(data.get('service_charge_percent', '0')))
-                service_charge_amount = subtotal * (service_charge_percent / Decimal('100.0'))
-            
-            # Delivery charges (only for Delivery)
-            delivery_charges = Decimal('0.00')
-            if order_type == 'Delivery':
-                delivery_charges = Decimal(str(data.get('delivery_charges', '0')))
-            
-            # Calculate total amount
-            total_amount = subtotal - discount_amount + tax_amount + service_charge_amount + delivery_charges
-            
-            # Check if a non-manual discount code was used
-            discount = None
-            if discount_code and discount_code != 'MANUAL':
-                try:
-                    discount = Discount.objects.get(code=discount_code, is_active=True)
-                except Discount.DoesNotExist:
-                    # If discount code doesn't exist, still create the order but without linking to a discount
-                    pass
-            
-            # Create order
-            order = Order.objects.create(
-                customer_name=customer_name,
-                customer_phone=customer_phone,
-                subtotal=subtotal,
-                tax_amount=tax_amount,
-                discount_amount=discount_amount,
-                discount_code=discount_code,
-                discount_type=discount_type,
-                discount_value=Decimal(str(discount_value)) if discount_value else Decimal('0'),
-                discount=discount,  # Link to discount object if found
-                service_charge_percent=service_charge_percent,
-                service_charge_amount=service_charge_amount,
-                delivery_charges=delivery_charges,
-                total_amount=total_amount,
-                payment_method=data.get('payment_method', 'Cash'),
-                payment_status=data.get('payment_status', 'Pending'),
-                order_status=data.get('order_status', 'Pending'),
-                notes=data.get('notes', ''),
-                user=request.user if request.user.is_authenticated else None,
-                order_type=order_type,
-                delivery_address=data.get('delivery_address', ''),
-                table_number=data.get('table_number', '')
-            )
-            
-            # Create order items
-            for item_data in items:
-                product_id = item_data['product_id']
-                quantity = int(item_data['quantity'])
-                unit_price = Decimal(str(item_data['unit_price']))
-                total_price = Decimal(str(item_data['total_price']))
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product_id=product_id,
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    total_price=total_price
-                )
-                
-                # Update product stock if not already updated in UI
-                if not data.get('stock_already_reduced', False):
-                    try:
-                        product = Product.objects.get(id=product_id)
-                        if not product.is_running:
-                            product.stock -= quantity
-                            product.save()
-                    except Product.DoesNotExist:
-                        # Log error but don't fail the order creation
-                        logger.error(f"Failed to update stock for product ID {product_id} - product not found")
-            
-            logger.info(f"Order #{order.id} created successfully by {request.user.username if request.user.is_authenticated else 'anonymous'}")
+            try:
+                order = create_order_from_payload(data, request.user)
+            except OrderValidationError as e:
+                response = {'status': 'error', 'message': e.message}
+                if e.product_id is not None:
+                    response['product_id'] = e.product_id
+                return JsonResponse(response, status=400)
             
             # Calculate display number (daily order number)
             today = timezone.localtime(timezone.now()).date()
@@ -1437,6 +1308,44 @@ def create_order_api(request):
             'details': str(e)
         }, status=500)
 
+@login_required
+@require_POST
+def sync_orders_api(request):
+    """
+    Create the orders a POS terminal queued while it was offline
+
+    Expects {"orders": [...]} with payloads as sent to create_order_api, each
+    with a client_uuid. Replaying a batch is safe: orders already received
+    are reported as duplicates.
+    """
+    try:
+        data = json.loads(request.body)
+        orders = data.get('orders')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    if not isinstance(orders, list):
+        return JsonResponse({'status': 'error', 'message': 'orders must be a list'}, status=400)
+    if len(orders) > MAX_BATCH_ORDERS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {MAX_BATCH_ORDERS} orders can be synced at once',
+        }, status=400)
+
+    try:
+        results = sync_orders(orders, request.user)
+    except Exception as e:
+        logger.exception(f"Error syncing offline orders: {str(e)}")
+        return JsonResponse({
+            'status': 'error',
+            'message': 'An unexpected error occurred while syncing orders.',
+            'details': str(e)
+        }, status=500)
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    if created:
+        logger.info(f"Synced {created} offline orders from {request.user.username}")
+    return JsonResponse({'status': 'success', 'results': results})
+
 def update_stock_on_order_pending(order):
     """
     Update product stock quantities in the database when an order is set to pending.
@@ -1607,15 +1516,7 @@ def get_active_tables(request):
     Return a list of tables that currently have pending orders assigned to them.
     This helps prevent assigning multiple orders to the same table.
     """
-    active_tables = Order.objects.filter(
-        order_type='Dine In', 
-        order_status='Pending',
-        table_number__isnull=False
-    ).exclude(table_number='').values_list('table_number', flat=True).distinct()
-    
-    # Convert to a list
-    active_tables_list = list(active_tables)
-    
+    # Served from the occupancy map kept by posapp.tables
     return JsonResponse({
-        'active_tables': active_tables_list
-    }) 
\ No newline at end of file
+        'active_tables': sorted(occupancy())
+    })
@@ -1,15 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.http import JsonResponse
 from ..models import Product, Category, OrderItem
 from ..forms import ProductForm
+from ..pagination import paginate
+from ..fragments import conditional_fragment, is_fragment_request, render_list_fragment
 import django.db.models.deletion
 from django.db import transaction
 
 @login_required
+@conditional_fragment('products')
 def product_list(request):
     """Display list of all products"""
     # Get search parameters
@@ -18,7 +20,7 @@ def product_list(request):
     show_archived = request.GET.get('show_archived') == 'on'
     
     # Filter products based on search and category
-    products = Product.objects.all().order_by('-created_at')
+    products = Product.objects.select_related('category').order_by('-created_at')
     
     # Filter by archived status
     if show_archived:
@@ -40,9 +42,7 @@ def product_list(request):
         products = products.filter(category_id=category_id)
     
     # Pagination
-    paginator = Paginator(products, 10)  # Show 10 products per page
-    page_number = request.GET.get('page')
-    products_page = paginator.get_page(page_number)
+    products_page = paginate(request, products, 10)  # Show 10 products per page
     
     categories = Category.objects.all()
     
@@ -54,9 +54,9 @@ def product_list(request):
         'show_archived': show_archived,
     }
     
-    # Check if this is an AJAX request
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return render(request, 'posapp/products/product_list.html', context)
+    # AJAX search only needs the rows and pagination
+    if is_fragment_request(request):
+        return render_list_fragment(request, 'posapp/products/partials/product_rows.html', products_page)
     
     return render(request, 'posapp/products/product_list.html', context)
 
@@ -81,6 +81,7 @@ def product_create(request):
         price = request.POST.get('price')
         sku = request.POST.get('sku') or None
         stock_quantity = request.POST.get('stock_quantity') or 0
+        reorder_threshold = request.POST.get('reorder_threshold') or 10
         is_available = request.POST.get('is_available') == 'on'
         running_item = request.POST.get('running_item') == 'on'
         description = request.POST.get('description') or None
@@ -107,6 +108,8 @@ def product_create(request):
             errors['price'] = "Price is required"
         if not running_item and not stock_quantity:
             errors['stock_quantity'] = "Stock quantity is required for non-running items"
+        if not str(reorder_threshold).isdigit():
+            errors['reorder_threshold'] = "Reorder threshold must be a whole number, 0 for no alerts"
         
         # If no errors, create product
         if not errors:
@@ -123,6 +126,7 @@ def product_create(request):
                     price=price,
                     sku=sku,
                     stock_quantity=stock_quantity,
+                    reorder_threshold=reorder_threshold,
                     is_available=is_available,
                     running_item=running_item,
                     description=description
@@ -165,6 +169,7 @@ def product_edit(request, product_id):
         price = request.POST.get('price')
         sku = request.POST.get('sku') or None
         stock_quantity = request.POST.get('stock_quantity') or 0
+        reorder_threshold = request.POST.get('reorder_threshold') or product.reorder_threshold
         is_available = request.POST.get('is_available') == 'on'
         is_archived = request.POST.get('is_archived') == 'on'
         running_item = request.POST.get('running_item') == 'on'
@@ -190,6 +195,8 @@ def product_edit(request, product_id):
             errors['price'] = "Price is required"
         if not running_item and not stock_quantity:
             errors['stock_quantity'] = "Stock quantity is required for non-running items"
+        if not str(reorder_threshold).isdigit():
+            errors['reorder_threshold'] = "Reorder threshold must be a whole number, 0 for no alerts"
             
         # If no errors, update product
         if not errors:
@@ -207,6 +214,7 @@ def product_edit(request, product_id):
             product.price = price
             product.sku = sku
             product.stock_quantity = stock_quantity
+            product.reorder_threshold = reorder_threshold
             product.is_available = is_available
             product.is_archived = is_archived
             product.running_item = running_item
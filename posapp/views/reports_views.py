@@ -2,30 +2,32 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, Count, F, DecimalField, Value
 from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, Coalesce
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.utils import timezone
 from django.contrib import messages
 from datetime import datetime, timedelta
 from decimal import Decimal
+from collections import defaultdict
 import csv
 import json
 from django.db.models import Q
-from django.core.cache import cache
 import logging
 from django.core.paginator import Paginator
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_POST
+import tempfile
 
-# Try to import xlwt for Excel export, but make it optional
-EXCEL_EXPORT_AVAILABLE = False
-try:
-    import xlwt
-    EXCEL_EXPORT_AVAILABLE = True
-except ImportError:
-    print("xlwt not installed. Excel export will be disabled.")
-except Exception as e:
-    print(f"xlwt error: {e}")
-
-from ..models import Order, OrderItem, Product, Category, BusinessSettings, BillAdjustment, AdvanceAdjustment, BusinessLogo, Setting, EndDay, SalesSummary
+from ..archive import aggregate_orders, order_sources, product_sales
+from ..models import Order, OrderItem, Product, Category, BusinessSettings, BillAdjustment, AdvanceAdjustment, BusinessLogo, EndDay, SalesSummary, SalesSummaryPdf
+from .. import settings_store
 from ..decorators import management_required
+from ..exports import EXCEL_EXPORT_AVAILABLE
+from ..jobs import enqueue
+from ..kpis import reports_kpis
+from ..pdfs import PDF_CONTENT_TYPE, PDF_EXPORT_AVAILABLE, receipt_figures, sales_summary_filename, write_sales_summary_pdf
+from ..tasks import enqueue_sales_summary_pdf
+from .. import analytics, printing, report_cache
 
 # Set up logger
 logger = logging.getLogger('posapp')
@@ -42,43 +44,14 @@ def reports_dashboard(request):
     last_end_day = EndDay.get_last_end_day()
     last_end_day_time = last_end_day.end_date if last_end_day else None
     
-    # Get some overview stats
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    # Base query for filtering orders
-    if is_admin or not last_end_day_time:
-        # Admin sees all orders, or if no end day exists, show all
-        base_query = Order.objects.all()
-    else:
-        # Branch manager sees only orders since last end day
-        base_query = Order.objects.filter(created_at__gte=last_end_day_time)
-    
-    # Orders count (exclude cancelled orders)
-    orders_today = base_query.filter(created_at__date=today).exclude(order_status='Cancelled').count()
-    orders_week = base_query.filter(created_at__date__gte=week_ago).exclude(order_status='Cancelled').count()
-    orders_month = base_query.filter(created_at__date__gte=month_ago).exclude(order_status='Cancelled').count()
-    orders_total = base_query.exclude(order_status='Cancelled').count()
-    
-    # Revenue (exclude cancelled orders)
-    revenue_today = base_query.filter(created_at__date=today).exclude(order_status='Cancelled').aggregate(total=Sum('total_amount'))['total'] or 0
-    revenue_week = base_query.filter(created_at__date__gte=week_ago).exclude(order_status='Cancelled').aggregate(total=Sum('total_amount'))['total'] or 0
-    revenue_month = base_query.filter(created_at__date__gte=month_ago).exclude(order_status='Cancelled').aggregate(total=Sum('total_amount'))['total'] or 0
-    revenue_total = base_query.exclude(order_status='Cancelled').aggregate(total=Sum('total_amount'))['total'] or 0
+    # Admin sees all orders, branch manager only orders since last end day
+    kpis = reports_kpis(None if is_admin else last_end_day_time)
     
     # Get categories for the product export filter
     categories = Category.objects.all()
     
     context = {
-        'orders_today': orders_today,
-        'orders_week': orders_week,
-        'orders_month': orders_month,
-        'orders_total': orders_total,
-        'revenue_today': revenue_today,
-        'revenue_week': revenue_week,
-        'revenue_month': revenue_month,
-        'revenue_total': revenue_total,
+        **kpis,
         'categories': categories,
         'excel_export_available': EXCEL_EXPORT_AVAILABLE,
         'is_admin': is_admin,
@@ -88,6 +61,96 @@ def reports_dashboard(request):
     return render(request, 'posapp/reports/dashboard.html', context)
 
 
+def _sales_report_data(start_date, end_date, since, report_type):
+    """
+    Figures shown by sales_report, as plain data that can be cached
+
+    Args:
+        start_date, end_date: First and last day of the report
+        since: Only count orders created after this moment (branch managers
+            see data since the last end day), or None
+        report_type: 'daily', 'weekly' or 'monthly' grouping of the chart
+    """
+    # Get sales data grouped by day/week/month
+    if report_type == 'daily':
+        truncate_date = TruncDay('created_at')
+    elif report_type == 'weekly':
+        truncate_date = TruncWeek('created_at')
+    else:  # monthly
+        truncate_date = TruncMonth('created_at')
+    
+    base_filter = Q(created_at__date__gte=start_date, created_at__date__lte=end_date)
+    
+    if since:
+        # Add condition for branch managers to only see data since last end day
+        base_filter &= Q(created_at__gte=since)
+    
+    # Get sales data excluding cancelled orders, from the archive too when
+    # the range reaches below the archive cutoff
+    sales_by_date = {}
+    for orders in order_sources(start_date):
+        rows = orders.filter(
+            base_filter
+        ).exclude(
+            order_status='Cancelled'
+        ).annotate(
+            date=truncate_date
+        ).values('date').annotate(
+            total_sales=Sum('total_amount'),
+            order_count=Count('id')
+        )
+        for row in rows:
+            period = sales_by_date.setdefault(row['date'], {'date': row['date'], 'total_sales': 0, 'order_count': 0})
+            period['total_sales'] += row['total_sales'] or 0
+            period['order_count'] += row['order_count']
+    sales_data = sorted(sales_by_date.values(), key=lambda row: row['date'])
+    
+    # Top selling products (only include completed orders)
+    top_products = product_sales(base_filter & Q(order_status='Completed'), start_date)[:10]
+    
+    # Sales by category (exclude orders that were cancelled)
+    sales_by_category = defaultdict(int)
+    for product in product_sales(base_filter & ~Q(order_status='Cancelled'), start_date):
+        sales_by_category[product['product__category__name']] += product['total_sales']
+    category_sales = sorted(
+        ({'product__category__name': name, 'total_sales': total} for name, total in sales_by_category.items()),
+        key=lambda row: row['total_sales'], reverse=True
+    )
+    
+    # Prepare chart data
+    chart_labels = []
+    chart_sales = []
+    chart_orders = []
+    
+    for item in sales_data:
+        if report_type == 'daily':
+            chart_labels.append(item['date'].strftime('%Y-%m-%d'))
+        elif report_type == 'weekly':
+            chart_labels.append(f"Week {item['date'].strftime('%U')}")
+        elif report_type == 'monthly':
+            chart_labels.append(item['date'].strftime('%b %Y'))
+        
+        chart_sales.append(float(item['total_sales']))
+        chart_orders.append(item['order_count'])
+    
+    # Category pie chart data
+    category_labels = [item['product__category__name'] or 'Unknown' for item in category_sales]
+    category_data = [float(item['total_sales']) for item in category_sales]
+    
+    return {
+        'sales_data': sales_data,
+        'top_products': top_products,
+        'category_sales': category_sales,
+        'chart_labels': json.dumps(chart_labels),
+        'chart_sales': json.dumps(chart_sales),
+        'chart_orders': json.dumps(chart_orders),
+        'category_labels': json.dumps(category_labels),
+        'category_data': json.dumps(category_data),
+        'total_sales': sum(chart_sales),
+        'total_orders': sum(chart_orders),
+    }
+
+
 @login_required
 @management_required
 def sales_report(request):
@@ -136,70 +199,13 @@ def sales_report(request):
         start_date = today - timedelta(days=6)
         end_date = today
     
-    # Get sales data grouped by day/week/month
-    if report_type == 'daily':
-        truncate_date = TruncDay('created_at')
-    elif report_type == 'weekly':
-        truncate_date = TruncWeek('created_at')
-    else:  # monthly
-        truncate_date = TruncMonth('created_at')
-    
-    # For branch managers, further limit by last end day if needed
-    base_filter = Q(created_at__date__gte=start_date, created_at__date__lte=end_date)
-    
-    if not is_admin and last_end_day_time:
-        # Add condition for branch managers to only see data since last end day
-        base_filter &= Q(created_at__gte=last_end_day_time)
-    
-    # Get sales data excluding cancelled orders
-    sales_data = Order.objects.filter(
-        base_filter
-    ).exclude(
-        order_status='Cancelled'
-    ).annotate(
-        date=truncate_date
-    ).values('date').annotate(
-        total_sales=Sum('total_amount'),
-        order_count=Count('id')
-    ).order_by('date')
-    
-    # Top selling products (exclude orders that were cancelled)
-    top_products = OrderItem.objects.filter(
-        order__in=Order.objects.filter(base_filter),
-        order__order_status='Completed'  # Only include completed orders
-    ).values('product__name', 'product__category__name').annotate(
-        total_quantity=Sum('quantity'),
-        total_sales=Sum('total_price')
-    ).order_by('-total_quantity')[:10]
-    
-    # Sales by category (exclude orders that were cancelled)
-    category_sales = OrderItem.objects.filter(
-        order__in=Order.objects.filter(base_filter)
-    ).exclude(
-        order__order_status='Cancelled'
-    ).values('product__category__name').annotate(
-        total_sales=Sum('total_price')
-    ).order_by('-total_sales')
-    
-    # Prepare chart data
-    chart_labels = []
-    chart_sales = []
-    chart_orders = []
-    
-    for item in sales_data:
-        if report_type == 'daily':
-            chart_labels.append(item['date'].strftime('%Y-%m-%d'))
-        elif report_type == 'weekly':
-            chart_labels.append(f"Week {item['date'].strftime('%U')}")
-        elif report_type == 'monthly':
-            chart_labels.append(item['date'].strftime('%b %Y'))
-        
-        chart_sales.append(float(item['total_sales']))
-        chart_orders.append(item['order_count'])
-    
-    # Category pie chart data
-    category_labels = [item['product__category__name'] or 'Unknown' for item in category_sales]
-    category_data = [float(item['total_sales']) for item in category_sales]
+    # Branch managers only see data since the last end day
+    since = None if is_admin else last_end_day_time
+    report = report_cache.cached_report(
+        'sales_report', start_date, end_date, [report_cache.ORDERS],
+        lambda: _sales_report_data(start_date, end_date, since, report_type),
+        since=since, report_type=report_type,
+    )
     
     context = {
         'report_type': report_type,
@@ -208,16 +214,7 @@ def sales_report(request):
         'custom_end': custom_end,
         'start_date': start_date,
         'end_date': end_date,
-        'sales_data': sales_data,
-        'top_products': top_products,
-        'category_sales': category_sales,
-        'chart_labels': json.dumps(chart_labels),
-        'chart_sales': json.dumps(chart_sales),
-        'chart_orders': json.dumps(chart_orders),
-        'category_labels': json.dumps(category_labels),
-        'category_data': json.dumps(category_data),
-        'total_sales': sum(chart_sales),
-        'total_orders': sum(chart_orders),
+        **report,
         'excel_export_available': EXCEL_EXPORT_AVAILABLE,
         'is_admin': is_admin,
         'last_end_day': last_end_day,
@@ -292,94 +289,17 @@ def export_orders_excel(request):
                 'error': 'Start date cannot be after end date.'
             }, status=400)
     
-        # Filter orders using exact timestamps
-        all_orders = Order.objects.filter(
-            created_at__gte=start_date_obj,
-            created_at__lte=end_date_obj
-        )
-        
-        if status:
-            all_orders = all_orders.filter(order_status=status)
-        
-        # Create workbook and add a worksheet
-        workbook = xlwt.Workbook(encoding='utf-8')
-        worksheet = workbook.add_sheet('Orders Report')
-        
-        # Styling
-        header_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center; pattern: pattern solid, fore_colour light_blue;')
-        title_style = xlwt.easyxf('font: bold on, height 280; align: wrap on, vert centre, horiz center;')
-        date_range_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center;')
-        date_style = xlwt.easyxf('font: bold off; align: wrap on, vert centre, horiz center', num_format_str='YYYY-MM-DD HH:MM:SS')
-        money_style = xlwt.easyxf('font: bold off; align: horiz right', num_format_str='#,##0.00')
-        total_style = xlwt.easyxf('font: bold on; align: horiz right; pattern: pattern solid, fore_colour light_green;', num_format_str='#,##0.00')
-        
-        # Add report title and date range
-        title_row = 0
-        date_range_row = 1
-        header_row = 3  # Move header down to make room for title and date range
-        
-        # Report title
-        worksheet.write_merge(title_row, title_row, 0, 11, 'Orders Report', title_style)
-        
-        # Date range information
-        date_range_text = f'Report Period: {start_date_obj.strftime("%d %b %Y %H:%M:%S")} to {end_date_obj.strftime("%d %b %Y %H:%M:%S")}'
-        if status:
-            date_range_text += f' | Status: {status}'
-        worksheet.write_merge(date_range_row, date_range_row, 0, 11, date_range_text, date_range_style)
-        
-        # Write header row
-        columns = ['Order #', 'Date', 'Customer', 'Customer Phone', 'Items Count', 'Status', 'Payment Status', 'Payment Method', 'Subtotal', 'Tax', 'Discount', 'Total']
-        
-        for col_num, column_title in enumerate(columns):
-            worksheet.write(header_row, col_num, column_title, header_style)
-        
-        # Write data rows
-        grand_total = 0
-        for row_num, order in enumerate(all_orders, 1):
-            # Get the items count for this order
-            items_count = order.items.count()
-            
-            # Adjust row index to account for header rows
-            adjusted_row = row_num + header_row
-            
-            worksheet.write(adjusted_row, 0, order.reference_number)
-            worksheet.write(adjusted_row, 1, order.created_at.strftime('%Y-%m-%d %H:%M:%S'), date_style)
-            worksheet.write(adjusted_row, 2, order.customer_name or 'Walk-in Customer')
-            worksheet.write(adjusted_row, 3, order.customer_phone or 'N/A')
-            worksheet.write(adjusted_row, 4, items_count)
-            worksheet.write(adjusted_row, 5, order.order_status)
-            worksheet.write(adjusted_row, 6, order.payment_status)
-            worksheet.write(adjusted_row, 7, order.payment_method)
-            worksheet.write(adjusted_row, 8, float(order.subtotal), money_style)
-            worksheet.write(adjusted_row, 9, float(order.tax_amount), money_style)
-            worksheet.write(adjusted_row, 10, float(order.discount_amount or 0), money_style)
-            worksheet.write(adjusted_row, 11, float(order.total_amount), money_style)
-            
-            # Only include non-cancelled orders in the total
-            if order.order_status != 'Cancelled':
-                grand_total += float(order.total_amount)
-        
-        # Write grand total row
-        total_row = len(all_orders) + header_row + 2
-        worksheet.write(total_row, 10, "GRAND TOTAL:", xlwt.easyxf('font: bold on; align: horiz right;'))
-        worksheet.write(total_row, 11, grand_total, total_style)
-        
-        # Set column width
-        for col_num in range(len(columns)):
-            worksheet.col(col_num).width = 256 * 20  # 20 characters wide
-        
-        # Set up the response
-        response = HttpResponse(content_type='application/ms-excel')
-        filename = f"orders_report_{start_date_obj.strftime('%Y%m%d_%H%M%S')}_to_{end_date_obj.strftime('%Y%m%d_%H%M%S')}.xls"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Save workbook to response
-        workbook.save(response)
-        return response
+        # The workbook is written by the background worker
+        job = enqueue('export_orders_excel', {
+            'start': start_date_obj.isoformat(),
+            'end': end_date_obj.isoformat(),
+            'status': status or None,
+        }, user=request.user)
+        return redirect('job_detail', job_id=job.id)
         
     except Exception as e:
         return JsonResponse({
-            'error': f'An error occurred while generating the Excel report: {str(e)}'
+            'error': f'An error occurred while queuing the Excel report: {str(e)}'
         }, status=500)
 
 
@@ -449,99 +369,195 @@ def export_order_items_excel(request):
                 'error': 'Start date cannot be after end date.'
             }, status=400)
     
-        # Aggregate product sales data with exact timestamps
-        product_sales = OrderItem.objects.filter(
-            order__created_at__gte=start_date_obj,
-            order__created_at__lte=end_date_obj,
-            order__order_status='Completed'  # Only include completed orders
-        )
-        
-        if category:
-            product_sales = product_sales.filter(product__category_id=category)
-            category_name = Category.objects.get(id=category).name
-        else:
-            category_name = "All Categories"
-        
-        # Group by product and sum quantities and totals
-        product_sales = product_sales.values(
-            'product__name', 
-            'product__category__name'
-        ).annotate(
-            total_quantity=Sum('quantity'),
-            total_sales=Sum('total_price'),
-            avg_unit_price=Sum('total_price') / Sum('quantity')
-        ).order_by('-total_quantity')
-        
-        # Create workbook and add a worksheet
-        workbook = xlwt.Workbook(encoding='utf-8')
-        worksheet = workbook.add_sheet('Products Sold Report')
-        
-        # Define column widths in characters
-        col_widths = [30, 20, 15, 15, 20]
-        
-        # Styling
-        header_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center; pattern: pattern solid, fore_colour light_blue;')
-        title_style = xlwt.easyxf('font: bold on, height 280; align: wrap on, vert centre, horiz center;')
-        date_range_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center;')
-        money_style = xlwt.easyxf('font: bold off; align: horiz right', num_format_str='#,##0.00')
-        total_style = xlwt.easyxf('font: bold on; align: horiz right; pattern: pattern solid, fore_colour light_green;', num_format_str='#,##0.00')
-        
-        # Add report title and date range
-        title_row = 0
-        date_range_row = 1
-        header_row = 3  # Move header down to make room for title and date range
-        
-        # Report title
-        worksheet.write_merge(title_row, title_row, 0, 4, 'Products Sold Report', title_style)
-        
-        # Date range information
-        date_range_text = f'Report Period: {start_date_obj.strftime("%d %b %Y %H:%M:%S")} to {end_date_obj.strftime("%d %b %Y %H:%M:%S")} | Category: {category_name}'
-        worksheet.write_merge(date_range_row, date_range_row, 0, 4, date_range_text, date_range_style)
-        
-        # Write header row
-        columns = ['Product', 'Category', 'Quantity Sold', 'Unit Price', 'Total Sales']
-        
-        for col_num, column_title in enumerate(columns):
-            worksheet.write(header_row, col_num, column_title, header_style)
-            worksheet.col(col_num).width = 256 * col_widths[col_num]  # Set column width
-        
-        # Write data rows
-        grand_total_qty = 0
-        grand_total_sales = 0
-        for row_num, product in enumerate(product_sales, 1):
-            # Adjust row index to account for header rows
-            adjusted_row = row_num + header_row
-            
-            worksheet.write(adjusted_row, 0, product['product__name'])
-            worksheet.write(adjusted_row, 1, product['product__category__name'] or 'Unknown')
-            worksheet.write(adjusted_row, 2, product['total_quantity'])
-            worksheet.write(adjusted_row, 3, float(product['avg_unit_price']), money_style)
-            worksheet.write(adjusted_row, 4, float(product['total_sales']), money_style)
-            
-            grand_total_qty += product['total_quantity']
-            grand_total_sales += float(product['total_sales'])
-        
-        # Write grand total row
-        total_row = len(product_sales) + header_row + 2
-        worksheet.write(total_row, 1, "GRAND TOTAL:", xlwt.easyxf('font: bold on; align: horiz right;'))
-        worksheet.write(total_row, 2, grand_total_qty, xlwt.easyxf('font: bold on;'))
-        worksheet.write(total_row, 4, grand_total_sales, total_style)
-        
-        # Set up the response
-        response = HttpResponse(content_type='application/ms-excel')
-        filename = f"products_sold_report_{start_date_obj.strftime('%Y%m%d_%H%M%S')}_to_{end_date_obj.strftime('%Y%m%d_%H%M%S')}.xls"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if category and not Category.objects.filter(id=category).exists():
+            return JsonResponse({
+                'error': f'Invalid category: {category}'
+            }, status=400)
         
-        # Save workbook to response
-        workbook.save(response)
-        return response
+        # The workbook is written by the background worker
+        job = enqueue('export_order_items_excel', {
+            'start': start_date_obj.isoformat(),
+            'end': end_date_obj.isoformat(),
+            'category': category or None,
+        }, user=request.user)
+        return redirect('job_detail', job_id=job.id)
         
     except Exception as e:
         return JsonResponse({
-            'error': f'An error occurred while generating the Excel report: {str(e)}'
+            'error': f'An error occurred while queuing the Excel report: {str(e)}'
         }, status=500)
 
 
+def _sales_receipt_data(start_date, end_date):
+    """Figures shown by sales_receipt, as plain data that can be cached"""
+    # Get all completed orders in the date range, hot and archived
+    completed = Q(created_at__gte=start_date, created_at__lte=end_date, order_status='Completed')
+    paid = Q(payment_status='Paid')
+    pending = Q(payment_status='Pending')
+    order_totals = aggregate_orders(
+        completed, start_date,
+        completed_order_count=Count('id'),
+        total_sales=Sum('total_amount'),
+        total_service_charge=Sum('service_charge_amount'),
+        total_paid=Sum('total_amount', filter=paid),
+        total_pending=Sum('total_amount', filter=pending),
+    )
+    
+    # Calculate the totals with proper decimal precision
+    total_sales = order_totals['total_sales'] or Decimal('0.00')
+    total_service_charge = order_totals['total_service_charge'] or Decimal('0.00')
+    total_paid = order_totals['total_paid'] or Decimal('0.00')
+    total_pending = order_totals['total_pending'] or Decimal('0.00')
+    
+    # Get all bill adjustments in the date range
+    bill_adjustments = BillAdjustment.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date
+    )
+    
+    # Calculate the total bill adjustments
+    total_bill_adjustments = bill_adjustments.aggregate(
+        total=Coalesce(Sum('price'), Decimal('0.00'))
+    )['total']
+    
+    # Get all advance adjustments in the date range
+    advance_adjustments = AdvanceAdjustment.objects.filter(
+        created_at__gte=start_date,
+        created_at__lte=end_date
+    )
+    
+    # Calculate the total advance adjustments
+    total_advance_adjustments = advance_adjustments.aggregate(
+        total=Coalesce(Sum('amount'), Decimal('0.00'))
+    )['total']
+    
+    # Calculate the total adjustments
+    total_adjustments = total_bill_adjustments + total_advance_adjustments
+    
+    # Calculate the net revenue
+    net_revenue = total_sales - total_adjustments
+    
+    # Determine if there's a shortage
+    is_shortage = net_revenue < 0
+    shortage_amount = abs(net_revenue) if is_shortage else Decimal('0.00')
+    
+    # Get products sold in the date range
+    products_sold = product_sales(completed, start_date, with_category=False)
+    
+    return {
+        'completed_order_count': order_totals['completed_order_count'],
+        'total_sales': total_sales,
+        'total_service_charge': total_service_charge,
+        'total_paid': total_paid,
+        'total_pending': total_pending,
+        'total_bill_adjustments': total_bill_adjustments,
+        'total_advance_adjustments': total_advance_adjustments,
+        'total_adjustments': total_adjustments,
+        'net_revenue': net_revenue,
+        'is_shortage': is_shortage,
+        'shortage_amount': shortage_amount,
+        'products_sold': products_sold,
+    }
+
+
+def _sales_receipt_context(params):
+    """
+    Figures and settings shown by sales_receipt and printed by sales_receipt_print
+
+    Args:
+        params: Query or form data with the optional start_date and end_date
+    """
+    # Get date range from request
+    start_date_param = params.get('start_date')
+    end_date_param = params.get('end_date')
+    
+    # Set default date range to current month if not provided
+    today = timezone.now()
+    
+    if not start_date_param or not end_date_param:
+        start_date = timezone.make_aware(datetime.combine(today.replace(day=1).date(), datetime.min.time()))
+        end_date = timezone.make_aware(datetime.combine(today.date(), datetime.max.time()))
+    else:
+        try:
+            # Try to parse as datetime with time first
+            try:
+                start_date = datetime.strptime(start_date_param, '%Y-%m-%d %H:%M:%S')
+                # Make timezone aware
+                if timezone.is_naive(start_date):
+                    start_date = timezone.make_aware(start_date)
+            except ValueError:
+                # Fall back to date only format
+                start_date = datetime.strptime(start_date_param, '%Y-%m-%d').date()
+                # Convert to datetime at start of day
+                start_date = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+                
+            # Try to parse as datetime with time first
+            try:
+                end_date = datetime.strptime(end_date_param, '%Y-%m-%d %H:%M:%S')
+                # Make timezone aware
+                if timezone.is_naive(end_date):
+                    end_date = timezone.make_aware(end_date)
+            except ValueError:
+                # Fall back to date only format
+                end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
+                # Convert to datetime at end of day
+                end_date = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
+        except ValueError:
+            # If there's any issue parsing the dates, use default values
+            start_date = timezone.make_aware(datetime.combine(today.replace(day=1).date(), datetime.min.time()))
+            end_date = timezone.make_aware(datetime.combine(today.date(), datetime.max.time()))
+    
+    # Exact range, so end day ranges with a time of day do not collide
+    # with whole-day ones
+    report = report_cache.cached_report(
+        'sales_receipt', start_date, end_date, [report_cache.ORDERS, report_cache.ADJUSTMENTS],
+        lambda: _sales_receipt_data(start_date, end_date),
+    )
+    
+    context = {
+        **report,
+        'start_date': start_date,
+        'end_date': end_date,
+        'now': timezone.now(),
+    }
+    
+    # Get business settings
+    try:
+        business_settings = settings_store.get_values([
+            'business_name', 'business_address', 'business_phone', 
+            'business_email', 'currency_symbol'
+        ])
+        
+        context.update({
+            'business_name': business_settings['business_name'],
+            'business_address': business_settings['business_address'],
+            'business_phone': business_settings['business_phone'],
+            'business_email': business_settings['business_email'],
+            'currency_symbol': business_settings['currency_symbol'] or 'Rs.',
+        })
+        
+        # Get business logo from BusinessLogo model
+        context['business_logo'] = BusinessLogo.get_logo_url()
+    except Exception as e:
+        logger.error(f"Error getting business settings: {str(e)}")
+        context.update({
+            'business_name': 'POS System',
+            'currency_symbol': 'Rs.',
+        })
+    
+    # Get receipt settings
+    try:
+        context.update(settings_store.get_values([
+            'receipt_header', 'receipt_footer', 'receipt_show_logo',
+            'receipt_show_cashier', 'receipt_paper_size',
+            'receipt_custom_css'
+        ]))
+    except Exception as e:
+        logger.error(f"Error getting receipt settings: {str(e)}")
+    
+    return context
+
+
 @login_required
 def sales_receipt(request):
     """Display a printable receipt for sales summary report"""
@@ -554,198 +570,9 @@ def sales_receipt(request):
         return redirect('dashboard')
     
     try:
-        # Get date range from request
-        start_date_param = request.GET.get('start_date')
-        end_date_param = request.GET.get('end_date')
+        context = _sales_receipt_context(request.GET)
         
-        # Set default date range to current month if not provided
-        today = timezone.now()
-        
-        if not start_date_param or not end_date_param:
-            start_date = timezone.make_aware(datetime.combine(today.replace(day=1).date(), datetime.min.time()))
-            end_date = timezone.make_aware(datetime.combine(today.date(), datetime.max.time()))
-        else:
-            try:
-                # Try to parse as datetime with time first
-                try:
-                    start_date = datetime.strptime(start_date_param, '%Y-%m-%d %H:%M:%S')
-                    # Make timezone aware
-                    if timezone.is_naive(start_date):
-                        start_date = timezone.make_aware(start_date)
-                except ValueError:
-                    # Fall back to date only format
-                    start_date = datetime.strptime(start_date_param, '%Y-%m-%d').date()
-                    # Convert to datetime at start of day
-                    start_date = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
-                    
-                # Try to parse as datetime with time first
-                try:
-                    end_date = datetime.strptime(end_date_param, '%Y-%m-%d %H:%M:%S')
-                    # Make timezone aware
-                    if timezone.is_naive(end_date):
-                        end_date = timezone.make_aware(end_date)
-                except ValueError:
-                    # Fall back to date only format
-                    end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
-                    # Convert to datetime at end of day
-                    end_date = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
-            except ValueError:
-                # If there's any issue parsing the dates, use default values
-                start_date = timezone.make_aware(datetime.combine(today.replace(day=1).date(), datetime.min.time()))
-                end_date = timezone.make_aware(datetime.combine(today.date(), datetime.max.time()))
-        
-        # Create a cache key based on the date range
-        cache_key = f"sales_receipt_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
-        
-        # Try to get cached results
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            logger.debug(f"Returning cached sales receipt data for {start_date} to {end_date}")
-            return render(request, 'posapp/reports/sales_receipt.html', cached_data)
-        
-        # Get all completed orders in the date range
-        completed_orders = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date,
-            order_status='Completed'
-        )
-        
-        # Calculate the total sales amount with proper decimal precision
-        total_sales = completed_orders.aggregate(
-            total=Coalesce(Sum('total_amount'), Decimal('0.00'))
-        )['total']
-        
-        # Calculate the total service charge amount
-        total_service_charge = completed_orders.aggregate(
-            total=Coalesce(Sum('service_charge_amount'), Decimal('0.00'))
-        )['total']
-        
-        # Calculate the total paid amount
-        total_paid = completed_orders.filter(
-            payment_status='Paid'
-        ).aggregate(
-            total=Coalesce(Sum('total_amount'), Decimal('0.00'))
-        )['total']
-        
-        # Calculate the total pending amount
-        total_pending = completed_orders.filter(
-            payment_status='Pending'
-        ).aggregate(
-            total=Coalesce(Sum('total_amount'), Decimal('0.00'))
-        )['total']
-        
-        # Get all bill adjustments in the date range
-        bill_adjustments = BillAdjustment.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        )
-        
-        # Calculate the total bill adjustments
-        total_bill_adjustments = bill_adjustments.aggregate(
-            total=Coalesce(Sum('price'), Decimal('0.00'))
-        )['total']
-        
-        # Get all advance adjustments in the date range
-        advance_adjustments = AdvanceAdjustment.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        )
-        
-        # Calculate the total advance adjustments
-        total_advance_adjustments = advance_adjustments.aggregate(
-            total=Coalesce(Sum('amount'), Decimal('0.00'))
-        )['total']
-        
-        # Calculate the total adjustments
-        total_adjustments = total_bill_adjustments + total_advance_adjustments
-        
-        # Calculate the net revenue
-        net_revenue = total_sales - total_adjustments
-        
-        # Determine if there's a shortage
-        is_shortage = net_revenue < 0
-        shortage_amount = abs(net_revenue) if is_shortage else Decimal('0.00')
-        
-        # Get products sold in the date range
-        products_sold = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date,
-            order__order_status='Completed'
-        ).values(
-            'product__name'
-        ).annotate(
-            total_quantity=Sum('quantity'),
-            total_sales=Sum('total_price')
-        ).order_by('-total_quantity')
-        
-        # Prepare context data
-        context = {
-            'completed_orders': completed_orders,
-            'total_sales': total_sales,
-            'total_service_charge': total_service_charge,
-            'total_paid': total_paid,
-            'total_pending': total_pending,
-            'bill_adjustments': bill_adjustments,
-            'total_bill_adjustments': total_bill_adjustments,
-            'advance_adjustments': advance_adjustments,
-            'total_advance_adjustments': total_advance_adjustments,
-            'total_adjustments': total_adjustments,
-            'net_revenue': net_revenue,
-            'is_shortage': is_shortage,
-            'shortage_amount': shortage_amount,
-            'products_sold': products_sold,
-            'start_date': start_date,
-            'end_date': end_date,
-            'now': timezone.now(),
-        }
-        
-        # Get business settings
-        try:
-            business_settings = get_or_create_settings([
-                'business_name', 'business_address', 'business_phone', 
-                'business_email', 'currency_symbol'
-            ])
-            
-            context.update({
-                'business_name': business_settings['business_name'].setting_value,
-                'business_address': business_settings['business_address'].setting_value,
-                'business_phone': business_settings['business_phone'].setting_value,
-                'business_email': business_settings['business_email'].setting_value,
-                'currency_symbol': business_settings['currency_symbol'].setting_value or 'Rs.',
-            })
-            
-            # Get business logo from BusinessLogo model
-            context['business_logo'] = BusinessLogo.get_logo_url()
-        except Exception as e:
-            logger.error(f"Error getting business settings: {str(e)}")
-            context.update({
-                'business_name': 'POS System',
-                'currency_symbol': 'Rs.',
-            })
-        
-        # Get receipt settings
-        try:
-            receipt_settings = get_or_create_settings([
-                'receipt_header', 'receipt_footer', 'receipt_show_logo',
-                'receipt_show_cashier', 'receipt_paper_size',
-                'receipt_custom_css'
-            ])
-            
-            context.update({
-                'receipt_header': receipt_settings['receipt_header'].setting_value,
-                'receipt_footer': receipt_settings['receipt_footer'].setting_value,
-                'receipt_show_logo': receipt_settings['receipt_show_logo'].setting_value == 'True',
-                'receipt_show_cashier': receipt_settings['receipt_show_cashier'].setting_value == 'True',
-                'receipt_paper_size': receipt_settings['receipt_paper_size'].setting_value,
-                'receipt_custom_css': receipt_settings['receipt_custom_css'].setting_value,
-            })
-        except Exception as e:
-            logger.error(f"Error getting receipt settings: {str(e)}")
-        
-        # Store in cache for 1 hour (3600 seconds)
-        cache.set(cache_key, context, 3600)
-        
-        logger.info(f"Generated sales receipt for period {start_date} to {end_date} by user {request.user.username}")
+        logger.info(f"Generated sales receipt for period {context['start_date']} to {context['end_date']} by user {request.user.username}")
         
         return render(request, 'posapp/reports/sales_receipt.html', context)
     except Exception as e:
@@ -756,29 +583,39 @@ def sales_receipt(request):
 
 @login_required
 @management_required
-def get_or_create_settings(keys, description_dict=None):
-    result = {}
-    for key in keys:
-        try:
-            setting = Setting.objects.get(setting_key=key)
-        except Setting.DoesNotExist:
-            # Create with default values if description_dict is provided
-            if description_dict and key in description_dict:
-                default_value = description_dict[key].get('default', '')
-                description = description_dict[key].get('help_text', key.replace('_', ' ').title())
-                setting = Setting.objects.create(
-                    setting_key=key,
-                    setting_value=default_value,
-                    setting_description=description
-                )
-            else:
-                setting = Setting.objects.create(
-                    setting_key=key,
-                    setting_value='',
-                    setting_description=key.replace('_', ' ').title()
-                )
-        result[key] = setting
-    return result
+@require_POST
+def sales_receipt_print(request):
+    """Send the sales summary receipt straight to the receipt printers"""
+    context = _sales_receipt_context(request.POST)
+    return printing.print_response(
+        printing.SALES_RECEIPT, context, request.user,
+        f"Sales {context['start_date']:%Y-%m-%d %H:%M} to {context['end_date']:%Y-%m-%d %H:%M}"
+    )
+
+
+@login_required
+@management_required
+def sales_receipt_pdf(request):
+    """
+    Sales summary for any range as a PDF, rendered on request
+
+    The range may still be open, so nothing is stored; the PDF is written to
+    a spooled temporary file and streamed from there.
+    """
+    if not PDF_EXPORT_AVAILABLE:
+        return JsonResponse({
+            'error': 'PDF export functionality requires the reportlab package. Please install it with: pip install reportlab'
+        }, status=400)
+    
+    context = _sales_receipt_context(request.GET)
+    output = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    write_sales_summary_pdf(receipt_figures(context), output)
+    output.seek(0)
+    
+    filename = f"sales_summary_{timezone.localtime(context['start_date']):%Y%m%d}_{timezone.localtime(context['end_date']):%Y%m%d}.pdf"
+    response = FileResponse(output, content_type=PDF_CONTENT_TYPE, filename=filename)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
@@ -808,11 +645,9 @@ def sales_summary_detail(request, pk):
     summary = get_object_or_404(SalesSummary, pk=pk)
     
     # Get business information for the receipt
-    business_settings = {'business_name': 'POS System', 'business_address': '', 'business_phone': '', 'currency_symbol': 'Rs.'}
-    for setting in Setting.objects.filter(
-        setting_key__in=['business_name', 'business_address', 'business_phone', 'currency_symbol']
-    ):
-        business_settings[setting.setting_key] = setting.setting_value
+    business_settings = settings_store.get_values(['business_name', 'business_address', 'business_phone', 'currency_symbol'])
+    business_settings['business_name'] = business_settings['business_name'] or 'POS System'
+    business_settings['currency_symbol'] = business_settings['currency_symbol'] or 'Rs.'
     
     # Get business logo URL
     logo_url = BusinessLogo.get_logo_url()
@@ -824,4 +659,84 @@ def sales_summary_detail(request, pk):
         'products_sold': summary.summary_data.get('products_sold', []) if summary.summary_data else [],
     }
     
-    return render(request, 'posapp/reports/sales_summary_detail.html', context) 
\ No newline at end of file
+    return render(request, 'posapp/reports/sales_summary_detail.html', context)
+
+
+@login_required
+@management_required
+def sales_summary_pdf(request, pk):
+    """
+    Stored PDF of a closed day's sales summary
+
+    The PDF never changes once written, so it is served with its ETag and
+    cached by the browser for good. Summaries built before PDFs were stored
+    get theirs from the background worker.
+    """
+    if not PDF_EXPORT_AVAILABLE:
+        return JsonResponse({
+            'error': 'PDF export functionality requires the reportlab package. Please install it with: pip install reportlab'
+        }, status=400)
+    
+    summary = get_object_or_404(SalesSummary, pk=pk)
+    etag = SalesSummaryPdf.objects.filter(summary=summary).values_list('etag', flat=True).first()
+    if etag is None:
+        job = enqueue_sales_summary_pdf(summary, request.user)
+        return redirect('job_detail', job_id=job.id)
+    
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        content = SalesSummaryPdf.objects.values_list('content', flat=True).get(summary=summary)
+        response = HttpResponse(bytes(content), content_type=PDF_CONTENT_TYPE)
+        response['Content-Disposition'] = f'inline; filename="{sales_summary_filename(summary)}"'
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
+
+
+def _sales_analytics_params(request):
+    """
+    Range and scope of the sales analytics from the query string
+
+    Returns:
+        A tuple of (start_date, end_date, since, is_admin); the range defaults
+        to the last 90 days and branch managers only see data since the last
+        end day
+    """
+    is_admin = request.user.is_superuser or (hasattr(request.user, 'profile') and request.user.profile.role.name == 'Admin')
+    today = timezone.localdate()
+    try:
+        start_date = datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.GET['end'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        start_date, end_date = today - timedelta(days=89), today
+
+    since = None
+    if not is_admin:
+        last_end_day = EndDay.get_last_end_day()
+        since = last_end_day.end_date if last_end_day else None
+    return start_date, end_date, since, is_admin
+
+
+@login_required
+@management_required
+def sales_analytics_report(request):
+    """Hour x weekday heatmap, day of week and basket size analytics"""
+    start_date, end_date, since, is_admin = _sales_analytics_params(request)
+    context = {
+        **analytics.sales_analytics(start_date, end_date, since=since),
+        'start': start_date,
+        'end': end_date,
+        'is_admin': is_admin,
+        'last_end_day': EndDay.get_last_end_day() if since else None,
+        'currency_symbol': settings_store.get_values(['currency_symbol'])['currency_symbol'] or 'Rs.',
+    }
+    return render(request, 'posapp/reports/sales_analytics.html', context)
+
+
+@login_required
+@management_required
+def sales_analytics_api(request):
+    """The figures of sales_analytics_report as JSON"""
+    start_date, end_date, since, _ = _sales_analytics_params(request)
+    return JsonResponse(analytics.sales_analytics(start_date, end_date, since=since))
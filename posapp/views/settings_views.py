@@ -2,9 +2,9 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django import forms
-from django.db import transaction
 
-from ..models import Setting, BusinessLogo
+from .. import settings_store
+from ..models import BusinessLogo
 from ..forms import BusinessLogoForm
 from ..views.user_views import is_admin
 
@@ -59,44 +59,6 @@ class SettingsForm(forms.Form):
                 )
 
 
-def get_or_create_settings(keys, settings_config=None):
-    """Get or create settings with the specified keys"""
-    settings_config = settings_config or {}
-    existing_settings = {s.setting_key: s for s in Setting.objects.filter(setting_key__in=keys)}
-    
-    result = {}
-    for key in keys:
-        if key in existing_settings:
-            result[key] = existing_settings[key]
-        else:
-            # Get default value and description from config if available
-            default_value = ''
-            description = key.replace('_', ' ').title()
-            
-            if settings_config and key in settings_config:
-                config = settings_config[key]
-                default_value = config.get('value', '')
-                description = config.get('help_text', description)
-            
-            # Create setting with default value if it doesn't exist
-            result[key] = Setting.objects.create(
-                setting_key=key,
-                setting_value=default_value,
-                setting_description=description
-            )
-    
-    return result
-
-
-def update_settings(settings_data):
-    """Update settings in the database"""
-    with transaction.atomic():
-        for key, value in settings_data.items():
-            Setting.set_value(key, value)
-    
-    return True
-
-
 @login_required
 def settings_dashboard(request):
     """Main settings dashboard"""
@@ -142,16 +104,15 @@ def business_settings(request):
         'business_website': {'type': 'text', 'required': False, 'help_text': 'Business website URL'},
         'business_tagline': {'type': 'text', 'required': False, 'help_text': 'Your business tagline or slogan'},
         'currency_symbol': {'type': 'text', 'required': True, 'help_text': 'Currency symbol (e.g., $, €, £)'},
-        'tax_rate_card': {'type': 'number', 'required': True, 'help_text': 'Tax rate (%) for card payments', 'value': '5.0'},
-        'tax_rate_cash': {'type': 'number', 'required': True, 'help_text': 'Tax rate (%) for cash payments', 'value': '15.0'},
-        'default_service_charge': {'type': 'number', 'required': True, 'help_text': 'Default service charge (%) for Dine In orders', 'value': '5.0'},
+        'tax_rate_card': {'type': 'number', 'required': True, 'help_text': 'Tax rate (%) for card payments'},
+        'tax_rate_cash': {'type': 'number', 'required': True, 'help_text': 'Tax rate (%) for cash payments'},
+        'default_service_charge': {'type': 'number', 'required': True, 'help_text': 'Default service charge (%) for Dine In orders'},
+        'reorder_lead_days': {'type': 'number', 'required': True, 'help_text': 'Days between ordering stock and receiving it'},
+        'reorder_cover_days': {'type': 'number', 'required': True, 'help_text': 'Days of sales a stock order should cover'},
     }
     
     # Get existing settings
-    settings = get_or_create_settings(business_settings_fields.keys(), business_settings_fields)
-    
-    # Prepare initial data
-    initial_data = {key: settings[key].setting_value for key in business_settings_fields.keys()}
+    initial_data = settings_store.get_values(business_settings_fields.keys())
     
     # Update business settings fields with current values
     for key in business_settings_fields:
@@ -177,7 +138,7 @@ def business_settings(request):
             # Handle regular settings form
             form = SettingsForm(request.POST, settings=business_settings_fields)
             if form.is_valid():
-                update_settings(form.cleaned_data)
+                settings_store.save(form.cleaned_data)
                 messages.success(request, "Business settings updated successfully.")
                 return redirect('business_settings')
     else:
@@ -211,10 +172,7 @@ def receipt_settings(request):
     }
     
     # Get existing settings
-    settings = get_or_create_settings(receipt_settings_fields.keys(), receipt_settings_fields)
-    
-    # Prepare initial data
-    initial_data = {key: settings[key].setting_value for key in receipt_settings_fields.keys()}
+    initial_data = settings_store.get_values(receipt_settings_fields.keys())
     
     # Update receipt settings fields with current values
     for key in receipt_settings_fields:
@@ -224,7 +182,7 @@ def receipt_settings(request):
         form = SettingsForm(request.POST, settings=receipt_settings_fields)
         
         if form.is_valid():
-            update_settings(form.cleaned_data)
+            settings_store.save(form.cleaned_data)
             messages.success(request, "Receipt settings updated successfully.")
             return redirect('receipt_settings')
     else:
@@ -264,10 +222,7 @@ def theme_settings(request):
     }
     
     # Get existing settings
-    settings = get_or_create_settings(theme_settings_fields.keys(), theme_settings_fields)
-    
-    # Prepare initial data
-    initial_data = {key: settings[key].setting_value for key in theme_settings_fields.keys()}
+    initial_data = settings_store.get_values(theme_settings_fields.keys())
     
     # Update theme settings fields with current values
     for key in theme_settings_fields:
@@ -277,7 +232,7 @@ def theme_settings(request):
         # Handle regular settings form
         form = SettingsForm(request.POST, settings=theme_settings_fields)
         if form.is_valid():
-            update_settings(form.cleaned_data)
+            settings_store.save(form.cleaned_data)
             messages.success(request, "Theme settings updated successfully.")
             return redirect('theme_settings')
     else:
@@ -0,0 +1,54 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.views.decorators.http import require_POST
+
+from .. import sse, stock_alerts
+from .dashboard_views import can_access_management
+
+__all__ = ['stock_alert_feed', 'stock_alert_resolve']
+
+
+def _feed_message(event_id):
+    """
+    The SSE message with the open stock alerts, if they differ from event_id
+
+    The event id is a digest of the alerts and their products' stock, so a
+    screen that reconnects is only sent the list again when it changed.
+    """
+    alerts = stock_alerts.open_alerts()
+    state = '\n'.join(f"{alert['id']}:{alert['stock_quantity']}" for alert in alerts)
+    current = hashlib.sha1(state.encode()).hexdigest()[:16]
+    if current == event_id:
+        return None, event_id
+    data = [dict(alert, created_at=alert['created_at'].isoformat()) for alert in alerts]
+    return sse.message('stock_alerts', current, {'alerts': data}), current
+
+
+async def stock_alert_feed(request):
+    """
+    Server-sent events feed of the open low stock alerts, for managers
+
+    Pages in posapp/base.html keep the navbar alert count from it. See
+    posapp.sse for how the feed is served under ASGI and WSGI.
+    """
+    allowed = await sync_to_async(lambda: request.user.is_authenticated and can_access_management(request.user))()
+    if not allowed:
+        return HttpResponse(status=403)
+    return await sse.feed_response(request, _feed_message)
+
+
+@login_required
+@require_POST
+def stock_alert_resolve(request, alert_id):
+    """Dismiss a low stock alert"""
+    if not can_access_management(request.user):
+        messages.error(request, "You don't have permission to access this feature.")
+        return redirect('pos')
+    if stock_alerts.resolve(alert_id, request.user):
+        messages.success(request, "Stock alert dismissed.")
+    return redirect('dashboard')
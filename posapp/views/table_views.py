@@ -0,0 +1,30 @@
+import hashlib
+
+from .. import sse, tables
+
+__all__ = ['table_feed']
+
+
+def _feed_message(event_id):
+    """
+    The SSE message with the occupied tables, if they differ from event_id
+
+    The event id is a digest of the occupied table numbers, so a terminal
+    that reconnects is only sent the list again when it changed.
+    """
+    active_tables = sorted(tables.occupancy())
+    current = hashlib.sha1('\n'.join(active_tables).encode()).hexdigest()[:16]
+    if current == event_id:
+        return None, event_id
+    return sse.message('tables', current, {'active_tables': active_tables}), current
+
+
+async def table_feed(request):
+    """
+    Server-sent events feed of the occupied tables
+
+    POS terminals keep their copy of the list from it and check tables
+    without asking the server. See posapp.sse for how the feed is served
+    under ASGI and WSGI.
+    """
+    return await sse.feed_response(request, _feed_message)
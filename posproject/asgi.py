@@ -1,5 +1,13 @@
 """
 ASGI config for posproject project.
+
+Serving the app through ASGI lets the kitchen display feed
+(views.kitchen_feed) stream ticket changes as they happen, e.g.:
+
+    gunicorn posproject.asgi:application -k uvicorn.workers.UvicornWorker
+
+Under WSGI the feed still works, with screens reconnecting every few
+seconds to fetch changes instead.
 """
 
 import os
@@ -8,4 +16,4 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'posproject.settings')
 
-application = get_asgi_application() 
\ No newline at end of file
+application = get_asgi_application()
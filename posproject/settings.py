@@ -36,10 +36,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posapp.middleware.AuditContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -50,7 +52,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -60,6 +61,15 @@ TEMPLATES = [
                 'posapp.context_processors.settings_processor',
                 'posapp.context_processors.pending_orders_processor',
             ],
+            # Keep compiled templates in memory instead of parsing them on
+            # every request. runserver's autoreloader clears this cache when a
+            # template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -83,6 +93,50 @@ DATABASES = {
     }
 }
 
+# Shared by every worker process on this host, so the version counters in
+# posapp.versioning, and everything keyed by them (list ETags, fragments,
+# cached reports), see each other's changes. Point it at Redis or Memcached
+# when workers run on more than one host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+# Historical orders archived by `manage.py archive_orders` are stored in this
+# database alias. Point it at a second entry in DATABASES to keep the archive
+# tables off the primary database.
+POS_ARCHIVE_DATABASE = 'default'
+
+DATABASE_ROUTERS = ['posapp.routers.ArchiveRouter']
+
+# Sales summaries, Excel exports and backfills are queued as background jobs
+# and executed by `manage.py run_jobs`. Set to True to run them inline when
+# no worker is running (development only).
+POS_JOBS_EAGER = False
+
+# Receipts printed on the thermal printers (Printer rows in the admin) are
+# queued and sent by `manage.py run_print_spool`. Set to True to send them
+# inline when no spool worker is running (development only).
+POS_PRINT_EAGER = False
+
+# Audit log entries are queued and written in batches by a background thread.
+# Set to True to write each entry as soon as its transaction commits.
+POS_AUDIT_EAGER = False
+
+# Country calling code dropped from customer phone numbers, so a number typed
+# with and without it is the same customer (see posapp.customers)
+POS_PHONE_COUNTRY_CODE = '92'
+
+# Match customer names in the order search on any word through MySQL FULLTEXT
+# indexes, created by `manage.py build_order_search_index --fulltext`.
+# Otherwise names are matched on their start (see posapp.order_search).
+POS_ORDER_SEARCH_FULLTEXT = False
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -116,11 +170,25 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+# Filled by `manage.py collectstatic` on deployment; not part of the repository
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'posapp/static'),
 ]
 
+# collectstatic gives every file a content-hashed name and writes gzip (and,
+# with the Brotli package, brotli) copies next to it. WhiteNoise serves the
+# hashed files with a one-year immutable Cache-Control, so terminals only
+# download a script or stylesheet again after it changes.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -10,6 +10,6 @@ urlpatterns = [
     path('api/', include('posapp.api.urls')),
 ]
 
+# Static files are served by WhiteNoise (see MIDDLEWARE)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) 
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) 
\ No newline at end of file